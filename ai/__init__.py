@@ -3,10 +3,12 @@ AI处理模块
 """
 from .ollama_client import OllamaClient, AIAnalysisResult
 from .openai_client import OpenAIClient, DeepSeekClient
+from .routing_client import RoutingAIClient
 
 __all__ = [
     'OllamaClient',
     'AIAnalysisResult',
     'OpenAIClient',
-    'DeepSeekClient'
+    'DeepSeekClient',
+    'RoutingAIClient'
 ]
@@ -8,39 +8,78 @@ AI服务管理器
 版本: v1.2.2
 """
 
+import asyncio
 import os
 import logging
-from typing import Optional, List, Dict, Any
-from dataclasses import dataclass, asdict
+import threading
+from concurrent.futures import Future
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Optional, List, Dict, Any, Iterable, Tuple
+from dataclasses import dataclass, asdict, replace
 from .ollama_client import OllamaClient, AIAnalysisResult
+from .analysis_cache import AnalysisCache
+from .segmented_analysis import SegmentedAnalysisMixin
+from .text_compressor import attach_compressor
+from .streaming import GenerationCancelled, streaming
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / 'data' / 'ai_cache.db'
+DEFAULT_LOCAL_MODEL_PATH = Path(__file__).parent.parent / 'data' / 'local_classifier.npz'
+
 
 @dataclass
 class AIConfig:
     """AI服务配置"""
     enabled: bool = True
-    backend: str = "ollama"  # ollama, openai, deepseek
+    backend: str = "ollama"  # ollama, openai, deepseek, hybrid
     ollama_host: str = "http://localhost:11434"
     ollama_model: str = "qwen2.5:3b"
     timeout: int = 180  # 增加到180秒处理大文本
+    ollama_keep_alive: Optional[str] = "30m"  # 模型空闲后常驻显存的时长（负数永久），None使用Ollama默认的5分钟
+    warmup_on_start: bool = False  # 服务启动时在后台预热模型（from_env默认开启）
     auto_analyze: bool = False  # 是否自动分析新对话
+    auto_analyze_min_confidence: float = 0.6  # 置信度低于该值的结果（如降级分析）会被后台重新分析
     enable_fallback: bool = True  # 超时时是否启用降级方案
+    cache_path: Optional[str] = None  # 分析结果缓存数据库路径，None表示不缓存
+    cache_max_mb: int = 64  # 缓存容量上限（MB）
+    batch_concurrency: Optional[int] = None  # 批量分析并发数，None表示按后端默认
+    rate_limit_rpm: Optional[float] = None  # 每分钟最多分析请求数，None表示不限速
+    compress_tokens: Optional[int] = None  # 预压缩的token预算，None表示不压缩
+    local_model_path: Optional[str] = None  # 本地分类器模型路径，None表示不使用
+    local_prepass_confidence: Optional[float] = None  # 本地分类置信度达到该值时跳过大模型分类/标签
+    embedding_backend: str = "hashing"  # 相关对话的向量后端: hashing（离线）, ollama
+    embedding_model: str = "nomic-embed-text"  # Ollama向量模型
+    related_top_k: int = 10  # 每条对话预先计算的相关对话数
     
     @classmethod
     def from_env(cls) -> 'AIConfig':
         """从环境变量创建配置"""
+        cache_enabled = os.getenv('AI_CACHE_ENABLED', 'true').lower() == 'true'
         return cls(
             enabled=os.getenv('AI_ENABLED', 'true').lower() == 'true',
             backend=os.getenv('AI_BACKEND', 'ollama'),
             ollama_host=os.getenv('OLLAMA_HOST', 'http://localhost:11434'),
             ollama_model=os.getenv('OLLAMA_MODEL', 'qwen2.5:3b'),
             timeout=int(os.getenv('AI_TIMEOUT', '180')),  # 默认180秒
+            ollama_keep_alive=os.getenv('OLLAMA_KEEP_ALIVE', '30m') or None,
+            warmup_on_start=os.getenv('AI_WARMUP_ON_START', 'true').lower() == 'true',
             auto_analyze=os.getenv('AI_AUTO_ANALYZE', 'false').lower() == 'true',
-            enable_fallback=os.getenv('AI_ENABLE_FALLBACK', 'true').lower() == 'true'
+            auto_analyze_min_confidence=float(os.getenv('AI_AUTO_ANALYZE_MIN_CONFIDENCE', '0.6')),
+            enable_fallback=os.getenv('AI_ENABLE_FALLBACK', 'true').lower() == 'true',
+            cache_path=os.getenv('AI_CACHE_PATH', str(DEFAULT_CACHE_PATH)) if cache_enabled else None,
+            cache_max_mb=int(os.getenv('AI_CACHE_MAX_MB', '64')),
+            batch_concurrency=int(os.getenv('AI_BATCH_CONCURRENCY', '0')) or None,
+            rate_limit_rpm=float(os.getenv('AI_RATE_LIMIT_RPM', '0')) or None,
+            compress_tokens=int(os.getenv('AI_COMPRESS_TOKENS', '2500')) or None,
+            local_model_path=os.getenv('AI_LOCAL_MODEL_PATH', str(DEFAULT_LOCAL_MODEL_PATH)),
+            local_prepass_confidence=float(os.getenv('AI_LOCAL_PREPASS_CONFIDENCE', '0')) or None,
+            embedding_backend=os.getenv('AI_EMBEDDING_BACKEND', 'hashing'),
+            embedding_model=os.getenv('AI_EMBEDDING_MODEL', 'nomic-embed-text'),
+            related_top_k=int(os.getenv('AI_RELATED_TOP_K', '10'))
         )
 
 
@@ -56,9 +95,16 @@ class AIService:
         """
         self.config = config or AIConfig.from_env()
         self.client = None
+        self.cache: Optional[AnalysisCache] = None
+        self.local_classifier = None  # 本地分类器（LocalClassifier）
+        self._batch = None  # 正在执行的BatchAnalyzer
+        self._inflight: Dict[str, Future] = {}  # 正在生成的分析请求，相同请求共享结果
+        self._inflight_lock = threading.Lock()
         
         if self.config.enabled:
             self._initialize_client()
+            self._initialize_cache()
+            self._initialize_local_classifier()
     
     def _initialize_client(self):
         """初始化AI客户端"""
@@ -67,7 +113,8 @@ class AIService:
                 self.client = OllamaClient(
                     base_url=self.config.ollama_host,
                     model=self.config.ollama_model,
-                    timeout=self.config.timeout
+                    timeout=self.config.timeout,
+                    keep_alive=self.config.ollama_keep_alive
                 )
                 logger.info(f"✅ Ollama客户端初始化成功: {self.config.ollama_model}")
             
@@ -81,13 +128,149 @@ class AIService:
                 self.client = DeepSeekClient()
                 logger.info("✅ DeepSeek客户端初始化成功")
             
+            elif self.config.backend == 'hybrid':
+                self.client = self._build_routing_client()
+                names = ', '.join(b.name for b in self.client.backends)
+                logger.info(f"✅ 混合路由客户端初始化成功: {names}")
+            
             else:
                 raise ValueError(f"不支持的AI后端: {self.config.backend}")
+            
+            if self.config.compress_tokens:
+                attach_compressor(self.client, self.config.compress_tokens)
+                logger.info(f"✅ 预压缩已启用: {self.config.compress_tokens} tokens")
+            
+            if self.config.warmup_on_start:
+                self.preload_model()
         
         except Exception as e:
             logger.error(f"❌ AI客户端初始化失败: {e}")
             self.config.enabled = False
     
+    def _initialize_cache(self):
+        """初始化分析结果缓存（失败时不影响AI功能）"""
+        if not self.config.cache_path:
+            return
+        try:
+            self.cache = AnalysisCache(
+                self.config.cache_path,
+                max_bytes=self.config.cache_max_mb * 1024 * 1024
+            )
+            logger.info(f"✅ 分析缓存已启用: {self.config.cache_path}")
+        except Exception as e:
+            logger.warning(f"⚠️ 分析缓存初始化失败，将不使用缓存: {e}")
+            self.cache = None
+    
+    def _initialize_local_classifier(self):
+        """加载本地分类器（模型不存在或缺少NumPy时使用关键词降级）"""
+        path = self.config.local_model_path
+        if not path or not Path(path).exists():
+            return
+        try:
+            from .local_classifier import LocalClassifier
+            self.local_classifier = LocalClassifier.load(path)
+            logger.info(f"✅ 本地分类器已加载: {self.local_classifier.num_samples} 条训练样本")
+        except Exception as e:
+            logger.warning(f"⚠️ 本地分类器加载失败，降级分析将使用关键词规则: {e}")
+            self.local_classifier = None
+    
+    def train_local_classifier(self, conn) -> Dict[str, Any]:
+        """
+        用数据库中已分类的对话训练本地分类器，保存并立即启用
+        
+        Args:
+            conn: 数据库连接（DatabaseManager.conn）
+        
+        Returns:
+            训练统计
+        """
+        from .local_classifier import LocalClassifier
+        stats = LocalClassifier.train_from_database(
+            conn, self.config.local_model_path or str(DEFAULT_LOCAL_MODEL_PATH),
+            min_confidence=self.config.auto_analyze_min_confidence
+        )
+        self.local_classifier = LocalClassifier.load(stats['path'])
+        return stats
+    
+    def _local_predict(self, conversation_text: str, title: str = ""):
+        """本地模型预测（未加载或失败时返回None）"""
+        if self.local_classifier is None:
+            return None
+        try:
+            return self.local_classifier.predict(conversation_text, title)
+        except Exception as e:
+            logger.warning(f"⚠️ 本地分类器预测失败: {e}")
+            return None
+    
+    def _cache_model_id(self) -> str:
+        """缓存键中的模型标识（后端类型 + 模型名）"""
+        if hasattr(self.client, 'backends'):
+            return 'hybrid:' + ','.join(
+                f"{b.name}/{getattr(b.client, 'model', '')}" for b in self.client.backends
+            )
+        return f"{self.client.__class__.__name__}:{getattr(self.client, 'model', '')}"
+    
+    def _request_key(self, kind: str, text: str, **params) -> str:
+        """请求标识（与缓存键相同），用于合并进行中的相同请求"""
+        if hasattr(self.client, 'segment_threshold'):
+            params.setdefault('segment_threshold', self.client.segment_threshold)
+            params.setdefault('segment_token_budget', self.client.segment_token_budget)
+        if self.config.compress_tokens:
+            params.setdefault('compress_tokens', self.config.compress_tokens)
+        if self.local_classifier is not None and self.config.local_prepass_confidence:
+            params.setdefault('local_prepass', [self.config.local_prepass_confidence,
+                                                self.local_classifier.version])
+        return AnalysisCache.make_key(
+            kind, text, self._cache_model_id(),
+            prompt_version=getattr(self.client, 'prompt_version', '1'),
+            params=params
+        )
+    
+    def _cache_get(self, key: Optional[str]):
+        """读取缓存（缓存故障按未命中处理）"""
+        if key is None:
+            return None
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            logger.warning(f"⚠️ 读取分析缓存失败: {e}")
+            return None
+    
+    def _cache_put(self, key: Optional[str], kind: str, value):
+        """写入缓存（失败只记录日志）"""
+        if key is None or value is None:
+            return
+        try:
+            self.cache.put(key, kind, self._cache_model_id(), value)
+        except Exception as e:
+            logger.warning(f"⚠️ 写入分析缓存失败: {e}")
+    
+    def _build_routing_client(self):
+        """构建混合路由客户端（在线后端需通过环境变量配置API密钥）"""
+        from .routing_client import RoutingAIClient
+        
+        clients = {}
+        if os.getenv('DEEPSEEK_API_KEY'):
+            from .openai_client import DeepSeekClient
+            clients['deepseek'] = DeepSeekClient(
+                api_key=os.getenv('DEEPSEEK_API_KEY'),
+                model=os.getenv('DEEPSEEK_MODEL', 'deepseek-chat')
+            )
+        if os.getenv('OPENAI_API_KEY'):
+            from .openai_client import OpenAIClient
+            clients['openai'] = OpenAIClient(
+                api_key=os.getenv('OPENAI_API_KEY'),
+                model=os.getenv('OPENAI_MODEL', 'gpt-4o-mini'),
+                base_url=os.getenv('OPENAI_BASE_URL') or None
+            )
+        clients['ollama'] = OllamaClient(
+            base_url=self.config.ollama_host,
+            model=self.config.ollama_model,
+            timeout=self.config.timeout,
+            keep_alive=self.config.ollama_keep_alive
+        )
+        return RoutingAIClient.from_clients(clients)
+    
     def is_available(self) -> bool:
         """检查AI服务是否可用"""
         if not self.config.enabled or not self.client:
@@ -102,6 +285,40 @@ class AIService:
         except:
             return False
     
+    async def is_available_async(self) -> bool:
+        """is_available 的异步版本（Ollama走异步探测，其余客户端与同步版本一致）"""
+        if not self.config.enabled or not self.client:
+            return False
+        
+        try:
+            if isinstance(self.client, OllamaClient):
+                return await self.client.is_available_async()
+            return self.is_available()
+        except Exception:
+            return False
+    
+    def _ollama_clients(self) -> List[OllamaClient]:
+        """当前使用的Ollama客户端（混合路由时为其中的Ollama后端）"""
+        if isinstance(self.client, OllamaClient):
+            return [self.client]
+        return [b.client for b in getattr(self.client, 'backends', []) if isinstance(b.client, OllamaClient)]
+    
+    def preload_model(self) -> bool:
+        """
+        在后台预热本地模型（服务启动、任务队列有待处理任务时调用）
+        
+        模型估计仍在显存中时不发送请求，可频繁调用。
+        
+        Returns:
+            是否启动了预热
+        """
+        if not self.config.enabled:
+            return False
+        started = False
+        for client in self._ollama_clients():
+            started = client.preload() or started
+        return started
+    
     def get_status(self) -> Dict[str, Any]:
         """获取AI服务状态"""
         status = {
@@ -127,6 +344,22 @@ class AIService:
                 status['model'] = self.client.model
                 if status['available']:
                     status['available_models'] = self.client.list_models()
+                # 模型是否已加载、keep_alive、冷启动次数和加载耗时
+                status['model_lifecycle'] = self.client.model_status(probe=status['available'])
+            elif hasattr(self.client, 'get_stats'):
+                # 混合路由：各后端的延迟、错误率和熔断状态
+                status['backends'] = self.client.get_stats()
+            
+            if self.cache:
+                status['cache'] = self.cache.stats()
+            
+            if self.local_classifier is not None:
+                status['local_classifier'] = {
+                    'samples': self.local_classifier.num_samples,
+                    'categories': self.local_classifier.categories,
+                    'tags': len(self.local_classifier.tags),
+                    'prepass_confidence': self.config.local_prepass_confidence,
+                }
             
             status['message'] = 'AI服务正常' if status['available'] else 'AI服务不可用'
         
@@ -138,7 +371,11 @@ class AIService:
     def analyze_conversation(self, 
                             conversation_text: str,
                             title: str = "",
-                            show_progress: bool = True) -> Optional[AIAnalysisResult]:
+                            show_progress: bool = True,
+                            use_cache: bool = True,
+                            on_token=None,
+                            cancel_event=None,
+                            tasks: Optional[Iterable[str]] = None) -> Optional[AIAnalysisResult]:
         """
         分析对话内容
         
@@ -146,65 +383,329 @@ class AIService:
             conversation_text: 对话文本
             title: 对话标题（可选）
             show_progress: 是否显示处理进度（推荐大文本时开启）
+            use_cache: 是否使用分析缓存（False则强制重新分析并刷新缓存）
+            on_token: 流式输出回调 on_token(token, stats)，stats含tokens_per_second
+            cancel_event: threading.Event，置位后尽快停止生成并返回None
+            tasks: 需要的输出（'summary'、'category'、'tags'的任意子集），None表示全部；
+                   请求的任务在一次生成中完成，未请求的字段为空
         
         Returns:
-            AIAnalysisResult对象，失败返回None
+            AIAnalysisResult对象，失败或取消返回None
+        """
+        return self._analyze(conversation_text, title, use_cache=use_cache,
+                             on_token=on_token, cancel_event=cancel_event, tasks=tasks)
+    
+    def _analyze(self,
+                 conversation_text: str,
+                 title: str = "",
+                 use_cache: bool = True,
+                 check_available: bool = True,
+                 on_token=None,
+                 cancel_event=None,
+                 tasks: Optional[Iterable[str]] = None,
+                 fallback: bool = True) -> Optional[AIAnalysisResult]:
+        """
+        分析单条对话（批量分析时已统一检查过可用性，可跳过探测）
+        
+        部分任务的请求优先由完整分析的缓存满足；同一对话正在生成时等待其结果，
+        不会重复生成。fallback=False 时失败直接返回None，不生成降级结果
+        （批量分析需要据此记录失败，以便断点续跑时重试）。
         """
         if not self.config.enabled:
             logger.warning("AI功能未启用")
             return None
         
-        if not self.is_available():
+        tasks = SegmentedAnalysisMixin.normalize_tasks(tasks)
+        keys = self._analysis_keys(conversation_text, tasks)
+        
+        if use_cache:
+            cached = self._cached_analysis(keys, tasks)
+            if cached is not None:
+                return cached
+        
+        shared, own = self._join_inflight(keys)
+        if shared is not None:
+            logger.info("⏳ 相同对话正在分析，等待其结果")
+            result = shared.result()
+            return self._select_tasks(result, tasks) if result else None
+        
+        try:
+            result = self._generate_analysis(conversation_text, title, check_available,
+                                             on_token, cancel_event, tasks, keys[-1],
+                                             fallback)
+            own.set_result(result)
+            return result
+        except BaseException as e:
+            own.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(keys[-1], None)
+    
+    async def analyze_conversation_async(self,
+                                         conversation_text: str,
+                                         title: str = "",
+                                         use_cache: bool = True,
+                                         on_token=None,
+                                         cancel_event=None,
+                                         tasks: Optional[Iterable[str]] = None,
+                                         timeout: Optional[float] = None) -> Optional[AIAnalysisResult]:
+        """
+        analyze_conversation 的异步版本，可在事件循环中与爬取、入库并发执行
+        
+        缓存、合并相同请求、本地快速通道和降级策略与同步版本相同。
+        客户端提供异步接口时直接在事件循环中等待模型输出；
+        否则（如混合路由客户端）放到线程中执行，同样不阻塞事件循环。
+        
+        Args:
+            conversation_text: 对话文本
+            title: 对话标题（可选）
+            use_cache: 是否使用分析缓存
+            on_token: 流式输出回调 on_token(token, stats)
+            cancel_event: threading.Event，置位后尽快停止生成并返回None
+            tasks: 需要的输出，None表示全部
+            timeout: 本次分析的总超时（秒），超时按配置降级；None不限制
+        
+        Returns:
+            AIAnalysisResult对象，失败或取消返回None
+        """
+        if not self.config.enabled:
+            logger.warning("AI功能未启用")
+            return None
+        
+        tasks = SegmentedAnalysisMixin.normalize_tasks(tasks)
+        keys = self._analysis_keys(conversation_text, tasks)
+        
+        if use_cache:
+            cached = self._cached_analysis(keys, tasks)
+            if cached is not None:
+                return cached
+        
+        shared, own = self._join_inflight(keys)
+        if shared is not None:
+            logger.info("⏳ 相同对话正在分析，等待其结果")
+            result = await asyncio.wrap_future(shared)
+            return self._select_tasks(result, tasks) if result else None
+        
+        try:
+            result = await self._generate_analysis_async(conversation_text, title, on_token,
+                                                         cancel_event, tasks, keys[-1], timeout)
+            own.set_result(result)
+            return result
+        except BaseException as e:
+            own.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(keys[-1], None)
+    
+    def _analysis_keys(self, conversation_text: str, tasks: Tuple[str, ...]) -> Tuple[str, ...]:
+        """完整分析的键（部分任务时再加上该任务组合的键，作为本次请求的键）"""
+        full_key = self._request_key('analysis', conversation_text)
+        if tasks == SegmentedAnalysisMixin.ANALYSIS_TASKS:
+            return (full_key,)
+        return (full_key, self._request_key('analysis', conversation_text, tasks=list(tasks)))
+    
+    def _cached_analysis(self, keys: Tuple[str, ...],
+                         tasks: Tuple[str, ...]) -> Optional[AIAnalysisResult]:
+        """部分任务的请求优先由完整分析的缓存满足"""
+        if not self.cache:
+            return None
+        for key in keys:
+            cached = self._cache_get(key)
+            if cached is not None:
+                logger.info(f"⚡ 命中分析缓存: {cached['category']} | 置信度: {cached['confidence']}")
+                return self._select_tasks(AIAnalysisResult(**cached), tasks)
+        return None
+    
+    def _join_inflight(self, keys: Tuple[str, ...]) -> Tuple[Optional[Future], Optional[Future]]:
+        """
+        相同请求（或包含所需任务的完整分析）正在生成时返回 (其Future, None)，
+        否则登记本次请求并返回 (None, 自己的Future)
+        """
+        with self._inflight_lock:
+            shared = next((self._inflight[key] for key in keys if key in self._inflight), None)
+            if shared is not None:
+                return shared, None
+            own = self._inflight[keys[-1]] = Future()
+            return None, own
+    
+    def _cache_result(self, request_key: str, result: AIAnalysisResult):
+        """缓存分析结果（不含分段耗时）"""
+        if self.cache:
+            cached = asdict(result)
+            cached.pop('segment_timings', None)
+            self._cache_put(request_key, 'analysis', cached)
+    
+    @staticmethod
+    def _select_tasks(result: AIAnalysisResult, tasks: Tuple[str, ...]) -> AIAnalysisResult:
+        """返回只包含所需任务字段的副本（共享结果不被调用方修改）"""
+        return replace(
+            result,
+            summary=result.summary if 'summary' in tasks else "",
+            category=result.category if 'category' in tasks else "",
+            tags=list(result.tags) if 'tags' in tasks else [],
+            segment_timings=list(result.segment_timings)
+        )
+    
+    def _generate_analysis(self,
+                           conversation_text: str,
+                           title: str,
+                           check_available: bool,
+                           on_token,
+                           cancel_event,
+                           tasks: Tuple[str, ...],
+                           request_key: str,
+                           fallback: bool = True) -> Optional[AIAnalysisResult]:
+        """调用模型生成分析结果（失败时按配置降级）"""
+        local, model_tasks = self._local_prepass(conversation_text, title, tasks)
+        if local is not None and not model_tasks:
+            return self._local_only_result(local, tasks, request_key)
+        
+        if check_available and not self.is_available():
             logger.warning("AI服务不可用")
             return None
         
         try:
-            text_length = len(conversation_text)
-            title_info = f': {title}' if title else ''
-            
-            logger.info(f"🚀 开始分析对话{title_info}（{text_length:,} 字符）")
-            
-            # 大文本提示
-            if text_length > 10000:
-                logger.info(f"💡 检测到大文本，预计处理时间: {text_length//1000 * 2}-{text_length//1000 * 5}秒")
+            self._log_analysis_start(conversation_text, title)
+            args = self._client_task_args(model_tasks)
             
-            # 调用AI分析
-            result = self.client.analyze_conversation(conversation_text)
+            # 调用AI分析（设置了回调或取消事件时走流式生成）
+            if on_token or cancel_event:
+                with streaming(on_token=on_token, cancel_event=cancel_event):
+                    result = self.client.analyze_conversation(conversation_text, **args)
+            else:
+                result = self.client.analyze_conversation(conversation_text, **args)
+            return self._finish_analysis(result, local, tasks, model_tasks, request_key)
+        
+        except Exception as e:
+            return self._analysis_failed(e, conversation_text, title, fallback)
+    
+    async def _generate_analysis_async(self,
+                                       conversation_text: str,
+                                       title: str,
+                                       on_token,
+                                       cancel_event,
+                                       tasks: Tuple[str, ...],
+                                       request_key: str,
+                                       timeout: Optional[float]) -> Optional[AIAnalysisResult]:
+        """_generate_analysis 的异步版本"""
+        local, model_tasks = self._local_prepass(conversation_text, title, tasks)
+        if local is not None and not model_tasks:
+            return self._local_only_result(local, tasks, request_key)
+        
+        if not await self.is_available_async():
+            logger.warning("AI服务不可用")
+            return None
+        
+        try:
+            self._log_analysis_start(conversation_text, title)
+            args = self._client_task_args(model_tasks)
             
-            logger.info(f"✅ 分析完成: {result.category} | 置信度: {result.confidence}")
+            analyze = getattr(self.client, 'analyze_conversation_async', None)
+            options = (streaming(on_token=on_token, cancel_event=cancel_event)
+                       if on_token or cancel_event else nullcontext())
+            with options:
+                if analyze is not None:
+                    call = analyze(conversation_text, **args)
+                else:
+                    # 没有异步接口的客户端放到线程中执行（to_thread会复制上下文）
+                    call = asyncio.to_thread(self.client.analyze_conversation, conversation_text, **args)
+                result = await asyncio.wait_for(call, timeout)
+            return self._finish_analysis(result, local, tasks, model_tasks, request_key)
+        
+        except asyncio.TimeoutError:
+            return self._analysis_failed(TimeoutError(f"分析超过{timeout}秒"), conversation_text, title)
+        except Exception as e:
+            return self._analysis_failed(e, conversation_text, title)
+    
+    def _local_prepass(self, conversation_text: str, title: str, tasks: Tuple[str, ...]):
+        """
+        前置快速通道：本地模型足够确定时，分类和标签不再交给大模型
+        
+        Returns:
+            (本地预测或None, 仍需大模型完成的任务)
+        """
+        local = None
+        if self.config.local_prepass_confidence and ('category' in tasks or 'tags' in tasks):
+            prediction = self._local_predict(conversation_text, title)
+            if prediction and prediction.confidence >= self.config.local_prepass_confidence:
+                local = prediction
+        model_tasks = tuple(t for t in tasks if local is None or t == 'summary')
+        return local, model_tasks
+    
+    def _local_only_result(self, local, tasks: Tuple[str, ...], request_key: str) -> AIAnalysisResult:
+        """只由本地模型完成的结果"""
+        result = AIAnalysisResult(summary="", category=local.category, tags=local.tags,
+                                  confidence=local.confidence)
+        logger.info(f"⚡ 本地模型完成分析: {local.category} | 置信度: {local.confidence}")
+        self._cache_result(request_key, result)
+        return self._select_tasks(result, tasks)
+    
+    @staticmethod
+    def _log_analysis_start(conversation_text: str, title: str):
+        text_length = len(conversation_text)
+        title_info = f': {title}' if title else ''
+        
+        logger.info(f"🚀 开始分析对话{title_info}（{text_length:,} 字符）")
+        
+        # 大文本提示
+        if text_length > 10000:
+            logger.info(f"💡 检测到大文本，预计处理时间: {text_length//1000 * 2}-{text_length//1000 * 5}秒")
+    
+    @staticmethod
+    def _client_task_args(model_tasks: Tuple[str, ...]) -> Dict[str, Any]:
+        """只请求部分任务时才传入tasks，兼容只接受对话文本的客户端"""
+        return {} if model_tasks == SegmentedAnalysisMixin.ANALYSIS_TASKS else {'tasks': model_tasks}
+    
+    def _finish_analysis(self, result: AIAnalysisResult, local, tasks: Tuple[str, ...],
+                         model_tasks: Tuple[str, ...], request_key: str) -> AIAnalysisResult:
+        """合并本地预测、记录日志并缓存模型返回的结果"""
+        result = self._select_tasks(result, model_tasks)
+        if local is not None:
+            result.category = local.category if 'category' in tasks else ""
+            result.tags = list(local.tags) if 'tags' in tasks else []
+        
+        logger.info(f"✅ 分析完成: {result.category or '-'} | 置信度: {result.confidence}")
+        if result.summary:
             logger.info(f"   📝 摘要: {result.summary[:80]}{'...' if len(result.summary) > 80 else ''}")
+        if result.tags:
             logger.info(f"   🏷️  标签: {', '.join(result.tags)}")
-            
-            return result
         
-        except TimeoutError as e:
-            logger.error(f"❌ 分析超时: {e}")
+        # 只缓存模型真实返回的结果（降级结果不缓存）
+        self._cache_result(request_key, result)
+        
+        return result
+    
+    def _analysis_failed(self, error: Exception, conversation_text: str,
+                         title: str, fallback: bool = True) -> Optional[AIAnalysisResult]:
+        """处理分析异常：取消返回None，超时和其他错误按配置降级（fallback=False时不降级）"""
+        if isinstance(error, GenerationCancelled):
+            logger.info("⏹️ 分析已取消")
+            return None
+        
+        if isinstance(error, TimeoutError):
+            logger.error(f"❌ 分析超时: {error}")
             logger.error(f"💡 建议: 1) 增加AI_TIMEOUT环境变量 2) 使用分段处理 3) 切换到更快的模型")
-            
-            # 降级方案：生成基础摘要
-            if self.config.enable_fallback:
-                logger.info("🔄 启动降级方案：生成基础摘要（基于规则）...")
-                return self._fallback_analysis(conversation_text, title)
-            else:
-                logger.warning("⚠️  降级方案已禁用，返回None")
-                return None
+        else:
+            logger.error(f"❌ 分析失败: {error}")
         
-        except Exception as e:
-            logger.error(f"❌ 分析失败: {e}")
-            
-            # 降级方案：生成基础摘要
-            if self.config.enable_fallback:
-                logger.info("🔄 启动降级方案：生成基础摘要（基于规则）...")
-                return self._fallback_analysis(conversation_text, title)
-            else:
-                logger.warning("⚠️  降级方案已禁用，返回None")
-                return None
+        # 降级方案：生成基础摘要
+        if fallback and self.config.enable_fallback:
+            logger.info("🔄 启动降级方案：生成基础摘要（基于规则）...")
+            return self._fallback_analysis(conversation_text, title)
+        else:
+            logger.warning("⚠️  降级方案已禁用，返回None")
+            return None
     
     def generate_summary(self, 
                         conversation_text: str,
                         max_words: int = 150) -> Optional[str]:
         """
-        快速生成摘要（不包含分类和标签）
+        生成摘要
+        
+        摘要、分类和标签在同一次生成中完成并缓存，之后对同一对话调用
+        generate_tags 或 analyze_conversation 不会再次生成。
         
         Args:
             conversation_text: 对话文本
@@ -213,16 +714,9 @@ class AIService:
         Returns:
             摘要文本，失败返回None
         """
-        if not self.is_available():
-            return None
-        
         try:
-            if isinstance(self.client, OllamaClient):
-                return self.client.generate_summary_only(conversation_text, max_words)
-            else:
-                # 其他客户端使用完整分析
-                result = self.analyze_conversation(conversation_text)
-                return result.summary if result else None
+            result = self._analyze(conversation_text)
+            return result.summary[:max_words] if result else None
         
         except Exception as e:
             logger.error(f"❌ 生成摘要失败: {e}")
@@ -232,7 +726,7 @@ class AIService:
                      conversation_text: str,
                      num_tags: int = 5) -> Optional[List[str]]:
         """
-        快速生成标签
+        生成标签（与摘要、分类共享同一次生成，见 generate_summary）
         
         Args:
             conversation_text: 对话文本
@@ -241,16 +735,9 @@ class AIService:
         Returns:
             标签列表，失败返回None
         """
-        if not self.is_available():
-            return None
-        
         try:
-            if isinstance(self.client, OllamaClient):
-                return self.client.generate_tags_only(conversation_text, num_tags)
-            else:
-                # 其他客户端使用完整分析
-                result = self.analyze_conversation(conversation_text)
-                return result.tags if result else None
+            result = self._analyze(conversation_text)
+            return result.tags[:num_tags] if result else None
         
         except Exception as e:
             logger.error(f"❌ 生成标签失败: {e}")
@@ -258,31 +745,40 @@ class AIService:
     
     def batch_analyze(self,
                      conversations: List[Dict[str, str]],
-                     callback=None) -> List[Optional[AIAnalysisResult]]:
+                     callback=None,
+                     progress_callback=None,
+                     concurrency: Optional[int] = None,
+                     checkpoint_path: Optional[str] = None) -> List[Optional[AIAnalysisResult]]:
         """
-        批量分析对话
+        并发批量分析对话
         
         Args:
-            conversations: 对话列表，每个元素包含 'text' 和可选的 'title'
+            conversations: 对话列表，每个元素包含 'text' 和可选的 'title'、'id'
             callback: 进度回调函数 callback(current, total)
+            progress_callback: 吞吐量回调，参数为进度字典（items_per_minute、eta_seconds等）
+            concurrency: 并发数，默认取配置或按后端确定
+            checkpoint_path: 检查点文件，中断或有失败后再次调用只分析未成功的对话
         
         Returns:
-            分析结果列表
+            分析结果列表（与输入顺序一致）
         """
-        results = []
-        total = len(conversations)
+        from .batch_analyzer import BatchAnalyzer
         
-        for i, conv in enumerate(conversations, 1):
-            text = conv.get('text', '')
-            title = conv.get('title', '')
-            
-            result = self.analyze_conversation(text, title)
-            results.append(result)
-            
-            if callback:
-                callback(i, total)
-        
-        return results
+        self._batch = BatchAnalyzer(
+            self,
+            concurrency=concurrency or self.config.batch_concurrency,
+            rate_per_minute=self.config.rate_limit_rpm,
+            checkpoint_path=checkpoint_path
+        )
+        try:
+            return self._batch.run(conversations, callback, progress_callback)
+        finally:
+            self._batch = None
+    
+    def cancel_batch(self):
+        """取消正在执行的批量分析"""
+        if self._batch:
+            self._batch.cancel()
     
     def pull_model(self, model_name: str = None) -> bool:
         """
@@ -298,15 +794,13 @@ class AIService:
             logger.error("只有Ollama后端支持下载模型")
             return False
         
-        import requests
-        
         model = model_name or self.config.ollama_model
         
         try:
             logger.info(f"开始下载模型: {model}...")
             
             url = f"{self.config.ollama_host}/api/pull"
-            response = requests.post(
+            response = self.client.session.post(
                 url,
                 json={"name": model},
                 stream=True,
@@ -326,6 +820,7 @@ class AIService:
                         logger.info(status)
             
             logger.info(f"✅ 模型下载完成: {model}")
+            self.client.list_models(force=True)
             return True
         
         except Exception as e:
@@ -338,10 +833,9 @@ class AIService:
         """
         降级分析方案（当AI分析失败或超时时）
         
-        使用规则提取而非AI模型：
+        不调用大模型：
         1. 提取前150字作为摘要
-        2. 基于关键词进行简单分类
-        3. 提取高频词作为标签
+        2. 分类和标签优先使用本地分类器，未训练时基于关键词和高频词
         
         Args:
             conversation_text: 对话文本
@@ -366,11 +860,17 @@ class AIService:
             if len(summary) > 150:
                 summary = summary[:147] + "..."
             
-            # 2. 基于关键词的简单分类
-            category = self._simple_categorize(conversation_text)
-            
-            # 3. 提取高频词作为标签
-            tags = self._extract_simple_tags(conversation_text)
+            # 2. 分类和标签：本地分类器 > 关键词规则
+            prediction = self._local_predict(conversation_text, title)
+            if prediction is not None:
+                category = prediction.category
+                tags = prediction.tags or self._extract_simple_tags(conversation_text)
+                # 置信度不超过0.5，仍可与大模型结果区分
+                confidence = min(0.5, prediction.confidence)
+            else:
+                category = self._simple_categorize(conversation_text)
+                tags = self._extract_simple_tags(conversation_text)
+                confidence = 0.3  # 降低置信度，表明是降级方案
             
             logger.info(f"✅ 降级分析完成: {category} | 标签: {', '.join(tags)}")
             
@@ -378,7 +878,7 @@ class AIService:
                 summary=summary or "无法生成摘要",
                 category=category,
                 tags=tags,
-                confidence=0.3  # 降低置信度，表明是降级方案
+                confidence=confidence
             )
         
         except Exception as e:
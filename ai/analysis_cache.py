@@ -0,0 +1,199 @@
+"""
+AI分析结果缓存（内容寻址）
+
+重复导入、重试或重复URL的同一段对话不必再次调用大模型：
+1. 缓存键 = sha256(规范化文本 + 模型 + 提示词版本 + 参数)
+2. 存储在独立的SQLite文件中，跨进程重启保留
+3. 按总字节数限制容量，超出时按最近使用时间（LRU）淘汰
+4. 记录命中率，供状态面板展示
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：Unicode NFC、合并空白、去除首尾空白"""
+    text = unicodedata.normalize('NFC', text or '')
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+class AnalysisCache:
+    """基于SQLite的LRU分析结果缓存（线程安全）"""
+
+    def __init__(self, db_path: str, max_bytes: int = 64 * 1024 * 1024):
+        """
+        初始化缓存
+
+        Args:
+            db_path: 缓存数据库路径
+            max_bytes: 缓存值总字节数上限
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                cache_key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                model TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_analysis_cache_lru
+                ON analysis_cache(last_used_at);
+        """)
+        self.conn.commit()
+        self._total_bytes = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM analysis_cache"
+        ).fetchone()[0]
+
+    @staticmethod
+    def make_key(kind: str, text: str, model: str,
+                 prompt_version: str = "1", params: Optional[Dict[str, Any]] = None) -> str:
+        """
+        计算缓存键
+
+        Args:
+            kind: 结果类型（analysis / summary / tags）
+            text: 对话文本（会先规范化）
+            model: 模型标识
+            prompt_version: 提示词版本，提示词变更后旧缓存自动失效
+            params: 影响结果的其他参数
+        """
+        header = json.dumps({
+            'kind': kind,
+            'model': model,
+            'prompt_version': prompt_version,
+            'params': params or {},
+        }, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256(header.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(normalize_text(text).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """读取缓存，命中时刷新最近使用时间"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value FROM analysis_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.conn.execute("""
+                UPDATE analysis_cache
+                SET last_used_at = ?, hit_count = hit_count + 1
+                WHERE cache_key = ?
+            """, (time.time(), key))
+            self.conn.commit()
+
+        return json.loads(row[0])
+
+    def put(self, key: str, kind: str, model: str, value: Any):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        payload = json.dumps(value, ensure_ascii=False)
+        size = len(payload.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        with self._lock:
+            old = self.conn.execute(
+                "SELECT size FROM analysis_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            self.conn.execute("""
+                INSERT INTO analysis_cache
+                    (cache_key, kind, model, value, size, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    value = excluded.value,
+                    size = excluded.size,
+                    last_used_at = excluded.last_used_at
+            """, (key, kind, model, payload, size, now, now))
+            self._total_bytes += size - (old[0] if old else 0)
+
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        """按LRU淘汰，直到总大小降到上限的90%（调用方持有锁）"""
+        target = int(self.max_bytes * 0.9)
+        while self._total_bytes > target:
+            rows = self.conn.execute("""
+                SELECT cache_key, size FROM analysis_cache
+                ORDER BY last_used_at LIMIT 100
+            """).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                return
+
+            victims = []
+            for key, size in rows:
+                victims.append((key,))
+                self._total_bytes -= size
+                if self._total_bytes <= target:
+                    break
+            self.conn.executemany("DELETE FROM analysis_cache WHERE cache_key = ?", victims)
+            self.evictions += len(victims)
+
+        logger.debug(f"🧹 分析缓存淘汰后大小: {self._total_bytes} 字节")
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self.conn.execute("DELETE FROM analysis_cache")
+            self.conn.commit()
+            self._total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计（命中率为本进程内的统计）"""
+        with self._lock:
+            entries, total_hits = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM analysis_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'entries': entries,
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'lifetime_hits': total_hits,
+        }
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self.conn.close()
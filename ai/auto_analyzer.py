@@ -0,0 +1,358 @@
+"""
+后台自动分析
+
+开启 AIConfig.auto_analyze 后，在后台补齐对话的摘要、分类和标签：
+1. 通过 analysis_confidence 索引查找未分析或置信度过低（降级分析）的对话
+2. 优先队列：刚保存的对话 > 未分析的对话 > 置信度越低越先
+3. 空闲时才分析：最近有用户操作或有爬取任务在执行时暂停
+4. 分析结果攒批后在一个事务中写回数据库
+5. 进度回调供GUI状态栏和CLI显示
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import heapq
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .text_compressor import conversation_text
+
+logger = logging.getLogger(__name__)
+
+# 队列优先级（数值越小越先处理）
+PRIORITY_NEW = 0.0       # 刚保存的对话
+PRIORITY_MISSING = 1.0   # 尚未分析的对话
+PRIORITY_LOW = 2.0       # 低置信度结果，实际优先级为 2 + 置信度
+
+
+class AutoAnalyzer:
+    """后台自动分析工作线程"""
+
+    def __init__(self, service, db_path: str,
+                 min_confidence: Optional[float] = None,
+                 batch_size: int = 10,
+                 flush_interval: float = 5.0,
+                 idle_delay: float = 3.0,
+                 throttle: float = 0.5,
+                 rescan_interval: float = 60.0,
+                 retry_interval: float = 3600.0,
+                 unavailable_backoff: float = 30.0,
+                 scan_limit: int = 200,
+                 is_busy: Optional[Callable[[], bool]] = None,
+                 progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None):
+        """
+        初始化自动分析
+
+        Args:
+            service: AIService实例
+            db_path: SQLite数据库路径（工作线程使用独立连接）
+            min_confidence: 低于该置信度的结果会被重新分析（默认取 AIConfig.auto_analyze_min_confidence）
+            batch_size: 攒够多少条结果写一次数据库
+            flush_interval: 距上次写入超过该秒数也会写入
+            idle_delay: 最近一次用户操作后需空闲的秒数
+            throttle: 两次分析之间的最小间隔（秒）
+            rescan_interval: 重新扫描数据库的间隔（秒）
+            retry_interval: 分析失败或结果仍为低置信度的对话，多久后再重试（秒）
+            unavailable_backoff: AI服务不可用时暂停的秒数
+            scan_limit: 每次扫描最多取出的对话数
+            is_busy: 返回True时暂停分析（如有爬取任务在执行）
+            progress_callback: 进度回调，参数见 progress()
+        """
+        self.service = service
+        self.db_path = db_path
+        self.min_confidence = (min_confidence if min_confidence is not None
+                               else service.config.auto_analyze_min_confidence)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.idle_delay = idle_delay
+        self.throttle = throttle
+        self.rescan_interval = rescan_interval
+        self.retry_interval = retry_interval
+        self.unavailable_backoff = unavailable_backoff
+        self.scan_limit = scan_limit
+        self.is_busy = is_busy
+        self.progress_callback = progress_callback
+
+        self._heap: List[Tuple[float, int, int]] = []
+        self._queued: Dict[int, float] = {}    # 对话ID -> 当前优先级
+        self._deferred: Dict[int, float] = {}  # 对话ID -> 可再次尝试的时间
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._last_activity = 0.0
+
+        self._results: List[Tuple[int, Dict[str, Any]]] = []
+        self._last_flush = time.monotonic()
+        self._started = time.monotonic()
+        self._state = 'stopped'
+        self._current: Optional[str] = None
+        self._completed = 0
+        self._failed = 0
+        self._saved = 0
+
+    # ==================== 控制 ====================
+
+    def start(self):
+        """启动后台线程"""
+        if self.running:
+            return
+        self._stop.clear()
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="ai-auto-analyze", daemon=True)
+        self._thread.start()
+        logger.info(f"🤖 后台自动分析已启动（置信度阈值 {self.min_confidence}）")
+
+    def stop(self, wait: bool = True):
+        """停止后台线程：正在进行的生成会被取消，已完成的结果会写回数据库"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if wait and self._thread:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def enqueue(self, conversation_id: int, priority: float = PRIORITY_NEW):
+        """加入队列（已在队列中时只会提高优先级）"""
+        with self._cond:
+            if self._queued.get(conversation_id, float('inf')) <= priority:
+                return
+            self._queued[conversation_id] = priority
+            self._deferred.pop(conversation_id, None)
+            heapq.heappush(self._heap, (priority, -conversation_id, conversation_id))
+            self._cond.notify()
+
+    def notify_activity(self):
+        """记录一次用户操作，之后 idle_delay 秒内不分析"""
+        self._last_activity = time.monotonic()
+
+    def progress(self) -> Dict[str, Any]:
+        """
+        当前进度
+
+        Returns:
+            state: stopped / idle / waiting（等待空闲）/ analyzing / paused（服务不可用）
+            completed / failed / saved: 已分析、失败、已写回数据库的条数
+            pending: 队列中剩余条数；current: 正在分析的对话标题
+        """
+        elapsed = time.monotonic() - self._started
+        return {
+            'state': self._state,
+            'completed': self._completed,
+            'failed': self._failed,
+            'saved': self._saved,
+            'pending': len(self._queued),
+            'current': self._current,
+            'items_per_minute': self._completed * 60 / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def run_once(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        在当前线程中处理所有待分析对话（CLI使用，不等待空闲、不限速）
+
+        Args:
+            limit: 最多分析的条数
+
+        Returns:
+            完成后的进度
+        """
+        from database.db_manager import DatabaseManager
+
+        db = DatabaseManager(self.db_path)
+        self._started = time.monotonic()
+        processed = 0
+        try:
+            self._scan(db)
+            while limit is None or processed < limit:
+                conversation_id = self._pop()
+                if conversation_id is None:
+                    break
+                self._set_state('analyzing')
+                if not self._process(db, conversation_id):
+                    if not self.service.is_available():
+                        logger.warning("AI服务不可用，自动分析中止")
+                        break
+                processed += 1
+                self._flush(db)
+        finally:
+            self._flush(db, force=True)
+            db.close()
+            self._set_state('stopped')
+        return self.progress()
+
+    # ==================== 工作线程 ====================
+
+    def _run(self):
+        from database.db_manager import DatabaseManager
+
+        db = DatabaseManager(self.db_path)
+        last_scan = None
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if last_scan is None or now - last_scan >= self.rescan_interval:
+                    self._scan(db)
+                    last_scan = now
+
+                conversation_id = self._pop()
+                if conversation_id is None:
+                    self._flush(db, force=True)
+                    self._set_state('idle')
+                    with self._cond:
+                        if not self._heap and not self._stop.is_set():
+                            self._cond.wait(max(0.0, self.rescan_interval - (time.monotonic() - last_scan)))
+                    continue
+
+                # 等待空闲期间先预热模型
+                preload = getattr(self.service, 'preload_model', None)
+                if preload is not None:
+                    preload()
+                if not self._wait_idle():
+                    break
+
+                self._set_state('analyzing')
+                ok = self._process(db, conversation_id)
+                self._flush(db)
+
+                if not ok and not self._stop.is_set():
+                    self._set_state('paused')
+                    self._stop.wait(self.unavailable_backoff)
+                elif self.throttle:
+                    self._stop.wait(self.throttle)
+        except Exception as e:
+            logger.error(f"❌ 自动分析线程异常: {e}", exc_info=True)
+        finally:
+            self._flush(db, force=True)
+            db.close()
+            self._set_state('stopped')
+            logger.info("⏹️ 后台自动分析已停止")
+
+    def _wait_idle(self) -> bool:
+        """等到没有用户操作和爬取任务；停止时返回False"""
+        while not self._stop.is_set():
+            busy = False
+            if self.is_busy:
+                try:
+                    busy = self.is_busy()
+                except Exception:
+                    busy = False
+            quiet = time.monotonic() - self._last_activity
+            if not busy and quiet >= self.idle_delay:
+                return True
+            self._set_state('waiting')
+            self._stop.wait(1.0 if busy else min(1.0, self.idle_delay - quiet))
+        return False
+
+    # ==================== 队列 ====================
+
+    def _scan(self, db):
+        """把数据库中待分析的对话加入队列（近期失败的跳过）"""
+        rows = db.get_pending_analysis(self.min_confidence, self.scan_limit + len(self._deferred))
+        now = time.monotonic()
+        for row in rows:
+            if self._deferred.get(row['id'], 0) > now:
+                continue
+            confidence = row['analysis_confidence']
+            self.enqueue(row['id'], PRIORITY_MISSING if confidence is None else PRIORITY_LOW + confidence)
+
+    def _pop(self) -> Optional[int]:
+        """取出优先级最高的对话（跳过已被提高优先级的旧条目）"""
+        with self._cond:
+            while self._heap:
+                priority, _, conversation_id = heapq.heappop(self._heap)
+                if self._queued.get(conversation_id) == priority:
+                    del self._queued[conversation_id]
+                    return conversation_id
+        return None
+
+    # ==================== 分析与写回 ====================
+
+    def _process(self, db, conversation_id: int) -> bool:
+        """
+        分析一条对话，结果放入待写回列表
+
+        Returns:
+            False表示AI服务没有给出结果（不可用或失败）
+        """
+        conv = db.get_conversation(conversation_id)
+        if conv is None:
+            return True
+        current = conv.get('analysis_confidence')
+        if current is not None and current >= self.min_confidence:
+            return True  # 已被其他途径分析
+
+        self._current = conv.get('title') or f"#{conversation_id}"
+        self._report()
+        text = conversation_text(conv['raw_content'])
+        title = conv.get('title') or ''
+
+        try:
+            result = self.service.analyze_conversation(text, title, cancel_event=self._stop)
+        except Exception as e:
+            logger.error(f"❌ 自动分析失败 #{conversation_id}: {e}")
+            result = None
+        if result is None and self._stop.is_set():
+            self.enqueue(conversation_id, PRIORITY_MISSING)  # 停止时被取消，下次启动再分析
+            return True
+
+        # 服务不可用时，至少给从未分析过的对话一个降级结果，之后再升级
+        if result is None and current is None and self.service.config.enable_fallback:
+            result = self.service._fallback_analysis(text, title)
+
+        self._current = None
+        if result is None:
+            self._failed += 1
+            self._deferred[conversation_id] = time.monotonic() + self.retry_interval
+            self._report()
+            return False
+
+        self._completed += 1
+        if result.confidence < self.min_confidence:
+            self._deferred[conversation_id] = time.monotonic() + self.retry_interval
+        if current is None or result.confidence > current:
+            self._results.append((conversation_id, {
+                'summary': result.summary,
+                'category': result.category,
+                'tags': result.tags,
+                'confidence': result.confidence,
+            }))
+        self._report()
+        return True
+
+    def _flush(self, db, force: bool = False):
+        """攒批写回数据库"""
+        if not self._results:
+            return
+        if not force and len(self._results) < self.batch_size \
+                and time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        results, self._results = self._results, []
+        try:
+            self._saved += db.save_analysis_results(results)
+            logger.info(f"💾 自动分析写回 {len(results)} 条结果")
+        except Exception as e:
+            logger.error(f"❌ 写回分析结果失败: {e}")
+            for conversation_id, _ in results:
+                self.enqueue(conversation_id, PRIORITY_MISSING)
+        self._last_flush = time.monotonic()
+        self._report()
+
+    # ==================== 进度 ====================
+
+    def _set_state(self, state: str):
+        if state != self._state:
+            self._state = state
+            self._report()
+
+    def _report(self):
+        if self.progress_callback:
+            try:
+                self.progress_callback(self.progress())
+            except Exception as e:
+                logger.warning(f"⚠️ 进度回调失败: {e}")
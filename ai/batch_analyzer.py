@@ -0,0 +1,310 @@
+"""
+并发批量分析引擎
+
+替代逐条顺序分析：
+1. 线程池有界并发，默认并发数按后端确定（Ollama并行槽位 / 在线API限速）
+2. 令牌桶限流，控制每分钟请求数
+3. 可按输入顺序返回，也可按完成顺序迭代
+4. 支持取消；每成功一条追加写入检查点，中断或有失败时重新运行只分析未成功的对话
+5. 进度回调报告吞吐量和预计剩余时间
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .analysis_cache import normalize_text
+from .ollama_client import AIAnalysisResult
+
+logger = logging.getLogger(__name__)
+
+# 各后端的默认并发数：Ollama受服务端并行槽位限制，在线API主要受限速约束
+DEFAULT_CONCURRENCY = {
+    'ollama': int(os.getenv('OLLAMA_NUM_PARALLEL', '2')),
+    'openai': 8,
+    'deepseek': 8,
+    'hybrid': 8,
+}
+
+
+class TokenBucket:
+    """令牌桶限流器（线程安全）"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            capacity: 桶容量（允许的突发请求数），默认等于1秒的令牌数
+        """
+        if rate <= 0:
+            raise ValueError("rate 必须大于0")
+        self.rate = rate
+        self.capacity = max(1.0, capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, cancel_event: Optional[threading.Event] = None) -> bool:
+        """
+        取一个令牌，不足时等待
+
+        Returns:
+            是否取得令牌（等待期间被取消时返回False）
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait_time = (1 - self.tokens) / self.rate
+
+            if cancel_event is not None:
+                if cancel_event.wait(wait_time):
+                    return False
+            else:
+                time.sleep(wait_time)
+
+
+class BatchAnalyzer:
+    """并发、限流、可取消、可断点续传的批量分析"""
+
+    def __init__(self, service,
+                 concurrency: Optional[int] = None,
+                 rate_per_minute: Optional[float] = None,
+                 checkpoint_path: Optional[str] = None,
+                 progress_interval: float = 2.0):
+        """
+        初始化批量分析引擎
+
+        Args:
+            service: AIService实例
+            concurrency: 并发数（默认按后端取 DEFAULT_CONCURRENCY）
+            rate_per_minute: 每分钟最多发起的分析请求数（None表示不限速）
+            checkpoint_path: 检查点文件路径（None表示不写检查点）
+            progress_interval: progress_callback 的最小调用间隔（秒）
+        """
+        self.service = service
+        self.concurrency = max(1, concurrency or DEFAULT_CONCURRENCY.get(service.config.backend, 4))
+        self.limiter = TokenBucket(rate_per_minute / 60.0, self.concurrency) if rate_per_minute else None
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.progress_interval = progress_interval
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    # ==================== 检查点 ====================
+
+    @staticmethod
+    def item_key(conv: Dict[str, Any]) -> str:
+        """对话在检查点中的标识：优先使用id，否则使用内容哈希"""
+        if conv.get('id') is not None:
+            return f"id:{conv['id']}"
+        text = normalize_text(conv.get('text', ''))
+        return "sha1:" + hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def load_checkpoint(self) -> Dict[str, AIAnalysisResult]:
+        """读取检查点中成功的结果（损坏的行和旧版本记录的失败会被忽略）"""
+        done = {}
+        if not self.checkpoint_path or not self.checkpoint_path.exists():
+            return done
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # 中断时写了一半的行
+                result = record.get('result')
+                if result:
+                    done[record['key']] = AIAnalysisResult(**result)
+        return done
+
+    def _append_checkpoint(self, handle, key: str, result: AIAnalysisResult):
+        """追加一条成功记录（失败的对话不记录，重新运行时会重试）"""
+        if handle is None:
+            return
+        data = asdict(result)
+        data.pop('segment_timings', None)
+        with self._lock:
+            handle.write(json.dumps({'key': key, 'result': data}, ensure_ascii=False) + "\n")
+            handle.flush()
+
+    def clear_checkpoint(self):
+        """删除检查点"""
+        if self.checkpoint_path and self.checkpoint_path.exists():
+            self.checkpoint_path.unlink()
+
+    # ==================== 控制 ====================
+
+    def cancel(self):
+        """取消批量分析：已开始的请求会完成，未开始的不再执行"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    # ==================== 执行 ====================
+
+    def _analyze_item(self, conv: Dict[str, Any]) -> Optional[AIAnalysisResult]:
+        """工作线程：限流后分析一条对话（失败不降级，记为失败以便续跑时重试）"""
+        if self._cancel.is_set():
+            return None
+        if self.limiter and not self.limiter.acquire(self._cancel):
+            return None
+        return self.service._analyze(
+            conv.get('text', ''), conv.get('title', ''),
+            check_available=False, cancel_event=self._cancel, fallback=False
+        )
+
+    def iter_results(self, conversations: List[Dict[str, Any]],
+                     callback: Optional[Callable[[int, int], None]] = None,
+                     progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+                     ) -> Iterator[Tuple[int, Optional[AIAnalysisResult]]]:
+        """
+        按完成顺序产出 (输入下标, 结果)
+
+        检查点中已成功的对话最先产出；服务不可用时所有结果为None。
+        """
+        total = len(conversations)
+        done = self.load_checkpoint()
+        keys = [self.item_key(conv) for conv in conversations]
+        todo = []
+        completed = 0
+
+        for index, key in enumerate(keys):
+            if key in done:
+                completed += 1
+                if callback:
+                    callback(completed, total)
+                yield index, done[key]
+            else:
+                todo.append(index)
+
+        if done:
+            logger.info(f"⏩ 从检查点恢复 {completed}/{total} 条分析结果")
+        if not todo:
+            self.clear_checkpoint()
+            return
+
+        # 整批只检查一次可用性，而不是每条对话都发一次探测请求
+        if not self.service.config.enabled or not self.service.is_available():
+            logger.warning("AI服务不可用，批量分析跳过")
+            for index in todo:
+                completed += 1
+                if callback:
+                    callback(completed, total)
+                yield index, None
+            return
+
+        logger.info(f"🚀 批量分析 {len(todo)} 条对话（并发 {self.concurrency}"
+                    f"{'，限速' if self.limiter else ''}）")
+
+        handle = None
+        if self.checkpoint_path:
+            self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+            handle = open(self.checkpoint_path, 'a', encoding='utf-8')
+
+        start = time.perf_counter()
+        last_report = start
+        processed = 0
+        failed = 0
+        queue = iter(todo)
+        pending = {}
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency,
+                                    thread_name_prefix="ai-batch") as executor:
+
+                def fill():
+                    # 只保持有限数量的任务在途，便于及时响应取消
+                    while len(pending) < self.concurrency * 2 and not self._cancel.is_set():
+                        index = next(queue, None)
+                        if index is None:
+                            return
+                        future = executor.submit(self._analyze_item, conversations[index])
+                        pending[future] = index
+
+                fill()
+                while pending:
+                    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        index = pending.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            logger.error(f"❌ 第{index + 1}条分析失败: {e}")
+                            result = None
+
+                        if self._cancel.is_set() and result is None:
+                            continue  # 取消后未执行的条目不记入检查点
+
+                        completed += 1
+                        processed += 1
+                        if result is None:
+                            failed += 1
+                        else:
+                            self._append_checkpoint(handle, keys[index], result)
+
+                        if callback:
+                            callback(completed, total)
+                        now = time.perf_counter()
+                        if progress_callback and (now - last_report >= self.progress_interval
+                                                  or completed == total):
+                            last_report = now
+                            progress_callback(self._progress(completed, total, processed,
+                                                             failed, now - start))
+                        yield index, result
+                    fill()
+        finally:
+            if handle:
+                handle.close()
+
+        duration = time.perf_counter() - start
+        rate = processed * 60 / duration if duration > 0 else 0.0
+        if self._cancel.is_set():
+            logger.warning(f"⏹️ 批量分析已取消: 完成 {completed}/{total}")
+        elif failed and self.checkpoint_path:
+            logger.warning(f"⚠️ 批量分析完成，{failed} 条失败: 保留检查点，重新运行时只重试失败的对话")
+        else:
+            logger.info(f"✅ 批量分析完成: {processed} 条, {duration:.1f}秒 ({rate:.1f} 条/分钟)")
+            self.clear_checkpoint()
+
+    def run(self, conversations: List[Dict[str, Any]],
+            callback: Optional[Callable[[int, int], None]] = None,
+            progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None
+            ) -> List[Optional[AIAnalysisResult]]:
+        """按输入顺序返回结果（取消后未执行的条目为None）"""
+        results: List[Optional[AIAnalysisResult]] = [None] * len(conversations)
+        for index, result in self.iter_results(conversations, callback, progress_callback):
+            results[index] = result
+        return results
+
+    @staticmethod
+    def _progress(completed: int, total: int, processed: int, failed: int,
+                  elapsed: float) -> Dict[str, Any]:
+        """计算吞吐量和剩余时间"""
+        rate = processed / elapsed if elapsed > 0 else 0.0
+        eta = (total - completed) / rate if rate > 0 else None
+        return {
+            'completed': completed,
+            'total': total,
+            'failed': failed,
+            'percent': completed * 100 / total if total else 100.0,
+            'items_per_minute': rate * 60,
+            'eta_seconds': eta,
+        }
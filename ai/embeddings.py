@@ -0,0 +1,442 @@
+"""
+对话向量与相关对话
+
+1. 编码器：Ollama /api/embed 批量计算，或离线哈希编码器（无需模型，毫秒级）
+2. 向量按内容哈希缓存在SQLite（embedding_cache），内容不变时不重复计算；
+   可选同时计算每条消息的向量（message_embeddings）
+3. 新对话到达时增量更新每条对话的 top-k 相似列表（related_conversations）：
+   - 新对话、列表不足k条（如相关对话被删除）的对话：分块矩阵乘法计算完整的 top-k
+   - 其余对话：只与新对话计算相似度，超过当前第k名时合并进列表
+   分块计算，内存占用与块大小成正比，与对话总数无关
+4. 详情面板和 CLI show 按主键直接读取相似列表（DatabaseManager.get_related_conversations）
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import hashlib
+import logging
+import math
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import requests
+
+from .text_compressor import conversation_text, feature_index, text_features
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行L2归一化（零向量保持为零），点积即余弦相似度"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+def content_hash(text: str) -> str:
+    """向量缓存键"""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+# ==================== 编码器 ====================
+
+class HashingEncoder:
+    """
+    离线哈希编码器
+
+    中英文混合特征（与本地分类器相同）按带符号的特征哈希映射到固定维度，
+    词频取对数。不需要模型，适合没有Ollama或要求离线的场景。
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    @property
+    def name(self) -> str:
+        return f"hashing-{self.dim}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        buckets = self.dim * 2
+        for row, text in enumerate(texts):
+            for feature, count in Counter(text_features(text)).items():
+                index = feature_index(feature, buckets)
+                # 最低位决定符号，减少哈希冲突带来的偏差
+                sign = 1.0 if index & 1 else -1.0
+                vectors[row, index >> 1] += sign * (1.0 + math.log(count))
+        return _normalize(vectors)
+
+
+class OllamaEmbedder:
+    """
+    Ollama向量模型（如 nomic-embed-text、bge-m3）
+
+    优先使用 /api/embed 一次请求编码整批文本；
+    旧版Ollama没有该接口时退回 /api/embeddings 逐条请求。
+    """
+
+    def __init__(self, base_url: str = "http://localhost:11434",
+                 model: str = "nomic-embed-text",
+                 timeout: int = 60,
+                 keep_alive=None):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.session = requests.Session()
+        self._batch_api = True
+
+    @property
+    def name(self) -> str:
+        return f"ollama:{self.model}"
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        try:
+            if self._batch_api:
+                embeddings = self._embed_batch(list(texts))
+                if embeddings is not None:
+                    return _normalize(embeddings)
+                self._batch_api = False
+                logger.info("Ollama不支持 /api/embed，改用 /api/embeddings 逐条计算")
+            return _normalize([self._embed_one(text) for text in texts])
+        except requests.Timeout:
+            raise TimeoutError(f"Ollama向量请求超时（{self.timeout}秒）")
+        except requests.RequestException as e:
+            raise RuntimeError(f"Ollama向量请求失败: {e}")
+
+    def _payload(self, **fields) -> Dict[str, Any]:
+        payload = {"model": self.model, **fields}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _embed_batch(self, texts: List[str]) -> Optional[List[List[float]]]:
+        response = self.session.post(f"{self.base_url}/api/embed",
+                                     json=self._payload(input=texts, truncate=True),
+                                     timeout=self.timeout)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()['embeddings']
+
+    def _embed_one(self, text: str) -> List[float]:
+        response = self.session.post(f"{self.base_url}/api/embeddings",
+                                     json=self._payload(prompt=text), timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()['embedding']
+
+
+# ==================== 流水线 ====================
+
+class EmbeddingPipeline:
+    """批量计算对话向量，增量维护相关对话列表"""
+
+    def __init__(self, encoder=None,
+                 top_k: int = 10,
+                 batch_size: int = 32,
+                 block_size: int = 2048,
+                 max_chars: int = 4000,
+                 per_message: bool = False):
+        """
+        初始化流水线
+
+        Args:
+            encoder: 编码器（HashingEncoder / OllamaEmbedder），默认离线哈希编码器
+            top_k: 每条对话保存的相关对话数
+            batch_size: 每次请求编码的文本数
+            block_size: 矩阵乘法的分块行数（控制内存占用）
+            max_chars: 每条对话参与编码的最大字符数
+            per_message: 是否同时计算每条消息的向量
+        """
+        self.encoder = encoder or HashingEncoder()
+        self.top_k = top_k
+        self.batch_size = max(1, batch_size)
+        self.block_size = max(1, block_size)
+        self.max_chars = max_chars
+        self.per_message = per_message
+
+    # ==================== 向量 ====================
+
+    def conversation_text(self, title: Optional[str], raw_content) -> str:
+        """参与编码的文本：标题 + 对话内容（截断）"""
+        text = conversation_text(raw_content)
+        if title:
+            text = f"{title}\n\n{text}"
+        return text[:self.max_chars]
+
+    def embed_texts(self, conn, texts: Sequence[str]) -> Tuple[List[str], Dict[str, int]]:
+        """
+        计算文本向量并写入缓存（已缓存的内容不重复计算）
+
+        Returns:
+            (各文本的内容哈希, {'computed': 新计算数, 'cached': 命中缓存数})
+        """
+        hashes = [content_hash(text) for text in texts]
+        unique = dict(zip(hashes, texts))
+        cached = self._cached_hashes(conn, list(unique))
+        missing = [(h, t) for h, t in unique.items() if h not in cached]
+
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            vectors = self.encoder.embed([text for _, text in batch])
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding_cache (content_hash, encoder, dim, vector) "
+                "VALUES (?, ?, ?, ?)",
+                [(h, self.encoder.name, vectors.shape[1], vectors[i].astype(np.float32).tobytes())
+                 for i, (h, _) in enumerate(batch)]
+            )
+            conn.commit()
+        return hashes, {'computed': len(missing), 'cached': len(unique) - len(missing)}
+
+    def _cached_hashes(self, conn, hashes: List[str]) -> set:
+        found = set()
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            found.update(row[0] for row in conn.execute(
+                f"SELECT content_hash FROM embedding_cache WHERE encoder = ? "
+                f"AND content_hash IN ({','.join('?' * len(chunk))})",
+                [self.encoder.name] + chunk
+            ))
+        return found
+
+    def load_vectors(self, conn) -> Tuple[List[int], np.ndarray]:
+        """读取当前编码器下所有对话的向量（按对话ID排序）"""
+        rows = conn.execute("""
+            SELECT e.conversation_id, c.vector FROM conversation_embeddings e
+            JOIN embedding_cache c ON c.content_hash = e.content_hash AND c.encoder = e.encoder
+            WHERE e.encoder = ? ORDER BY e.conversation_id
+        """, (self.encoder.name,)).fetchall()
+        if not rows:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        ids = [row[0] for row in rows]
+        matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        return ids, matrix
+
+    # ==================== 增量更新 ====================
+
+    def update(self, conn, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        计算尚无向量的对话并更新相关对话列表
+
+        Args:
+            conn: SQLite连接（DatabaseManager.conn）
+            limit: 本次最多编码的对话数，None表示全部
+
+        Returns:
+            统计：embedded（新编码对话数）、computed/cached（向量计算/缓存命中数）、
+            conversations（有向量的对话总数）、updated（重写的相关列表数）、seconds
+        """
+        start = time.perf_counter()
+
+        # 更换编码器后，旧向量和相关列表不再可比
+        if conn.execute("SELECT 1 FROM conversation_embeddings WHERE encoder != ? LIMIT 1",
+                        (self.encoder.name,)).fetchone():
+            logger.info(f"🔄 编码器已变更为 {self.encoder.name}，重建相关对话")
+            conn.execute("DELETE FROM conversation_embeddings")
+            conn.execute("DELETE FROM message_embeddings")
+            conn.execute("DELETE FROM related_conversations")
+            conn.commit()
+
+        rows = conn.execute("""
+            SELECT c.id, c.title, c.raw_content FROM conversations c
+            LEFT JOIN conversation_embeddings e ON e.conversation_id = c.id
+            WHERE e.conversation_id IS NULL ORDER BY c.id LIMIT ?
+        """, (-1 if limit is None else limit,)).fetchall()
+
+        counts = {'computed': 0, 'cached': 0}
+        if rows:
+            texts = [self.conversation_text(row[1], row[2]) for row in rows]
+            hashes, stats = self.embed_texts(conn, texts)
+            for key in counts:
+                counts[key] += stats[key]
+            conn.executemany(
+                "INSERT OR REPLACE INTO conversation_embeddings (conversation_id, encoder, content_hash) "
+                "VALUES (?, ?, ?)",
+                [(row[0], self.encoder.name, h) for row, h in zip(rows, hashes)]
+            )
+            if self.per_message:
+                stats = self._embed_messages(conn, rows)
+                for key in counts:
+                    counts[key] += stats[key]
+            conn.commit()
+
+        new_ids = [row[0] for row in rows]
+        ids, matrix = self.load_vectors(conn)
+        updated = self._update_neighbors(conn, ids, matrix, new_ids)
+
+        result = {
+            'embedded': len(new_ids),
+            'computed': counts['computed'],
+            'cached': counts['cached'],
+            'conversations': len(ids),
+            'updated': updated,
+            'seconds': round(time.perf_counter() - start, 3),
+        }
+        if new_ids or updated:
+            logger.info(f"🧭 相关对话已更新: 新编码 {len(new_ids)} 条，重写 {updated} 个列表"
+                        f"（{result['seconds']:.2f}秒）")
+        return result
+
+    def _embed_messages(self, conn, rows) -> Dict[str, int]:
+        """为新对话的每条消息计算向量"""
+        import json
+
+        items = []
+        for conversation_id, _, raw_content in rows:
+            data = json.loads(raw_content) if isinstance(raw_content, str) else raw_content
+            for index, message in enumerate(data.get('messages', []) if isinstance(data, dict) else []):
+                content = (message.get('content') or '').strip()
+                if content:
+                    items.append((conversation_id, index, content[:self.max_chars]))
+        if not items:
+            return {'computed': 0, 'cached': 0}
+
+        hashes, stats = self.embed_texts(conn, [text for _, _, text in items])
+        conn.executemany(
+            "INSERT OR REPLACE INTO message_embeddings "
+            "(conversation_id, message_index, encoder, content_hash) VALUES (?, ?, ?, ?)",
+            [(cid, index, self.encoder.name, h) for (cid, index, _), h in zip(items, hashes)]
+        )
+        return stats
+
+    def _update_neighbors(self, conn, ids: List[int], matrix: np.ndarray,
+                          new_ids: Iterable[int]) -> int:
+        """重写需要更新的相关列表，返回重写的列表数"""
+        n = len(ids)
+        k = min(self.top_k, n - 1)
+        if k <= 0:
+            return 0
+
+        listed = {row[0]: (row[1], row[2]) for row in conn.execute(
+            "SELECT conversation_id, COUNT(*), MIN(score) FROM related_conversations GROUP BY conversation_id"
+        )}
+        new_set = set(new_ids)
+        stale = np.array([i for i, cid in enumerate(ids)
+                          if cid in new_set or listed.get(cid, (0, 0.0))[0] < k], dtype=np.int64)
+        lists: Dict[int, List[Tuple[int, float]]] = {}
+
+        # 1. 新对话和列表不完整的对话：完整计算 top-k
+        for start in range(0, len(stale), self.block_size):
+            rows = stale[start:start + self.block_size]
+            indices, scores = self.top_k_neighbors(matrix[rows], rows, matrix, k)
+            for row, row_indices, row_scores in zip(rows, indices, scores):
+                lists[ids[row]] = [(ids[j], float(s)) for j, s in zip(row_indices, row_scores)]
+
+        # 2. 其余对话：新对话的相似度超过当前第k名时合并
+        new_rows = np.array([i for i, cid in enumerate(ids) if cid in new_set], dtype=np.int64)
+        stale_set = set(stale.tolist())
+        fresh = np.array([i for i in range(n) if i not in stale_set], dtype=np.int64)
+        if len(new_rows) and len(fresh):
+            queries = matrix[new_rows]
+            thresholds = np.array([listed[ids[i]][1] for i in fresh], dtype=np.float32)
+            candidates: Dict[int, List[Tuple[int, float]]] = {}
+            for start in range(0, len(fresh), self.block_size):
+                rows = fresh[start:start + self.block_size]
+                scores = matrix[rows] @ queries.T
+                hit_rows, hit_cols = np.nonzero(scores > thresholds[start:start + len(rows), None])
+                for r, c in zip(hit_rows, hit_cols):
+                    candidates.setdefault(ids[rows[r]], []).append((ids[new_rows[c]], float(scores[r, c])))
+
+            if candidates:
+                current = self._load_lists(conn, list(candidates))
+                for conversation_id, extra in candidates.items():
+                    merged = dict(current.get(conversation_id, []))
+                    merged.update(extra)
+                    lists[conversation_id] = sorted(merged.items(), key=lambda item: -item[1])[:k]
+
+        self._write_lists(conn, lists)
+        return len(lists)
+
+    def top_k_neighbors(self, queries: np.ndarray, query_rows: np.ndarray,
+                        matrix: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        分块计算 queries 在 matrix 中最相似的k行（排除自身）
+
+        Args:
+            queries: 查询向量（已归一化）
+            query_rows: 查询在 matrix 中的行号（用于排除自身，不在其中时传 -1）
+            matrix: 全部向量（已归一化）
+            k: 返回的近邻数
+
+        Returns:
+            (行号, 相似度)，形状均为 (len(queries), k)，按相似度降序
+        """
+        m = len(queries)
+        best_rows = np.empty((m, 0), dtype=np.int64)
+        best_scores = np.empty((m, 0), dtype=np.float32)
+        query_rows = np.asarray(query_rows, dtype=np.int64)
+
+        for start in range(0, len(matrix), self.block_size):
+            block = matrix[start:start + self.block_size]
+            scores = queries @ block.T
+            own = (query_rows >= start) & (query_rows < start + len(block))
+            scores[np.nonzero(own)[0], query_rows[own] - start] = -np.inf
+
+            block_rows = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+            all_scores = np.concatenate([best_scores, scores], axis=1)
+            all_rows = np.concatenate([best_rows, block_rows], axis=1)
+            if all_scores.shape[1] > k:
+                keep = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+                all_scores = np.take_along_axis(all_scores, keep, axis=1)
+                all_rows = np.take_along_axis(all_rows, keep, axis=1)
+            best_scores, best_rows = all_scores, all_rows
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    @staticmethod
+    def _load_lists(conn, conversation_ids: List[int]) -> Dict[int, List[Tuple[int, float]]]:
+        lists: Dict[int, List[Tuple[int, float]]] = {}
+        for start in range(0, len(conversation_ids), 500):
+            chunk = conversation_ids[start:start + 500]
+            for cid, related_id, score in conn.execute(
+                f"SELECT conversation_id, related_id, score FROM related_conversations "
+                f"WHERE conversation_id IN ({','.join('?' * len(chunk))}) ORDER BY conversation_id, rank",
+                chunk
+            ):
+                lists.setdefault(cid, []).append((related_id, score))
+        return lists
+
+    @staticmethod
+    def _write_lists(conn, lists: Dict[int, List[Tuple[int, float]]]):
+        """在一个事务中替换相关列表"""
+        if not lists:
+            return
+        with conn:
+            conn.executemany("DELETE FROM related_conversations WHERE conversation_id = ?",
+                             [(cid,) for cid in lists])
+            conn.executemany(
+                "INSERT INTO related_conversations (conversation_id, rank, related_id, score) "
+                "VALUES (?, ?, ?, ?)",
+                [(cid, rank, related_id, round(score, 6))
+                 for cid, items in lists.items()
+                 for rank, (related_id, score) in enumerate(items, 1)]
+            )
+
+    def rebuild(self, conn) -> Dict[str, Any]:
+        """清空相关列表后全部重新计算（向量缓存保留）"""
+        conn.execute("DELETE FROM related_conversations")
+        conn.commit()
+        return self.update(conn)
+
+
+def create_pipeline(config) -> EmbeddingPipeline:
+    """
+    按AI配置创建流水线
+
+    Args:
+        config: AIConfig（embedding_backend 为 'ollama' 时使用Ollama向量模型，否则离线哈希编码）
+    """
+    if config.embedding_backend == 'ollama':
+        encoder = OllamaEmbedder(config.ollama_host, config.embedding_model, config.timeout,
+                                 keep_alive=config.ollama_keep_alive)
+    elif config.embedding_backend == 'hashing':
+        encoder = HashingEncoder()
+    else:
+        raise ValueError(f"不支持的向量后端: {config.embedding_backend}")
+    return EmbeddingPipeline(encoder, top_k=config.related_top_k)
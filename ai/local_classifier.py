@@ -0,0 +1,400 @@
+"""
+本地快速分类器和标签器
+
+用数据库中已有分类和标签的对话训练（只取置信度达标、非重复的对话），替代基于关键词的降级分析：
+1. 特征：中英文混合的哈希TF-IDF（与预压缩共用特征提取，无需分词器）
+2. 分类：多类逻辑回归（softmax），NumPy小批量Adam训练
+3. 标签：每个标签一个TF-IDF质心向量（Rocchio），按余弦相似度排序；
+   标签数多达数百个时训练仍只需一次遍历，数千条对话数秒内完成，模型保存为 .npz
+4. 单条预测只计算非零特征对应的权重行，耗时在毫秒以内
+
+AIService 在大模型不可用或超时时用它做降级分析；
+置信度足够高时也可作为前置快速通道，跳过大模型的分类和标签生成。
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import json
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .text_compressor import conversation_text, feature_index, text_features
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = Path(__file__).parent.parent / 'data' / 'local_classifier.npz'
+# 训练样本的最低分析置信度（与 AIConfig.auto_analyze_min_confidence 默认值一致），
+# 低于该值的多为降级分析结果，用来训练会把关键词规则的错误学进模型
+DEFAULT_MIN_CONFIDENCE = 0.6
+
+
+@dataclass
+class LocalPrediction:
+    """本地模型的预测结果"""
+    category: str
+    confidence: float  # 分类概率
+    tags: List[str] = field(default_factory=list)
+    tag_scores: Dict[str, float] = field(default_factory=dict)
+
+
+class _Adam:
+    """Adam优化器（原地更新参数；可只更新本批次出现过的特征行）"""
+
+    def __init__(self, params: List[np.ndarray], learning_rate: float):
+        self.params = params
+        self.learning_rate = learning_rate
+        self.m = [np.zeros_like(p) for p in params]
+        self.v = [np.zeros_like(p) for p in params]
+        self.t = 0
+
+    def step(self, grads: List[np.ndarray], rows: List[Optional[np.ndarray]],
+             beta1: float = 0.9, beta2: float = 0.999, eps: float = 1e-8):
+        """
+        Args:
+            grads: 各参数的梯度（rows不为None时只含对应行）
+            rows: 各参数要更新的行下标，None表示整个参数
+        """
+        self.t += 1
+        correction = np.sqrt(1 - beta2 ** self.t) / (1 - beta1 ** self.t)
+        for param, grad, m, v, index in zip(self.params, grads, self.m, self.v, rows):
+            if index is None:
+                index = slice(None)
+            m[index] = beta1 * m[index] + (1 - beta1) * grad
+            v[index] = beta2 * v[index] + (1 - beta2) * grad * grad
+            param[index] -= self.learning_rate * correction * m[index] / (np.sqrt(v[index]) + eps)
+
+
+class LocalClassifier:
+    """哈希TF-IDF + 线性模型的分类器和标签器"""
+
+    def __init__(self,
+                 num_features: int = 1 << 14,
+                 max_chars: int = 4000,
+                 min_tag_count: int = 2,
+                 max_tags: int = 300,
+                 tag_threshold: float = 0.05,
+                 tag_relative: float = 0.5):
+        """
+        初始化本地分类器
+
+        Args:
+            num_features: 特征哈希的维度
+            max_chars: 每条对话参与特征提取的最大字符数（控制预测耗时）
+            min_tag_count: 标签至少出现在多少条对话中才参与训练
+            max_tags: 最多学习的标签数（按出现次数取前N个）
+            tag_threshold: 预测标签的最低余弦相似度
+            tag_relative: 预测标签的相似度至少为最相似标签的该比例
+        """
+        self.num_features = num_features
+        self.max_chars = max_chars
+        self.min_tag_count = min_tag_count
+        self.max_tags = max_tags
+        self.tag_threshold = tag_threshold
+        self.tag_relative = tag_relative
+
+        self.categories: List[str] = []
+        self.tags: List[str] = []
+        self.idf: Optional[np.ndarray] = None
+        self.category_weights: Optional[np.ndarray] = None
+        self.category_bias: Optional[np.ndarray] = None
+        self.tag_weights: Optional[np.ndarray] = None  # 标签质心（每列一个标签）
+        self.trained_at: Optional[float] = None
+        self.num_samples = 0
+
+    @property
+    def is_trained(self) -> bool:
+        return self.category_weights is not None
+
+    @property
+    def version(self) -> str:
+        """模型版本（训练时间戳），用于区分不同模型的缓存结果"""
+        return f"{self.trained_at:.0f}" if self.trained_at else "untrained"
+
+    # ==================== 特征 ====================
+
+    def _counts(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """特征下标及词频（先按特征计数，只对不同的特征求哈希）"""
+        counter = Counter(text_features(text[:self.max_chars]))
+        if not counter:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        indices = np.fromiter((feature_index(f, self.num_features) for f in counter),
+                              dtype=np.int64, count=len(counter))
+        counts = np.fromiter(counter.values(), dtype=np.float32, count=len(counter))
+        # 哈希冲突的特征合并计数
+        unique, inverse = np.unique(indices, return_inverse=True)
+        return unique, np.bincount(inverse, weights=counts).astype(np.float32)
+
+    def _weighted(self, indices: np.ndarray, counts: np.ndarray) -> np.ndarray:
+        """对数词频 × IDF，L2归一化"""
+        values = np.log1p(counts) * self.idf[indices]
+        norm = np.linalg.norm(values)
+        return values / norm if norm > 0 else values
+
+    def _dense(self, rows: Sequence[Tuple[np.ndarray, np.ndarray]],
+               columns: np.ndarray) -> np.ndarray:
+        """小批量的稠密矩阵，只包含批次中出现过的特征列"""
+        matrix = np.zeros((len(rows), len(columns)), dtype=np.float32)
+        for i, (indices, counts) in enumerate(rows):
+            matrix[i, np.searchsorted(columns, indices)] = self._weighted(indices, counts)
+        return matrix
+
+    # ==================== 训练 ====================
+
+    def fit(self,
+            texts: Sequence[str],
+            categories: Sequence[str],
+            tags: Optional[Sequence[Sequence[str]]] = None,
+            epochs: int = 30,
+            batch_size: int = 256,
+            learning_rate: float = 0.05,
+            l2: float = 1e-5,
+            seed: int = 0) -> Dict[str, Any]:
+        """
+        训练分类器和标签器
+
+        Args:
+            texts: 对话文本
+            categories: 每条对话的分类
+            tags: 每条对话的标签列表（可选）
+            epochs: 训练轮数
+            batch_size: 小批量大小
+            learning_rate: Adam学习率
+            l2: L2正则系数
+            seed: 随机种子（打乱顺序）
+
+        Returns:
+            训练统计（样本数、类别数、标签数、训练集准确率、耗时）
+        """
+        if len(texts) != len(categories):
+            raise ValueError("texts 与 categories 数量不一致")
+        if len(set(categories)) < 2:
+            raise ValueError("至少需要两个不同分类的样本才能训练")
+
+        start = time.perf_counter()
+        n = len(texts)
+        rows = [self._counts(text) for text in texts]
+
+        document_freq = np.zeros(self.num_features, dtype=np.float32)
+        for indices, _ in rows:
+            document_freq[indices] += 1
+        self.idf = (np.log((1 + n) / (1 + document_freq)) + 1.0).astype(np.float32)
+
+        self.categories = sorted(set(categories))
+        category_index = {c: i for i, c in enumerate(self.categories)}
+        y_category = np.array([category_index[c] for c in categories])
+
+        tags = tags or [[] for _ in texts]
+        tag_counts: Dict[str, int] = {}
+        for item_tags in tags:
+            for tag in set(item_tags):
+                tag_counts[tag] = tag_counts.get(tag, 0) + 1
+        frequent = [t for t, c in sorted(tag_counts.items(), key=lambda kv: (-kv[1], kv[0]))
+                    if c >= self.min_tag_count]
+        self.tags = frequent[:self.max_tags]
+        tag_index = {t: i for i, t in enumerate(self.tags)}
+        y_tags = np.zeros((n, len(self.tags)), dtype=bool)
+        for i, item_tags in enumerate(tags):
+            for tag in item_tags:
+                if tag in tag_index:
+                    y_tags[i, tag_index[tag]] = True
+
+        k, t = len(self.categories), len(self.tags)
+
+        # 标签质心：带该标签的对话向量之和，按列归一化
+        self.tag_weights = np.zeros((self.num_features, t), dtype=np.float32)
+        for (indices, counts), labels in zip(rows, y_tags):
+            for j in np.flatnonzero(labels):
+                self.tag_weights[indices, j] += self._weighted(indices, counts)
+        norms = np.linalg.norm(self.tag_weights, axis=0)
+        norms[norms == 0] = 1.0
+        self.tag_weights /= norms
+
+        self.category_weights = np.zeros((self.num_features, k), dtype=np.float32)
+        self.category_bias = np.zeros(k, dtype=np.float32)
+        optimizer = _Adam([self.category_weights, self.category_bias], learning_rate)
+
+        rng = np.random.default_rng(seed)
+        for _ in range(epochs):
+            order = rng.permutation(n)
+            for begin in range(0, n, batch_size):
+                batch = order[begin:begin + batch_size]
+                batch_rows = [rows[i] for i in batch]
+                columns = np.unique(np.concatenate([indices for indices, _ in batch_rows]))
+                x = self._dense(batch_rows, columns)
+                m = len(batch)
+
+                weights = self.category_weights[columns]
+                probs = self._softmax(x @ weights + self.category_bias)
+                probs[np.arange(m), y_category[batch]] -= 1.0
+                grad_w = x.T @ probs / m + l2 * weights
+                grad_b = probs.mean(axis=0)
+
+                optimizer.step([grad_w, grad_b], [columns, None])
+
+        self.trained_at = time.time()
+        self.num_samples = n
+
+        predicted = [self.predict(text).category for text in texts]
+        accuracy = float(np.mean([p == c for p, c in zip(predicted, categories)]))
+        stats = {
+            'samples': n,
+            'categories': k,
+            'tags': t,
+            'train_accuracy': round(accuracy, 3),
+            'seconds': round(time.perf_counter() - start, 2),
+        }
+        logger.info(f"✅ 本地分类器训练完成: {n} 条, {k} 个分类, {t} 个标签, "
+                    f"准确率 {accuracy:.1%}, 耗时 {stats['seconds']}秒")
+        return stats
+
+    @staticmethod
+    def _softmax(logits: np.ndarray) -> np.ndarray:
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        exp = np.exp(logits)
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    # ==================== 预测 ====================
+
+    def predict(self, text: str, title: str = "", num_tags: int = 5) -> LocalPrediction:
+        """
+        预测分类和标签（只读取非零特征对应的权重行）
+
+        Raises:
+            RuntimeError: 模型尚未训练
+        """
+        if not self.is_trained:
+            raise RuntimeError("本地分类器尚未训练")
+
+        indices, counts = self._counts(f"{title}\n{text}" if title else text)
+        if len(indices):
+            values = self._weighted(indices, counts)
+            category_logits = values @ self.category_weights[indices] + self.category_bias
+            similarity = values @ self.tag_weights[indices]
+        else:
+            category_logits = self.category_bias
+            similarity = np.zeros(len(self.tags), dtype=np.float32)
+
+        probs = self._softmax(category_logits)
+        best = int(np.argmax(probs))
+
+        ranked = np.argsort(-similarity)[:num_tags]
+        floor = max(self.tag_threshold, self.tag_relative * float(similarity[ranked[0]])) \
+            if len(ranked) else 0.0
+        tag_scores = {self.tags[i]: round(float(similarity[i]), 3)
+                      for i in ranked if similarity[i] >= floor}
+
+        return LocalPrediction(
+            category=self.categories[best],
+            confidence=round(float(probs[best]), 3),
+            tags=list(tag_scores),
+            tag_scores=tag_scores
+        )
+
+    # ==================== 持久化 ====================
+
+    def save(self, path: Optional[str] = None) -> Path:
+        """保存模型（.npz，不使用pickle）"""
+        if not self.is_trained:
+            raise RuntimeError("本地分类器尚未训练")
+        path = Path(path) if path else DEFAULT_MODEL_PATH
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            'num_features': self.num_features,
+            'max_chars': self.max_chars,
+            'tag_threshold': self.tag_threshold,
+            'tag_relative': self.tag_relative,
+            'trained_at': self.trained_at,
+            'num_samples': self.num_samples,
+        }
+        with open(path, 'wb') as f:
+            np.savez_compressed(
+                f,
+                meta=np.array(json.dumps(meta)),
+                categories=np.array(self.categories, dtype=str),
+                tags=np.array(self.tags, dtype=str),
+                idf=self.idf,
+                category_weights=self.category_weights,
+                category_bias=self.category_bias,
+                tag_weights=self.tag_weights,
+            )
+        return path
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> 'LocalClassifier':
+        """加载模型"""
+        path = Path(path) if path else DEFAULT_MODEL_PATH
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            model = cls(num_features=meta['num_features'], max_chars=meta['max_chars'],
+                        tag_threshold=meta['tag_threshold'], tag_relative=meta['tag_relative'])
+            model.categories = [str(c) for c in data['categories']]
+            model.tags = [str(t) for t in data['tags']]
+            model.idf = data['idf']
+            model.category_weights = data['category_weights']
+            model.category_bias = data['category_bias']
+            model.tag_weights = data['tag_weights'].reshape(meta['num_features'], len(model.tags))
+        model.trained_at = meta['trained_at']
+        model.num_samples = meta['num_samples']
+        return model
+
+    # ==================== 训练数据 ====================
+
+    conversation_text = staticmethod(conversation_text)
+
+    @classmethod
+    def load_training_data(cls, conn, min_confidence: float = DEFAULT_MIN_CONFIDENCE
+                           ) -> Tuple[List[str], List[str], List[List[str]]]:
+        """
+        从数据库读取已分类的对话（一次查询同时取回标签）
+
+        跳过置信度不足（含未经分析）的对话和近似重复对话：重复对话沿用原对话的
+        分析结果，计入训练只会重复加权同一条样本。
+
+        Args:
+            conn: sqlite3连接（DatabaseManager.conn）
+            min_confidence: 最低分析置信度
+
+        Returns:
+            (文本列表, 分类列表, 标签列表)
+        """
+        rows = conn.execute("""
+            SELECT c.title, c.raw_content, c.category,
+                   GROUP_CONCAT(t.name, char(31)) AS tag_names
+            FROM conversations c
+            LEFT JOIN conversation_tags ct ON ct.conversation_id = c.id
+            LEFT JOIN tags t ON t.id = ct.tag_id
+            WHERE c.category IS NOT NULL AND c.category != ''
+              AND c.analysis_confidence >= ?
+              AND c.duplicate_of IS NULL
+            GROUP BY c.id
+        """, (min_confidence,)).fetchall()
+
+        texts, categories, tags = [], [], []
+        for title, raw_content, category, tag_names in rows:
+            body = cls.conversation_text(raw_content)
+            texts.append(f"{title}\n{body}" if title else body)
+            categories.append(category)
+            tags.append(tag_names.split('\x1f') if tag_names else [])
+        return texts, categories, tags
+
+    @classmethod
+    def train_from_database(cls, conn, path: Optional[str] = None,
+                            min_confidence: float = DEFAULT_MIN_CONFIDENCE, **kwargs) -> Dict[str, Any]:
+        """
+        用数据库中已分类的对话训练并保存模型
+
+        Returns:
+            训练统计（含模型路径）
+        """
+        texts, categories, tags = cls.load_training_data(conn, min_confidence)
+        model = cls(**kwargs)
+        stats = model.fit(texts, categories, tags)
+        stats['path'] = str(model.save(path))
+        return stats
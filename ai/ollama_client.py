@@ -1,11 +1,30 @@
 """
 Ollama本地大模型客户端
 用于生成摘要、分类和标签
+
+同步接口基于 requests；*_async 接口基于 httpx.AsyncClient，
+可在事件循环中与爬取、入库并发执行。
+
+模型生命周期：请求携带 keep_alive 让模型常驻显存，warm_up/preload 提前加载，
+响应中的 load_duration 用于统计冷启动次数和耗时。
 """
+import asyncio
 import json
+import logging
+import re
+import threading
+import time
+import weakref
 import requests
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from requests.adapters import HTTPAdapter
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from dataclasses import dataclass, field
+
+from .segmented_analysis import SegmentedAnalysisMixin
+from .streaming import (GenerationCancelled, JsonCompletionDetector, StreamStats,
+                        current_stream_options)
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -15,15 +34,63 @@ class AIAnalysisResult:
     category: str
     tags: List[str]
     confidence: float = 0.0  # 置信度
+    segment_timings: List[Dict[str, Any]] = field(default_factory=list)  # 分段分析时每段的耗时
+    compression_ratio: Optional[float] = None  # 预压缩后/前的token比例（未压缩为None）
+
+
+# Ollama未指定keep_alive时，模型空闲5分钟后卸载
+DEFAULT_KEEP_ALIVE_SECONDS = 300.0
+# load_duration 超过该值视为一次冷启动（已加载时通常只有几毫秒）
+COLD_LOAD_THRESHOLD = 0.1
+
+_DURATION_PATTERN = re.compile(r'(-?\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1.0, 'm': 60.0, 'h': 3600.0}
+
+
+def keep_alive_seconds(value) -> Optional[float]:
+    """
+    把 keep_alive 换算成秒（None表示永久常驻）
+    
+    与Ollama的取值一致：数字为秒，字符串如 "30m"、"1h30m"；负数表示永久，0表示用完即卸载。
+    未设置（None）时按Ollama默认的5分钟计算。
+    """
+    if value is None:
+        return DEFAULT_KEEP_ALIVE_SECONDS
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        text = str(value).strip()
+        try:
+            seconds = float(text)
+        except ValueError:
+            parts = _DURATION_PATTERN.findall(text)
+            if not parts or ''.join(n + u for n, u in parts) != text:
+                raise ValueError(f"无效的keep_alive: {value}")
+            seconds = sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+    return None if seconds < 0 else seconds
 
 
-class OllamaClient:
+@dataclass
+class ModelLoadStats:
+    """模型加载统计（来自响应中的 load_duration）"""
+    cold_loads: int = 0                      # load_duration 超过阈值的次数
+    warmups: int = 0                         # 主动预热次数
+    last_load_seconds: Optional[float] = None
+    max_load_seconds: float = 0.0
+    last_used: Optional[float] = None        # 最近一次请求完成的时间（monotonic）
+
+
+class OllamaClient(SegmentedAnalysisMixin):
     """Ollama API客户端"""
     
     def __init__(self, 
                  base_url: str = "http://localhost:11434",
                  model: str = "qwen2.5:7b",
-                 timeout: int = 60):
+                 timeout: int = 60,
+                 availability_ttl: float = 30.0,
+                 models_ttl: float = 300.0,
+                 pool_size: int = 16,
+                 keep_alive=None):
         """
         初始化Ollama客户端
         
@@ -31,46 +98,113 @@ class OllamaClient:
             base_url: Ollama服务地址
             model: 使用的模型名称（qwen2.5:7b, llama3.2, mistral等）
             timeout: 请求超时时间（秒）
+            availability_ttl: 可用性检查结果的缓存时间（秒）
+            models_ttl: 模型列表的缓存时间（秒）
+            pool_size: 连接池大小（应不小于并发请求数）
+            keep_alive: 模型空闲后常驻的时长（如 "30m"、秒数，负数表示永久），None使用Ollama默认值
         """
         self.base_url = base_url.rstrip('/')
         self.model = model
         self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.keep_alive_seconds = keep_alive_seconds(keep_alive)
         self.api_url = f"{self.base_url}/api/generate"
+        self.availability_ttl = availability_ttl
+        self.models_ttl = models_ttl
+        
+        # 复用keep-alive连接，避免每次请求重新建立TCP连接
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        
+        # 异步连接池：httpx.AsyncClient 与事件循环绑定，每个循环各建一个
+        self.pool_size = pool_size
+        self._async_clients = weakref.WeakKeyDictionary()
+        
+        # 健康状态：(是否可用, 检查时间)；模型列表：(列表, 获取时间)
+        self._health: Optional[tuple] = None
+        self._models: Optional[tuple] = None
+        self._state_lock = threading.Lock()
+        
+        self.load_stats = ModelLoadStats()
+        self._warming: Optional[threading.Thread] = None
     
-    def is_available(self) -> bool:
-        """检查Ollama服务是否可用"""
+    def _probe(self) -> bool:
+        """请求 /api/tags，同时刷新可用性和模型列表缓存"""
+        now = time.monotonic()
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            return response.status_code == 200
-        except:
-            return False
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=5)
+            available = response.status_code == 200
+        except Exception:
+            available = False
+        
+        models = None
+        if available:
+            try:
+                models = [model['name'] for model in response.json().get('models', [])]
+            except Exception:
+                models = None
+        
+        self._store_probe(available, models, now)
+        return available
     
-    def list_models(self) -> List[str]:
-        """列出可用的模型"""
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            if response.status_code == 200:
-                data = response.json()
-                return [model['name'] for model in data.get('models', [])]
-        except:
-            pass
-        return []
-    
-    def generate(self, prompt: str, system_prompt: str = None) -> str:
+    def _store_probe(self, available: bool, models: Optional[List[str]], checked_at: float):
+        with self._state_lock:
+            self._health = (available, checked_at)
+            if models is not None:
+                self._models = (models, checked_at)
+    
+    def _mark_health(self, available: bool):
+        """根据实际请求结果被动更新健康状态，省去额外的探测请求"""
+        with self._state_lock:
+            self._health = (available, time.monotonic())
+    
+    def is_available(self, force: bool = False) -> bool:
         """
-        调用Ollama生成文本
+        检查Ollama服务是否可用
         
-        Args:
-            prompt: 用户提示词
-            system_prompt: 系统提示词
+        结果缓存 availability_ttl 秒；生成请求的成败也会刷新该状态。
         
-        Returns:
-            生成的文本
+        Args:
+            force: 忽略缓存，立即探测
         """
+        health = self._cached_health()
+        if not force and health is not None:
+            return health
+        return self._probe()
+    
+    def _cached_health(self) -> Optional[bool]:
+        """未过期的可用性缓存（没有或已过期时为None）"""
+        with self._state_lock:
+            health = self._health
+        if health and time.monotonic() - health[1] < self.availability_ttl:
+            return health[0]
+        return None
+    
+    def list_models(self, force: bool = False) -> List[str]:
+        """列出可用的模型（缓存 models_ttl 秒）"""
+        with self._state_lock:
+            cached = self._models
+        if not force and cached and time.monotonic() - cached[1] < self.models_ttl:
+            return list(cached[0])
+        
+        self._probe()
+        with self._state_lock:
+            cached = self._models
+        return list(cached[0]) if cached else []
+    
+    def close(self):
+        """关闭连接池"""
+        self.session.close()
+    
+    def _build_payload(self, prompt: str, system_prompt: str = None, stream: bool = False,
+                       json_mode: bool = False) -> Dict:
+        """构建 /api/generate 请求体（json_mode 时要求模型输出合法JSON）"""
         payload = {
             "model": self.model,
             "prompt": prompt,
-            "stream": False,
+            "stream": stream,
             "options": {
                 "temperature": 0.3,  # 降低随机性，提高稳定性
                 "top_p": 0.9,
@@ -80,8 +214,37 @@ class OllamaClient:
         if system_prompt:
             payload["system"] = system_prompt
         
+        if json_mode:
+            payload["format"] = "json"
+        
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        
+        return payload
+    
+    def generate(self, prompt: str, system_prompt: str = None, stop_at_json: bool = False) -> str:
+        """
+        调用Ollama生成文本
+        
+        在 streaming() 上下文中或 stop_at_json=True 时走流式接口：
+        逐token回调、响应取消，JSON对象闭合后立即结束生成。
+        
+        Args:
+            prompt: 用户提示词
+            system_prompt: 系统提示词
+            stop_at_json: 以JSON模式（format: json）生成，第一个JSON对象完整后即停止
+        
+        Returns:
+            生成的文本
+        """
+        options = current_stream_options()
+        if options is not None or stop_at_json:
+            return self._generate_streaming(prompt, system_prompt, stop_at_json, options)
+        
+        payload = self._build_payload(prompt, system_prompt)
+        
         try:
-            response = requests.post(
+            response = self.session.post(
                 self.api_url,
                 json=payload,
                 timeout=self.timeout
@@ -89,60 +252,475 @@ class OllamaClient:
             response.raise_for_status()
             
             result = response.json()
+            self._mark_health(True)
+            self._record_response(result)
             return result.get('response', '').strip()
             
         except requests.Timeout:
             raise TimeoutError(f"Ollama请求超时（{self.timeout}秒）")
+        except requests.ConnectionError as e:
+            self._mark_health(False)
+            raise RuntimeError(f"Ollama请求失败: {str(e)}")
         except requests.RequestException as e:
             raise RuntimeError(f"Ollama请求失败: {str(e)}")
     
-    def analyze_conversation(self, conversation_text: str) -> AIAnalysisResult:
+    def stream_generate(self,
+                        prompt: str,
+                        system_prompt: str = None,
+                        stop_at_json: bool = False,
+                        cancel_event: Optional[threading.Event] = None,
+                        stats: Optional[StreamStats] = None) -> Iterator[str]:
+        """
+        流式生成（NDJSON），逐段产出token
+        
+        结束、提前停止或取消时都会关闭连接，Ollama随即停止生成并释放并行槽位。
+        timeout 作用于两次输出之间的间隔，卡住的生成不必等满整个超时。
+        
+        Args:
+            prompt: 用户提示词
+            system_prompt: 系统提示词
+            stop_at_json: 以JSON模式生成，第一个JSON对象闭合后停止
+            cancel_event: 置位后抛出 GenerationCancelled
+            stats: 用于记录token数和速度的统计对象
+        """
+        stats = stats if stats is not None else StreamStats()
+        detector = JsonCompletionDetector() if stop_at_json else None
+        timing = self._start_timing()
+        
+        try:
+            response = self.session.post(
+                self.api_url,
+                json=self._build_payload(prompt, system_prompt, stream=True, json_mode=stop_at_json),
+                stream=True,
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+        except requests.Timeout:
+            raise TimeoutError(f"Ollama请求超时（{self.timeout}秒）")
+        except requests.ConnectionError as e:
+            self._mark_health(False)
+            raise RuntimeError(f"Ollama请求失败: {str(e)}")
+        except requests.RequestException as e:
+            raise RuntimeError(f"Ollama请求失败: {str(e)}")
+        self._mark_health(True)
+        
+        try:
+            for line in response.iter_lines():
+                if cancel_event is not None and cancel_event.is_set():
+                    raise GenerationCancelled("生成已取消")
+                if not line:
+                    continue
+                self._first_chunk(timing)
+                
+                data = json.loads(line)
+                if data.get('error'):
+                    raise RuntimeError(f"Ollama生成失败: {data['error']}")
+                
+                chunk = data.get('response', '')
+                if detector is not None:
+                    end = detector.feed(chunk)
+                    if end >= 0:
+                        stats.add_token()
+                        stats.stopped_early = not data.get('done', False)
+                        self._record_response(data, self._estimated_load(timing))
+                        yield chunk[:end]
+                        return
+                
+                if chunk:
+                    stats.add_token()
+                    yield chunk
+                
+                if data.get('done'):
+                    if data.get('eval_count') and data.get('eval_duration'):
+                        stats.tokens = data['eval_count']
+                        stats.eval_duration = data['eval_duration'] / 1e9
+                    self._record_response(data)
+                    return
+        
+        except requests.RequestException as e:
+            if isinstance(e, requests.Timeout) or 'timed out' in str(e):
+                raise TimeoutError(f"Ollama超过{self.timeout}秒无输出")
+            raise RuntimeError(f"Ollama流式读取失败: {str(e)}")
+        finally:
+            response.close()
+    
+    def _generate_streaming(self, prompt: str, system_prompt: Optional[str],
+                            stop_at_json: bool, options) -> str:
+        """流式生成并拼接完整文本"""
+        stats = StreamStats()
+        cancel_event = options.cancel_event if options else None
+        on_token = options.on_token if options else None
+        
+        parts = []
+        for chunk in self.stream_generate(prompt, system_prompt, stop_at_json, cancel_event, stats):
+            parts.append(chunk)
+            if on_token:
+                on_token(chunk, stats)
+        
+        logger.debug(f"流式生成完成: {stats.tokens} tokens, {stats.tokens_per_second:.1f} tokens/s"
+                     f"{'（JSON完整，提前结束）' if stats.stopped_early else ''}")
+        return ''.join(parts).strip()
+    
+    def _generate_json(self, prompt: str, system_prompt: str = None) -> str:
+        """生成JSON结果：使用结构化输出，对象闭合后立即结束，释放模型槽位"""
+        return self.generate(prompt, system_prompt, stop_at_json=True)
+    
+    # ==================== 模型生命周期 ====================
+    
+    def _record_response(self, data: Dict, estimated_load: Optional[float] = None):
+        """
+        记录一次完成的请求：最近使用时间，以及 load_duration（纳秒）
+        
+        Args:
+            data: 响应（流式时为最后读到的一块）
+            estimated_load: 响应不含 load_duration 时使用的加载耗时估计（秒）
+        """
+        now = time.monotonic()
+        load = data.get('load_duration')
+        seconds = load / 1e9 if load else estimated_load
+        with self._state_lock:
+            stats = self.load_stats
+            stats.last_used = now
+            if seconds:
+                stats.last_load_seconds = seconds
+                if seconds >= COLD_LOAD_THRESHOLD:
+                    stats.cold_loads += 1
+                    stats.max_load_seconds = max(stats.max_load_seconds, seconds)
+                    logger.info(f"🧊 模型冷启动: {self.model} 加载耗时 {seconds:.1f}秒")
+    
+    def _start_timing(self) -> Dict:
+        """流式请求开始：记录发送时间和模型是否估计已加载"""
+        return {'start': time.perf_counter(), 'was_loaded': self.is_model_loaded(), 'first_chunk': None}
+    
+    @staticmethod
+    def _first_chunk(timing: Dict):
+        if timing['first_chunk'] is None:
+            timing['first_chunk'] = time.perf_counter() - timing['start']
+    
+    @staticmethod
+    def _estimated_load(timing: Dict) -> Optional[float]:
         """
-        分析对话内容，生成摘要、分类和标签
+        提前停止时的加载耗时估计
+        
+        load_duration 只在最后的 done 块中返回，JSON完整后提前断开就读不到；
+        请求前模型估计未加载时，用首块到达的耗时（加载 + 处理提示词）近似加载耗时。
+        """
+        return None if timing['was_loaded'] else timing['first_chunk']
+    
+    def is_model_loaded(self) -> bool:
+        """按最近使用时间和 keep_alive 估计模型是否仍在显存中"""
+        with self._state_lock:
+            last_used = self.load_stats.last_used
+        if last_used is None:
+            return False
+        if self.keep_alive_seconds is None:
+            return True
+        return time.monotonic() - last_used < self.keep_alive_seconds
+    
+    def _warm_up_payload(self) -> Dict:
+        """空prompt只加载模型、不生成（同时按 keep_alive 续期）"""
+        payload = {"model": self.model, "prompt": "", "stream": False}
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+    
+    def warm_up(self, force: bool = False) -> Optional[float]:
+        """
+        预热：让Ollama加载模型，之后的第一次分析不必等待冷启动
         
         Args:
-            conversation_text: 完整对话文本
+            force: 即使估计模型仍已加载也发送请求
+        
+        Returns:
+            本次加载耗时（秒）；估计已加载而跳过时为0；失败返回None
+        """
+        if not force and self.is_model_loaded():
+            return 0.0
+        
+        start = time.perf_counter()
+        try:
+            response = self.session.post(self.api_url, json=self._warm_up_payload(), timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except requests.RequestException as e:
+            logger.warning(f"⚠️ 模型预热失败: {e}")
+            return None
+        
+        return self._finish_warm_up(data, start)
+    
+    def _finish_warm_up(self, data: Dict, start: float) -> float:
+        self._mark_health(True)
+        self._record_response(data)
+        with self._state_lock:
+            self.load_stats.warmups += 1
+        seconds = data['load_duration'] / 1e9 if data.get('load_duration') else time.perf_counter() - start
+        logger.info(f"🔥 模型已预热: {self.model}（{seconds:.1f}秒）")
+        return seconds
+    
+    def preload(self) -> bool:
+        """
+        在后台线程中预热（不阻塞调用方；已加载或正在预热时不重复）
         
         Returns:
-            AIAnalysisResult对象
+            是否启动了预热
         """
-        # 限制输入长度（避免超过模型上下文窗口）
-        max_length = 8000
-        if len(conversation_text) > max_length:
-            conversation_text = conversation_text[:max_length] + "\n...(内容过长已截断)"
+        if self.is_model_loaded():
+            return False
+        with self._state_lock:
+            if self._warming is not None and self._warming.is_alive():
+                return False
+            self._warming = threading.Thread(target=self.warm_up, name="ollama-warmup", daemon=True)
+            self._warming.start()
+        return True
+    
+    def loaded_models(self) -> Optional[List[str]]:
+        """通过 /api/ps 查询当前已加载的模型（接口不可用时返回None）"""
+        try:
+            response = self.session.get(f"{self.base_url}/api/ps", timeout=5)
+            response.raise_for_status()
+            return [model.get('name') or model.get('model') for model in response.json().get('models', [])]
+        except (requests.RequestException, ValueError):
+            return None
+    
+    def model_status(self, probe: bool = True) -> Dict[str, Any]:
+        """
+        模型生命周期状态
         
-        # 构建提示词
-        prompt = self._build_analysis_prompt(conversation_text)
-        system_prompt = "你是一个专业的AI对话分析助手，擅长提取关键信息、生成摘要和分类。"
+        Args:
+            probe: 通过 /api/ps 确认是否已加载（失败时退回按 keep_alive 估计）
+        """
+        loaded = None
+        if probe:
+            names = self.loaded_models()
+            if names is not None:
+                loaded = self.model in names
+        if loaded is None:
+            loaded = self.is_model_loaded()
         
-        # 调用模型
-        response = self.generate(prompt, system_prompt)
+        with self._state_lock:
+            stats = self.load_stats
+            idle = time.monotonic() - stats.last_used if stats.last_used is not None else None
+            return {
+                'model': self.model,
+                'loaded': loaded,
+                'keep_alive': self.keep_alive,
+                'cold_loads': stats.cold_loads,
+                'warmups': stats.warmups,
+                'last_load_seconds': stats.last_load_seconds,
+                'max_load_seconds': stats.max_load_seconds,
+                'idle_seconds': round(idle, 1) if idle is not None else None,
+            }
+    
+    # ==================== 异步接口 ====================
+    
+    def _get_async_client(self):
+        """当前事件循环的 httpx.AsyncClient（连接池大小与同步会话相同）"""
+        import httpx
         
-        # 解析结果
-        return self._parse_analysis_result(response)
+        loop = asyncio.get_running_loop()
+        with self._state_lock:
+            client = self._async_clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=self.pool_size,
+                                        max_keepalive_connections=self.pool_size),
+                    timeout=self._request_timeout()
+                )
+                self._async_clients[loop] = client
+        return client
     
-    def _build_analysis_prompt(self, conversation_text: str) -> str:
-        """构建分析提示词"""
-        prompt = f"""请分析以下AI对话内容，并按照JSON格式返回结果：
-
-对话内容：
-{conversation_text}
-
-请提供：
-1. summary: 一个简洁的摘要（100-150字），概括对话的核心主题和关键结论
-2. category: 主要分类，从以下选项中选择一个：编程、写作、学习、策划、休闲娱乐、其他
-3. tags: 3-5个关键词标签（例如：Python、机器学习、数据分析等）
-
-返回格式（必须是有效的JSON）：
-{{
-    "summary": "对话摘要内容...",
-    "category": "编程",
-    "tags": ["Python", "数据分析", "pandas"]
-}}
-
-请直接返回JSON，不要添加任何其他文字说明。"""
+    def _request_timeout(self, timeout: Optional[float] = None):
+        """单次请求的超时：连接最多等5秒，读取按 timeout（默认 self.timeout）"""
+        import httpx
+        
+        seconds = self.timeout if timeout is None else timeout
+        return httpx.Timeout(seconds, connect=min(5.0, seconds))
+    
+    async def is_available_async(self, force: bool = False) -> bool:
+        """is_available 的异步版本（与同步接口共享缓存）"""
+        health = self._cached_health()
+        if not force and health is not None:
+            return health
+        
+        now = time.monotonic()
+        try:
+            response = await self._get_async_client().get(f"{self.base_url}/api/tags",
+                                                          timeout=self._request_timeout(5))
+            available = response.status_code == 200
+        except Exception:
+            available = False
         
-        return prompt
+        models = None
+        if available:
+            try:
+                models = [model['name'] for model in response.json().get('models', [])]
+            except Exception:
+                models = None
+        
+        self._store_probe(available, models, now)
+        return available
+    
+    async def close_async(self):
+        """关闭当前事件循环的异步连接池"""
+        with self._state_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+    
+    async def warm_up_async(self, force: bool = False) -> Optional[float]:
+        """warm_up 的异步版本"""
+        import httpx
+        
+        if not force and self.is_model_loaded():
+            return 0.0
+        
+        start = time.perf_counter()
+        try:
+            response = await self._get_async_client().post(self.api_url, json=self._warm_up_payload())
+            response.raise_for_status()
+            data = response.json()
+        except httpx.HTTPError as e:
+            logger.warning(f"⚠️ 模型预热失败: {e}")
+            return None
+        
+        return self._finish_warm_up(data, start)
+    
+    async def generate_async(self, prompt: str, system_prompt: str = None,
+                             stop_at_json: bool = False, timeout: Optional[float] = None) -> str:
+        """
+        generate 的异步版本
+        
+        Args:
+            prompt: 用户提示词
+            system_prompt: 系统提示词
+            stop_at_json: 以JSON模式生成，第一个JSON对象完整后即停止
+            timeout: 本次请求的超时（秒），默认 self.timeout
+        """
+        options = current_stream_options()
+        if options is not None or stop_at_json:
+            return await self._generate_streaming_async(prompt, system_prompt, stop_at_json,
+                                                        options, timeout)
+        
+        import httpx
+        
+        try:
+            response = await self._get_async_client().post(
+                self.api_url,
+                json=self._build_payload(prompt, system_prompt),
+                timeout=self._request_timeout(timeout)
+            )
+            response.raise_for_status()
+            
+            result = response.json()
+            self._mark_health(True)
+            self._record_response(result)
+            return result.get('response', '').strip()
+            
+        except httpx.TimeoutException:
+            raise TimeoutError(f"Ollama请求超时（{timeout or self.timeout}秒）")
+        except httpx.ConnectError as e:
+            self._mark_health(False)
+            raise RuntimeError(f"Ollama请求失败: {str(e)}")
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Ollama请求失败: {str(e)}")
+    
+    async def stream_generate_async(self,
+                                    prompt: str,
+                                    system_prompt: str = None,
+                                    stop_at_json: bool = False,
+                                    cancel_event: Optional[threading.Event] = None,
+                                    stats: Optional[StreamStats] = None,
+                                    timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        stream_generate 的异步版本（异步生成器）
+        
+        提前结束、取消或协程被cancel时都会关闭连接，Ollama随即停止生成。
+        timeout 作用于两次输出之间的间隔。
+        """
+        import httpx
+        
+        stats = stats if stats is not None else StreamStats()
+        detector = JsonCompletionDetector() if stop_at_json else None
+        seconds = timeout or self.timeout
+        timing = self._start_timing()
+        
+        try:
+            async with self._get_async_client().stream(
+                'POST', self.api_url,
+                json=self._build_payload(prompt, system_prompt, stream=True, json_mode=stop_at_json),
+                timeout=self._request_timeout(timeout)
+            ) as response:
+                if response.is_error:
+                    await response.aread()
+                    response.raise_for_status()
+                self._mark_health(True)
+                
+                async for line in response.aiter_lines():
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise GenerationCancelled("生成已取消")
+                    if not line:
+                        continue
+                    self._first_chunk(timing)
+                    
+                    data = json.loads(line)
+                    if data.get('error'):
+                        raise RuntimeError(f"Ollama生成失败: {data['error']}")
+                    
+                    chunk = data.get('response', '')
+                    if detector is not None:
+                        end = detector.feed(chunk)
+                        if end >= 0:
+                            stats.add_token()
+                            stats.stopped_early = not data.get('done', False)
+                            self._record_response(data, self._estimated_load(timing))
+                            yield chunk[:end]
+                            return
+                    
+                    if chunk:
+                        stats.add_token()
+                        yield chunk
+                    
+                    if data.get('done'):
+                        if data.get('eval_count') and data.get('eval_duration'):
+                            stats.tokens = data['eval_count']
+                            stats.eval_duration = data['eval_duration'] / 1e9
+                        self._record_response(data)
+                        return
+        
+        except httpx.TimeoutException:
+            raise TimeoutError(f"Ollama超过{seconds}秒无输出")
+        except httpx.ConnectError as e:
+            self._mark_health(False)
+            raise RuntimeError(f"Ollama请求失败: {str(e)}")
+        except httpx.HTTPError as e:
+            raise RuntimeError(f"Ollama流式读取失败: {str(e)}")
+    
+    async def _generate_streaming_async(self, prompt: str, system_prompt: Optional[str],
+                                        stop_at_json: bool, options,
+                                        timeout: Optional[float] = None) -> str:
+        """流式生成并拼接完整文本（异步）"""
+        stats = StreamStats()
+        cancel_event = options.cancel_event if options else None
+        on_token = options.on_token if options else None
+        
+        parts = []
+        stream = self.stream_generate_async(prompt, system_prompt, stop_at_json, cancel_event,
+                                            stats, timeout)
+        try:
+            async for chunk in stream:
+                parts.append(chunk)
+                if on_token:
+                    on_token(chunk, stats)
+        finally:
+            await stream.aclose()
+        
+        logger.debug(f"流式生成完成: {stats.tokens} tokens, {stats.tokens_per_second:.1f} tokens/s"
+                     f"{'（JSON完整，提前结束）' if stats.stopped_early else ''}")
+        return ''.join(parts).strip()
+    
+    async def _generate_json_async(self, prompt: str, system_prompt: str = None) -> str:
+        """_generate_json 的异步版本"""
+        return await self.generate_async(prompt, system_prompt, stop_at_json=True)
     
     def _parse_analysis_result(self, response: str) -> AIAnalysisResult:
         """解析AI返回的分析结果"""
@@ -163,10 +741,10 @@ class OllamaClient:
                 summary=data.get('summary', '').strip(),
                 category=data.get('category', '其他').strip(),
                 tags=data.get('tags', []),
-                confidence=0.8
+                confidence=float(data.get('confidence', 0.8))
             )
             
-        except json.JSONDecodeError:
+        except (json.JSONDecodeError, TypeError, ValueError):
             # JSON解析失败，尝试手动提取
             print(f"[警告] JSON解析失败，尝试手动提取。原始响应:\n{response}")
             return self._fallback_parse(response)
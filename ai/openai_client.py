@@ -1,18 +1,28 @@
 """
 OpenAI API客户端（备用方案）
 用于在线API调用
+
+*_async 接口基于 AsyncOpenAI（httpx连接池），可在事件循环中并发调用。
 """
+import asyncio
 import json
-from typing import List
-from openai import OpenAI
+import threading
+import weakref
+from typing import Dict, List, Optional
+from openai import APITimeoutError, AsyncOpenAI, OpenAI
 
 from .ollama_client import AIAnalysisResult
+from .segmented_analysis import SegmentedAnalysisMixin
+from .streaming import check_cancelled
 
 
-class OpenAIClient:
+class OpenAIClient(SegmentedAnalysisMixin):
     """OpenAI API客户端"""
     
-    def __init__(self, api_key: str, model: str = "gpt-4o-mini", base_url: str = None):
+    DIRECT_SYSTEM_PROMPT = "你是一个专业的AI对话分析助手。请严格按照JSON格式返回结果，不要添加其他文字。"
+    
+    def __init__(self, api_key: str, model: str = "gpt-4o-mini", base_url: str = None,
+                 timeout: Optional[float] = None):
         """
         初始化OpenAI客户端
         
@@ -20,12 +30,20 @@ class OpenAIClient:
             api_key: OpenAI API密钥
             model: 模型名称（gpt-4o-mini, gpt-4o等）
             base_url: 自定义API地址（用于兼容其他服务如DeepSeek）
+            timeout: 同步和异步接口的默认请求超时（秒），None使用SDK默认值
         """
         self.model = model
-        self.client = OpenAI(
-            api_key=api_key,
-            base_url=base_url
-        )
+        self.timeout = timeout
+        # 显式传入None会关闭SDK的超时，未设置时不传
+        options = {'api_key': api_key, 'base_url': base_url}
+        if timeout:
+            options['timeout'] = timeout
+        self.client = OpenAI(**options)
+        
+        # 异步客户端与事件循环绑定，每个循环各建一个
+        self._async_options = options
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._async_lock = threading.Lock()
     
     def is_available(self) -> bool:
         """检查API是否可用"""
@@ -36,21 +54,18 @@ class OpenAIClient:
         except:
             return False
     
-    def generate(self, prompt: str, system_prompt: str = None) -> str:
-        """生成文本"""
-        messages = []
-        
-        if system_prompt:
-            messages.append({"role": "system", "content": system_prompt})
-        
-        messages.append({"role": "user", "content": prompt})
+    def generate(self, prompt: str, system_prompt: str = None, json_mode: bool = False) -> str:
+        """
+        生成文本
         
+        Args:
+            prompt: 用户提示词
+            system_prompt: 系统提示词
+            json_mode: 使用JSON模式（response_format=json_object），保证返回合法JSON
+        """
         try:
             response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.3,
-                max_tokens=1000
+                **self._completion_params(prompt, system_prompt, json_mode)
             )
             
             return response.choices[0].message.content.strip()
@@ -58,35 +73,90 @@ class OpenAIClient:
         except Exception as e:
             raise RuntimeError(f"OpenAI API调用失败: {str(e)}")
     
-    def analyze_conversation(self, conversation_text: str) -> AIAnalysisResult:
-        """分析对话内容"""
-        # 限制长度
-        max_length = 12000
-        if len(conversation_text) > max_length:
-            conversation_text = conversation_text[:max_length] + "\n...(内容过长已截断)"
+    def _completion_params(self, prompt: str, system_prompt: str = None,
+                           json_mode: bool = False) -> Dict:
+        """构建 chat.completions.create 的参数"""
+        messages = []
         
-        prompt = f"""请分析以下AI对话内容，并按照JSON格式返回结果：
-
-对话内容：
-{conversation_text}
-
-请提供：
-1. summary: 一个简洁的摘要（100-150字），概括对话的核心主题和关键结论
-2. category: 主要分类，从以下选项中选择一个：编程、写作、学习、策划、休闲娱乐、其他
-3. tags: 3-5个关键词标签
-
-返回格式（必须是有效的JSON）：
-{{
-    "summary": "对话摘要内容...",
-    "category": "编程",
-    "tags": ["Python", "数据分析", "pandas"]
-}}"""
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
         
-        system_prompt = "你是一个专业的AI对话分析助手。请严格按照JSON格式返回结果，不要添加其他文字。"
+        messages.append({"role": "user", "content": prompt})
         
-        response = self.generate(prompt, system_prompt)
+        params = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": 0.3,
+            "max_tokens": 1000,
+        }
+        if json_mode:
+            params["response_format"] = {"type": "json_object"}
+        return params
+    
+    def _generate_json(self, prompt: str, system_prompt: str = None) -> str:
+        """以JSON模式生成结构化结果"""
+        return self.generate(prompt, system_prompt, json_mode=True)
+    
+    # ==================== 异步接口 ====================
+    
+    def _get_async_client(self) -> AsyncOpenAI:
+        """当前事件循环的 AsyncOpenAI 客户端（SDK内部复用httpx连接池）"""
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = AsyncOpenAI(**self._async_options)
+                self._async_clients[loop] = client
+        return client
+    
+    async def is_available_async(self) -> bool:
+        """is_available 的异步版本"""
+        try:
+            await self._get_async_client().models.list()
+            return True
+        except Exception:
+            return False
+    
+    async def close_async(self):
+        """关闭当前事件循环的异步客户端"""
+        with self._async_lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+    
+    async def generate_async(self, prompt: str, system_prompt: str = None, json_mode: bool = False,
+                             timeout: Optional[float] = None) -> str:
+        """
+        generate 的异步版本
         
-        # 解析结果
+        Args:
+            prompt: 用户提示词
+            system_prompt: 系统提示词
+            json_mode: 使用JSON模式
+            timeout: 本次请求的超时（秒），默认 self.timeout
+        """
+        check_cancelled()
+        seconds = timeout or self.timeout
+        extra = {"timeout": seconds} if seconds else {}
+        
+        try:
+            response = await self._get_async_client().chat.completions.create(
+                **self._completion_params(prompt, system_prompt, json_mode), **extra
+            )
+            
+            return response.choices[0].message.content.strip()
+        
+        except APITimeoutError:
+            raise TimeoutError(f"OpenAI API请求超时（{seconds}秒）")
+        except Exception as e:
+            raise RuntimeError(f"OpenAI API调用失败: {str(e)}")
+    
+    async def _generate_json_async(self, prompt: str, system_prompt: str = None) -> str:
+        """以JSON模式生成结构化结果（异步）"""
+        return await self.generate_async(prompt, system_prompt, json_mode=True)
+    
+    def _parse_analysis_result(self, response: str) -> AIAnalysisResult:
+        """解析AI返回的JSON分析结果"""
         try:
             # 移除可能的markdown标记
             json_text = response
@@ -101,7 +171,7 @@ class OpenAIClient:
                 summary=data.get('summary', '').strip(),
                 category=data.get('category', '其他').strip(),
                 tags=data.get('tags', []),
-                confidence=0.9
+                confidence=float(data.get('confidence', 0.9))
             )
         except:
             # 降级处理
@@ -117,11 +187,12 @@ class OpenAIClient:
 class DeepSeekClient(OpenAIClient):
     """DeepSeek API客户端（兼容OpenAI接口）"""
     
-    def __init__(self, api_key: str, model: str = "deepseek-chat"):
+    def __init__(self, api_key: str, model: str = "deepseek-chat", timeout: Optional[float] = None):
         super().__init__(
             api_key=api_key,
             model=model,
-            base_url="https://api.deepseek.com"
+            base_url="https://api.deepseek.com",
+            timeout=timeout
         )
 
 
@@ -0,0 +1,328 @@
+"""
+延迟感知的AI后端路由客户端
+
+在多个后端（Ollama、OpenAI、DeepSeek）之间按请求动态选择：
+1. 记录每个后端的滚动延迟（p50/p95）和错误率
+2. 每次请求优先发往最快的健康后端
+3. 主请求超过该后端的延迟分位数仍未返回时，向第二个后端发起对冲请求，取先返回者
+4. 熔断器：连续失败的后端暂时摘除，冷却后半开试探
+
+对外接口与OllamaClient/OpenAIClient一致，可直接替换给AIService使用。
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from .ollama_client import AIAnalysisResult
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """熔断器（closed → open → half_open → closed）"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            reset_timeout: 熔断后多久允许半开试探（秒）
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """当前是否允许发送请求（半开状态只放行一个试探请求）"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def is_open(self) -> bool:
+        """是否处于熔断中（不改变状态）"""
+        with self._lock:
+            return (self.state == self.OPEN
+                    and time.monotonic() - self.opened_at < self.reset_timeout)
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if (self.state == self.HALF_OPEN
+                    or self.consecutive_failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class BackendStats:
+    """单个后端的滚动统计"""
+
+    def __init__(self, window: int = 50):
+        self.latencies = deque(maxlen=window)   # 成功请求的耗时（秒）
+        self.outcomes = deque(maxlen=window)    # True=成功, False=失败
+        self.requests = 0
+        self.hedged_wins = 0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, success: bool):
+        with self._lock:
+            self.requests += 1
+            self.outcomes.append(success)
+            if success:
+                self.latencies.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """延迟分位数（q取0~1），无样本时返回None"""
+        with self._lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+        return ordered[index]
+
+    @property
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self.outcomes:
+                return 0.0
+            return self.outcomes.count(False) / len(self.outcomes)
+
+
+class Backend:
+    """路由表中的一个后端"""
+
+    def __init__(self, name: str, client, window: int = 50,
+                 failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.client = client
+        self.stats = BackendStats(window)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+    def score(self, prior: float) -> float:
+        """
+        路由评分（越小越优先）：p50延迟按错误率加权
+
+        Args:
+            prior: 没有成功样本（从未请求或只有失败）时代替p50的悲观先验，
+                   避免未经验证或一直失败的后端排在已知可用的后端之前
+        """
+        p50 = self.stats.percentile(0.5)
+        if p50 is None:
+            p50 = prior
+        return p50 * (1.0 + 4.0 * self.stats.error_rate)
+
+
+class RoutingAIClient:
+    """按延迟和健康度在多个AI后端之间路由，支持对冲请求和熔断"""
+
+    def __init__(self, backends: List[Backend],
+                 hedge: bool = True,
+                 hedge_percentile: float = 0.95,
+                 min_hedge_delay: float = 0.5,
+                 default_hedge_delay: float = 10.0,
+                 max_hedge_delay: float = 60.0):
+        """
+        初始化路由客户端
+
+        Args:
+            backends: 后端列表（顺序即无统计数据时的优先级）
+            hedge: 是否启用对冲请求
+            hedge_percentile: 主后端超过该延迟分位数仍未返回时发起对冲
+            min_hedge_delay: 对冲等待下限（秒）
+            default_hedge_delay: 主后端无延迟样本时的对冲等待（秒）
+            max_hedge_delay: 对冲等待上限（秒）
+        """
+        if not backends:
+            raise ValueError("至少需要一个AI后端")
+
+        self.backends = backends
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.default_hedge_delay = default_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.hedges_sent = 0
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(4, len(backends) * 4),
+            thread_name_prefix="ai-router"
+        )
+
+    @classmethod
+    def from_clients(cls, clients: Dict[str, Any], **kwargs) -> 'RoutingAIClient':
+        """由 {名称: 客户端} 构造（保持字典顺序作为初始优先级）"""
+        return cls([Backend(name, client) for name, client in clients.items()], **kwargs)
+
+    # ==================== 路由 ====================
+
+    def _ranked_backends(self) -> List[Backend]:
+        """
+        可用后端按评分排序（稳定排序，评分相同保持配置顺序）
+
+        没有成功样本的后端按所有后端中观测到的最大延迟计分（都没有样本时取
+        default_hedge_delay），与最慢的已知后端持平，只失败过的后端排在最后。
+        """
+        healthy = [b for b in self.backends if not b.breaker.is_open()]
+        observed = [b.stats.percentile(1.0) for b in self.backends]
+        prior = max((latency for latency in observed if latency is not None),
+                    default=self.default_hedge_delay)
+        return sorted(healthy, key=lambda b: b.score(prior))
+
+    def _hedge_delay(self, backend: Backend) -> float:
+        """主请求等待多久后发起对冲"""
+        delay = backend.stats.percentile(self.hedge_percentile)
+        if delay is None:
+            delay = self.default_hedge_delay
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, delay))
+
+    def _invoke(self, backend: Backend, method: str, args, kwargs):
+        """在指定后端上执行调用并记录结果"""
+        start = time.perf_counter()
+        try:
+            result = self._dispatch(backend.client, method, args, kwargs)
+        except Exception:
+            backend.stats.record(time.perf_counter() - start, False)
+            backend.breaker.record_failure()
+            raise
+        backend.stats.record(time.perf_counter() - start, True)
+        backend.breaker.record_success()
+        return result
+
+    @staticmethod
+    def _dispatch(client, method: str, args, kwargs):
+        """调用客户端方法；缺少快速模式的客户端退化为只请求对应任务的多任务分析"""
+        if hasattr(client, method):
+            return getattr(client, method)(*args, **kwargs)
+        if method == 'generate_summary_only':
+            return client.analyze_conversation(args[0], tasks=('summary',)).summary
+        if method == 'generate_tags_only':
+            num_tags = kwargs.get('num_tags', args[1] if len(args) > 1 else 5)
+            return client.analyze_conversation(args[0], tasks=('tags',)).tags[:num_tags]
+        raise AttributeError(f"{client.__class__.__name__} 不支持 {method}")
+
+    def _call(self, method: str, *args, **kwargs):
+        """
+        路由一次调用：主后端 + 最多一次对冲；失败时依次降级到后续后端
+        """
+        ranked = self._ranked_backends()
+        pending = {}
+        next_index = 0
+        hedged = False
+        last_error: Optional[Exception] = None
+
+        def launch() -> Optional[Backend]:
+            """启动排名中下一个熔断器放行的后端"""
+            nonlocal next_index
+            while next_index < len(ranked):
+                backend = ranked[next_index]
+                next_index += 1
+                if backend.breaker.allow_request():
+                    future = self._executor.submit(self._invoke, backend, method, args, kwargs)
+                    pending[future] = backend
+                    return backend
+            return None
+
+        primary = launch()
+        if primary is None:
+            raise RuntimeError("没有可用的AI后端（全部处于熔断状态）")
+
+        while pending:
+            can_hedge = (self.hedge and not hedged and next_index < len(ranked)
+                         and len(pending) == 1)
+            timeout = self._hedge_delay(primary) if can_hedge else None
+
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                hedged = True
+                backup = launch()
+                if backup:
+                    self.hedges_sent += 1
+                    logger.info(f"⏱️ {primary.name} 超过 {timeout:.1f}s 未返回，对冲到 {backup.name}")
+                continue
+
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"⚠️ AI后端 {backend.name} 调用失败: {e}")
+                    if not pending:
+                        launch()
+                    continue
+
+                if hedged and backend is not primary:
+                    backend.stats.hedged_wins += 1
+                return result
+
+        raise last_error or RuntimeError("所有AI后端调用失败")
+
+    # ==================== 客户端接口 ====================
+
+    def is_available(self) -> bool:
+        """只要有后端未熔断即视为可用（不发起网络请求）"""
+        return any(not b.breaker.is_open() for b in self.backends)
+
+    def generate(self, prompt: str, system_prompt: str = None) -> str:
+        return self._call('generate', prompt, system_prompt)
+
+    def analyze_conversation(self, conversation_text: str, tasks=None) -> AIAnalysisResult:
+        if tasks is None:
+            return self._call('analyze_conversation', conversation_text)
+        return self._call('analyze_conversation', conversation_text, tasks=tasks)
+
+    def generate_summary_only(self, conversation_text: str, max_words: int = 150) -> str:
+        return self._call('generate_summary_only', conversation_text, max_words)
+
+    def generate_tags_only(self, conversation_text: str, num_tags: int = 5) -> List[str]:
+        return self._call('generate_tags_only', conversation_text, num_tags)
+
+    def get_stats(self) -> List[Dict[str, Any]]:
+        """每个后端的路由统计（用于状态展示）"""
+        return [{
+            'name': b.name,
+            'state': b.breaker.state,
+            'requests': b.stats.requests,
+            'error_rate': round(b.stats.error_rate, 3),
+            'p50_ms': self._ms(b.stats.percentile(0.5)),
+            'p95_ms': self._ms(b.stats.percentile(0.95)),
+            'hedged_wins': b.stats.hedged_wins,
+        } for b in self.backends]
+
+    @staticmethod
+    def _ms(value: Optional[float]) -> Optional[int]:
+        return int(value * 1000) if value is not None else None
+
+    def close(self):
+        """释放线程池"""
+        self._executor.shutdown(wait=False)
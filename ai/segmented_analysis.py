@@ -0,0 +1,526 @@
+"""
+长对话分段分析（map-reduce）
+
+超过阈值的对话不再截断，而是：
+1. 按对话轮次切分为若干段，每段不超过token预算
+2. 线程池并发生成各段摘要（有界并发）
+3. 合并分段摘要，生成最终的摘要、分类和标签
+
+整体耗时约等于最慢一段的耗时，而不是各段之和。
+摘要、分类、标签由同一个多任务提示词在一次生成中完成，可只请求其中一部分。
+OllamaClient 和 OpenAIClient 通过混入本类获得分段能力。
+
+宿主提供 generate_async 时还可使用 analyze_conversation_async：流程相同，
+分段摘要改为在事件循环中用信号量限制并发，不占用线程。
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .streaming import GenerationCancelled, check_cancelled
+
+logger = logging.getLogger(__name__)
+
+# 中日韩字符大约1个字符1个token，其余文本大约4个字符1个token
+_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的token数（无需加载分词器）"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class SegmentedAnalysisMixin:
+    """
+    分段分析混入类
+
+    宿主类需要提供：
+    - generate(prompt, system_prompt) -> str
+    - _parse_analysis_result(response) -> AIAnalysisResult
+    - generate_async(prompt, system_prompt) -> str（可选，异步接口使用）
+    """
+
+    # 一次生成可同时完成的分析任务（按输出顺序排列）
+    ANALYSIS_TASKS = ('summary', 'category', 'tags')
+
+    TASK_INSTRUCTIONS = {
+        'summary': "summary: 一个简洁的摘要（100-150字），概括对话的核心主题和关键结论",
+        'category': "category: 主要分类，从以下选项中选择一个：编程、写作、学习、策划、休闲娱乐、其他",
+        'tags': "tags: 3-5个关键词标签（例如：Python、机器学习、数据分析等）",
+        'confidence': "confidence: 置信度（0-1）",
+    }
+
+    TASK_EXAMPLES = {
+        'summary': "对话摘要内容...",
+        'category': "编程",
+        'tags': ["Python", "数据分析", "pandas"],
+        'confidence': 0.85,
+    }
+
+    # 达到该长度（字符）的对话走分段分析
+    segment_threshold = 12000
+    # 每段的token预算
+    segment_token_budget = 3000
+    # 同时进行的分段摘要请求数
+    segment_concurrency = 10
+    # 合并后的摘要仍超过阈值时，最多再归约几轮
+    max_reduce_rounds = 2
+
+    # 分隔符按优先级排列：对话轮次 > 标题 > 段落
+    SEGMENT_SEPARATORS = (
+        '\n\nUser:', '\n\nAssistant:',
+        '\n\n用户:', '\n\n助手:',
+        '\n\n## ', '\n\n### ',
+        '\n\n---', '\n\n',
+    )
+
+    # 抽取式预压缩器（TextCompressor），设置后分析前先压缩对话文本
+    compressor = None
+
+    # 提示词版本：修改提示词后递增，使分析缓存失效
+    prompt_version = "2"
+
+    ANALYSIS_SYSTEM_PROMPT = "你是一个专业的AI对话分析助手，擅长提取关键信息、生成摘要和分类。"
+    # 直接分析（不分段）使用的系统提示词
+    DIRECT_SYSTEM_PROMPT = ANALYSIS_SYSTEM_PROMPT
+
+    def analyze_conversation(self, conversation_text: str, tasks: Optional[Iterable[str]] = None):
+        """
+        分析对话内容，按长度自动选择策略
+
+        - 短于 segment_threshold → 直接分析
+        - 否则 → 分段摘要再合并
+
+        Args:
+            conversation_text: 完整对话文本
+            tasks: 需要的输出（summary/category/tags的任意子集），None表示全部；
+                   所有任务在同一次生成中完成，未请求的字段为空
+        """
+        tasks = self.normalize_tasks(tasks)
+
+        # 先按原文长度决定策略：长对话整体压缩会丢掉大部分内容，改为逐段压缩
+        if len(conversation_text) >= self.segment_threshold:
+            logger.info(f"💡 对话长度 {len(conversation_text)} 字符，启用分段摘要策略")
+            result = self._analyze_with_segments(conversation_text, tasks)
+            return self._restrict_to_tasks(result, tasks)
+
+        conversation_text, compression = self._compress(conversation_text)
+        result = self._analyze_direct(conversation_text, tasks)
+        return self._finish_result(result, compression, tasks)
+
+    def _compress(self, conversation_text: str, token_budget: Optional[int] = None):
+        """按需预压缩，返回 (文本, 压缩结果或None)；token_budget 覆盖压缩器的预算"""
+        if self.compressor is None:
+            return conversation_text, None
+        compression = self.compressor.compress(conversation_text, token_budget)
+        logger.info(f"🗜️ 预压缩: {compression.original_tokens} → {compression.compressed_tokens} tokens "
+                    f"(压缩比 {compression.ratio:.2f}，去重 {compression.duplicates_removed}，"
+                    f"折叠代码 {compression.code_blocks_collapsed})")
+        return compression.text, compression
+
+    def _finish_result(self, result, compression, tasks: Tuple[str, ...]):
+        """记录压缩比并清空未请求的字段"""
+        if compression is not None:
+            result.compression_ratio = round(compression.ratio, 3)
+        return self._restrict_to_tasks(result, tasks)
+
+    # ==================== 多任务提示词 ====================
+
+    @classmethod
+    def normalize_tasks(cls, tasks: Optional[Iterable[str]] = None) -> Tuple[str, ...]:
+        """规范化任务列表：去重并按 ANALYSIS_TASKS 排序，None表示全部"""
+        if tasks is None:
+            return cls.ANALYSIS_TASKS
+        if isinstance(tasks, str):
+            tasks = [tasks]
+        requested = set(tasks)
+        unknown = requested - set(cls.ANALYSIS_TASKS)
+        if unknown:
+            raise ValueError(f"不支持的分析任务: {', '.join(sorted(unknown))}")
+        if not requested:
+            raise ValueError("至少需要一个分析任务")
+        return tuple(task for task in cls.ANALYSIS_TASKS if task in requested)
+
+    def _build_analysis_prompt(self, conversation_text: str,
+                               tasks: Optional[Iterable[str]] = None,
+                               header: str = "请分析以下AI对话内容，并按照JSON格式返回结果：\n\n对话内容：",
+                               with_confidence: bool = False) -> str:
+        """
+        构建多任务分析提示词：只列出请求的字段，要求模型一次返回一个JSON对象
+        """
+        fields = list(self.normalize_tasks(tasks))
+        if with_confidence:
+            fields.append('confidence')
+
+        items = "\n".join(f"{i}. {self.TASK_INSTRUCTIONS[name]}" for i, name in enumerate(fields, 1))
+        example = json.dumps({name: self.TASK_EXAMPLES[name] for name in fields},
+                             ensure_ascii=False, indent=4)
+
+        return f"""{header}
+{conversation_text}
+
+请提供：
+{items}
+
+返回格式（必须是有效的JSON）：
+{example}
+
+请直接返回JSON，不要添加任何其他文字说明。"""
+
+    def _restrict_to_tasks(self, result, tasks: Tuple[str, ...]):
+        """清空未请求的字段，避免把解析默认值当作模型输出"""
+        if 'summary' not in tasks:
+            result.summary = ""
+        if 'category' not in tasks:
+            result.category = ""
+        if 'tags' not in tasks:
+            result.tags = []
+        return result
+
+    def _generate_json(self, prompt: str, system_prompt: str = None) -> str:
+        """生成JSON格式的结果（支持流式的客户端可在对象闭合后提前结束）"""
+        return self.generate(prompt, system_prompt)
+
+    def _direct_prompt(self, conversation_text: str, tasks: Optional[Iterable[str]] = None) -> str:
+        """直接分析的提示词（超长对话由 analyze_conversation 转交分段分析，这里只做兜底截断）"""
+        # 限制输入长度（避免超过模型上下文窗口）
+        if len(conversation_text) > self.segment_threshold:
+            conversation_text = conversation_text[:self.segment_threshold] + "\n...(内容过长已截断)"
+        return self._build_analysis_prompt(conversation_text, tasks)
+
+    def _analyze_direct(self, conversation_text: str, tasks: Optional[Iterable[str]] = None):
+        """
+        直接分析对话内容，一次生成请求的摘要、分类和标签
+
+        Args:
+            conversation_text: 完整对话文本
+            tasks: 需要的输出，None表示全部
+
+        Returns:
+            AIAnalysisResult对象
+        """
+        prompt = self._direct_prompt(conversation_text, tasks)
+        response = self._generate_json(prompt, self.DIRECT_SYSTEM_PROMPT)
+        return self._parse_analysis_result(response)
+
+    # ==================== 分段 ====================
+
+    def _segment_length_for(self, text: str) -> int:
+        """把token预算换算成该文本对应的字符长度"""
+        tokens = estimate_tokens(text)
+        if not tokens:
+            return len(text) or 1
+        chars_per_token = len(text) / tokens
+        return max(1000, int(self.segment_token_budget * chars_per_token))
+
+    def _split_into_segments(self, text: str, max_segment_length: int = 6000) -> List[str]:
+        """
+        智能分段：优先在对话边界处分割，避免截断单条消息
+
+        在每段末尾前500字符的窗口内按优先级寻找分隔符，
+        找不到时在 max_segment_length 处强制分割，保证每段不超过预算。
+
+        Args:
+            text: 完整文本
+            max_segment_length: 每段最大字符数
+
+        Returns:
+            分段列表（空文本返回空列表）
+        """
+        if not text:
+            return []
+        if len(text) <= max_segment_length:
+            return [text]
+
+        window = min(500, max_segment_length // 2)
+        segments = []
+        start = 0
+        length = len(text)
+
+        while length - start > max_segment_length:
+            end = start + max_segment_length
+            search_start = end - window
+
+            split = -1
+            for separator in self.SEGMENT_SEPARATORS:
+                pos = text.rfind(separator, search_start, end)
+                if pos > start:
+                    split = pos
+                    break
+            if split == -1:
+                split = end
+
+            segment = text[start:split].strip()
+            if segment:
+                segments.append(segment)
+            start = split
+
+        tail = text[start:].strip()
+        if tail:
+            segments.append(tail)
+
+        return segments
+
+    # ==================== Map ====================
+
+    def _summarize_segment(self, segment: str, segment_num: int,
+                           max_length: Optional[int] = 3000) -> str:
+        """
+        对单个分段生成摘要
+
+        Args:
+            segment: 分段文本
+            segment_num: 分段序号（从1开始）
+            max_length: 输入的最大字符数，None表示不截断
+
+        Returns:
+            分段摘要；生成失败时降级为分段前150字
+        """
+        check_cancelled()
+        try:
+            return self.generate(self._segment_prompt(segment, segment_num, max_length),
+                                 self.ANALYSIS_SYSTEM_PROMPT).strip()
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ 第{segment_num}段摘要失败，使用原文开头: {e}")
+            return segment[:150] + "..."
+
+    @staticmethod
+    def _segment_prompt(segment: str, segment_num: int, max_length: Optional[int] = 3000) -> str:
+        """分段摘要提示词（max_length为None表示不截断）"""
+        if max_length is not None and len(segment) > max_length:
+            content = segment[:max_length] + "\n...(后续内容省略)"
+        else:
+            content = segment
+
+        return f"""请为以下对话片段（第{segment_num}段）生成简洁摘要（100-150字）：
+
+{content}
+
+摘要要求：
+1. 概括这段对话的主要内容和结论
+2. 保留关键信息（问题、解决方案、重要观点）
+3. 100-150字以内
+4. 直接输出摘要文本，不要额外解释
+
+摘要："""
+
+    def _summarize_segments(self, segments: List[str]) -> List[Dict[str, Any]]:
+        """
+        并发生成所有分段摘要（结果保持分段顺序）
+
+        Returns:
+            每段的 {'index', 'chars', 'seconds', 'summary'}
+        """
+        def run(index: int, segment: str) -> Dict[str, Any]:
+            start = time.perf_counter()
+            summary = self._summarize_segment(segment, index, max_length=None)
+            return {
+                'index': index,
+                'chars': len(segment),
+                'seconds': round(time.perf_counter() - start, 3),
+                'summary': summary,
+            }
+
+        workers = max(1, min(self.segment_concurrency, len(segments)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ai-segment") as executor:
+            # 每个子任务复制一份上下文，使流式回调和取消事件在工作线程中生效
+            futures = [executor.submit(contextvars.copy_context().run, run, i, seg)
+                       for i, seg in enumerate(segments, 1)]
+            return [future.result() for future in futures]
+
+    # ==================== Reduce ====================
+
+    @staticmethod
+    def _merge_segment_summaries(summaries: List[str]) -> str:
+        """按顺序合并分段摘要"""
+        return "\n\n".join(f"[第{i}段] {summary}" for i, summary in enumerate(summaries, 1))
+
+    def _analyze_with_segments(self, conversation_text: str,
+                               tasks: Optional[Iterable[str]] = None):
+        """
+        分段分析主流程：分段 → 并发摘要 → 合并 → 最终分析（一次生成完成所有请求的任务）
+
+        Returns:
+            AIAnalysisResult（segment_timings 记录每段耗时）
+        """
+        start = time.perf_counter()
+        segments, ratio = self._plan_segments(conversation_text)
+
+        timings = self._summarize_segments(segments)
+        combined = self._combine_timings(timings)
+
+        # 段数很多时合并结果可能仍然过长，再归约一轮
+        rounds = 0
+        while len(combined) >= self.segment_threshold and rounds < self.max_reduce_rounds:
+            rounds += 1
+            parts = self._split_into_segments(combined, self._segment_length_for(combined))
+            logger.info(f"🔁 合并摘要过长，第 {rounds} 轮归约（{len(parts)} 段）")
+            combined = self._merge_segment_summaries(
+                [item['summary'] for item in self._summarize_segments(parts)]
+            )
+
+        check_cancelled()
+        response = self._generate_json(self._final_prompt(combined, tasks), self.ANALYSIS_SYSTEM_PROMPT)
+        return self._finish_segments(response, segments, timings, start, ratio)
+
+    def _plan_segments(self, conversation_text: str) -> Tuple[List[str], Optional[float]]:
+        """
+        按token预算切分对话
+
+        启用预压缩时逐段压缩到 segment_token_budget（每段本就不超过预算，
+        只去掉样板文字、重复段落和折叠长代码块，不删句子）
+
+        Returns:
+            (分段列表, 整体压缩比或None)
+        """
+        segments = self._split_into_segments(
+            conversation_text, self._segment_length_for(conversation_text)
+        )
+        logger.info(f"📦 已分为 {len(segments)} 段（并发 {min(self.segment_concurrency, len(segments))}）")
+        if self.compressor is None:
+            return segments, None
+
+        compressed = [self.compressor.compress(segment, self.segment_token_budget) for segment in segments]
+        ratio = sum(c.compressed_tokens for c in compressed) / max(1, sum(c.original_tokens for c in compressed))
+        logger.info(f"🗜️ 逐段预压缩: 压缩比 {ratio:.2f}")
+        return [c.text for c in compressed if c.text.strip()] or segments, ratio
+
+    def _combine_timings(self, timings: List[Dict[str, Any]]) -> str:
+        """记录各段耗时并合并分段摘要"""
+        for item in timings:
+            logger.info(f"  ✅ 第 {item['index']} 段 ({item['chars']} 字符) "
+                        f"{item['seconds']:.1f}秒: {item['summary'][:60]}")
+        return self._merge_segment_summaries([item['summary'] for item in timings])
+
+    def _final_prompt(self, combined: str, tasks: Optional[Iterable[str]]) -> str:
+        """基于合并摘要的最终分析提示词"""
+        return self._build_analysis_prompt(
+            combined, tasks,
+            header="基于以下按顺序排列的分段摘要，生成完整的对话分析：\n",
+            with_confidence=True
+        )
+
+    def _finish_segments(self, response: str, segments: List[str],
+                         timings: List[Dict[str, Any]], start: float,
+                         compression_ratio: Optional[float] = None):
+        """解析最终结果并附上分段耗时和逐段压缩比"""
+        result = self._parse_analysis_result(response)
+        result.segment_timings = timings
+        if compression_ratio is not None:
+            result.compression_ratio = round(compression_ratio, 3)
+
+        slowest = max((item['seconds'] for item in timings), default=0.0)
+        logger.info(f"✅ 分段分析完成: {len(segments)} 段, 总耗时 "
+                    f"{time.perf_counter() - start:.1f}秒 (最慢一段 {slowest:.1f}秒)")
+        return result
+
+    # ==================== 异步接口 ====================
+
+    async def analyze_conversation_async(self, conversation_text: str,
+                                         tasks: Optional[Iterable[str]] = None):
+        """
+        analyze_conversation 的异步版本（需要宿主提供 generate_async）
+
+        策略与同步版本相同；等待模型输出时不阻塞事件循环，
+        可与爬取、入库等其他协程并发执行。
+        """
+        tasks = self.normalize_tasks(tasks)
+
+        if len(conversation_text) >= self.segment_threshold:
+            logger.info(f"💡 对话长度 {len(conversation_text)} 字符，启用分段摘要策略")
+            result = await self._analyze_with_segments_async(conversation_text, tasks)
+            return self._restrict_to_tasks(result, tasks)
+
+        conversation_text, compression = self._compress(conversation_text)
+        result = await self._analyze_direct_async(conversation_text, tasks)
+        return self._finish_result(result, compression, tasks)
+
+    async def _generate_json_async(self, prompt: str, system_prompt: str = None) -> str:
+        """_generate_json 的异步版本"""
+        return await self.generate_async(prompt, system_prompt)
+
+    async def _analyze_direct_async(self, conversation_text: str,
+                                    tasks: Optional[Iterable[str]] = None):
+        """_analyze_direct 的异步版本"""
+        prompt = self._direct_prompt(conversation_text, tasks)
+        response = await self._generate_json_async(prompt, self.DIRECT_SYSTEM_PROMPT)
+        return self._parse_analysis_result(response)
+
+    async def _summarize_segment_async(self, segment: str, segment_num: int,
+                                       max_length: Optional[int] = 3000) -> str:
+        """_summarize_segment 的异步版本（失败时同样降级为分段开头）"""
+        check_cancelled()
+        try:
+            response = await self.generate_async(self._segment_prompt(segment, segment_num, max_length),
+                                                 self.ANALYSIS_SYSTEM_PROMPT)
+            return response.strip()
+        except GenerationCancelled:
+            raise
+        except Exception as e:
+            logger.warning(f"⚠️ 第{segment_num}段摘要失败，使用原文开头: {e}")
+            return segment[:150] + "..."
+
+    async def _summarize_segments_async(self, segments: List[str]) -> List[Dict[str, Any]]:
+        """
+        在事件循环中并发生成分段摘要（信号量限制为 segment_concurrency）
+
+        任一段被取消时取消其余各段。
+        """
+        semaphore = asyncio.Semaphore(max(1, self.segment_concurrency))
+
+        async def run(index: int, segment: str) -> Dict[str, Any]:
+            async with semaphore:
+                start = time.perf_counter()
+                summary = await self._summarize_segment_async(segment, index, max_length=None)
+            return {
+                'index': index,
+                'chars': len(segment),
+                'seconds': round(time.perf_counter() - start, 3),
+                'summary': summary,
+            }
+
+        # 协程任务创建时自动复制上下文，流式回调和取消事件同样生效
+        pending = [asyncio.ensure_future(run(i, seg)) for i, seg in enumerate(segments, 1)]
+        try:
+            return list(await asyncio.gather(*pending))
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            raise
+
+    async def _analyze_with_segments_async(self, conversation_text: str,
+                                           tasks: Optional[Iterable[str]] = None):
+        """_analyze_with_segments 的异步版本"""
+        start = time.perf_counter()
+        segments, ratio = self._plan_segments(conversation_text)
+
+        timings = await self._summarize_segments_async(segments)
+        combined = self._combine_timings(timings)
+
+        rounds = 0
+        while len(combined) >= self.segment_threshold and rounds < self.max_reduce_rounds:
+            rounds += 1
+            parts = self._split_into_segments(combined, self._segment_length_for(combined))
+            logger.info(f"🔁 合并摘要过长，第 {rounds} 轮归约（{len(parts)} 段）")
+            combined = self._merge_segment_summaries(
+                [item['summary'] for item in await self._summarize_segments_async(parts)]
+            )
+
+        check_cancelled()
+        response = await self._generate_json_async(self._final_prompt(combined, tasks),
+                                                   self.ANALYSIS_SYSTEM_PROMPT)
+        return self._finish_segments(response, segments, timings, start, ratio)
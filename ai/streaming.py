@@ -0,0 +1,132 @@
+"""
+流式生成的公共工具
+
+- GenerationCancelled: 协作式取消时抛出
+- StreamStats: 流式生成的实时统计（token数、tokens/sec）
+- JsonCompletionDetector: 增量检测JSON对象是否已完整，完整即可提前结束生成
+- streaming(): 为当前调用链设置逐token回调和取消事件
+
+回调和取消事件通过 contextvars 传递，客户端方法签名保持不变；
+分段分析等在线程池中执行的子任务需用 contextvars.copy_context().run 继承。
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, Optional
+
+
+class GenerationCancelled(RuntimeError):
+    """生成被取消"""
+
+
+@dataclass
+class StreamStats:
+    """一次流式生成的统计"""
+    tokens: int = 0
+    started_at: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+    eval_duration: Optional[float] = None  # 模型报告的生成耗时（秒）
+    stopped_early: bool = False  # 是否因JSON已完整而提前结束
+
+    def add_token(self):
+        self.tokens += 1
+        self.elapsed = time.perf_counter() - self.started_at
+
+    @property
+    def tokens_per_second(self) -> float:
+        duration = self.eval_duration or self.elapsed
+        return self.tokens / duration if duration > 0 else 0.0
+
+
+@dataclass
+class StreamOptions:
+    """当前调用链的流式选项"""
+    on_token: Optional[Callable[[str, StreamStats], None]] = None
+    cancel_event: Optional[threading.Event] = None
+
+    def check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise GenerationCancelled("生成已取消")
+
+
+_stream_options: ContextVar[Optional[StreamOptions]] = ContextVar('ai_stream_options', default=None)
+
+
+def current_stream_options() -> Optional[StreamOptions]:
+    """当前调用链设置的流式选项（未设置时为None）"""
+    return _stream_options.get()
+
+
+def check_cancelled():
+    """若当前调用链已被取消则抛出 GenerationCancelled"""
+    options = _stream_options.get()
+    if options is not None:
+        options.check_cancelled()
+
+
+@contextmanager
+def streaming(on_token: Optional[Callable[[str, StreamStats], None]] = None,
+              cancel_event: Optional[threading.Event] = None) -> Iterator[StreamOptions]:
+    """
+    在上下文内的AI调用启用流式回调和协作式取消
+
+    Args:
+        on_token: 每收到一个token调用 on_token(token, stats)
+        cancel_event: 置位后正在进行的生成会尽快停止
+    """
+    options = StreamOptions(on_token=on_token, cancel_event=cancel_event)
+    token = _stream_options.set(options)
+    try:
+        yield options
+    finally:
+        _stream_options.reset(token)
+
+
+class JsonCompletionDetector:
+    """
+    增量检测第一个JSON对象是否已闭合
+
+    忽略对象之前的任何文本（如 ```json 代码块标记），正确处理字符串中的括号和转义。
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.started = False
+        self.in_string = False
+        self.escaped = False
+        self.complete = False
+
+    def feed(self, chunk: str) -> int:
+        """
+        输入一段文本
+
+        Returns:
+            对象在该段中结束位置之后的下标；对象尚未闭合时返回-1
+        """
+        if self.complete:
+            return 0
+        for i, ch in enumerate(chunk):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == '\\':
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"' and self.started:
+                self.in_string = True
+            elif ch == '{':
+                self.started = True
+                self.depth += 1
+            elif ch == '}' and self.started:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.complete = True
+                    return i + 1
+        return -1
@@ -0,0 +1,424 @@
+"""
+对话文本抽取式预压缩
+
+在送入大模型之前先在本地压缩对话文本，替代盲目截断：
+1. 去除界面残留的样板文字（Copy code、复制代码、Regenerate等）
+2. 重复的段落和代码块只保留第一次出现
+3. 长代码块折叠为签名行（def/class/function/import等）
+4. 仍超过token预算时，用TF-IDF + TextRank（NumPy向量化）给句子打分，
+   按分数挑选句子直到填满预算，并按原文顺序输出
+
+压缩结果报告压缩比。未安装NumPy时第4步退化为按位置选句。
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import hashlib
+import json
+import logging
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, List, Optional
+
+from .segmented_analysis import estimate_tokens
+
+try:
+    import numpy as np
+except ImportError:  # NumPy为可选依赖
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# 各平台复制页面时混入的按钮文字，整行出现时删除
+_BOILERPLATE = re.compile(
+    r'^[ \t]*(?:copy code|copy|copied!?|复制代码|复制|已复制|regenerate(?: response)?|重新生成|'
+    r'edit|编辑|share|分享|\d+ ?/ ?\d+|chatgpt said:|you said:)[ \t]*$\n?',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# 紧贴在代码块前的复制按钮文字（如"...方法。Copy code\n```"）
+_INLINE_BOILERPLATE = re.compile(r'[ \t]*(?:copy code|复制代码)[ \t]*(?=\n```)', re.IGNORECASE)
+
+_CODE_FENCE = re.compile(r'```[^\n`]*\n.*?(?:```|\Z)', re.DOTALL)
+
+# 折叠代码时保留的签名行
+_SIGNATURE = re.compile(
+    r'^\s*(?:@\w+|(?:async\s+)?def\s|class\s|function\s|func\s|fn\s|interface\s|struct\s|enum\s|'
+    r'impl\s|trait\s|type\s+\w+\s*=|(?:export\s+)?(?:default\s+)?(?:async\s+)?function\b|'
+    r'(?:public|private|protected|static)\s|import\s|from\s+\S+\s+import\s|#include\s|package\s|'
+    r'module\s|create\s+table\s|(?:const|let|var)\s+\w+\s*=\s*(?:async\s*)?\()',
+    re.IGNORECASE
+)
+
+# 消息开头的角色前缀（ConversationData.get_full_text 的输出格式）
+_ROLE_PREFIX = re.compile(r'^(用户|助手|User|Assistant|Human|AI)[:：]\s*')
+
+# 句子切分：中文句末标点后、英文句末标点加空白后、换行处
+_SENTENCE_END = re.compile(r'(?<=[。！？；!?;])|(?<=[.])(?=\s)|\n+')
+
+_WORD = re.compile(r'[a-z_][a-z0-9_]+|\d+|[一-鿿]')
+_CJK_BIGRAM = re.compile(r'(?=([一-鿿]{2}))')
+
+
+@dataclass
+class CompressionResult:
+    """一次预压缩的结果和统计"""
+    text: str
+    original_tokens: int
+    compressed_tokens: int
+    duplicates_removed: int = 0
+    code_blocks_collapsed: int = 0
+    sentences_dropped: int = 0
+
+    @property
+    def ratio(self) -> float:
+        """压缩后token数 / 原始token数（越小压缩越多）"""
+        if not self.original_tokens:
+            return 1.0
+        return self.compressed_tokens / self.original_tokens
+
+
+@dataclass
+class _Unit:
+    """参与排序的最小单元（句子或折叠后的代码块）"""
+    message: int
+    paragraph: int
+    text: str
+    tokens: int
+    is_code: bool = False
+    is_user: bool = False
+    first_in_message: bool = False
+
+
+class TextCompressor:
+    """抽取式预压缩器"""
+
+    def __init__(self,
+                 token_budget: int = 2500,
+                 code_keep_lines: int = 8,
+                 max_signature_lines: int = 12,
+                 textrank_max_units: int = 800,
+                 hash_features: int = 2048,
+                 damping: float = 0.85,
+                 redundancy_threshold: float = 0.9):
+        """
+        初始化预压缩器
+
+        Args:
+            token_budget: 压缩后的token预算
+            code_keep_lines: 不超过该行数的代码块原样保留
+            max_signature_lines: 折叠代码块时最多保留的签名行数
+            textrank_max_units: 句子数超过该值时改用质心相似度打分（避免n²的相似度矩阵）
+            hash_features: TF-IDF特征哈希的维度
+            damping: TextRank阻尼系数
+            redundancy_threshold: 与已选句子的余弦相似度超过该值时跳过
+        """
+        self.token_budget = token_budget
+        self.code_keep_lines = code_keep_lines
+        self.max_signature_lines = max_signature_lines
+        self.textrank_max_units = textrank_max_units
+        self.hash_features = hash_features
+        self.damping = damping
+        self.redundancy_threshold = redundancy_threshold
+
+    def compress(self, text: str, token_budget: Optional[int] = None) -> CompressionResult:
+        """
+        压缩对话文本
+
+        Args:
+            text: 对话文本
+            token_budget: 本次使用的token预算，None表示使用 self.token_budget
+
+        Returns:
+            CompressionResult（text不超过预算，除非单个保留单元本身超出）
+        """
+        budget = token_budget or self.token_budget
+        original_tokens = estimate_tokens(text)
+        result = CompressionResult(text=text, original_tokens=original_tokens,
+                                   compressed_tokens=original_tokens)
+        if not text:
+            return result
+
+        cleaned = _INLINE_BOILERPLATE.sub('', _BOILERPLATE.sub('', text))
+        messages = self._split_messages(cleaned)
+        messages = self._dedupe_and_collapse(messages, result)
+        compressed = self._join(messages)
+
+        if estimate_tokens(compressed) > budget:
+            compressed = self._extract(messages, result, budget)
+
+        result.text = compressed
+        result.compressed_tokens = estimate_tokens(compressed)
+        return result
+
+    # ==================== 结构切分 ====================
+
+    @staticmethod
+    def _split_messages(text: str) -> List[List[str]]:
+        """
+        切分为 消息 → 段落；代码块作为一个完整段落，不在其内部切分
+        """
+        messages: List[List[str]] = []
+        position = 0
+        paragraphs: List[str] = []
+        pieces = []
+        for match in _CODE_FENCE.finditer(text):
+            pieces.append((False, text[position:match.start()]))
+            pieces.append((True, match.group(0)))
+            position = match.end()
+        pieces.append((False, text[position:]))
+
+        for is_code, piece in pieces:
+            if is_code:
+                paragraphs.append(piece.strip())
+                continue
+            for paragraph in re.split(r'\n\s*\n', piece):
+                paragraph = paragraph.strip()
+                if not paragraph:
+                    continue
+                if _ROLE_PREFIX.match(paragraph) and paragraphs:
+                    messages.append(paragraphs)
+                    paragraphs = []
+                paragraphs.append(paragraph)
+        if paragraphs:
+            messages.append(paragraphs)
+        return messages
+
+    @staticmethod
+    def _join(messages: List[List[str]]) -> str:
+        return "\n\n".join("\n\n".join(paragraphs) for paragraphs in messages if paragraphs)
+
+    # ==================== 去重与代码折叠 ====================
+
+    def _dedupe_and_collapse(self, messages: List[List[str]],
+                             result: CompressionResult) -> List[List[str]]:
+        """删除重复段落/代码块，折叠长代码块"""
+        seen = set()
+        output = []
+        for paragraphs in messages:
+            kept = []
+            for index, paragraph in enumerate(paragraphs):
+                prefix_match = _ROLE_PREFIX.match(paragraph) if index == 0 else None
+                prefix = prefix_match.group(0) if prefix_match else ""
+                body = paragraph[len(prefix):]
+
+                digest = hashlib.sha1(re.sub(r'\s+', ' ', body).strip().lower()
+                                      .encode('utf-8')).digest()
+                # "好的"、"谢谢"之类的短句重复出现不算冗余
+                if digest in seen and len(body) >= 10:
+                    result.duplicates_removed += 1
+                    if prefix:
+                        kept.append(prefix + "（与前文重复，已省略）")
+                    continue
+                seen.add(digest)
+
+                if body.startswith('```'):
+                    collapsed = self._collapse_code(body)
+                    if collapsed != body:
+                        result.code_blocks_collapsed += 1
+                    body = collapsed
+                kept.append(prefix + body)
+            output.append(kept)
+        return output
+
+    def _collapse_code(self, block: str) -> str:
+        """长代码块只保留签名行"""
+        lines = block.split('\n')
+        opening = lines[0]
+        closing = lines[-1] if len(lines) > 1 and lines[-1].strip() == '```' else None
+        body = lines[1:-1] if closing else lines[1:]
+        if len(body) <= self.code_keep_lines:
+            return block
+
+        signatures = [line.rstrip() for line in body if _SIGNATURE.match(line)]
+        signatures = signatures[:self.max_signature_lines]
+        omitted = len(body) - len(signatures)
+        collapsed = [opening, *signatures, f"# ...（省略 {omitted} 行代码）", '```']
+        return '\n'.join(collapsed)
+
+    # ==================== 句子抽取 ====================
+
+    def _units(self, messages: List[List[str]]) -> List[_Unit]:
+        units = []
+        for m, paragraphs in enumerate(messages):
+            is_user = bool(paragraphs) and paragraphs[0].startswith(('用户', 'User', 'Human'))
+            first = True
+            for p, paragraph in enumerate(paragraphs):
+                if paragraph.startswith('```'):
+                    pieces = [paragraph]
+                    is_code = True
+                else:
+                    pieces = [s for s in _SENTENCE_END.split(paragraph) if s and s.strip()]
+                    is_code = False
+                for piece in pieces:
+                    units.append(_Unit(m, p, piece.strip(), estimate_tokens(piece),
+                                       is_code=is_code, is_user=is_user, first_in_message=first))
+                    first = False
+        return units
+
+    def _extract(self, messages: List[List[str]], result: CompressionResult, budget: int) -> str:
+        """按句子重要性抽取，填满token预算后按原文顺序拼接"""
+        units = self._units(messages)
+        scores, matrix = self._score(units)
+
+        # 用户提问和每条消息的开头句更能代表对话意图
+        for i, unit in enumerate(units):
+            if unit.is_user:
+                scores[i] *= 1.5
+            if unit.first_in_message:
+                scores[i] *= 1.3
+
+        order = sorted(range(len(units)), key=lambda i: -scores[i])
+        remaining = budget
+        selected = set()
+        chosen_rows = []
+        for i in order:
+            cost = units[i].tokens + 1
+            if cost > remaining:
+                continue
+            # 与已选句子几乎相同的句子不再重复占用预算
+            if matrix is not None and chosen_rows and \
+                    float((matrix[chosen_rows] @ matrix[i]).max()) > self.redundancy_threshold:
+                continue
+            selected.add(i)
+            chosen_rows.append(i)
+            remaining -= cost
+        result.sentences_dropped = len(units) - len(selected)
+
+        # 按原文顺序重建：同一段落的句子拼接，段落之间空行分隔，缺失的消息前缀补回
+        parts: List[str] = []
+        current = None
+        for i, unit in enumerate(units):
+            if i not in selected:
+                continue
+            key = (unit.message, unit.paragraph)
+            if key != current:
+                text = unit.text
+                if current is None or current[0] != unit.message:
+                    prefix_match = _ROLE_PREFIX.match(messages[unit.message][0])
+                    if prefix_match and not _ROLE_PREFIX.match(text):
+                        text = prefix_match.group(0) + "…" + text
+                parts.append(text)
+                current = key
+            else:
+                joiner = "" if _ends_cjk(parts[-1]) else " "
+                parts[-1] += joiner + unit.text
+        return "\n\n".join(parts)
+
+    def _score(self, units: List[_Unit]):
+        """
+        句子重要性分数（NumPy可用时为TextRank，否则按位置）
+
+        Returns:
+            (分数列表, TF-IDF矩阵或None)
+        """
+        n = len(units)
+        if n == 0:
+            return [], None
+        if np is None:
+            return [1.0 / (1 + unit.paragraph) for unit in units], None
+
+        matrix = self._tfidf([unit.text for unit in units])
+        if n <= self.textrank_max_units:
+            scores = self._textrank(matrix)
+        else:
+            # 句子过多时用与全文质心的相似度近似中心性
+            centroid = matrix.sum(axis=0)
+            norm = np.linalg.norm(centroid)
+            scores = matrix @ (centroid / norm) if norm > 0 else np.ones(n)
+        return [float(s) for s in scores], matrix
+
+    def _tfidf(self, texts: List[str]):
+        """特征哈希的TF-IDF矩阵（行已L2归一化）"""
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            for feature in text_features(text):
+                rows.append(row)
+                cols.append(feature_index(feature, self.hash_features))
+
+        matrix = np.zeros((len(texts), self.hash_features), dtype=np.float32)
+        if rows:
+            np.add.at(matrix, (np.array(rows), np.array(cols)), 1.0)
+
+        document_freq = np.count_nonzero(matrix, axis=0)
+        idf = np.log((1 + len(texts)) / (1 + document_freq)) + 1.0
+        matrix = np.log1p(matrix) * idf.astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def _textrank(self, matrix, iterations: int = 50, tolerance: float = 1e-6):
+        """余弦相似度图上的PageRank（幂迭代）"""
+        n = matrix.shape[0]
+        similarity = matrix @ matrix.T
+        np.fill_diagonal(similarity, 0.0)
+        row_sums = similarity.sum(axis=1, keepdims=True)
+        # 与其他句子都不相似的句子均匀分配权重
+        transition = np.where(row_sums > 0, similarity / np.where(row_sums > 0, row_sums, 1.0),
+                              1.0 / n)
+
+        scores = np.full(n, 1.0 / n, dtype=np.float32)
+        for _ in range(iterations):
+            updated = (1 - self.damping) / n + self.damping * (transition.T @ scores)
+            if np.abs(updated - scores).sum() < tolerance:
+                scores = updated
+                break
+            scores = updated
+        return scores
+
+
+def text_features(text: str) -> List[str]:
+    """
+    文本特征：英文单词、数字、中文单字及相邻二字组合
+
+    无需分词器，中英文混合文本均可使用。
+    """
+    lowered = text.lower()
+    return _WORD.findall(lowered) + _CJK_BIGRAM.findall(lowered)
+
+
+@lru_cache(maxsize=1 << 16)
+def feature_index(feature: str, buckets: int) -> int:
+    """稳定的特征哈希（不受PYTHONHASHSEED影响；常见特征命中缓存）"""
+    digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=4).digest()
+    return int.from_bytes(digest, 'little') % buckets
+
+
+def conversation_text(raw_content: Any) -> str:
+    """由数据库中的raw_content生成与 ConversationData.get_full_text 相同格式的文本"""
+    if isinstance(raw_content, str):
+        try:
+            raw_content = json.loads(raw_content)
+        except ValueError:
+            return raw_content
+    messages = raw_content.get('messages', []) if isinstance(raw_content, dict) else []
+    return "\n\n".join(
+        f"{'用户' if m.get('role') == 'user' else '助手'}: {m.get('content', '')}"
+        for m in messages
+    )
+
+
+def _ends_cjk(text: str) -> bool:
+    """以中日韩字符或全角标点结尾时句子之间不加空格"""
+    return bool(text) and ('\u3000' <= text[-1] <= '\u9fff' or '\uff00' <= text[-1] <= '\uffef')
+
+
+def attach_compressor(client, token_budget: Optional[int]):
+    """
+    为客户端启用预压缩（混合路由客户端会设置到每个后端）
+
+    Args:
+        client: AI客户端
+        token_budget: token预算，None或0表示不压缩
+
+    Returns:
+        传入的客户端
+    """
+    compressor = TextCompressor(token_budget) if token_budget else None
+    targets = [b.client for b in client.backends] if hasattr(client, 'backends') else [client]
+    for target in targets:
+        if hasattr(target, 'segment_threshold'):
+            target.compressor = compressor
+    return client
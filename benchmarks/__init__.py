@@ -0,0 +1,10 @@
+"""
+性能基准测试
+
+fake_llm_server: Ollama/OpenAI兼容的本地模拟大模型服务
+ai_benchmark: AI流水线吞吐量基准（p50/p95延迟、每分钟对话数）
+html_parse_benchmark: HTML解析后端与通用文本提取耗时
+scraper_corpus: 爬虫离线语料（生成/录制的分享页及期望解析结果）
+replay_server: 在本地回放语料中的分享页
+scraper_benchmark: 各平台、各抓取层从页面到对话数据的耗时、CPU和内存
+"""
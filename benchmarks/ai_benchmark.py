@@ -0,0 +1,286 @@
+"""
+AI流水线吞吐量基准测试
+
+对模拟大模型服务（或指定的真实服务）运行以下场景，报告 p50/p95 延迟和每分钟对话数：
+    ollama  - OllamaClient.analyze_conversation 顺序调用
+    openai  - OpenAIClient.analyze_conversation 顺序调用（OpenAI兼容接口）
+    batch   - AIService.batch_analyze 并发批量分析
+    ingest  - 入库流水线：写入SQLite后由自动分析补齐并批量写回
+
+对话由固定随机种子生成，可按比例混入超过分段阈值的长对话，结果可复现。
+
+用法:
+    python -m benchmarks.ai_benchmark --n 40 --latency 0.05 --tps 200 --concurrency 4
+    python -m benchmarks.ai_benchmark --scenarios batch --json result.json
+    python -m benchmarks.ai_benchmark --url http://localhost:11434 --model qwen2.5:3b   # 真实Ollama
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.fake_llm_server import FakeLLMConfig, FakeLLMServer
+
+SCENARIOS = ('ollama', 'openai', 'batch', 'ingest')
+
+_TOPICS = [
+    ('Python列表推导式', ['列表推导式比for循环更简洁', '可以加入if条件过滤', '嵌套推导式要注意可读性']),
+    ('SQL索引优化', ['联合索引遵循最左前缀原则', '用EXPLAIN查看执行计划', '避免在索引列上使用函数']),
+    ('论文写作', ['摘要要概括研究问题和结论', '引言说明研究背景和意义', '结论呼应引言中的问题']),
+    ('旅行计划', ['提前预订机票和酒店更便宜', '行程不要安排得太满', '准备好签证和保险材料']),
+    ('前端性能', ['图片懒加载减少首屏请求', '合并和压缩静态资源', '使用缓存策略减少重复下载']),
+]
+
+
+@dataclass
+class ScenarioResult:
+    """单个场景的测量结果"""
+    name: str
+    count: int
+    errors: int
+    wall_seconds: float
+    latencies: List[float] = field(default_factory=list, repr=False)
+
+    @property
+    def p50(self) -> float:
+        return percentile(self.latencies, 50)
+
+    @property
+    def p95(self) -> float:
+        return percentile(self.latencies, 95)
+
+    @property
+    def per_minute(self) -> float:
+        return (self.count - self.errors) * 60 / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'count': self.count,
+            'errors': self.errors,
+            'wall_seconds': round(self.wall_seconds, 3),
+            'p50_ms': round(self.p50 * 1000, 1),
+            'p95_ms': round(self.p95 * 1000, 1),
+            'conversations_per_minute': round(self.per_minute, 1),
+        }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩法百分位数（空列表返回0）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def make_conversations(n: int, seed: int = 42, long_ratio: float = 0.0,
+                       long_chars: int = 15000) -> List[Dict[str, Any]]:
+    """
+    生成可复现的对话
+
+    Args:
+        n: 对话数
+        seed: 随机种子
+        long_ratio: 超过分段阈值的长对话比例
+        long_chars: 长对话的大致字符数
+    """
+    rng = random.Random(seed)
+    conversations = []
+    for i in range(n):
+        topic, points = _TOPICS[rng.randrange(len(_TOPICS))]
+        turns = []
+        target = long_chars if rng.random() < long_ratio else rng.randint(300, 2500)
+        length = 0
+        while length < target:
+            question = f"用户: 关于{topic}，{rng.choice(points)}，这一点能再详细讲讲吗？（第{len(turns) // 2 + 1}问）"
+            answer = "助手: " + "；".join(rng.sample(points, len(points))) + "。" * rng.randint(1, 3)
+            turns += [question, answer]
+            length += len(question) + len(answer)
+        conversations.append({'id': i + 1, 'title': f"{topic} #{i + 1}", 'text': "\n\n".join(turns)})
+    return conversations
+
+
+def _timed(fn: Callable, latencies: List[float]) -> Callable:
+    """包装函数，记录每次调用耗时"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+# ==================== 场景 ====================
+
+def bench_client(name: str, client, conversations: List[Dict[str, Any]]) -> ScenarioResult:
+    """顺序调用客户端的 analyze_conversation"""
+    latencies: List[float] = []
+    errors = 0
+    analyze = _timed(client.analyze_conversation, latencies)
+    start = time.perf_counter()
+    for conv in conversations:
+        try:
+            analyze(conv['text'])
+        except Exception:
+            errors += 1
+    return ScenarioResult(name, len(conversations), errors, time.perf_counter() - start, latencies)
+
+
+def bench_batch(service, conversations: List[Dict[str, Any]],
+                concurrency: Optional[int] = None) -> ScenarioResult:
+    """AIService.batch_analyze 并发批量分析"""
+    latencies: List[float] = []
+    service._analyze = _timed(service._analyze, latencies)
+    start = time.perf_counter()
+    results = service.batch_analyze(conversations, concurrency=concurrency)
+    wall = time.perf_counter() - start
+    errors = sum(1 for r in results if r is None)
+    return ScenarioResult('batch', len(conversations), errors, wall, latencies)
+
+
+def bench_ingest(service, conversations: List[Dict[str, Any]], db_path: str) -> ScenarioResult:
+    """写入数据库 + 自动分析批量写回（不含爬取）"""
+    from ai.auto_analyzer import AutoAnalyzer
+    from database.db_manager import DatabaseManager
+
+    latencies: List[float] = []
+    service.analyze_conversation = _timed(service.analyze_conversation, latencies)
+    start = time.perf_counter()
+
+    db = DatabaseManager(db_path)
+    for conv in conversations:
+        messages = [{'role': 'user' if part.startswith('用户') else 'assistant', 'content': part[4:]}
+                    for part in conv['text'].split("\n\n")]
+        db.add_conversation(source_url=f"https://bench.local/{conv['id']}", platform='chatgpt',
+                            title=conv['title'], raw_content={'messages': messages})
+    db.close()
+
+    progress = AutoAnalyzer(service, db_path, throttle=0, idle_delay=0).run_once()
+    wall = time.perf_counter() - start
+    return ScenarioResult('ingest', len(conversations), len(conversations) - progress['saved'],
+                          wall, latencies)
+
+
+# ==================== 运行 ====================
+
+def run_benchmark(url: str, model: str, conversations: List[Dict[str, Any]],
+                  scenarios=SCENARIOS, concurrency: Optional[int] = None,
+                  timeout: int = 60) -> List[ScenarioResult]:
+    """
+    对指定服务依次运行各场景（每个场景使用新的客户端/服务，不共享缓存）
+
+    Args:
+        url: 服务地址（Ollama接口；OpenAI接口为 url + '/v1'）
+        model: 模型名称
+        conversations: 对话列表
+        scenarios: 要运行的场景
+        concurrency: batch 场景的并发数（None按后端默认）
+        timeout: 单次请求超时（秒）
+    """
+    from ai.ai_service import AIConfig, AIService
+    from ai.ollama_client import OllamaClient
+
+    def service() -> AIService:
+        return AIService(AIConfig(ollama_host=url, ollama_model=model, timeout=timeout,
+                                  cache_path=None, batch_concurrency=concurrency))
+
+    results = []
+    for name in scenarios:
+        if name == 'ollama':
+            results.append(bench_client('ollama', OllamaClient(base_url=url, model=model, timeout=timeout),
+                                        conversations))
+        elif name == 'openai':
+            from ai.openai_client import OpenAIClient
+            client = OpenAIClient(api_key='benchmark', model=model, base_url=f"{url}/v1")
+            results.append(bench_client('openai', client, conversations))
+        elif name == 'batch':
+            results.append(bench_batch(service(), conversations, concurrency))
+        elif name == 'ingest':
+            with tempfile.TemporaryDirectory() as tmp:
+                results.append(bench_ingest(service(), conversations, str(Path(tmp) / 'bench.db')))
+        else:
+            raise ValueError(f"未知场景: {name}（可选: {', '.join(SCENARIOS)}）")
+    return results
+
+
+def format_report(results: List[ScenarioResult]) -> str:
+    """格式化结果表格"""
+    lines = [f"{'场景':<8}{'数量':>6}{'失败':>6}{'p50(ms)':>10}{'p95(ms)':>10}{'对话/分钟':>12}{'总耗时(s)':>11}"]
+    for r in results:
+        lines.append(f"{r.name:<10}{r.count:>6}{r.errors:>6}{r.p50 * 1000:>10.1f}{r.p95 * 1000:>10.1f}"
+                     f"{r.per_minute:>12.1f}{r.wall_seconds:>11.2f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI流水线吞吐量基准测试")
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS), help="逗号分隔: " + ",".join(SCENARIOS))
+    parser.add_argument('--n', type=int, default=30, help="对话数")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--long-ratio', type=float, default=0.0, help="超过分段阈值的长对话比例")
+    parser.add_argument('--concurrency', type=int, default=None, help="batch场景并发数")
+    parser.add_argument('--url', default=None, help="使用已有服务而不是启动模拟服务")
+    parser.add_argument('--model', default='fake-model')
+    parser.add_argument('--timeout', type=int, default=60)
+    parser.add_argument('--json', dest='json_path', default=None, help="结果另存为JSON（便于比较）")
+    # 模拟服务参数
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--tps', type=float, default=200.0)
+    parser.add_argument('--parallel', type=int, default=4)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--hang-rate', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    conversations = make_conversations(args.n, args.seed, args.long_ratio)
+
+    server = None
+    url = args.url
+    if url is None:
+        config = FakeLLMConfig(latency=args.latency, tokens_per_second=args.tps, parallel=args.parallel,
+                               failure_rate=args.failure_rate, hang_rate=args.hang_rate,
+                               hang_seconds=args.timeout + 1, drop_rate=args.drop_rate,
+                               model=args.model, seed=args.seed)
+        server = FakeLLMServer(config=config).start()
+        url = server.url
+
+    print(f"🧪 基准测试: {len(conversations)} 条对话 | 服务 {url} | 场景 {', '.join(scenarios)}")
+    try:
+        results = run_benchmark(url, args.model, conversations, scenarios, args.concurrency, args.timeout)
+    finally:
+        if server:
+            server.stop()
+
+    print(format_report(results))
+
+    if args.json_path:
+        report = {
+            'params': {k: v for k, v in vars(args).items() if k != 'json_path'},
+            'results': [r.to_dict() for r in results],
+        }
+        if server:
+            report['server'] = {k: v for k, v in asdict(server.stats).items() if k != 'durations'}
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"💾 结果已保存: {args.json_path}")
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,465 @@
+"""
+本地模拟大模型服务
+
+同时提供 Ollama 和 OpenAI 兼容接口，用于离线测量和回归测试AI流水线性能：
+1. 可配置首token延迟、生成速度（tokens/s）和并行槽位数（模拟 OLLAMA_NUM_PARALLEL）
+2. 支持流式（Ollama NDJSON / OpenAI SSE）和非流式响应
+3. 故障注入：按比例返回500、卡住不响应、流式输出中途断开
+4. 分析类提示词返回只含所请求字段的合法JSON，分段摘要等返回纯文本
+5. 模型加载：未加载时首个请求多等 load_duration 秒，空闲超过 keep_alive 后卸载；
+   空prompt只加载模型（与Ollama的预热方式相同）
+6. 向量接口：按字符二元组哈希返回确定性的向量（内容相近的文本相似度高）
+
+接口:
+    Ollama: GET /api/tags, GET /api/ps, POST /api/generate, POST /api/chat,
+            POST /api/embed（批量）, POST /api/embeddings（旧版逐条）
+    OpenAI: GET /v1/models, POST /v1/chat/completions
+
+用法:
+    python -m benchmarks.fake_llm_server --port 11434 --latency 0.2 --tps 80
+    或在代码中:  with FakeLLMServer(latency=0.1) as server: OllamaClient(base_url=server.url)
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ai.ollama_client import keep_alive_seconds
+
+CATEGORIES = ['编程', '写作', '学习', '策划', '休闲娱乐', '其他']
+TAG_POOL = ['Python', 'JavaScript', '算法', '数据库', '性能优化', '写作技巧', '学习方法',
+            '项目规划', '调试', '架构设计', '机器学习', '前端', '后端', '测试']
+
+# 提示词中要求的JSON字段（与 SegmentedAnalysisMixin.TASK_EXAMPLES 的键一致）
+_FIELD_PATTERN = re.compile(r'"(summary|category|tags|confidence)"\s*:')
+_TOKEN_PATTERN = re.compile(r'[一-鿿]|[^\s一-鿿]{1,4}|\s+')
+
+
+@dataclass
+class FakeLLMConfig:
+    """模拟服务的行为配置"""
+    latency: float = 0.05          # 首token延迟（秒），模拟排队后的prompt处理
+    tokens_per_second: float = 200.0  # 生成速度
+    parallel: int = 4              # 并行槽位数，超出的请求排队
+    failure_rate: float = 0.0      # 返回HTTP 500的比例
+    hang_rate: float = 0.0         # 卡住 hang_seconds 秒后才响应的比例（触发客户端超时）
+    hang_seconds: float = 30.0
+    drop_rate: float = 0.0         # 流式输出中途断开连接的比例
+    load_duration: float = 0.0     # 模型未加载时的加载耗时（秒）；空闲超过keep_alive后卸载
+    embed_dim: int = 64            # 向量维度
+    embed_batch_api: bool = True   # 是否提供 /api/embed（False时模拟只有 /api/embeddings 的旧版Ollama）
+    model: str = "fake-model"
+    seed: int = 0
+
+
+@dataclass
+class FakeLLMStats:
+    """服务端统计"""
+    requests: int = 0
+    failures: int = 0
+    hangs: int = 0
+    drops: int = 0
+    max_concurrency: int = 0
+    durations: List[float] = field(default_factory=list)
+
+
+class FakeLLMServer:
+    """Ollama/OpenAI兼容的模拟服务（后台线程运行）"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 config: Optional[FakeLLMConfig] = None, **overrides):
+        """
+        Args:
+            host: 监听地址
+            port: 端口（0表示随机空闲端口）
+            config: 行为配置
+            **overrides: 覆盖config中的同名字段，如 latency=0.2
+        """
+        self.config = config or FakeLLMConfig()
+        for key, value in overrides.items():
+            if not hasattr(self.config, key):
+                raise TypeError(f"未知的配置项: {key}")
+            setattr(self.config, key, value)
+
+        self.stats = FakeLLMStats()
+        self._rng = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self._slots = threading.Semaphore(max(1, self.config.parallel))
+        self._active = 0
+        self._expires_at: Optional[float] = None  # 模型卸载时间（monotonic），None表示未加载
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+
+    # ==================== 生命周期 ====================
+
+    def start(self) -> 'FakeLLMServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'FakeLLMServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = FakeLLMStats()
+
+    # ==================== 响应内容 ====================
+
+    @staticmethod
+    def respond_to(prompt: str) -> str:
+        """
+        根据提示词生成确定性的回复
+
+        提示词要求JSON字段时返回只含这些字段的JSON，否则返回一段摘要文本。
+        """
+        digest = hashlib.md5(prompt.encode('utf-8')).digest()
+        fields = list(dict.fromkeys(_FIELD_PATTERN.findall(prompt)))
+        summary = f"模拟摘要{digest.hex()[:8]}：用户与助手讨论了相关问题，并得到了具体的解决步骤和建议。"
+        if not fields:
+            return summary
+
+        values = {
+            'summary': summary,
+            'category': CATEGORIES[digest[0] % len(CATEGORIES)],
+            'tags': [TAG_POOL[(digest[1] + i * 5) % len(TAG_POOL)] for i in range(3)],
+            'confidence': round(0.7 + (digest[2] % 30) / 100, 2),
+        }
+        return json.dumps({name: values[name] for name in fields}, ensure_ascii=False)
+
+    def embed(self, text: str) -> List[float]:
+        """字符二元组计数哈希到 embed_dim 维（未归一化）"""
+        vector = [0.0] * self.config.embed_dim
+        for i in range(max(1, len(text) - 1)):
+            digest = hashlib.md5(text[i:i + 2].encode('utf-8')).digest()
+            vector[int.from_bytes(digest[:4], 'little') % self.config.embed_dim] += 1.0
+        return vector
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """按汉字/短词切分，近似模型的token粒度"""
+        return _TOKEN_PATTERN.findall(text)
+
+    # ==================== 故障与时序 ====================
+
+    def _roll(self) -> str:
+        """决定本次请求的故障类型：ok / fail / hang / drop"""
+        config = self.config
+        with self._lock:
+            value = self._rng.random()
+        if value < config.failure_rate:
+            return 'fail'
+        value -= config.failure_rate
+        if value < config.hang_rate:
+            return 'hang'
+        value -= config.hang_rate
+        if value < config.drop_rate:
+            return 'drop'
+        return 'ok'
+
+    def _take_load_duration(self) -> float:
+        """模型未加载（或已过期卸载）时返回加载耗时，并视为已加载"""
+        with self._lock:
+            now = time.monotonic()
+            if self._expires_at is not None and now < self._expires_at:
+                return 0.0
+            self._expires_at = float('inf')  # 请求进行中不会卸载
+        return self.config.load_duration
+
+    def _release_model(self, keep_alive=None):
+        """请求结束后按 keep_alive 计算卸载时间（负数永久常驻，0立即卸载）"""
+        seconds = keep_alive_seconds(keep_alive)
+        with self._lock:
+            if self._expires_at is None:
+                return  # 本次请求没有加载模型（如注入的失败）
+            self._expires_at = float('inf') if seconds is None else time.monotonic() + seconds
+
+    @property
+    def model_loaded(self) -> bool:
+        with self._lock:
+            return self._expires_at is not None and time.monotonic() < self._expires_at
+
+    def _enter(self):
+        self._slots.acquire()
+        with self._lock:
+            self._active += 1
+            self.stats.requests += 1
+            self.stats.max_concurrency = max(self.stats.max_concurrency, self._active)
+
+    def _leave(self, started: float, outcome: str):
+        with self._lock:
+            self._active -= 1
+            self.stats.durations.append(time.perf_counter() - started)
+            if outcome == 'fail':
+                self.stats.failures += 1
+            elif outcome == 'hang':
+                self.stats.hangs += 1
+            elif outcome == 'drop':
+                self.stats.drops += 1
+        self._slots.release()
+
+    # ==================== HTTP ====================
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # 客户端读到完整JSON后关闭了连接
+
+            # ---------- 基础 ----------
+
+            def _json(self, status: int, data: Dict[str, Any]):
+                body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _start_chunked(self, content_type: str):
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+            def _chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _end_chunked(self):
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def _read_json(self) -> Dict[str, Any]:
+                length = int(self.headers.get('Content-Length', 0))
+                return json.loads(self.rfile.read(length) or b'{}')
+
+            # ---------- 路由 ----------
+
+            def do_GET(self):
+                if self.path == '/api/tags':
+                    self._json(200, {'models': [{'name': server.config.model, 'size': 0}]})
+                elif self.path == '/api/ps':
+                    models = [{'name': server.config.model, 'model': server.config.model}] \
+                        if server.model_loaded else []
+                    self._json(200, {'models': models})
+                elif self.path == '/v1/models':
+                    self._json(200, {'object': 'list',
+                                     'data': [{'id': server.config.model, 'object': 'model'}]})
+                else:
+                    self._json(404, {'error': 'not found'})
+
+            def do_POST(self):
+                routes = {
+                    '/api/generate': self._ollama,
+                    '/api/chat': self._ollama,
+                    '/v1/chat/completions': self._openai,
+                    '/api/embeddings': self._embeddings,
+                }
+                if server.config.embed_batch_api:
+                    routes['/api/embed'] = self._embed
+                handler = routes.get(self.path)
+                payload = self._read_json()   # 先读完请求体，404后连接仍可复用
+                if handler is None:
+                    self._json(404, {'error': 'not found'})
+                    return
+                started = time.perf_counter()
+                server._enter()
+                outcome = server._roll()
+                try:
+                    if outcome == 'hang':
+                        time.sleep(server.config.hang_seconds)
+                    if outcome == 'fail':
+                        self._json(500, {'error': 'injected failure'})
+                        return
+                    handler(payload, outcome)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # 客户端提前断开（如JSON闭合后停止读取）
+                finally:
+                    server._release_model(payload.get('keep_alive'))
+                    server._leave(started, outcome)
+
+            # ---------- 生成 ----------
+
+            def _generate(self, prompt: str):
+                """按配置的延迟和速度逐个产出token；返回 (token迭代器, token总数, 加载耗时)"""
+                load = server._take_load_duration()
+                tokens = server.tokenize(server.respond_to(prompt))
+                interval = 1.0 / server.config.tokens_per_second if server.config.tokens_per_second > 0 else 0.0
+
+                def produce():
+                    time.sleep(load + server.config.latency)
+                    for token in tokens:
+                        if interval:
+                            time.sleep(interval)
+                        yield token
+
+                return produce(), len(tokens), load
+
+            def _ollama(self, payload: Dict[str, Any], outcome: str):
+                if 'messages' not in payload and not payload.get('prompt') and not payload.get('system'):
+                    # 空prompt：只加载模型
+                    load = server._take_load_duration()
+                    time.sleep(load)
+                    self._json(200, {'model': server.config.model, 'response': '', 'done': True,
+                                     'done_reason': 'load', 'load_duration': int(load * 1e9)})
+                    return
+                self._ollama_generate(payload, outcome)
+
+            def _embed(self, payload: Dict[str, Any], outcome: str):
+                texts = payload.get('input', [])
+                texts = [texts] if isinstance(texts, str) else texts
+                load = server._take_load_duration()
+                time.sleep(load + server.config.latency)
+                self._json(200, {'model': server.config.model,
+                                 'embeddings': [server.embed(text) for text in texts],
+                                 'load_duration': int(load * 1e9)})
+
+            def _embeddings(self, payload: Dict[str, Any], outcome: str):
+                load = server._take_load_duration()
+                time.sleep(load + server.config.latency)
+                self._json(200, {'embedding': server.embed(payload.get('prompt', ''))})
+
+            def _ollama_generate(self, payload: Dict[str, Any], outcome: str):
+                if 'messages' in payload:
+                    prompt = "\n".join(m.get('content', '') for m in payload['messages'])
+                else:
+                    prompt = (payload.get('system') or '') + "\n" + payload.get('prompt', '')
+                tokens, count, load = self._generate(prompt)
+                started = time.perf_counter()
+                is_chat = 'messages' in payload
+
+                def piece(text: str, done: bool) -> Dict[str, Any]:
+                    data = {'model': server.config.model, 'done': done}
+                    if is_chat:
+                        data['message'] = {'role': 'assistant', 'content': text}
+                    else:
+                        data['response'] = text
+                    return data
+
+                def finish(data: Dict[str, Any]) -> Dict[str, Any]:
+                    elapsed = time.perf_counter() - started
+                    data.update({
+                        'total_duration': int(elapsed * 1e9),
+                        'load_duration': int(load * 1e9),
+                        'prompt_eval_count': len(server.tokenize(prompt)),
+                        'eval_count': count,
+                        'eval_duration': int(max(elapsed - load - server.config.latency, 1e-6) * 1e9),
+                    })
+                    return data
+
+                if not payload.get('stream', True):
+                    self._json(200, finish(piece("".join(tokens), True)))
+                    return
+
+                self._start_chunked('application/x-ndjson')
+                for i, token in enumerate(tokens):
+                    if outcome == 'drop' and i == count // 2:
+                        self.close_connection = True
+                        return
+                    self._chunk((json.dumps(piece(token, False), ensure_ascii=False) + "\n").encode('utf-8'))
+                self._chunk((json.dumps(finish(piece("", True)), ensure_ascii=False) + "\n").encode('utf-8'))
+                self._end_chunked()
+
+            def _openai(self, payload: Dict[str, Any], outcome: str):
+                prompt = "\n".join(str(m.get('content', '')) for m in payload.get('messages', []))
+                tokens, count, _ = self._generate(prompt)
+                created = int(time.time())
+                usage = {'prompt_tokens': len(server.tokenize(prompt)), 'completion_tokens': count,
+                         'total_tokens': len(server.tokenize(prompt)) + count}
+
+                if not payload.get('stream'):
+                    self._json(200, {
+                        'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': created,
+                        'model': server.config.model,
+                        'choices': [{'index': 0, 'finish_reason': 'stop',
+                                     'message': {'role': 'assistant', 'content': "".join(tokens)}}],
+                        'usage': usage,
+                    })
+                    return
+
+                def event(delta: Dict[str, Any], finish_reason=None) -> bytes:
+                    data = {'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': created,
+                            'model': server.config.model,
+                            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+                    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+                self._start_chunked('text/event-stream')
+                self._chunk(event({'role': 'assistant', 'content': ''}))
+                for i, token in enumerate(tokens):
+                    if outcome == 'drop' and i == count // 2:
+                        self.close_connection = True
+                        return
+                    self._chunk(event({'content': token}))
+                self._chunk(event({}, 'stop'))
+                self._chunk(b"data: [DONE]\n\n")
+                self._end_chunked()
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ollama/OpenAI兼容的本地模拟大模型服务")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11434)
+    parser.add_argument('--latency', type=float, default=0.05, help="首token延迟（秒）")
+    parser.add_argument('--tps', type=float, default=200.0, help="生成速度（tokens/s）")
+    parser.add_argument('--parallel', type=int, default=4, help="并行槽位数")
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--hang-rate', type=float, default=0.0)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--load-duration', type=float, default=0.0, help="首次请求的模型加载耗时（秒）")
+    args = parser.parse_args()
+
+    config = FakeLLMConfig(latency=args.latency, tokens_per_second=args.tps, parallel=args.parallel,
+                           failure_rate=args.failure_rate, hang_rate=args.hang_rate,
+                           drop_rate=args.drop_rate, load_duration=args.load_duration)
+    server = FakeLLMServer(args.host, args.port, config)
+    print(f"🧪 模拟大模型服务已启动: {server.url}")
+    print(f"   Ollama: OLLAMA_HOST={server.url}   OpenAI: base_url={server.url}/v1")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+HTML解析基准测试
+
+对保存下来的分享页（或按参数生成的模拟页面）测量：
+    parse   - 构建文档树（各解析后端）
+    scrape  - ChatGPTScraper.parse_html 完整解析
+    blocks  - 通用文本提取：单遍实现 text_blocks 与原来逐个div统计子元素文本的实现对比
+
+模拟页面仿照ChatGPT渲染后的结构（每条消息外层包着多层div），
+--fallback 生成没有 data-testid / article 标记的页面，解析时走通用文本提取。
+
+用法:
+    python -m benchmarks.html_parse_benchmark --mb 4
+    python -m benchmarks.html_parse_benchmark --mb 4 --fallback --json result.json
+    python -m benchmarks.html_parse_benchmark saved/share1.html saved/share2.html   # 保存的真实页面
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from scrapers.chatgpt_scraper import ChatGPTScraper
+from scrapers.html_parser import PARSERS, is_installed, make_soup, text_blocks
+
+_SENTENCES = [
+    "联合索引遵循最左前缀原则，查询条件要从索引的第一列开始。",
+    "可以用EXPLAIN查看执行计划，确认是否走了索引。",
+    "列表推导式比for循环更简洁，也可以加入if条件过滤。",
+    "行程不要安排得太满，留出休息和应对意外的时间。",
+    "图片懒加载可以减少首屏请求，合并静态资源能减少连接数。",
+]
+
+
+def make_share_page(target_bytes: int, seed: int = 42, depth: int = 12, fallback: bool = False) -> str:
+    """生成约 target_bytes 大小的模拟分享页"""
+    rnd = random.Random(seed)
+    turns = []
+    size = 0
+    index = 0
+    while size < target_bytes:
+        role = 'user' if index % 2 == 0 else 'assistant'
+        paragraphs = "".join(
+            f"<p>{''.join(rnd.choices(_SENTENCES, k=rnd.randint(1, 4)))}</p>"
+            for _ in range(rnd.randint(1, 3 if role == 'user' else 12)))
+        body = f'<div class="markdown prose">{paragraphs}</div>'
+        for level in range(depth):
+            body = f'<div class="flex w-full gap-{level}">{body}<button>复制</button></div>'
+        if fallback:
+            turn = f'<div class="group turn-{index}">{body}</div>'
+        else:
+            turn = (f'<div data-testid="conversation-turn-{index}" data-message-author-role="{role}" '
+                    f'class="group w-full">{body}</div>')
+        turns.append(turn)
+        size += len(turn.encode('utf-8'))
+        index += 1
+    return ("<html><head><title>模拟对话 - ChatGPT</title></head><body>"
+            f"<div id=\"__next\"><main class=\"main\">{''.join(turns)}</main></div></body></html>")
+
+
+def quadratic_text_blocks(soup) -> List[str]:
+    """原来的通用文本提取实现（对每个div重新统计所有内部div的文本）"""
+    blocks = []
+    for div in soup.find_all('div', class_=True):
+        text = div.get_text(strip=True)
+        if 20 < len(text) < 5000:
+            children_text = sum(len(child.get_text(strip=True)) for child in div.find_all('div'))
+            if children_text < len(text) * 0.5:
+                blocks.append(text)
+    return blocks
+
+
+def measure(fn: Callable, repeat: int) -> float:
+    """重复运行取中位数（秒）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def bench_page(name: str, html: str, parsers: List[str], repeat: int, old_blocks: bool) -> List[Dict]:
+    """测量单个页面在各解析后端下的耗时"""
+    rows = []
+    scraper = ChatGPTScraper()
+    for parser in parsers:
+        soup = make_soup(html, parser)
+        row = {
+            'page': name,
+            'size_mb': round(len(html.encode('utf-8')) / 1024 / 1024, 2),
+            'parser': parser,
+            'parse_ms': measure(lambda: make_soup(html, parser), repeat) * 1000,
+            'blocks_ms': measure(lambda: text_blocks(soup), repeat) * 1000,
+            'blocks_old_ms': measure(lambda: quadratic_text_blocks(soup), 1) * 1000 if old_blocks else None,
+        }
+
+        def scrape():
+            with contextlib.redirect_stdout(io.StringIO()):
+                return scraper.parse_html(html, 'https://chatgpt.com/share/benchmark')
+
+        # 爬虫通过 SCRAPER_HTML_PARSER 选择后端
+        previous = os.environ.get('SCRAPER_HTML_PARSER')
+        os.environ['SCRAPER_HTML_PARSER'] = parser
+        try:
+            row['scrape_ms'] = measure(scrape, repeat) * 1000
+            row['messages'] = len(scrape().messages)
+        except ValueError:
+            row['scrape_ms'], row['messages'] = None, 0
+        finally:
+            if previous is None:
+                os.environ.pop('SCRAPER_HTML_PARSER', None)
+            else:
+                os.environ['SCRAPER_HTML_PARSER'] = previous
+        rows.append(row)
+    return rows
+
+
+def format_report(rows: List[Dict]) -> str:
+    """格式化结果表格"""
+    def ms(value: Optional[float]) -> str:
+        return f"{value:>12.1f}" if value is not None else f"{'-':>12}"
+
+    lines = [f"{'页面':<22}{'MB':>6}  {'后端':<12}{'parse(ms)':>12}{'scrape(ms)':>12}"
+             f"{'blocks(ms)':>12}{'原实现(ms)':>12}{'消息数':>8}"]
+    for r in rows:
+        lines.append(f"{r['page'][:24]:<24}{r['size_mb']:>6}  {r['parser']:<12}{ms(r['parse_ms'])}"
+                     f"{ms(r['scrape_ms'])}{ms(r['blocks_ms'])}{ms(r['blocks_old_ms'])}{r['messages']:>8}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTML解析基准测试")
+    parser.add_argument('pages', nargs='*', help="保存的分享页HTML文件（不指定则生成模拟页面）")
+    parser.add_argument('--mb', type=float, default=2.0, help="模拟页面大小（MB）")
+    parser.add_argument('--depth', type=int, default=12, help="模拟页面每条消息外层的div层数")
+    parser.add_argument('--fallback', action='store_true', help="模拟页面不带消息标记（走通用文本提取）")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--parsers', default=",".join(PARSERS), help="逗号分隔: " + ",".join(PARSERS))
+    parser.add_argument('--repeat', type=int, default=3, help="每项重复次数（取中位数）")
+    parser.add_argument('--skip-old', action='store_true', help="不运行原来的平方复杂度实现")
+    parser.add_argument('--json', dest='json_path', default=None, help="结果另存为JSON（便于比较）")
+    args = parser.parse_args(argv)
+
+    parsers = [p.strip() for p in args.parsers.split(',') if p.strip()]
+    missing = [p for p in parsers if not is_installed(p)]
+    if missing:
+        print(f"⚠️  未安装的解析后端已跳过: {', '.join(missing)}")
+        parsers = [p for p in parsers if p not in missing]
+
+    if args.pages:
+        pages = [(Path(path).name, Path(path).read_text(encoding='utf-8', errors='replace')) for path in args.pages]
+    else:
+        name = f"模拟{'(无标记)' if args.fallback else ''}-{args.mb}MB"
+        pages = [(name, make_share_page(int(args.mb * 1024 * 1024), args.seed, args.depth, args.fallback))]
+
+    print(f"🧪 HTML解析基准测试: {len(pages)} 个页面 | 后端 {', '.join(parsers)} | 重复 {args.repeat} 次")
+    rows = []
+    for name, html in pages:
+        rows.extend(bench_page(name, html, parsers, args.repeat, not args.skip_old))
+
+    print(format_report(rows))
+
+    if args.json_path:
+        report = {'params': {k: v for k, v in vars(args).items() if k != 'json_path'}, 'results': rows}
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"💾 结果已保存: {args.json_path}")
+    return rows
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+分享页回放服务
+
+在本地回放语料中的分享页，HTTP层和浏览器层抓取都从这里取页面，不访问真实网站。
+可模拟服务器延迟和带宽，使两层的耗时对比更接近真实网络。
+
+路径: /<平台>/share/<页面名>，如 /chatgpt/share/chatgpt-long
+
+用法:
+    python -m benchmarks.replay_server corpus/ --port 8765 --latency 0.1
+    或在代码中:  with ReplayServer(pages, latency=0.05) as server: fetch_html(server.url_for(page))
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import argparse
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.scraper_corpus import CorpusPage, load_corpus
+
+_CHUNK = 16384
+
+
+class ReplayServer:
+    """语料回放服务（后台线程运行）"""
+
+    def __init__(self, pages: Iterable[CorpusPage], host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, bandwidth_kbps: float = 0.0):
+        """
+        Args:
+            pages: 语料页面
+            host: 监听地址
+            port: 端口（0表示随机空闲端口）
+            latency: 每个请求返回响应前等待的秒数
+            bandwidth_kbps: 响应体传输速率（KB/s，0表示不限速）
+        """
+        self.latency = latency
+        self.bandwidth_kbps = bandwidth_kbps
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._bodies: Dict[str, bytes] = {self.path_for(page): page.html.encode('utf-8') for page in pages}
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def path_for(page: CorpusPage) -> str:
+        return f"/{page.platform}/share/{page.name}"
+
+    def url_for(self, page: CorpusPage) -> str:
+        """页面的回放地址"""
+        return self.url + self.path_for(page)
+
+    # ==================== 生命周期 ====================
+
+    def start(self) -> 'ReplayServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="replay-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'ReplayServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True     # 响应头和正文分开写出，否则小页面每次多等约40ms的延迟确认
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # 浏览器拦截或取消了请求
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                body = server._bodies.get(self.path.split('?', 1)[0])
+                if body is None:
+                    body = "页面不存在".encode('utf-8')
+                    self.send_response(404)
+                else:
+                    self.send_response(200)
+                if server.latency:
+                    time.sleep(server.latency)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+
+                if not server.bandwidth_kbps:
+                    self.wfile.write(body)
+                    return
+                for start in range(0, len(body), _CHUNK):
+                    chunk = body[start:start + _CHUNK]
+                    self.wfile.write(chunk)
+                    time.sleep(len(chunk) / 1024 / server.bandwidth_kbps)
+
+        return Handler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="分享页回放服务")
+    parser.add_argument('corpus', help="语料目录（python -m benchmarks.scraper_corpus build 生成）")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="每个请求的延迟（秒）")
+    parser.add_argument('--bandwidth', type=float, default=0.0, help="传输速率（KB/s，0不限速）")
+    args = parser.parse_args(argv)
+
+    pages = load_corpus(args.corpus)
+    server = ReplayServer(pages, args.host, args.port, args.latency, args.bandwidth)
+    print(f"📼 回放服务已启动: {server.url}（{len(pages)} 个页面，Ctrl+C 停止）")
+    for page in pages:
+        print(f"   {server.url_for(page)}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+爬虫基准测试
+
+对离线语料（scraper_corpus）中的每个分享页，测量从页面到 ConversationData 的耗时、
+解析CPU时间和Python内存峰值，按平台和抓取层分别统计：
+
+    parse    - parse_html 解析渲染后的HTML（浏览器层的解析部分）
+    embedded - parse_embedded 解析页面内嵌数据（HTTP层的解析部分）
+    http     - 从回放服务请求页面并解析内嵌数据（HTTP层完整流程）
+    browser  - 浏览器池打开回放服务的页面、等待就绪并解析（浏览器层完整流程，需要Chromium）
+
+每项重复 --repeat 次取 p50/p95；CPU时间只统计执行抓取的线程（不含回放服务和Chromium进程），
+内存峰值用 tracemalloc 单独运行一次测得。每个结果都与语料中的期望比较，解析错误的页面标记为失败。
+
+生成的语料由随机种子决定，--json 保存的结果附带运行环境，--baseline 与之前保存的结果比较p50变化。
+
+用法:
+    python -m benchmarks.scraper_benchmark                                 # 生成语料，测试所有层
+    python -m benchmarks.scraper_benchmark --sizes short,long --tiers parse,embedded,http
+    python -m benchmarks.scraper_benchmark --corpus corpus/ --json after.json --baseline before.json
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import platform as platform_lib
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.ai_benchmark import percentile
+from benchmarks.replay_server import ReplayServer
+from benchmarks.scraper_corpus import PLATFORMS, SIZES, CorpusPage, build_corpus, check, load_corpus
+from scrapers.chatgpt_scraper import ChatGPTScraper
+from scrapers.claude_scraper import ClaudeScraper
+from scrapers.deepseek_scraper import DeepSeekScraper
+from scrapers.fetch_tiers import fetch_html
+from scrapers.html_parser import get_parser
+
+TIERS = ('parse', 'embedded', 'http', 'browser')
+
+_SCRAPERS = {'chatgpt': ChatGPTScraper, 'claude': ClaudeScraper, 'deepseek': DeepSeekScraper}
+
+# 一次抓取：返回 (解析结果, 抓取线程的CPU秒数)
+Runner = Callable[[], Tuple[object, float]]
+
+
+def _timed(fn: Callable[[], object]) -> Tuple[object, float]:
+    start = time.thread_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn()
+    return result, time.thread_time() - start
+
+
+# ==================== 各层的抓取 ====================
+
+def make_runner(tier: str, page: CorpusPage, server: Optional[ReplayServer] = None, pool=None) -> Runner:
+    """构造页面在某一层的抓取函数"""
+    scraper = _SCRAPERS[page.platform](use_playwright=tier == 'browser')
+
+    if tier == 'parse':
+        return lambda: _timed(lambda: scraper.parse_html(page.html, page.share_url))
+    if tier == 'embedded':
+        return lambda: _timed(lambda: scraper.parse_embedded(page.html, page.share_url))
+    if tier == 'http':
+        # 与 _fetch_embedded 相同，但不计入全局的分层统计
+        url = server.url_for(page)
+        return lambda: _timed(lambda: scraper.parse_embedded(fetch_html(url), page.share_url))
+    if tier == 'browser':
+        url = server.url_for(page)
+        # 在浏览器池的工作线程中计时，CPU时间才对应执行抓取的线程
+        return lambda: pool.run(lambda p: _timed(lambda: scraper._scrape_page(p, url)))
+    raise ValueError(f"未知的抓取层: {tier}")
+
+
+def bench(tier: str, page: CorpusPage, runner: Runner, repeat: int) -> Dict:
+    """重复运行一页在一层的抓取，统计耗时、CPU时间和内存峰值"""
+    latencies, cpu = [], []
+    data = None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        data, cpu_seconds = runner()
+        latencies.append((time.perf_counter() - start) * 1000)
+        cpu.append(cpu_seconds * 1000)
+
+    tracemalloc.start()
+    try:
+        runner()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    problems = check(page, data)
+    return {
+        'page': page.name,
+        'platform': page.platform,
+        'size_mb': page.size_mb,
+        'tier': tier,
+        'messages': len(data.messages) if data else 0,
+        'ok': not problems,
+        'problems': problems,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'cpu_ms': round(percentile(cpu, 50), 2),
+        'peak_mb': round(peak / 1024 / 1024, 2),
+    }
+
+
+def run_benchmark(pages: Sequence[CorpusPage], tiers: Sequence[str] = TIERS, repeat: int = 3,
+                  latency: float = 0.0) -> List[Dict]:
+    """
+    对所有页面运行各层的基准测试
+
+    Args:
+        pages: 语料页面
+        tiers: 要测试的抓取层
+        repeat: 每项重复次数
+        latency: 回放服务每个请求的模拟延迟（秒）
+    """
+    rows = []
+    server = ReplayServer(pages, latency=latency).start() if {'http', 'browser'} & set(tiers) else None
+    pool = None
+    try:
+        for tier in tiers:
+            if tier == 'browser':
+                pool = _start_pool()
+                if pool is None:
+                    continue
+            for page in pages:
+                rows.append(bench(tier, page, make_runner(tier, page, server, pool), repeat))
+    finally:
+        if pool:
+            pool.close()
+        if server:
+            server.stop()
+    return rows
+
+
+def _start_pool():
+    """启动浏览器池，Chromium不可用时返回None（跳过浏览器层）"""
+    from scrapers.browser_pool import BrowserPool
+
+    pool = BrowserPool(size=1, idle_timeout=None)
+    try:
+        pool.run(lambda page: page.set_content("<p>ok</p>"))
+    except Exception as e:
+        pool.close()
+        print(f"⚠️  浏览器不可用，跳过browser层: {str(e).splitlines()[0] if str(e) else type(e).__name__}")
+        return None
+    return pool
+
+
+# ==================== 报告 ====================
+
+def environment() -> Dict:
+    """运行环境（比较不同运行的结果时确认条件相同）"""
+    versions = {}
+    for module in ('bs4', 'lxml', 'playwright', 'requests'):
+        try:
+            versions[module] = getattr(__import__(module), '__version__', 'unknown')
+        except ImportError:
+            versions[module] = None
+    return {
+        'python': platform_lib.python_version(),
+        'machine': f"{platform_lib.system()} {platform_lib.machine()}",
+        'html_parser': get_parser(),
+        'packages': versions,
+    }
+
+
+def compare(rows: List[Dict], baseline: List[Dict]) -> Dict[Tuple[str, str], float]:
+    """与基线比较：(页面, 层) -> p50 变化百分比（负数表示变快）"""
+    before = {(r['page'], r['tier']): r['p50_ms'] for r in baseline}
+    deltas = {}
+    for r in rows:
+        old = before.get((r['page'], r['tier']))
+        if old:
+            deltas[(r['page'], r['tier'])] = (r['p50_ms'] - old) / old * 100
+    return deltas
+
+
+def format_report(rows: List[Dict], deltas: Optional[Dict[Tuple[str, str], float]] = None) -> str:
+    """格式化结果表格"""
+    deltas = deltas or {}
+    lines = [f"{'页面':<18}{'MB':>6}  {'层':<10}{'消息数':>6}{'p50(ms)':>11}{'p95(ms)':>11}"
+             f"{'CPU(ms)':>11}{'内存(MB)':>10}{'基线':>10}  结果"]
+    for r in rows:
+        delta = deltas.get((r['page'], r['tier']))
+        delta_text = f"{delta:+.1f}%" if delta is not None else "-"
+        result = "✅" if r['ok'] else "❌ " + "; ".join(r['problems'])
+        lines.append(f"{r['page'][:20]:<20}{r['size_mb']:>6}  {r['tier']:<11}{r['messages']:>6}"
+                     f"{r['p50_ms']:>11.1f}{r['p95_ms']:>11.1f}{r['cpu_ms']:>11.1f}{r['peak_mb']:>10.1f}"
+                     f"{delta_text:>10}  {result}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="爬虫基准测试")
+    parser.add_argument('--corpus', default=None, help="语料目录（不指定则按随机种子生成）")
+    parser.add_argument('--platforms', default=",".join(PLATFORMS))
+    parser.add_argument('--sizes', default="short,long", help="生成语料的长度，逗号分隔: " + ",".join(SIZES))
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--tiers', default=",".join(TIERS), help="逗号分隔: " + ",".join(TIERS))
+    parser.add_argument('--repeat', type=int, default=3, help="每项重复次数")
+    parser.add_argument('--latency', type=float, default=0.0, help="回放服务每个请求的延迟（秒）")
+    parser.add_argument('--json', dest='json_path', default=None, help="结果另存为JSON（便于比较）")
+    parser.add_argument('--baseline', default=None, help="之前保存的JSON结果，比较p50变化")
+    args = parser.parse_args(argv)
+
+    platforms = [p.strip() for p in args.platforms.split(',') if p.strip()]
+    tiers = [t.strip() for t in args.tiers.split(',') if t.strip()]
+    if args.corpus:
+        pages = load_corpus(args.corpus, platforms)
+    else:
+        pages = build_corpus(platforms, [s.strip() for s in args.sizes.split(',') if s.strip()], args.seed)
+
+    print(f"🧪 爬虫基准测试: {len(pages)} 个页面 | 层 {', '.join(tiers)} | 重复 {args.repeat} 次 | "
+          f"解析后端 {get_parser()}")
+    rows = run_benchmark(pages, tiers, args.repeat, args.latency)
+
+    deltas = None
+    if args.baseline:
+        deltas = compare(rows, json.loads(Path(args.baseline).read_text(encoding='utf-8'))['results'])
+    print(format_report(rows, deltas))
+
+    failed = [r for r in rows if not r['ok']]
+    if failed:
+        print(f"❌ {len(failed)} 项解析结果与语料不一致")
+
+    if args.json_path:
+        report = {
+            'params': {k: v for k, v in vars(args).items() if k not in ('json_path', 'baseline')},
+            'environment': environment(),
+            'results': rows,
+        }
+        Path(args.json_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"💾 结果已保存: {args.json_path}")
+    return rows
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+"""
+爬虫离线语料
+
+分享页语料由 manifest.json 和若干HTML文件组成，每个页面记录平台、原始分享链接和期望的解析结果
+（标题、各条消息的角色、所有消息文本去掉空白后的SHA1），用于离线回归测试和基准测试，不访问真实网站。
+
+语料有两种来源：
+1. 生成：按固定随机种子生成 ChatGPT / Claude / DeepSeek 三个平台、短/长/超长三种长度的页面。
+   页面同时包含渲染后的消息标记（浏览器层解析）和服务端内嵌数据（HTTP层解析，
+   分别使用 __NEXT_DATA__、Next.js Flight 和 Remix 三种格式）
+2. 录制：抓取真实的分享页保存到语料目录，期望结果取录制时的解析结果（之后的解析与之比较）
+
+用法:
+    python -m benchmarks.scraper_corpus build corpus/                  # 生成
+    python -m benchmarks.scraper_corpus build corpus/ --sizes short,long --seed 7
+    python -m benchmarks.scraper_corpus record corpus/ https://chatgpt.com/share/xxx
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import argparse
+import hashlib
+import html as html_lib
+import json
+import random
+import re
+import sys
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from scrapers.platforms import get_platform
+
+PLATFORMS = ('chatgpt', 'claude', 'deepseek')
+
+# 各长度的对话轮数（一问一答为两条消息）
+SIZES = {'short': 6, 'long': 120, 'huge': 1600}
+
+MANIFEST = 'manifest.json'
+
+_TITLES = ["SQL索引优化", "Python列表推导式", "旅行计划", "前端性能优化", "论文写作建议"]
+
+_SENTENCES = [
+    "联合索引遵循最左前缀原则，查询条件要从索引的第一列开始匹配。",
+    "可以用EXPLAIN查看执行计划，重点关注type、key和rows三列。",
+    "列表推导式比for循环更简洁，也可以在末尾加入if条件过滤。",
+    "行程不要安排得太满，留出休息和应对意外情况的时间。",
+    "图片懒加载可以减少首屏请求，合并静态资源能减少连接数。",
+    "摘要要概括研究问题、方法和结论，控制在三百字以内。",
+    "避免在索引列上使用函数或隐式类型转换，否则索引会失效。",
+    "提前预订机票和酒店通常更便宜，也更容易选到合适的时间。",
+]
+
+Turns = List[Tuple[str, List[str]]]
+
+
+@dataclass
+class CorpusPage:
+    """语料中的一个分享页"""
+    name: str
+    platform: str
+    share_url: str
+    title: str
+    roles: List[str]
+    digest: str
+    source: str = 'generated'          # generated | recorded
+    html: str = field(default='', repr=False)
+
+    @property
+    def size_mb(self) -> float:
+        return round(len(self.html.encode('utf-8')) / 1024 / 1024, 2)
+
+    def to_manifest(self) -> Dict:
+        entry = asdict(self)
+        del entry['html']
+        entry['file'] = f"{self.name}.html"
+        return entry
+
+
+def content_digest(contents: Iterable[str]) -> str:
+    """所有消息文本去掉空白后的SHA1（与段落换行、缩进等排版无关）"""
+    digest = hashlib.sha1()
+    for content in contents:
+        digest.update(re.sub(r'\s+', '', content).encode('utf-8'))
+        digest.update(b'\x00')
+    return digest.hexdigest()
+
+
+def check(page: CorpusPage, data) -> List[str]:
+    """
+    比较解析结果与期望
+
+    Returns:
+        不一致之处的描述，全部一致时为空列表
+    """
+    problems = []
+    if data is None:
+        return ["未解析出对话"]
+    if data.title != page.title:
+        problems.append(f"标题: {data.title!r} != {page.title!r}")
+    roles = [m.role for m in data.messages]
+    if roles != page.roles:
+        problems.append(f"消息: {len(roles)} 条（期望 {len(page.roles)} 条）" if len(roles) != len(page.roles)
+                        else "消息角色不一致")
+    elif content_digest(m.content for m in data.messages) != page.digest:
+        problems.append("消息内容不一致")
+    return problems
+
+
+# ==================== 生成 ====================
+
+def _turns(rnd: random.Random, count: int) -> Turns:
+    turns = []
+    for i in range(count * 2):
+        role = 'user' if i % 2 == 0 else 'assistant'
+        paragraphs = ["".join(rnd.choices(_SENTENCES, k=rnd.randint(1, 3)))
+                      for _ in range(1 if role == 'user' else rnd.randint(1, 8))]
+        turns.append((role, paragraphs))
+    return turns
+
+
+def _paragraphs(paragraphs: List[str]) -> str:
+    return "".join(f"<p>{html_lib.escape(p)}</p>" for p in paragraphs)
+
+
+def _script_json(data) -> str:
+    # 防止内容中的 </script> 提前结束脚本
+    return json.dumps(data, ensure_ascii=False).replace('</', '<\\/')
+
+
+def _page(title: str, suffix: str, body: str, scripts: str) -> str:
+    return (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+            f"<title>{html_lib.escape(title)} - {suffix}</title></head>"
+            f"<body>{body}{scripts}</body></html>")
+
+
+def render_chatgpt(title: str, turns: Turns) -> str:
+    """ChatGPT：conversation-turn 标记 + __NEXT_DATA__"""
+    body = "".join(
+        f'<div data-testid="conversation-turn-{i}" data-message-author-role="{role}" class="group w-full">'
+        f'<div class="flex"><div class="markdown prose">{_paragraphs(paragraphs)}</div>'
+        f'<button>复制</button></div></div>'
+        for i, (role, paragraphs) in enumerate(turns))
+    data = {'props': {'pageProps': {'serverResponse': {'data': {
+        'title': title,
+        'linear_conversation': [{'id': 'root'}] + [
+            {'message': {'author': {'role': role}, 'content': {'content_type': 'text', 'parts': ["\n\n".join(paragraphs)]}}}
+            for role, paragraphs in turns],
+    }}}}}
+    script = f'<script id="__NEXT_DATA__" type="application/json">{_script_json(data)}</script>'
+    return _page(title, 'ChatGPT', f'<div id="__next"><main>{body}</main></div>', script)
+
+
+def render_claude(title: str, turns: Turns) -> str:
+    """Claude：message 标记 + Next.js Flight 数据（分块推送）"""
+    body = "".join(
+        f'<div data-test-render-count="1" class="message {"human" if role == "user" else "assistant"}">'
+        f'<div class="font-body">{_paragraphs(paragraphs)}</div></div>'
+        for role, paragraphs in turns)
+    data = {'name': title, 'chat_messages': [
+        {'sender': 'human' if role == 'user' else 'assistant',
+         'content': [{'type': 'text', 'text': "\n\n".join(paragraphs)}]}
+        for role, paragraphs in turns]}
+    flight = f'0:["$","html",null,{{}}]\n1:{json.dumps(data, ensure_ascii=False)}\n'
+    chunks = [flight[i:i + 16384] for i in range(0, len(flight), 16384)]
+    scripts = "".join(f'<script>self.__next_f.push([1,{_script_json(chunk)}])</script>' for chunk in chunks)
+    return _page(title, 'Claude', f'<div class="conversation">{body}</div>', scripts)
+
+
+def render_deepseek(title: str, turns: Turns) -> str:
+    """DeepSeek：message 标记 + Remix 上下文"""
+    body = "".join(
+        f'<div class="message {role}"><div class="ds-markdown">{_paragraphs(paragraphs)}</div></div>'
+        for role, paragraphs in turns)
+    data = {'state': {'loaderData': {'routes/share.$id': {'conversation': {
+        'title': title,
+        'messages': [{'role': role, 'content': "\n\n".join(paragraphs)} for role, paragraphs in turns],
+    }}}}}
+    script = f'<script>window.__remixContext = {_script_json(data)};</script>'
+    return _page(title, 'DeepSeek', f'<div id="root">{body}</div>', script)
+
+
+_RENDERERS = {'chatgpt': render_chatgpt, 'claude': render_claude, 'deepseek': render_deepseek}
+
+
+def build_corpus(platforms: Sequence[str] = PLATFORMS, sizes: Sequence[str] = tuple(SIZES),
+                 seed: int = 42) -> List[CorpusPage]:
+    """按固定随机种子生成语料（同样的参数总是生成同样的页面）"""
+    pages = []
+    for platform in platforms:
+        for size in sizes:
+            rnd = random.Random(f"{seed}-{platform}-{size}")
+            title = rnd.choice(_TITLES)
+            turns = _turns(rnd, SIZES[size])
+            name = f"{platform}-{size}"
+            pages.append(CorpusPage(
+                name=name,
+                platform=platform,
+                share_url=get_platform(platform).canonical.format(f"{name}-{seed}"),
+                title=title,
+                roles=[role for role, _ in turns],
+                digest=content_digest("".join(paragraphs) for _, paragraphs in turns),
+                html=_RENDERERS[platform](title, turns),
+            ))
+    return pages
+
+
+# ==================== 读写 ====================
+
+def save_corpus(pages: Iterable[CorpusPage], directory) -> Path:
+    """写入语料目录（与已有的清单合并，同名页面覆盖）"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest_path = directory / MANIFEST
+    entries = {}
+    if manifest_path.exists():
+        entries = {entry['name']: entry for entry in json.loads(manifest_path.read_text(encoding='utf-8'))}
+    for page in pages:
+        (directory / f"{page.name}.html").write_text(page.html, encoding='utf-8')
+        entries[page.name] = page.to_manifest()
+    manifest_path.write_text(json.dumps(list(entries.values()), ensure_ascii=False, indent=2), encoding='utf-8')
+    return manifest_path
+
+
+def load_corpus(directory, platforms: Optional[Sequence[str]] = None) -> List[CorpusPage]:
+    """读取语料目录"""
+    directory = Path(directory)
+    pages = []
+    for entry in json.loads((directory / MANIFEST).read_text(encoding='utf-8')):
+        if platforms and entry['platform'] not in platforms:
+            continue
+        html = (directory / entry.pop('file')).read_text(encoding='utf-8')
+        pages.append(CorpusPage(html=html, **entry))
+    return pages
+
+
+def record_page(url: str, directory, use_browser: bool = True) -> CorpusPage:
+    """
+    录制真实的分享页
+
+    优先保存浏览器渲染后的页面（同时保留内嵌数据脚本，两层都可回放）；
+    浏览器不可用或 use_browser=False 时保存HTTP返回的HTML。期望结果取录制时的解析结果。
+    """
+    from scrapers.fetch_tiers import fetch_html
+    from scrapers.scraper_factory import ScraperFactory
+    from scrapers.url_canonical import canonicalize_url
+
+    url = canonicalize_url(url)
+    scraper = ScraperFactory().get_scraper(url)
+    if scraper is None:
+        raise ValueError(f"不支持的链接格式: {url}")
+
+    html = None
+    if use_browser:
+        from scrapers.browser_pool import get_browser_pool
+
+        def capture(page):
+            scraper._scrape_page(page, url)   # 等待对话渲染完成
+            return page.content()
+
+        try:
+            html = get_browser_pool().run(capture)
+        except Exception as e:
+            print(f"⚠️  浏览器录制失败，改为保存HTTP页面: {e}")
+    if html is None:
+        html = fetch_html(url)
+
+    data = scraper.parse_embedded(html, url)
+    if data is None:
+        data = scraper.parse_html(html, url)
+    share_id = url.rstrip('/').rsplit('/', 1)[-1]
+    page = CorpusPage(
+        name=f"{scraper.platform_name}-recorded-{share_id}",
+        platform=scraper.platform_name,
+        share_url=url,
+        title=data.title,
+        roles=[m.role for m in data.messages],
+        digest=content_digest(m.content for m in data.messages),
+        source='recorded',
+        html=html,
+    )
+    save_corpus([page], directory)
+    return page
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="爬虫离线语料")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="生成语料")
+    build.add_argument('directory')
+    build.add_argument('--platforms', default=",".join(PLATFORMS))
+    build.add_argument('--sizes', default=",".join(SIZES), help="逗号分隔: " + ",".join(SIZES))
+    build.add_argument('--seed', type=int, default=42)
+
+    record = sub.add_parser('record', help="录制真实的分享页")
+    record.add_argument('directory')
+    record.add_argument('urls', nargs='+')
+    record.add_argument('--no-browser', action='store_true', help="只保存HTTP返回的HTML")
+
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        pages = build_corpus(args.platforms.split(','), args.sizes.split(','), args.seed)
+        save_corpus(pages, args.directory)
+        for page in pages:
+            print(f"📄 {page.name}: {len(page.roles)} 条消息, {page.size_mb} MB")
+        print(f"💾 已生成 {len(pages)} 个页面: {args.directory}")
+    else:
+        for url in args.urls:
+            page = record_page(url, args.directory, use_browser=not args.no_browser)
+            print(f"📼 {page.name}: {page.title} | {len(page.roles)} 条消息, {page.size_mb} MB")
+
+
+if __name__ == '__main__':
+    main()
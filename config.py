@@ -14,7 +14,7 @@ PROJECT_ROOT = Path(__file__).parent
 
 # ==================== AI配置 ====================
 
-AI_MODE = os.getenv('AI_MODE', 'local')  # local / online / hybrid
+AI_MODE = os.getenv('AI_MODE', 'local')  # local / online / hybrid（按延迟路由）
 
 # Ollama配置
 OLLAMA_BASE_URL = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
@@ -29,10 +29,17 @@ OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY', '')
 DEEPSEEK_MODEL = os.getenv('DEEPSEEK_MODEL', 'deepseek-chat')
 
+# 分析前的抽取式预压缩token预算（0表示不压缩；长对话仍走分段分析，逐段压缩）
+AI_COMPRESS_TOKENS = int(os.getenv('AI_COMPRESS_TOKENS', '2500'))
+
 # ==================== 数据库配置 ====================
 
 DATABASE_PATH = os.getenv('DATABASE_PATH', str(PROJECT_ROOT / 'data' / 'chatcompass.db'))
 
+# 入库时的近似重复处理: flag（标记并沿用原对话的分析结果） / merge（不入库，链接记为原对话的别名） / off
+DEDUPE_POLICY = os.getenv('DEDUPE_POLICY', 'flag')
+DEDUPE_THRESHOLD = float(os.getenv('DEDUPE_THRESHOLD', '0.8'))  # 内容相似度（Jaccard）阈值
+
 # ==================== 爬虫配置 ====================
 
 USE_PLAYWRIGHT = os.getenv('USE_PLAYWRIGHT', 'true').lower() == 'true'
@@ -82,11 +89,17 @@ def get_storage(db_path=None):
     if db_path is None:
         db_path = DATABASE_PATH
         
-    return DatabaseManager(db_path)
+    return DatabaseManager(db_path, dedupe=DEDUPE_POLICY, dedupe_threshold=DEDUPE_THRESHOLD)
 
 
 def get_ai_client():
-    """根据配置获取AI客户端"""
+    """根据配置获取AI客户端（按 AI_COMPRESS_TOKENS 启用预压缩）"""
+    from ai.text_compressor import attach_compressor
+    return attach_compressor(_create_ai_client(), AI_COMPRESS_TOKENS)
+
+
+def _create_ai_client():
+    """按 AI_MODE 创建AI客户端"""
     if AI_MODE == 'local':
         from ai.ollama_client import OllamaClient
         return OllamaClient(base_url=OLLAMA_BASE_URL, model=OLLAMA_MODEL)
@@ -102,19 +115,22 @@ def get_ai_client():
             raise ValueError("在线模式需要配置API密钥")
     
     elif AI_MODE == 'hybrid':
-        # 混合模式：优先在线，失败降级到本地
-        try:
-            if DEEPSEEK_API_KEY:
-                from ai.openai_client import DeepSeekClient
-                client = DeepSeekClient(api_key=DEEPSEEK_API_KEY)
-                if client.is_available():
-                    return client
-        except:
-            pass
-        
-        # 降级到本地
+        # 混合模式：按实时延迟和健康度在所有已配置后端之间路由，并对慢请求对冲
         from ai.ollama_client import OllamaClient
-        return OllamaClient(base_url=OLLAMA_BASE_URL, model=OLLAMA_MODEL)
+        from ai.routing_client import RoutingAIClient
+        
+        clients = {}
+        if DEEPSEEK_API_KEY:
+            from ai.openai_client import DeepSeekClient
+            clients['deepseek'] = DeepSeekClient(api_key=DEEPSEEK_API_KEY, model=DEEPSEEK_MODEL)
+        if OPENAI_API_KEY:
+            from ai.openai_client import OpenAIClient
+            clients['openai'] = OpenAIClient(
+                api_key=OPENAI_API_KEY, model=OPENAI_MODEL, base_url=OPENAI_BASE_URL
+            )
+        clients['ollama'] = OllamaClient(base_url=OLLAMA_BASE_URL, model=OLLAMA_MODEL)
+        
+        return RoutingAIClient.from_clients(clients)
     
     else:
         raise ValueError(f"不支持的AI模式: {AI_MODE}")
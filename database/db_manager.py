@@ -4,6 +4,7 @@
 """
 import sqlite3
 import json
+import threading
 from typing import List, Optional, Dict, Tuple
 from datetime import datetime
 from pathlib import Path
@@ -12,15 +13,31 @@ from pathlib import Path
 class DatabaseManager:
     """数据库管理器"""
     
-    def __init__(self, db_path: str = "chatcompass.db"):
+    DEDUPE_POLICIES = ('flag', 'merge')
+    
+    def __init__(self, db_path: str = "chatcompass.db", dedupe: Optional[str] = None,
+                 dedupe_threshold: float = 0.8):
         """
         初始化数据库管理器
         
         Args:
             db_path: 数据库文件路径
+            dedupe: 入库时的近似重复处理：None/'off' 不检测；
+                    'flag' 照常入库并标记 duplicate_of，沿用原对话的分析结果；
+                    'merge' 不入库，把链接记为原对话的别名
+            dedupe_threshold: 判定为重复的内容相似度（Jaccard估计）
         """
+        if dedupe == 'off':
+            dedupe = None
+        if dedupe is not None and dedupe not in self.DEDUPE_POLICIES:
+            raise ValueError(f"不支持的查重策略: {dedupe}（可选: off, {', '.join(self.DEDUPE_POLICIES)}）")
         self.db_path = db_path
+        self.dedupe = dedupe
+        self.dedupe_threshold = dedupe_threshold
         self.conn = None
+        self._near_duplicates = None
+        self._url_index = None
+        self._url_lock = threading.Lock()
         self._init_database()
     
     def _init_database(self):
@@ -44,6 +61,7 @@ class DatabaseManager:
             # 如果schema.sql不存在，使用内联SQL
             self._create_tables_inline()
         
+        self._migrate_schema()
         self.conn.commit()
         print(f"[数据库] 初始化完成: {self.db_path}")
     
@@ -66,7 +84,9 @@ class DatabaseManager:
                 created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                 is_favorite INTEGER DEFAULT 0,
-                notes TEXT
+                notes TEXT,
+                analysis_confidence REAL,
+                duplicate_of INTEGER
             )
         """)
         
@@ -102,6 +122,78 @@ class DatabaseManager:
             )
         """)
     
+    def _migrate_schema(self):
+        """为旧数据库补齐新增列和索引，修复FTS同步触发器"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(conversations)")}
+        rebuild_fts = False
+        
+        # 旧版触发器直接DELETE外部内容FTS表，更新对话后索引会损坏
+        outdated = [name for name, sql in self.conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' "
+            "AND name IN ('conversations_au', 'conversations_ad')"
+        ) if "'delete'" not in sql]
+        if outdated:
+            for name in outdated:
+                self.conn.execute(f"DROP TRIGGER {name}")
+            schema_path = Path(__file__).parent / "schema.sql"
+            if schema_path.exists():
+                with open(schema_path, 'r', encoding='utf-8') as f:
+                    self.conn.executescript(f.read())
+            rebuild_fts = True
+        
+        # 旧版变更日志触发器不判断是否启用了复制，换成新版并清掉无人消费的积压
+        ungated = [name for name, sql in self.conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name GLOB '*_cl_*'"
+        ) if 'replication_state' not in sql]
+        if ungated:
+            for name in ungated:
+                self.conn.execute(f"DROP TRIGGER {name}")
+            schema_path = Path(__file__).parent / "schema.sql"
+            if schema_path.exists():
+                with open(schema_path, 'r', encoding='utf-8') as f:
+                    self.conn.executescript(f.read())
+        try:
+            self.conn.execute("""
+                DELETE FROM change_log WHERE NOT EXISTS (SELECT 1 FROM replication_state)
+            """)
+        except sqlite3.OperationalError:
+            pass  # 内联建表时没有变更日志
+        
+        if 'analysis_confidence' not in columns:
+            rebuild_fts = True  # 旧数据库的FTS表可能是后建的，没有索引已有对话
+            self.conn.execute("ALTER TABLE conversations ADD COLUMN analysis_confidence REAL")
+            # 迁移前已有摘要和分类的对话无法区分来源，视为已完成分析
+            self.conn.execute("""
+                UPDATE conversations SET analysis_confidence = 1.0
+                WHERE summary IS NOT NULL AND summary != ''
+                  AND category IS NOT NULL AND category != ''
+            """)
+        
+        # 自动分析按置信度查找待分析对话
+        self.conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_conversations_analysis
+            ON conversations(analysis_confidence)
+        """)
+        
+        # 近似重复标记：被引用的对话删除后，重复对话恢复为独立对话
+        if 'duplicate_of' not in columns:
+            self.conn.execute("ALTER TABLE conversations ADD COLUMN duplicate_of INTEGER")
+        self.conn.execute("""
+            CREATE INDEX IF NOT EXISTS idx_conversations_duplicate_of
+            ON conversations(duplicate_of) WHERE duplicate_of IS NOT NULL
+        """)
+        self.conn.execute("""
+            CREATE TRIGGER IF NOT EXISTS conversations_dup_ad AFTER DELETE ON conversations BEGIN
+                UPDATE conversations SET duplicate_of = NULL WHERE duplicate_of = old.id;
+            END
+        """)
+        
+        if rebuild_fts:
+            try:
+                self.conn.execute("INSERT INTO conversations_fts(conversations_fts) VALUES('rebuild')")
+            except sqlite3.OperationalError:
+                pass  # 没有FTS表（内联建表时FTS5不可用）
+    
     def close(self):
         """关闭数据库连接"""
         if self.conn:
@@ -116,15 +208,47 @@ class DatabaseManager:
                         raw_content: dict,
                         summary: str = None,
                         category: str = None,
-                        tags: List[str] = None) -> int:
+                        tags: List[str] = None,
+                        analysis_confidence: float = None,
+                        duplicate_of: int = None) -> int:
         """
         添加新对话
         
+        Args:
+            analysis_confidence: AI分析置信度（未分析时为None，由自动分析补齐）
+            duplicate_of: 已知重复的原对话ID；为None且开启查重时自动检测
+        
         Returns:
-            新对话的ID
+            新对话的ID（按 'merge' 策略合并或链接是已合并的别名时，返回原对话ID）
         """
         cursor = self.conn.cursor()
         
+        # 已合并为别名的链接
+        cursor.execute("SELECT conversation_id FROM conversation_aliases WHERE source_url = ?", (source_url,))
+        row = cursor.fetchone()
+        if row:
+            print(f"[数据库] 链接已合并到对话: ID={row[0]}")
+            return row[0]
+        
+        # 同一分享的其他链接形式（如 chat.openai.com 与 chatgpt.com）已收藏
+        existing = self.find_by_url(source_url)
+        if existing:
+            print(f"[数据库] 对话已存在: {source_url}")
+            return existing
+        
+        # 近似重复检测（链接已收藏的情况在上面已返回）
+        signature = None
+        index = self._near_duplicate_index() if self.dedupe else None
+        if index is not None:
+            signature = index.signature(raw_content)
+            if duplicate_of is None and signature is not None:
+                match = self._best_duplicate(index, signature)
+                duplicate_of = match['id'] if match else None
+        if duplicate_of and self.dedupe == 'merge':
+            self.add_alias(source_url, duplicate_of)
+            print(f"[数据库] 近似重复，已合并到对话: ID={duplicate_of}")
+            return duplicate_of
+        
         # 将raw_content转为JSON字符串
         content_json = json.dumps(raw_content, ensure_ascii=False)
         
@@ -135,18 +259,30 @@ class DatabaseManager:
         try:
             cursor.execute("""
                 INSERT INTO conversations 
-                (source_url, platform, title, raw_content, summary, category, word_count, message_count)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (source_url, platform, title, content_json, summary, category, word_count, message_count))
+                (source_url, platform, title, raw_content, summary, category, word_count, message_count,
+                 analysis_confidence, duplicate_of)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (source_url, platform, title, content_json, summary, category, word_count, message_count,
+                  analysis_confidence, duplicate_of))
             
             conversation_id = cursor.lastrowid
+            self._remember_url(source_url, conversation_id)
+            if signature is not None:
+                index.add(conversation_id, signature)
             
             # 添加标签
             if tags:
                 self._add_tags_to_conversation(conversation_id, tags)
             
+            # 重复对话沿用原对话的分析结果，不再单独分析
+            if duplicate_of and analysis_confidence is None:
+                self._copy_analysis(duplicate_of, conversation_id)
+            
             self.conn.commit()
-            print(f"[数据库] 添加对话成功: ID={conversation_id}, 标题={title}")
+            if duplicate_of:
+                print(f"[数据库] 添加对话成功: ID={conversation_id}, 标题={title}（与ID={duplicate_of}近似重复）")
+            else:
+                print(f"[数据库] 添加对话成功: ID={conversation_id}, 标题={title}")
             return conversation_id
             
         except sqlite3.IntegrityError:
@@ -258,11 +394,29 @@ class DatabaseManager:
         
         self.conn.commit()
     
+    def replace_content(self, conversation_id: int, title: str, raw_content: dict):
+        """
+        用重新抓取的内容替换对话（保留收藏、备注和标签）
+        
+        分析置信度清空，由自动分析（或调用方随后写回的结果）重新分析；
+        内容签名和向量由触发器丢弃，之后重新计算。
+        """
+        content_json = json.dumps(raw_content, ensure_ascii=False)
+        with self.conn:
+            self.conn.execute("""
+                UPDATE conversations
+                SET title = ?, raw_content = ?, word_count = ?, message_count = ?,
+                    analysis_confidence = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE id = ?
+            """, (title, content_json, len(content_json), len(raw_content.get('messages', [])),
+                  conversation_id))
+    
     def delete_conversation(self, conversation_id: int):
         """删除对话"""
         cursor = self.conn.cursor()
         cursor.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
         self.conn.commit()
+        self._url_index = None
         print(f"[数据库] 删除对话: ID={conversation_id}")
     
     # ==================== 标签操作 ====================
@@ -502,6 +656,329 @@ class DatabaseManager:
         
         return matches
     
+    # ==================== AI分析结果 ====================
+    
+    def get_pending_analysis(self, min_confidence: float, limit: int = 100) -> List[Dict]:
+        """
+        查找需要（重新）分析的对话：未分析，或置信度低于阈值（如降级分析的结果）
+        
+        近似重复的对话不单独分析，原对话的结果写回时一并更新。
+        走 idx_conversations_analysis 索引，不扫描全表；未分析的排在前面，同类按新到旧。
+        
+        Args:
+            min_confidence: 置信度阈值
+            limit: 返回数量
+        
+        Returns:
+            [{'id', 'title', 'analysis_confidence'}]，不含对话内容
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT id, title, analysis_confidence FROM conversations
+            WHERE (analysis_confidence IS NULL OR analysis_confidence < ?) AND duplicate_of IS NULL
+            ORDER BY analysis_confidence IS NOT NULL, analysis_confidence, id DESC
+            LIMIT ?
+        """, (min_confidence, limit))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def save_analysis_results(self, results: List[Tuple[int, Dict]]) -> int:
+        """
+        在一个事务中批量写回AI分析结果（摘要、分类、标签、置信度）
+        
+        已有更高置信度结果的对话不会被覆盖；写入的标签替换对话原有标签。
+        标记为其近似重复的对话同时写入相同的结果。
+        
+        Args:
+            results: [(对话ID, {'summary', 'category', 'tags', 'confidence'})]
+        
+        Returns:
+            实际更新的对话数（含重复对话）
+        """
+        results = list(results)
+        results += self._duplicate_results(results)
+        updated = 0
+        with self.conn:
+            cursor = self.conn.cursor()
+            for conversation_id, result in results:
+                cursor.execute("""
+                    UPDATE conversations
+                    SET summary = ?, category = ?, analysis_confidence = ?
+                    WHERE id = ? AND (analysis_confidence IS NULL OR analysis_confidence <= ?)
+                """, (result.get('summary'), result.get('category'), result['confidence'],
+                      conversation_id, result['confidence']))
+                if not cursor.rowcount:
+                    continue
+                updated += 1
+                
+                tags = list(dict.fromkeys(result.get('tags') or []))
+                cursor.execute("""
+                    UPDATE tags SET usage_count = MAX(usage_count - 1, 0)
+                    WHERE id IN (SELECT tag_id FROM conversation_tags WHERE conversation_id = ?)
+                """, (conversation_id,))
+                cursor.execute("DELETE FROM conversation_tags WHERE conversation_id = ?",
+                               (conversation_id,))
+                cursor.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)",
+                                   [(tag,) for tag in tags])
+                cursor.executemany("""
+                    INSERT OR IGNORE INTO conversation_tags (conversation_id, tag_id)
+                    SELECT ?, id FROM tags WHERE name = ?
+                """, [(conversation_id, tag) for tag in tags])
+                cursor.executemany("UPDATE tags SET usage_count = usage_count + 1 WHERE name = ?",
+                                   [(tag,) for tag in tags])
+        return updated
+    
+    def _duplicate_results(self, results: List[Tuple[int, Dict]]) -> List[Tuple[int, Dict]]:
+        """把分析结果展开到标记为重复的对话"""
+        by_id = dict(results)
+        if not by_id:
+            return []
+        ids = list(by_id)
+        extra = []
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            for row in self.conn.execute(
+                f"SELECT id, duplicate_of FROM conversations "
+                f"WHERE duplicate_of IN ({','.join('?' * len(chunk))})", chunk
+            ):
+                if row[0] not in by_id:
+                    extra.append((row[0], by_id[row[1]]))
+        return extra
+    
+    # ==================== 链接索引 ====================
+    
+    def find_by_url(self, url: str) -> Optional[int]:
+        """
+        按规范化链接查找已收藏的对话（抓取之前调用）
+        
+        chat.openai.com 与 chatgpt.com、带跟踪参数或结尾斜杠等形式视为同一分享；
+        已合并为别名的链接返回原对话。
+        
+        Returns:
+            对话ID，未收藏时为None
+        """
+        from scrapers.url_canonical import canonicalize_url
+        
+        canonical = canonicalize_url(url)
+        index = self._known_urls()
+        conversation_id = index.get(canonical)
+        if conversation_id is not None:
+            # 对话可能已被其他连接删除
+            if self.conn.execute("SELECT 1 FROM conversations WHERE id = ?", (conversation_id,)).fetchone():
+                return conversation_id
+            index.pop(canonical, None)
+        
+        # 内存索引之外（如其他进程刚写入）再按 source_url 索引查一次
+        row = self.conn.execute("""
+            SELECT id FROM conversations WHERE source_url IN (?, ?)
+            UNION ALL
+            SELECT conversation_id FROM conversation_aliases WHERE source_url IN (?, ?)
+            LIMIT 1
+        """, (url, canonical, url, canonical)).fetchone()
+        if row:
+            index[canonical] = row[0]
+            return row[0]
+        return None
+    
+    def _known_urls(self) -> Dict[str, int]:
+        """规范链接 -> 对话ID（首次使用时从对话表和别名表加载）"""
+        with self._url_lock:
+            if self._url_index is None:
+                from scrapers.url_canonical import canonicalize_url
+                
+                index = {}
+                for url, conversation_id in self.conn.execute(
+                        "SELECT source_url, conversation_id FROM conversation_aliases"):
+                    index[canonicalize_url(url)] = conversation_id
+                for url, conversation_id in self.conn.execute("SELECT source_url, id FROM conversations"):
+                    index[canonicalize_url(url)] = conversation_id
+                self._url_index = index
+            return self._url_index
+    
+    def _remember_url(self, url: str, conversation_id: int):
+        if self._url_index is not None:
+            from scrapers.url_canonical import canonicalize_url
+            self._url_index[canonicalize_url(url)] = conversation_id
+    
+    # ==================== 近似重复 ====================
+    
+    def _near_duplicate_index(self):
+        """MinHash/LSH索引（首次使用时创建）；缺少NumPy时返回None"""
+        if self._near_duplicates is None:
+            try:
+                from database.near_duplicates import NearDuplicateIndex
+            except ImportError as e:
+                print(f"[数据库] 近似重复检测不可用: {e}")
+                self._near_duplicates = False
+            else:
+                self._near_duplicates = NearDuplicateIndex(self.conn, threshold=self.dedupe_threshold)
+        return self._near_duplicates or None
+    
+    def _best_duplicate(self, index, signature, exclude_id: int = None) -> Optional[Dict]:
+        """最相似的已入库对话（指向其原对话）"""
+        matches = index.find(signature, exclude_id=exclude_id, limit=1)
+        if not matches:
+            return None
+        match = matches[0]
+        row = self.conn.execute(
+            "SELECT COALESCE(c.duplicate_of, c.id), o.title FROM conversations c "
+            "JOIN conversations o ON o.id = COALESCE(c.duplicate_of, c.id) WHERE c.id = ?",
+            (match.conversation_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return {'id': row[0], 'title': row[1], 'similarity': match.similarity, 'hamming': match.hamming}
+    
+    def find_near_duplicate(self, raw_content: dict) -> Optional[Dict]:
+        """
+        查找与内容近似重复的已入库对话（入库和AI分析之前调用）
+        
+        Args:
+            raw_content: 对话内容（含 messages）
+        
+        Returns:
+            {'id', 'title', 'similarity', 'hamming'}，id为最早入库的原对话；没有重复或内容过短时为None
+        """
+        index = self._near_duplicate_index()
+        if index is None:
+            return None
+        signature = index.signature(raw_content)
+        return self._best_duplicate(index, signature) if signature is not None else None
+    
+    def add_alias(self, source_url: str, conversation_id: int):
+        """把分享链接记为对话的别名（再次添加该链接时直接返回该对话）"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO conversation_aliases (source_url, conversation_id) VALUES (?, ?)",
+            (source_url, conversation_id)
+        )
+        self.conn.commit()
+        self._remember_url(source_url, conversation_id)
+    
+    def _copy_analysis(self, source_id: int, target_id: int):
+        """原对话已分析、重复对话未分析时，把摘要、分类、置信度和标签复制给重复对话"""
+        row = self.conn.execute(
+            "SELECT summary, category, analysis_confidence FROM conversations WHERE id = ?", (source_id,)
+        ).fetchone()
+        if not row or row['analysis_confidence'] is None:
+            return
+        cursor = self.conn.execute(
+            "UPDATE conversations SET summary = ?, category = ?, analysis_confidence = ? "
+            "WHERE id = ? AND analysis_confidence IS NULL",
+            (row['summary'], row['category'], row['analysis_confidence'], target_id)
+        )
+        if not cursor.rowcount:
+            return
+        tags = self.get_conversation_tags(source_id)
+        if tags:
+            self._add_tags_to_conversation(target_id, tags)
+    
+    def merge_duplicate(self, duplicate_id: int, original_id: int):
+        """
+        把重复对话合并到原对话：链接记为别名，收藏、备注和标签并入原对话，然后删除重复对话
+        
+        Args:
+            duplicate_id: 要删除的重复对话
+            original_id: 保留的对话
+        """
+        duplicate = self.conn.execute(
+            "SELECT source_url, is_favorite, notes FROM conversations WHERE id = ?", (duplicate_id,)
+        ).fetchone()
+        original = self.conn.execute(
+            "SELECT is_favorite, notes FROM conversations WHERE id = ?", (original_id,)
+        ).fetchone()
+        if not duplicate or not original:
+            return
+        
+        tags = self.get_conversation_tags(duplicate_id)
+        with self.conn:
+            self.conn.execute("UPDATE conversation_aliases SET conversation_id = ? WHERE conversation_id = ?",
+                              (original_id, duplicate_id))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO conversation_aliases (source_url, conversation_id) VALUES (?, ?)",
+                (duplicate['source_url'], original_id)
+            )
+            self.conn.execute("UPDATE conversations SET duplicate_of = ? WHERE duplicate_of = ?",
+                              (original_id, duplicate_id))
+            
+            notes = original['notes']
+            if duplicate['notes'] and duplicate['notes'] != notes:
+                notes = f"{notes}\n{duplicate['notes']}" if notes else duplicate['notes']
+            self.conn.execute(
+                "UPDATE conversations SET is_favorite = ?, notes = ? WHERE id = ?",
+                (int(bool(original['is_favorite'] or duplicate['is_favorite'])), notes, original_id)
+            )
+            self.conn.execute("""
+                UPDATE tags SET usage_count = MAX(usage_count - 1, 0)
+                WHERE id IN (SELECT tag_id FROM conversation_tags WHERE conversation_id = ?)
+            """, (duplicate_id,))
+            self.conn.execute("DELETE FROM conversation_tags WHERE conversation_id = ?", (duplicate_id,))
+            self.conn.execute("DELETE FROM conversations WHERE id = ?", (duplicate_id,))
+        self._url_index = None  # 别名已改指原对话，下次查找时重新加载
+        if tags:
+            self._add_tags_to_conversation(original_id, tags)
+    
+    def dedupe_library(self, merge: bool = False) -> Dict:
+        """
+        批量查重：为已有对话补齐签名，按LSH分桶找出重复组
+        
+        Args:
+            merge: True时把重复对话合并到组内最早入库的对话（删除重复对话），
+                   False时只标记 duplicate_of 并沿用原对话的分析结果
+        
+        Returns:
+            {'indexed': 新计算的签名数, 'duplicates': [{'id', 'original_id', 'similarity', 'hamming'}]}
+        
+        Raises:
+            ImportError: 缺少NumPy
+        """
+        from database.near_duplicates import NearDuplicateIndex
+        
+        index = self._near_duplicate_index() or NearDuplicateIndex(self.conn, threshold=self.dedupe_threshold)
+        indexed = index.index_missing()
+        duplicates = index.find_duplicates()
+        
+        for item in duplicates:
+            if merge:
+                self.merge_duplicate(item['id'], item['original_id'])
+            else:
+                with self.conn:
+                    self.conn.execute("UPDATE conversations SET duplicate_of = ? WHERE id = ?",
+                                      (item['original_id'], item['id']))
+                    self._copy_analysis(item['original_id'], item['id'])
+        
+        return {'indexed': indexed, 'duplicates': duplicates}
+    
+    # ==================== 相关对话 ====================
+    
+    def get_related_conversations(self, conversation_id: int, limit: int = 5) -> List[Dict]:
+        """
+        读取预先计算的相关对话（由 ai.embeddings.EmbeddingPipeline 维护）
+        
+        按 (conversation_id, rank) 主键直接读取，不做相似度计算。
+        
+        Args:
+            conversation_id: 对话ID
+            limit: 返回数量
+        
+        Returns:
+            [{'id', 'title', 'platform', 'category', 'score'}]，按相似度降序；尚未计算时为空列表
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT c.id, c.title, c.platform, c.category, r.score
+            FROM related_conversations r JOIN conversations c ON c.id = r.related_id
+            WHERE r.conversation_id = ?
+            ORDER BY r.rank
+            LIMIT ?
+        """, (conversation_id, limit))
+        return [dict(row) for row in cursor.fetchall()]
+    
+    def has_embedding(self, conversation_id: int) -> bool:
+        """对话是否已计算向量（相关列表为空时区分"尚未计算"和"没有其他对话"）"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT 1 FROM conversation_embeddings WHERE conversation_id = ?",
+                       (conversation_id,))
+        return cursor.fetchone() is not None
+    
     # ==================== 统计信息 ====================
     
     def get_statistics(self) -> Dict:
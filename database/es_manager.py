@@ -665,6 +665,52 @@ class ElasticsearchManager(BaseStorage):
             logger.error(f"❌ 批量保存消息失败: {e}")
             return 0
     
+    def bulk_write(self, actions: List[Dict]) -> Tuple[int, List[Dict]]:
+        """
+        执行任意bulk动作（index/delete混合），不抛出单条失败
+
+        Args:
+            actions: helpers.bulk格式的动作列表（需包含_op_type/_index/_id）
+
+        Returns:
+            (成功数, 失败条目列表)
+        """
+        success, errors = helpers.bulk(
+            self.es, actions, raise_on_error=False, refresh=True
+        )
+        return success, errors
+
+    def delete_messages_from(self, cutoffs: Dict[str, int], chunk_size: int = 200) -> int:
+        """
+        删除各对话中order_index不小于截断位置的消息（0表示删除该对话的全部消息）
+
+        对话变短、被删除或链接变化后，用于清理多出来的旧消息文档。
+
+        Args:
+            cutoffs: {对话文档ID: 保留的消息数}
+            chunk_size: 每个delete_by_query请求包含的对话数
+
+        Returns:
+            删除的消息数
+        """
+        items = list(cutoffs.items())
+        deleted = 0
+        for start in range(0, len(items), chunk_size):
+            should = [{
+                "bool": {"filter": [
+                    {"term": {"conversation_id": doc_id}},
+                    {"range": {"order_index": {"gte": keep}}},
+                ]}
+            } for doc_id, keep in items[start:start + chunk_size]]
+            result = self.es.delete_by_query(
+                index=self.message_index,
+                body={"query": {"bool": {"should": should, "minimum_should_match": 1}}},
+                conflicts="proceed",
+                refresh=True
+            )
+            deleted += result.get('deleted', 0)
+        return deleted
+
     # ==================== 数据迁移 ====================
     
     def migrate_from_sqlite(self, sqlite_db_path: str) -> Tuple[int, int]:
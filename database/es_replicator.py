@@ -0,0 +1,464 @@
+"""
+SQLite → Elasticsearch 增量复制器
+
+基于变更日志（change_log，由schema.sql中的触发器写入）持续把SQLite的变化
+同步到Elasticsearch：
+1. 按seq顺序读取高水位之后的变更
+2. 合并同一实体的重复变更（多次更新只发一次，更新后删除只发删除）
+3. 以bulk请求批量写入ES（对话文档连同其消息文档），再清理变短、删除或换了链接的对话留下的旧文档
+4. 成功后持久化高水位（replication_state表），并可清理已消费的日志
+
+触发器只在replication_state中登记了消费者后才写日志，创建复制器即完成登记。
+
+使用方法:
+    python -m database.migrate_to_es --source ./data/chatcompass.db --follow
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def to_es_time(value: Optional[str]) -> Optional[str]:
+    """SQLite的'YYYY-MM-DD HH:MM:SS'转换为ES可识别的ISO格式"""
+    return value.replace(' ', 'T') if value else value
+
+
+def conversation_doc_id(source_url: str) -> str:
+    """与ElasticsearchManager.add_conversation保持一致的文档ID"""
+    return hashlib.md5(source_url.encode()).hexdigest()
+
+
+def conversation_to_es_doc(conv: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    SQLite对话行 → ES对话文档
+
+    Args:
+        conv: conversations表的一行（dict），需额外包含tags名称列表
+    """
+    return {
+        "conversation_id": conversation_doc_id(conv['source_url']),
+        "source_url": conv['source_url'],
+        "raw_content": conv['raw_content'] or "",
+        "title": conv['title'],
+        "platform": conv['platform'],
+        "create_time": to_es_time(conv.get('created_at')),
+        "update_time": to_es_time(conv.get('updated_at')),
+        "message_count": conv.get('message_count') or 0,
+        "tags": conv.get('tags', []),
+        "summary": conv.get('summary') or "",
+        "category": conv.get('category') or "",
+    }
+
+
+def build_conversation_actions(conv: Dict[str, Any],
+                               conversation_index: str,
+                               message_index: str) -> List[Dict[str, Any]]:
+    """
+    把一行对话转换为bulk动作（1个对话文档 + N个消息文档）
+
+    定义为模块级函数，以便在进程池中执行。消息文档ID为 "<对话文档ID>_<序号>"。
+    """
+    doc = conversation_to_es_doc(conv)
+    doc_id = doc['conversation_id']
+    actions = [{
+        "_op_type": "index",
+        "_index": conversation_index,
+        "_id": doc_id,
+        "_source": doc,
+    }]
+
+    try:
+        content = json.loads(conv['raw_content']) if conv['raw_content'] else {}
+    except (TypeError, ValueError):
+        content = {}
+
+    create_time = to_es_time(conv.get('created_at'))
+    for index, msg in enumerate(content.get('messages', []) or []):
+        message_id = f"{doc_id}_{index}"
+        actions.append({
+            "_op_type": "index",
+            "_index": message_index,
+            "_id": message_id,
+            "_source": {
+                "message_id": message_id,
+                "conversation_id": doc_id,
+                "role": msg.get('role', 'unknown'),
+                "content": msg.get('content', ''),
+                "create_time": to_es_time(msg.get('timestamp')) or create_time,
+                "order_index": index,
+                "parent_message_id": f"{doc_id}_{index - 1}" if index else "",
+                "tokens": 0,
+            },
+        })
+
+    return actions
+
+
+class ChangeLogReplicator:
+    """变更日志复制器：tail change_log 并批量同步到ES"""
+
+    def __init__(self, sqlite_path: str, es_mgr,
+                 consumer: str = "elasticsearch",
+                 batch_size: int = 500,
+                 poll_interval: float = 2.0,
+                 purge: bool = True):
+        """
+        初始化复制器
+
+        Args:
+            sqlite_path: SQLite数据库路径（需已包含change_log表）
+            es_mgr: ElasticsearchManager实例（需提供bulk_write、delete_messages_from及索引名）
+            consumer: 消费者名称，用于区分不同的高水位
+            batch_size: 每批读取的最大变更条数
+            poll_interval: 无变更时的轮询间隔（秒）
+            purge: 复制成功后是否清理已消费的变更日志
+        """
+        self.sqlite_path = sqlite_path
+        self.es_mgr = es_mgr
+        self.consumer = consumer
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.purge = purge
+
+        self.conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        self.stats = {
+            'batches': 0,
+            'changes_read': 0,
+            'actions_sent': 0,
+            'errors': 0,
+            'last_batch_at': None,
+        }
+        self._register()
+
+    # ==================== 高水位 ====================
+
+    def _register(self):
+        """登记消费者，此后触发器开始写入变更日志"""
+        self.conn.execute(
+            "INSERT OR IGNORE INTO replication_state (consumer, last_seq) VALUES (?, 0)",
+            (self.consumer,)
+        )
+        self.conn.commit()
+
+    def get_high_water_mark(self) -> int:
+        """获取已复制的最大seq"""
+        row = self.conn.execute(
+            "SELECT last_seq FROM replication_state WHERE consumer = ?",
+            (self.consumer,)
+        ).fetchone()
+        return row['last_seq'] if row else 0
+
+    def _save_high_water_mark(self, seq: int):
+        """持久化高水位"""
+        self.conn.execute("""
+            INSERT INTO replication_state (consumer, last_seq, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(consumer) DO UPDATE SET
+                last_seq = excluded.last_seq,
+                updated_at = excluded.updated_at
+        """, (self.consumer, seq))
+
+    def get_lag(self) -> Dict[str, Any]:
+        """
+        获取复制延迟
+
+        Returns:
+            {'pending': 未复制变更数, 'oldest_pending_at': 最早未复制变更时间}
+        """
+        row = self.conn.execute("""
+            SELECT COUNT(*) AS pending, MIN(changed_at) AS oldest
+            FROM change_log WHERE seq > ?
+        """, (self.get_high_water_mark(),)).fetchone()
+        return {'pending': row['pending'], 'oldest_pending_at': row['oldest']}
+
+    def seed(self) -> int:
+        """
+        为现有数据补写upsert变更（首次启用复制时使用，代替全量迁移）
+
+        Returns:
+            写入的变更条数
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            INSERT INTO change_log (entity, entity_id, op, entity_key)
+            SELECT 'tag', id, 'upsert', name FROM tags
+        """)
+        count = cursor.rowcount
+        cursor.execute("""
+            INSERT INTO change_log (entity, entity_id, op, entity_key)
+            SELECT 'conversation', id, 'upsert', source_url FROM conversations
+        """)
+        count += cursor.rowcount
+        self.conn.commit()
+        logger.info(f"📋 已为现有数据写入 {count} 条变更")
+        return count
+
+    # ==================== 读取与合并 ====================
+
+    def fetch_changes(self, after_seq: int, limit: int) -> List[sqlite3.Row]:
+        """读取指定seq之后的变更"""
+        return self.conn.execute("""
+            SELECT seq, entity, entity_id, op, entity_key
+            FROM change_log
+            WHERE seq > ?
+            ORDER BY seq
+            LIMIT ?
+        """, (after_seq, limit)).fetchall()
+
+    @staticmethod
+    def coalesce(changes) -> Dict[Tuple[str, int], Dict[str, Any]]:
+        """
+        合并同一实体的多次变更
+
+        同一(entity, entity_id)只保留最后一次操作；删除时记录的业务键
+        会被保留下来，以便"删除后又出现关联变更"时仍能正确删除ES文档。
+        业务键中途变化（对话换了链接）时，旧键记入stale，其文档需要删除。
+
+        Returns:
+            {(entity, entity_id): {'op': ..., 'key': ..., 'stale': [旧键]}}，按最后出现顺序排列
+        """
+        merged: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        for change in changes:
+            ident = (change['entity'], change['entity_id'])
+            previous = merged.pop(ident, None)
+            stale = list(previous['stale']) if previous else []
+            key = change['entity_key'] or (previous['key'] if previous else None)
+            if previous and previous['key'] not in (None, key) and previous['key'] not in stale:
+                stale.append(previous['key'])
+            merged[ident] = {'op': change['op'], 'key': key, 'stale': stale}
+        return merged
+
+    # ==================== 构建bulk动作 ====================
+
+    def _load_conversations(self, ids: List[int]) -> Dict[int, Dict]:
+        """批量读取对话及其标签"""
+        if not ids:
+            return {}
+        placeholders = ','.join('?' * len(ids))
+        rows = self.conn.execute(
+            f"SELECT * FROM conversations WHERE id IN ({placeholders})", ids
+        ).fetchall()
+        conversations = {row['id']: dict(row) for row in rows}
+
+        for conv in conversations.values():
+            conv['tags'] = []
+        tag_rows = self.conn.execute(f"""
+            SELECT ct.conversation_id, t.name FROM conversation_tags ct
+            JOIN tags t ON t.id = ct.tag_id
+            WHERE ct.conversation_id IN ({placeholders})
+        """, ids).fetchall()
+        for row in tag_rows:
+            if row['conversation_id'] in conversations:
+                conversations[row['conversation_id']]['tags'].append(row['name'])
+
+        return conversations
+
+    def _load_tags(self, ids: List[int]) -> Dict[int, Dict]:
+        """批量读取标签"""
+        if not ids:
+            return {}
+        placeholders = ','.join('?' * len(ids))
+        rows = self.conn.execute(
+            f"SELECT * FROM tags WHERE id IN ({placeholders})", ids
+        ).fetchall()
+        return {row['id']: dict(row) for row in rows}
+
+    @staticmethod
+    def conversation_doc_id(source_url: str) -> str:
+        """与ElasticsearchManager.add_conversation保持一致的文档ID"""
+        return conversation_doc_id(source_url)
+
+    def build_actions(self, merged: Dict[Tuple[str, int], Dict[str, Any]]
+                      ) -> Tuple[List[Dict], Dict[str, int]]:
+        """
+        把合并后的变更转换为ES bulk动作
+
+        Returns:
+            (bulk动作, 消息截断位置{对话文档ID: 保留的消息数})；
+            截断位置交给es_mgr.delete_messages_from清理多余的旧消息文档
+        """
+        conv_ids = [i for (entity, i), c in merged.items()
+                    if entity == 'conversation' and c['op'] == 'upsert']
+        tag_ids = [i for (entity, i), c in merged.items()
+                   if entity == 'tag' and c['op'] == 'upsert']
+        conversations = self._load_conversations(conv_ids)
+        tags = self._load_tags(tag_ids)
+
+        actions = []
+        live: Dict[str, int] = {}       # 本批写入的对话: 文档ID -> 消息数
+        removed: List[str] = []         # 本批删除的对话文档ID
+        for (entity, entity_id), change in merged.items():
+            if entity == 'conversation':
+                conv = conversations.get(entity_id) if change['op'] == 'upsert' else None
+                if conv:
+                    conv_actions = build_conversation_actions(
+                        conv, self.es_mgr.conversation_index, self.es_mgr.message_index
+                    )
+                    actions.extend(conv_actions)
+                    live[conv_actions[0]['_id']] = len(conv_actions) - 1
+                stale = change['stale'] + ([change['key']] if change['key'] and not conv else [])
+                for key in stale:
+                    # 已删除、upsert时行已不存在，或换了链接后的旧文档
+                    doc_id = self.conversation_doc_id(key)
+                    actions.append({
+                        "_op_type": "delete",
+                        "_index": self.es_mgr.conversation_index,
+                        "_id": doc_id,
+                    })
+                    removed.append(doc_id)
+
+            elif entity == 'tag':
+                tag = tags.get(entity_id) if change['op'] == 'upsert' else None
+                if tag:
+                    actions.append({
+                        "_op_type": "index",
+                        "_index": self.es_mgr.tag_index,
+                        "_id": str(tag['id']),
+                        "_source": {
+                            "tag_id": str(tag['id']),
+                            "name": tag['name'],
+                            "color": tag['color'],
+                            "description": "",
+                            "create_time": to_es_time(tag.get('created_at')),
+                        },
+                    })
+                else:
+                    actions.append({
+                        "_op_type": "delete",
+                        "_index": self.es_mgr.tag_index,
+                        "_id": str(entity_id),
+                    })
+
+        # 同一链接在本批中先删后建时保留新写入的消息，只截掉多出的旧消息
+        cutoffs = dict(live)
+        for doc_id in removed:
+            cutoffs.setdefault(doc_id, 0)
+        return actions, cutoffs
+
+    # ==================== 复制 ====================
+
+    def run_once(self) -> Dict[str, Any]:
+        """
+        复制一批变更
+
+        Returns:
+            本批统计: {'changes': 读取的变更数, 'actions': 发送的动作数,
+                       'high_water_mark': 新高水位}
+        """
+        with self._lock:
+            hwm = self.get_high_water_mark()
+            changes = self.fetch_changes(hwm, self.batch_size)
+            if not changes:
+                return {'changes': 0, 'actions': 0, 'high_water_mark': hwm}
+
+            merged = self.coalesce(changes)
+            actions, cutoffs = self.build_actions(merged)
+
+            if actions:
+                success, errors = self.es_mgr.bulk_write(actions)
+                # 删除不存在的文档(404)视为成功，其余错误则不推进高水位
+                real_errors = [e for e in errors
+                               if not self._is_missing_delete(e)]
+                if real_errors:
+                    self.stats['errors'] += len(real_errors)
+                    raise RuntimeError(
+                        f"ES批量写入失败 {len(real_errors)} 条，首条: {real_errors[0]}"
+                    )
+            if cutoffs:
+                self.es_mgr.delete_messages_from(cutoffs)
+
+            new_hwm = changes[-1]['seq']
+            self._save_high_water_mark(new_hwm)
+            if self.purge:
+                self._purge_consumed()
+            self.conn.commit()
+
+            self.stats['batches'] += 1
+            self.stats['changes_read'] += len(changes)
+            self.stats['actions_sent'] += len(actions)
+            self.stats['last_batch_at'] = time.time()
+
+            logger.info(
+                f"🔄 复制批次: {len(changes)}条变更 → {len(actions)}个动作 "
+                f"(seq≤{new_hwm})"
+            )
+            return {'changes': len(changes), 'actions': len(actions),
+                    'high_water_mark': new_hwm}
+
+    @staticmethod
+    def _is_missing_delete(error: Dict) -> bool:
+        """bulk错误是否为删除不存在的文档"""
+        item = error.get('delete') if isinstance(error, dict) else None
+        return bool(item) and item.get('status') == 404
+
+    def _purge_consumed(self):
+        """清理所有消费者均已复制的变更"""
+        self.conn.execute("""
+            DELETE FROM change_log
+            WHERE seq <= (SELECT MIN(last_seq) FROM replication_state)
+        """)
+
+    def catch_up(self) -> int:
+        """
+        持续复制直到没有积压
+
+        Returns:
+            本次复制的变更总数
+        """
+        total = 0
+        while True:
+            result = self.run_once()
+            total += result['changes']
+            if result['changes'] < self.batch_size:
+                return total
+
+    def run_forever(self):
+        """阻塞运行，直到stop()被调用"""
+        logger.info(f"🚀 增量复制已启动 (consumer={self.consumer}, "
+                    f"batch={self.batch_size}, interval={self.poll_interval}s)")
+        while not self._stop_event.is_set():
+            try:
+                self.catch_up()
+            except Exception as e:
+                logger.error(f"❌ 复制失败，稍后重试: {e}")
+            self._stop_event.wait(self.poll_interval)
+        logger.info("⏹️ 增量复制已停止")
+
+    def start(self) -> threading.Thread:
+        """在后台线程中运行复制"""
+        if self._thread and self._thread.is_alive():
+            return self._thread
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self.run_forever, name="es-replicator", daemon=True
+        )
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止后台复制"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def close(self):
+        """停止复制并关闭连接"""
+        self.stop()
+        self.conn.close()
@@ -2,10 +2,11 @@
 SQLite到Elasticsearch数据迁移工具
 
 提供命令行工具用于将现有SQLite数据迁移到Elasticsearch。
-支持增量迁移、数据验证和回滚。
+支持流式并行迁移、断点续传、增量复制和数据验证。
 
 使用方法:
     python -m database.migrate_to_es --source ./data/chatcompass.db --validate
+    python -m database.migrate_to_es --source ./data/chatcompass.db --follow --seed
 
 作者: ChatCompass Team
 版本: v1.2.2
@@ -62,44 +63,37 @@ class DataMigrator:
             logger.error(f"❌ 初始化失败: {e}")
             raise
     
-    def migrate_all(self, validate: bool = True) -> Dict[str, Any]:
+    def migrate_all(self, validate: bool = True, resume: bool = True,
+                    workers: int = None, page_size: int = 500) -> Dict[str, Any]:
         """
-        执行完整数据迁移
+        执行完整数据迁移（流式、并行、可断点续传）
         
         Args:
             validate: 是否在迁移后验证数据
+            resume: 是否从上次中断的检查点继续
+            workers: 文档转换进程数（默认CPU核数）
+            page_size: 每页读取的对话数
         
         Returns:
             迁移统计信息
         """
+        from .streaming_migrator import StreamingMigrator
+        
         logger.info("=" * 60)
         logger.info("开始数据迁移: SQLite → Elasticsearch")
         logger.info("=" * 60)
         
         start_time = datetime.now()
-        stats = {
-            'start_time': start_time.isoformat(),
-            'conversations': 0,
-            'messages': 0,
-            'tags': 0,
-            'errors': []
-        }
         
         try:
-            # 1. 迁移标签
-            logger.info("\n📋 Step 1/3: 迁移标签...")
-            stats['tags'] = self._migrate_tags()
-            logger.info(f"✅ 标签迁移完成: {stats['tags']}个")
-            
-            # 2. 迁移对话
-            logger.info("\n💬 Step 2/3: 迁移对话...")
-            stats['conversations'] = self._migrate_conversations()
-            logger.info(f"✅ 对话迁移完成: {stats['conversations']}个")
-            
-            # 3. 迁移消息
-            logger.info("\n📨 Step 3/3: 迁移消息...")
-            stats['messages'] = self._migrate_messages()
-            logger.info(f"✅ 消息迁移完成: {stats['messages']}条")
+            migrator = StreamingMigrator(
+                self.sqlite_path,
+                self.es_mgr,
+                page_size=page_size,
+                workers=workers
+            )
+            stats = migrator.run(resume=resume)
+            stats['start_time'] = start_time.isoformat()
             
             # 验证数据
             if validate:
@@ -110,17 +104,13 @@ class DataMigrator:
                 if validation_result['status'] == 'success':
                     logger.info("✅ 数据验证通过")
                 else:
-                    logger.warning(f"⚠️ 数据验证警告: {validation_result['message']}")
+                    logger.warning(f"⚠️ 数据验证警告: {validation_result.get('message')}")
             
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
-            stats['end_time'] = end_time.isoformat()
-            stats['duration_seconds'] = duration
-            stats['status'] = 'success'
+            stats['end_time'] = datetime.now().isoformat()
             
             logger.info("\n" + "=" * 60)
             logger.info("✅ 数据迁移完成！")
-            logger.info(f"⏱️  总耗时: {duration:.2f}秒")
+            logger.info(f"⏱️  总耗时: {stats['duration_seconds']:.2f}秒")
             logger.info(f"📊 迁移统计:")
             logger.info(f"   - 对话: {stats['conversations']}个")
             logger.info(f"   - 消息: {stats['messages']}条")
@@ -130,140 +120,12 @@ class DataMigrator:
             return stats
             
         except Exception as e:
-            logger.error(f"❌ 迁移失败: {e}")
-            stats['status'] = 'failed'
-            stats['error'] = str(e)
-            return stats
-    
-    def _migrate_tags(self) -> int:
-        """迁移标签"""
-        try:
-            conn = sqlite3.connect(self.sqlite_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT * FROM tags")
-            tags = cursor.fetchall()
-            
-            count = 0
-            for tag in tags:
-                tag_dict = {
-                    'tag_id': tag['tag_id'],
-                    'name': tag['name'],
-                    'color': tag.get('color', '#3b82f6'),
-                    'description': tag.get('description', '')
-                }
-                
-                if self.es_mgr.save_tag(**tag_dict):
-                    count += 1
-            
-            conn.close()
-            return count
-            
-        except Exception as e:
-            logger.error(f"❌ 标签迁移失败: {e}")
-            return 0
-    
-    def _migrate_conversations(self) -> int:
-        """迁移对话"""
-        try:
-            conn = sqlite3.connect(self.sqlite_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # 获取对话及其标签
-            cursor.execute("""
-                SELECT c.*, GROUP_CONCAT(ct.tag_id) as tag_ids
-                FROM conversations c
-                LEFT JOIN conversation_tags ct ON c.conversation_id = ct.conversation_id
-                GROUP BY c.conversation_id
-            """)
-            conversations = cursor.fetchall()
-            
-            count = 0
-            for conv in conversations:
-                conv_dict = {
-                    'conversation_id': conv['conversation_id'],
-                    'title': conv['title'],
-                    'platform': conv['platform'],
-                    'create_time': conv['create_time'],
-                    'message_count': conv.get('message_count', 0),
-                    'total_tokens': conv.get('total_tokens', 0),
-                    'model': conv.get('model', ''),
-                    'summary': conv.get('summary', ''),
-                    'category': conv.get('category', ''),
-                    'tags': conv['tag_ids'].split(',') if conv['tag_ids'] else []
-                }
-                
-                if self.es_mgr.save_conversation(**conv_dict):
-                    count += 1
-                    
-                    if count % 100 == 0:
-                        logger.info(f"   已迁移: {count}个对话...")
-            
-            conn.close()
-            return count
-            
-        except Exception as e:
-            logger.error(f"❌ 对话迁移失败: {e}")
-            return 0
-    
-    def _migrate_messages(self) -> int:
-        """迁移消息（批量）"""
-        try:
-            conn = sqlite3.connect(self.sqlite_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute("SELECT COUNT(*) as total FROM messages")
-            total = cursor.fetchone()['total']
-            logger.info(f"   总消息数: {total}条")
-            
-            # 分批迁移，每批1000条
-            batch_size = 1000
-            offset = 0
-            total_migrated = 0
-            
-            while True:
-                cursor.execute(f"""
-                    SELECT * FROM messages
-                    ORDER BY conversation_id, order_index
-                    LIMIT {batch_size} OFFSET {offset}
-                """)
-                messages = cursor.fetchall()
-                
-                if not messages:
-                    break
-                
-                # 准备批量数据
-                batch_data = []
-                for msg in messages:
-                    msg_dict = {
-                        'message_id': msg['message_id'],
-                        'conversation_id': msg['conversation_id'],
-                        'role': msg['role'],
-                        'content': msg['content'],
-                        'create_time': msg['create_time'],
-                        'order_index': msg.get('order_index', 0),
-                        'parent_message_id': msg.get('parent_message_id', ''),
-                        'tokens': msg.get('tokens', 0)
-                    }
-                    batch_data.append(msg_dict)
-                
-                # 批量保存
-                migrated = self.es_mgr.bulk_save_messages(batch_data)
-                total_migrated += migrated
-                
-                logger.info(f"   进度: {total_migrated}/{total} ({total_migrated*100//total}%)")
-                
-                offset += batch_size
-            
-            conn.close()
-            return total_migrated
-            
-        except Exception as e:
-            logger.error(f"❌ 消息迁移失败: {e}")
-            return 0
+            logger.error(f"❌ 迁移失败（可重新运行以从检查点继续）: {e}")
+            return {
+                'start_time': start_time.isoformat(),
+                'status': 'failed',
+                'error': str(e)
+            }
     
     def validate_migration(self) -> Dict[str, Any]:
         """验证迁移数据的完整性"""
@@ -275,7 +137,8 @@ class DataMigrator:
             cursor.execute("SELECT COUNT(*) FROM conversations")
             sqlite_conv_count = cursor.fetchone()[0]
             
-            cursor.execute("SELECT COUNT(*) FROM messages")
+            # 消息存储在raw_content中，迁移时按message_count展开
+            cursor.execute("SELECT COALESCE(SUM(message_count), 0) FROM conversations")
             sqlite_msg_count = cursor.fetchone()[0]
             
             cursor.execute("SELECT COUNT(*) FROM tags")
@@ -386,6 +249,54 @@ class DataMigrator:
             logger.error(f"❌ 增量迁移失败: {e}")
             return {'status': 'error', 'error': str(e)}
 
+    def replicate(self, follow: bool = False, seed: bool = False,
+                  batch_size: int = 500, poll_interval: float = 2.0) -> Dict[str, Any]:
+        """
+        基于变更日志的增量复制（推荐，替代基于时间戳的incremental_migrate）
+
+        删除、标签变更都会通过change_log触发器记录并同步。
+
+        Args:
+            follow: 是否持续运行（Ctrl+C退出），否则追平积压后返回
+            seed: 是否先为现有数据写入upsert变更（首次启用时使用）
+            batch_size: 每批变更条数
+            poll_interval: 持续模式下的轮询间隔（秒）
+        """
+        from .es_replicator import ChangeLogReplicator
+        
+        replicator = ChangeLogReplicator(
+            self.sqlite_path,
+            self.es_mgr,
+            batch_size=batch_size,
+            poll_interval=poll_interval
+        )
+        
+        try:
+            if seed:
+                replicator.seed()
+            
+            if follow:
+                try:
+                    replicator.run_forever()
+                except KeyboardInterrupt:
+                    logger.info("\n⏹️ 收到中断信号，停止复制")
+            else:
+                total = replicator.catch_up()
+                logger.info(f"✅ 增量复制完成: {total}条变更")
+            
+            return {
+                'status': 'success',
+                'high_water_mark': replicator.get_high_water_mark(),
+                **replicator.stats
+            }
+        
+        except Exception as e:
+            logger.error(f"❌ 增量复制失败: {e}")
+            return {'status': 'error', 'error': str(e)}
+        
+        finally:
+            replicator.close()
+
 
 def main():
     """命令行入口"""
@@ -433,6 +344,44 @@ def main():
         help='增量迁移: 仅迁移此时间后的数据 (ISO格式: 2024-01-01T00:00:00)'
     )
     
+    parser.add_argument(
+        '--replicate',
+        action='store_true',
+        help='基于变更日志增量复制（包含删除和标签变更）'
+    )
+    
+    parser.add_argument(
+        '--follow',
+        action='store_true',
+        help='持续复制，使ES与SQLite保持秒级同步（隐含--replicate）'
+    )
+    
+    parser.add_argument(
+        '--seed',
+        action='store_true',
+        help='复制前为现有数据写入变更记录（首次启用复制时使用）'
+    )
+    
+    parser.add_argument(
+        '--restart',
+        action='store_true',
+        help='忽略检查点，从头开始全量迁移'
+    )
+    
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='文档转换进程数 (默认: CPU核数)'
+    )
+    
+    parser.add_argument(
+        '--page-size',
+        type=int,
+        default=500,
+        help='每页读取的对话数 (默认: 500)'
+    )
+    
     args = parser.parse_args()
     
     try:
@@ -445,10 +394,17 @@ def main():
         )
         
         # 执行迁移
-        if args.incremental:
+        if args.replicate or args.follow:
+            result = migrator.replicate(follow=args.follow, seed=args.seed)
+        elif args.incremental:
             result = migrator.incremental_migrate(args.incremental)
         else:
-            result = migrator.migrate_all(validate=args.validate)
+            result = migrator.migrate_all(
+                validate=args.validate,
+                resume=not args.restart,
+                workers=args.workers,
+                page_size=args.page_size
+            )
         
         # 输出结果
         if result['status'] == 'success':
@@ -0,0 +1,259 @@
+"""
+近似重复对话检测
+
+同一段对话经常通过不同的分享链接到达（chat.openai.com / chatgpt.com、重复分享），
+source_url 唯一约束拦不住。入库时计算内容签名，在SQLite中维护LSH分桶索引：
+1. MinHash：消息内容规范化后取字符 n-gram，num_perm 个哈希函数的最小值；
+   两条签名相同位置相等的比例即 Jaccard 相似度的估计
+2. LSH：签名切成 bands 段，每段哈希成一个桶，任一段同桶即为候选，
+   只对候选估计相似度，不扫描全表
+3. SimHash：64位指纹，与候选一起返回海明距离，便于人工核对
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import hashlib
+import json
+import random
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_PRIME = (1 << 32) + 15   # 大于 2^32 的最小素数
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+@dataclass
+class ContentSignature:
+    """对话内容签名"""
+    minhash: np.ndarray    # num_perm 个 uint32
+    simhash: int           # 64位（有符号，便于存入SQLite INTEGER）
+    shingles: int          # 不同 n-gram 数
+
+
+@dataclass
+class DuplicateMatch:
+    """候选重复对话"""
+    conversation_id: int
+    similarity: float      # MinHash估计的Jaccard相似度
+    hamming: int           # SimHash海明距离
+
+
+def normalize_text(raw_content) -> str:
+    """
+    提取消息内容并规范化：全半角统一、小写、去掉空白和标点
+
+    分享页之间的排版差异（Markdown符号、换行）不影响签名。
+    """
+    if isinstance(raw_content, str):
+        try:
+            raw_content = json.loads(raw_content)
+        except json.JSONDecodeError:
+            return _NON_WORD.sub('', unicodedata.normalize('NFKC', raw_content).lower())
+    messages = raw_content.get('messages', []) if isinstance(raw_content, dict) else []
+    text = "\n".join(str(m.get('content') or '') for m in messages)
+    return _NON_WORD.sub('', unicodedata.normalize('NFKC', text).lower())
+
+
+def _hash(data: bytes, size: int) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=size).digest(), 'little')
+
+
+def _signed64(value: int) -> int:
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class NearDuplicateIndex:
+    """MinHash签名 + LSH分桶索引（表 content_signatures / lsh_bands）"""
+
+    def __init__(self, conn, num_perm: int = 128, bands: int = 16,
+                 threshold: float = 0.8, shingle_size: int = 5,
+                 min_chars: int = 50, max_chars: int = 50000):
+        """
+        初始化索引
+
+        Args:
+            conn: SQLite连接
+            num_perm: MinHash哈希函数个数
+            bands: LSH段数（每段 num_perm // bands 行）；16x8 时 Jaccard 0.8 的召回约95%
+            threshold: 判定为重复的Jaccard相似度
+            shingle_size: 字符 n-gram 长度
+            min_chars: 规范化后短于该长度的对话不参与检测（过短的内容误判率高）
+            max_chars: 参与签名的最大字符数
+        """
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) 必须是 bands ({bands}) 的整数倍")
+        self.conn = conn
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+
+        # 固定种子，签名在不同进程之间可比
+        rng = random.Random(1)
+        self._a = np.array([rng.randrange(1, (1 << 32) - 1) for _ in range(num_perm)], dtype=np.uint64)
+        self._b = np.array([rng.randrange(0, 1 << 32) for _ in range(num_perm)], dtype=np.uint64)
+
+    # ==================== 签名 ====================
+
+    def signature(self, raw_content) -> Optional[ContentSignature]:
+        """计算对话内容签名；内容过短时返回None"""
+        text = normalize_text(raw_content)[:self.max_chars]
+        if len(text) < self.min_chars:
+            return None
+
+        k = self.shingle_size
+        shingles = {text[i:i + k] for i in range(len(text) - k + 1)}
+        encoded = [s.encode('utf-8') for s in shingles]
+        hashes = np.array([_hash(s, 4) for s in encoded], dtype=np.uint64)
+
+        # (a*h + b) mod p：a、b、h 均小于 2^32，uint64 不溢出
+        minhash = np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        for start in range(0, len(hashes), 2048):
+            chunk = hashes[start:start + 2048, None]
+            values = (chunk * self._a + self._b) % _PRIME
+            np.minimum(minhash, values.min(axis=0), out=minhash)
+
+        return ContentSignature(minhash=(minhash & 0xFFFFFFFF).astype(np.uint32),
+                                simhash=self._simhash(encoded), shingles=len(shingles))
+
+    @staticmethod
+    def _simhash(features: List[bytes]) -> int:
+        fingerprints = np.array([_hash(f, 8) for f in features], dtype=np.uint64)
+        bits = np.unpackbits(fingerprints.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')
+        weights = bits.sum(axis=0, dtype=np.int64) * 2 - len(features)
+        value = sum(1 << i for i in range(64) if weights[i] > 0)
+        return _signed64(value)
+
+    def _buckets(self, minhash: np.ndarray) -> List[int]:
+        """每段签名（连同段号）哈希成一个桶"""
+        return [_signed64(_hash(band.to_bytes(2, 'little') +
+                                minhash[band * self.rows:(band + 1) * self.rows].tobytes(), 8))
+                for band in range(self.bands)]
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """MinHash估计的Jaccard相似度"""
+        return float(np.mean(a == b))
+
+    @staticmethod
+    def hamming(a: int, b: int) -> int:
+        return bin((a ^ b) & ((1 << 64) - 1)).count('1')
+
+    # ==================== 索引 ====================
+
+    def add(self, conversation_id: int, signature: ContentSignature):
+        """写入签名和分桶（由调用方提交事务）"""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO content_signatures (conversation_id, minhash, simhash, shingles) "
+            "VALUES (?, ?, ?, ?)",
+            (conversation_id, signature.minhash.tobytes(), signature.simhash, signature.shingles)
+        )
+        self.conn.execute("DELETE FROM lsh_bands WHERE conversation_id = ?", (conversation_id,))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO lsh_bands (bucket, conversation_id) VALUES (?, ?)",
+            [(bucket, conversation_id) for bucket in self._buckets(signature.minhash)]
+        )
+
+    def find(self, signature: ContentSignature, exclude_id: Optional[int] = None,
+             limit: int = 5) -> List[DuplicateMatch]:
+        """
+        查找与签名近似重复的已入库对话
+
+        Returns:
+            相似度不低于阈值的对话，按相似度降序
+        """
+        buckets = self._buckets(signature.minhash)
+        candidates = [row[0] for row in self.conn.execute(
+            f"SELECT DISTINCT conversation_id FROM lsh_bands WHERE bucket IN ({','.join('?' * len(buckets))})",
+            buckets
+        ) if row[0] != exclude_id]
+
+        matches = []
+        for conversation_id, minhash, simhash in self._load(candidates):
+            score = self.similarity(signature.minhash, minhash)
+            if score >= self.threshold:
+                matches.append(DuplicateMatch(conversation_id, score,
+                                              self.hamming(signature.simhash, simhash)))
+        matches.sort(key=lambda m: (-m.similarity, m.conversation_id))
+        return matches[:limit]
+
+    def _load(self, conversation_ids: List[int]) -> Iterable[Tuple[int, np.ndarray, int]]:
+        for start in range(0, len(conversation_ids), 500):
+            chunk = conversation_ids[start:start + 500]
+            for row in self.conn.execute(
+                f"SELECT conversation_id, minhash, simhash FROM content_signatures "
+                f"WHERE conversation_id IN ({','.join('?' * len(chunk))})", chunk
+            ):
+                yield row[0], np.frombuffer(row[1], dtype=np.uint32), row[2]
+
+    def index_missing(self, batch_size: int = 200) -> int:
+        """为尚无签名的对话补齐签名（内容过短的对话跳过），返回写入的签名数"""
+        indexed = 0
+        rows = self.conn.execute("""
+            SELECT c.id, c.raw_content FROM conversations c
+            LEFT JOIN content_signatures s ON s.conversation_id = c.id
+            WHERE s.conversation_id IS NULL ORDER BY c.id
+        """).fetchall()
+        for start in range(0, len(rows), batch_size):
+            with self.conn:
+                for conversation_id, raw_content in rows[start:start + batch_size]:
+                    signature = self.signature(raw_content)
+                    if signature is not None:
+                        self.add(conversation_id, signature)
+                        indexed += 1
+        return indexed
+
+    # ==================== 批量查重 ====================
+
+    def find_duplicates(self) -> List[Dict[str, Any]]:
+        """
+        在已入库的对话中查找重复组
+
+        同桶的对话两两估计相似度，重复的对话归到组内ID最小（最早入库）的对话。
+
+        Returns:
+            [{'id', 'original_id', 'similarity', 'hamming'}]，按ID排序
+        """
+        pairs = set()
+        for (members,) in self.conn.execute(
+            "SELECT GROUP_CONCAT(conversation_id) FROM lsh_bands GROUP BY bucket HAVING COUNT(*) > 1"
+        ):
+            ids = sorted(int(i) for i in members.split(','))
+            pairs.update((a, b) for i, a in enumerate(ids) for b in ids[i + 1:])
+        if not pairs:
+            return []
+
+        signatures = {cid: (minhash, simhash) for cid, minhash, simhash
+                      in self._load(sorted({cid for pair in pairs for cid in pair}))}
+
+        # 并查集：根为组内最小ID
+        parent: Dict[int, int] = {}
+
+        def root(cid: int) -> int:
+            while parent.get(cid, cid) != cid:
+                cid = parent[cid]
+            return cid
+
+        best: Dict[int, Tuple[float, int]] = {}   # 每条对话最相似的一对（相似度, 海明距离）
+        for a, b in sorted(pairs, key=lambda pair: (pair[1], pair[0])):
+            score = self.similarity(signatures[a][0], signatures[b][0])
+            if score < self.threshold:
+                continue
+            ra, rb = root(a), root(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+            hamming = self.hamming(signatures[a][1], signatures[b][1])
+            for cid in (a, b):
+                if score > best.get(cid, (0.0, 0))[0]:
+                    best[cid] = (score, hamming)
+
+        return [{'id': cid, 'original_id': root(cid), 'similarity': best[cid][0], 'hamming': best[cid][1]}
+                for cid in sorted(best) if root(cid) != cid]
@@ -16,7 +16,9 @@ CREATE TABLE IF NOT EXISTS conversations (
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP, -- 创建时间
     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP, -- 更新时间
     is_favorite INTEGER DEFAULT 0,                 -- 是否收藏
-    notes TEXT                                     -- 用户备注
+    notes TEXT,                                    -- 用户备注
+    analysis_confidence REAL,                      -- AI分析置信度（NULL表示尚未分析）
+    duplicate_of INTEGER                           -- 近似重复时指向最早入库的对话（NULL表示不是重复）
 );
 
 -- 2. 标签表
@@ -58,16 +60,20 @@ CREATE TRIGGER IF NOT EXISTS conversations_ai AFTER INSERT ON conversations BEGI
     VALUES (new.id, new.title, new.summary, new.raw_content);
 END;
 
--- 更新时同步到FTS表
-CREATE TRIGGER IF NOT EXISTS conversations_au AFTER UPDATE ON conversations BEGIN
-    DELETE FROM conversations_fts WHERE rowid = old.id;
+-- 更新时同步到FTS表（外部内容表必须用'delete'命令并传入旧值删除索引；
+-- 只监听被索引的列，避免更新时间戳的触发器再次同步）
+CREATE TRIGGER IF NOT EXISTS conversations_au
+AFTER UPDATE OF title, summary, raw_content ON conversations BEGIN
+    INSERT INTO conversations_fts(conversations_fts, rowid, title, summary, raw_content)
+    VALUES ('delete', old.id, old.title, old.summary, old.raw_content);
     INSERT INTO conversations_fts(rowid, title, summary, raw_content)
     VALUES (new.id, new.title, new.summary, new.raw_content);
 END;
 
 -- 删除时同步到FTS表
 CREATE TRIGGER IF NOT EXISTS conversations_ad AFTER DELETE ON conversations BEGIN
-    DELETE FROM conversations_fts WHERE rowid = old.id;
+    INSERT INTO conversations_fts(conversations_fts, rowid, title, summary, raw_content)
+    VALUES ('delete', old.id, old.title, old.summary, old.raw_content);
 END;
 
 -- 更新updated_at时间戳
@@ -78,6 +84,192 @@ BEGIN
     UPDATE conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id;
 END;
 
+-- ============================================
+-- 变更日志（Outbox）：供增量复制到Elasticsearch使用
+-- ============================================
+
+-- 5. 变更日志表：记录conversations/tags/conversation_tags上的每次变更
+--    只有登记了复制消费者（replication_state非空）时触发器才写入，未启用复制的安装不会积压日志
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,         -- 单调递增序号（复制位点）
+    entity TEXT NOT NULL,                          -- 实体类型: conversation / tag
+    entity_id INTEGER NOT NULL,                    -- 实体ID
+    op TEXT NOT NULL,                              -- 操作: upsert / delete
+    entity_key TEXT,                               -- 删除时保留的业务键(source_url / 标签名)
+    changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 6. 复制状态表：每个消费者持久化自己的高水位
+CREATE TABLE IF NOT EXISTS replication_state (
+    consumer TEXT PRIMARY KEY,                     -- 消费者名称，如 elasticsearch
+    last_seq INTEGER NOT NULL DEFAULT 0,           -- 已成功复制的最大seq
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 对话新增
+CREATE TRIGGER IF NOT EXISTS conversations_cl_ai AFTER INSERT ON conversations
+WHEN EXISTS (SELECT 1 FROM replication_state) BEGIN
+    INSERT INTO change_log(entity, entity_id, op, entity_key)
+    VALUES ('conversation', new.id, 'upsert', new.source_url);
+END;
+
+-- 对话更新（不监听updated_at，避免时间戳触发器造成重复记录）
+CREATE TRIGGER IF NOT EXISTS conversations_cl_au
+AFTER UPDATE OF source_url, platform, title, raw_content, summary, category,
+                word_count, message_count, is_favorite, notes
+ON conversations
+WHEN EXISTS (SELECT 1 FROM replication_state) BEGIN
+    -- 链接变化后文档ID随之变化，先记录旧链接的删除
+    INSERT INTO change_log(entity, entity_id, op, entity_key)
+    SELECT 'conversation', old.id, 'delete', old.source_url
+    WHERE old.source_url != new.source_url;
+    INSERT INTO change_log(entity, entity_id, op, entity_key)
+    VALUES ('conversation', new.id, 'upsert', new.source_url);
+END;
+
+-- 对话删除
+CREATE TRIGGER IF NOT EXISTS conversations_cl_ad AFTER DELETE ON conversations
+WHEN EXISTS (SELECT 1 FROM replication_state) BEGIN
+    INSERT INTO change_log(entity, entity_id, op, entity_key)
+    VALUES ('conversation', old.id, 'delete', old.source_url);
+END;
+
+-- 标签新增
+CREATE TRIGGER IF NOT EXISTS tags_cl_ai AFTER INSERT ON tags
+WHEN EXISTS (SELECT 1 FROM replication_state) BEGIN
+    INSERT INTO change_log(entity, entity_id, op, entity_key)
+    VALUES ('tag', new.id, 'upsert', new.name);
+END;
+
+-- 标签改名/改色（usage_count的频繁变化不需要复制）
+CREATE TRIGGER IF NOT EXISTS tags_cl_au AFTER UPDATE OF name, color ON tags
+WHEN EXISTS (SELECT 1 FROM replication_state) BEGIN
+    INSERT INTO change_log(entity, entity_id, op, entity_key)
+    VALUES ('tag', new.id, 'upsert', new.name);
+    -- 改名后需要刷新引用该标签的对话
+    INSERT INTO change_log(entity, entity_id, op, entity_key)
+    SELECT 'conversation', ct.conversation_id, 'upsert', NULL
+    FROM conversation_tags ct WHERE ct.tag_id = new.id;
+END;
+
+-- 标签删除
+CREATE TRIGGER IF NOT EXISTS tags_cl_ad AFTER DELETE ON tags
+WHEN EXISTS (SELECT 1 FROM replication_state) BEGIN
+    INSERT INTO change_log(entity, entity_id, op, entity_key)
+    VALUES ('tag', old.id, 'delete', old.name);
+    INSERT INTO change_log(entity, entity_id, op, entity_key)
+    SELECT 'conversation', ct.conversation_id, 'upsert', NULL
+    FROM conversation_tags ct WHERE ct.tag_id = old.id;
+END;
+
+-- 对话-标签关联变化 => 对话文档需要更新tags字段
+CREATE TRIGGER IF NOT EXISTS conversation_tags_cl_ai AFTER INSERT ON conversation_tags
+WHEN EXISTS (SELECT 1 FROM replication_state) BEGIN
+    INSERT INTO change_log(entity, entity_id, op, entity_key)
+    VALUES ('conversation', new.conversation_id, 'upsert', NULL);
+END;
+
+CREATE TRIGGER IF NOT EXISTS conversation_tags_cl_ad AFTER DELETE ON conversation_tags
+WHEN EXISTS (SELECT 1 FROM replication_state) BEGIN
+    INSERT INTO change_log(entity, entity_id, op, entity_key)
+    VALUES ('conversation', old.conversation_id, 'upsert', NULL);
+END;
+
+-- ============================================
+-- 对话向量与相关对话（由 ai/embeddings.py 增量维护）
+-- ============================================
+
+-- 7. 向量缓存：按内容哈希缓存，内容不变时不重复计算
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    content_hash TEXT NOT NULL,                    -- 编码文本的blake2b哈希
+    encoder TEXT NOT NULL,                         -- 编码器标识，如 hashing-512 / ollama:nomic-embed-text
+    dim INTEGER NOT NULL,                          -- 向量维度
+    vector BLOB NOT NULL,                          -- 归一化后的float32向量
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (content_hash, encoder)
+);
+
+-- 8. 对话向量：对话 => 向量缓存
+CREATE TABLE IF NOT EXISTS conversation_embeddings (
+    conversation_id INTEGER PRIMARY KEY,
+    encoder TEXT NOT NULL,
+    content_hash TEXT NOT NULL
+);
+
+-- 9. 消息向量（可选）：对话中每条消息 => 向量缓存
+CREATE TABLE IF NOT EXISTS message_embeddings (
+    conversation_id INTEGER NOT NULL,
+    message_index INTEGER NOT NULL,
+    encoder TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, message_index)
+);
+
+-- 10. 相关对话：预先计算的top-k，按主键直接读取
+CREATE TABLE IF NOT EXISTS related_conversations (
+    conversation_id INTEGER NOT NULL,
+    rank INTEGER NOT NULL,                         -- 1为最相似
+    related_id INTEGER NOT NULL,
+    score REAL NOT NULL,                           -- 余弦相似度
+    PRIMARY KEY (conversation_id, rank)
+) WITHOUT ROWID;
+
+-- 内容变化 => 丢弃向量和相关列表，并从其他对话的列表中移除（旧相似度已失效），
+-- 下次更新时重新计算（列表不足k条的对话会被完整重算）
+CREATE TRIGGER IF NOT EXISTS conversations_emb_au
+AFTER UPDATE OF title, raw_content ON conversations BEGIN
+    DELETE FROM conversation_embeddings WHERE conversation_id = new.id;
+    DELETE FROM message_embeddings WHERE conversation_id = new.id;
+    DELETE FROM related_conversations WHERE conversation_id = new.id OR related_id = new.id;
+END;
+
+-- 删除对话 => 同时从其他对话的相关列表中移除
+CREATE TRIGGER IF NOT EXISTS conversations_emb_ad AFTER DELETE ON conversations BEGIN
+    DELETE FROM conversation_embeddings WHERE conversation_id = old.id;
+    DELETE FROM message_embeddings WHERE conversation_id = old.id;
+    DELETE FROM related_conversations WHERE conversation_id = old.id OR related_id = old.id;
+END;
+
+-- ============================================
+-- 近似重复检测（由 database/near_duplicates.py 维护）
+-- ============================================
+
+-- 11. 内容签名
+CREATE TABLE IF NOT EXISTS content_signatures (
+    conversation_id INTEGER PRIMARY KEY,
+    minhash BLOB NOT NULL,                         -- MinHash签名（uint32数组）
+    simhash INTEGER NOT NULL,                      -- 64位SimHash指纹
+    shingles INTEGER NOT NULL                      -- 不同n-gram数
+);
+
+-- 12. LSH分桶：签名每段一个桶，同桶的对话为重复候选
+CREATE TABLE IF NOT EXISTS lsh_bands (
+    bucket INTEGER NOT NULL,                       -- 段号和该段签名的哈希
+    conversation_id INTEGER NOT NULL,
+    PRIMARY KEY (bucket, conversation_id)
+) WITHOUT ROWID;
+
+-- 13. 合并后的别名链接：重复对话的分享链接指向保留的对话
+CREATE TABLE IF NOT EXISTS conversation_aliases (
+    source_url TEXT PRIMARY KEY,
+    conversation_id INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 内容变化 => 丢弃签名（批量查重时重新计算）
+CREATE TRIGGER IF NOT EXISTS conversations_sig_au
+AFTER UPDATE OF raw_content ON conversations BEGIN
+    DELETE FROM content_signatures WHERE conversation_id = new.id;
+    DELETE FROM lsh_bands WHERE conversation_id = new.id;
+END;
+
+-- 删除对话 => 删除签名和别名
+CREATE TRIGGER IF NOT EXISTS conversations_sig_ad AFTER DELETE ON conversations BEGIN
+    DELETE FROM content_signatures WHERE conversation_id = old.id;
+    DELETE FROM lsh_bands WHERE conversation_id = old.id;
+    DELETE FROM conversation_aliases WHERE conversation_id = old.id;
+END;
+
 -- ============================================
 -- 索引优化
 -- ============================================
@@ -100,6 +292,20 @@ CREATE INDEX IF NOT EXISTS idx_tags_name ON tags(name);
 -- 标签使用次数索引
 CREATE INDEX IF NOT EXISTS idx_tags_usage_count ON tags(usage_count DESC);
 
+-- 待分析对话索引（analysis_confidence 列由 DatabaseManager 迁移时补齐，
+-- 其索引 idx_conversations_analysis 也在迁移中创建，兼容旧数据库）
+
+-- 关联表按标签反查（标签改名时刷新对话）
+CREATE INDEX IF NOT EXISTS idx_conversation_tags_tag_id ON conversation_tags(tag_id);
+
+-- 相关列表按被引用对话反查（删除对话时清理）
+CREATE INDEX IF NOT EXISTS idx_related_conversations_related_id ON related_conversations(related_id);
+
+-- 签名按对话删除分桶
+CREATE INDEX IF NOT EXISTS idx_lsh_bands_conversation_id ON lsh_bands(conversation_id);
+
+-- 重复标记（duplicate_of 列的索引和维护触发器在迁移中创建，兼容旧数据库）
+
 -- ============================================
 -- 初始化数据
 -- ============================================
@@ -0,0 +1,312 @@
+"""
+流式并行迁移引擎: SQLite → Elasticsearch
+
+相比逐条保存的旧实现：
+1. 只读连接 + 键集分页（WHERE id > ? ORDER BY id LIMIT ?），避免OFFSET的O(n²)扫描
+2. 进程池并行解析raw_content并生成对话/消息文档
+3. helpers.parallel_bulk多线程写入ES
+4. 每页完成后写检查点，中断后从上次位置继续
+5. 实时输出 docs/sec 和预计剩余时间
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from elasticsearch import helpers
+
+from .es_replicator import build_conversation_actions, to_es_time
+
+logger = logging.getLogger(__name__)
+
+
+def _build_actions_for_page(args) -> List[Dict[str, Any]]:
+    """进程池入口：处理一组对话"""
+    rows, conversation_index, message_index = args
+    actions = []
+    for row in rows:
+        actions.extend(build_conversation_actions(row, conversation_index, message_index))
+    return actions
+
+
+class StreamingMigrator:
+    """流式、并行、可断点续传的迁移引擎"""
+
+    def __init__(self, sqlite_path: str, es_mgr,
+                 page_size: int = 500,
+                 workers: Optional[int] = None,
+                 bulk_threads: int = 4,
+                 bulk_chunk_size: int = 1000,
+                 checkpoint_path: Optional[str] = None,
+                 progress_interval: float = 2.0):
+        """
+        初始化迁移引擎
+
+        Args:
+            sqlite_path: SQLite数据库路径
+            es_mgr: ElasticsearchManager实例（使用其es客户端和索引名）
+            page_size: 每页读取的对话数
+            workers: 文档转换进程数（默认CPU核数，1表示在当前进程中转换）
+            bulk_threads: parallel_bulk线程数
+            bulk_chunk_size: 每个bulk请求的文档数
+            checkpoint_path: 检查点文件路径（默认 <sqlite_path>.es-migrate.json）
+            progress_interval: 进度输出间隔（秒）
+        """
+        self.sqlite_path = sqlite_path
+        self.es_mgr = es_mgr
+        self.page_size = page_size
+        self.workers = workers or os.cpu_count() or 1
+        self.bulk_threads = bulk_threads
+        self.bulk_chunk_size = bulk_chunk_size
+        self.checkpoint_path = Path(checkpoint_path or f"{sqlite_path}.es-migrate.json")
+        self.progress_interval = progress_interval
+
+    # ==================== 检查点 ====================
+
+    def load_checkpoint(self) -> Dict[str, Any]:
+        """读取检查点，不存在时返回初始状态"""
+        if self.checkpoint_path.exists():
+            try:
+                with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ 检查点损坏，将重新开始: {e}")
+        return {'last_id': 0, 'conversations': 0, 'messages': 0}
+
+    def _save_checkpoint(self, state: Dict[str, Any]):
+        """原子写入检查点"""
+        tmp_path = self.checkpoint_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def clear_checkpoint(self):
+        """删除检查点（重新开始全量迁移）"""
+        if self.checkpoint_path.exists():
+            self.checkpoint_path.unlink()
+
+    # ==================== 读取 ====================
+
+    def _connect_readonly(self) -> sqlite3.Connection:
+        """打开只读连接，迁移过程中不会持有写锁"""
+        uri = f"{Path(self.sqlite_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def iter_pages(self, conn: sqlite3.Connection, after_id: int) -> Iterator[List[Dict]]:
+        """键集分页读取对话（附带标签名称）"""
+        last_id = after_id
+        while True:
+            rows = conn.execute("""
+                SELECT id, source_url, platform, title, raw_content, summary,
+                       category, message_count, created_at, updated_at
+                FROM conversations
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, self.page_size)).fetchall()
+            if not rows:
+                return
+
+            page = [dict(row) for row in rows]
+            by_id = {conv['id']: conv for conv in page}
+            for conv in page:
+                conv['tags'] = []
+            tag_rows = conn.execute("""
+                SELECT ct.conversation_id, t.name FROM conversation_tags ct
+                JOIN tags t ON t.id = ct.tag_id
+                WHERE ct.conversation_id BETWEEN ? AND ?
+            """, (page[0]['id'], page[-1]['id'])).fetchall()
+            for row in tag_rows:
+                if row['conversation_id'] in by_id:
+                    by_id[row['conversation_id']]['tags'].append(row['name'])
+
+            yield page
+            last_id = page[-1]['id']
+
+    def count_remaining(self, conn: sqlite3.Connection, after_id: int) -> Dict[str, int]:
+        """统计剩余待迁移的对话数和消息数（用于ETA）"""
+        row = conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(message_count), 0)
+            FROM conversations WHERE id > ?
+        """, (after_id,)).fetchone()
+        return {'conversations': row[0], 'messages': row[1]}
+
+    # ==================== 写入 ====================
+
+    def _index(self, actions: List[Dict[str, Any]]) -> int:
+        """并行bulk写入，返回成功数；任一失败则抛出异常"""
+        success = 0
+        for ok, item in helpers.parallel_bulk(
+            self.es_mgr.es,
+            actions,
+            thread_count=self.bulk_threads,
+            chunk_size=self.bulk_chunk_size,
+            raise_on_error=False,
+        ):
+            if not ok:
+                raise RuntimeError(f"ES写入失败: {item}")
+            success += 1
+        return success
+
+    def migrate_tags(self, conn: sqlite3.Connection) -> int:
+        """标签数量很少，单次bulk即可"""
+        actions = [{
+            "_index": self.es_mgr.tag_index,
+            "_id": str(row['id']),
+            "_source": {
+                "tag_id": str(row['id']),
+                "name": row['name'],
+                "color": row['color'],
+                "description": "",
+                "create_time": to_es_time(row['created_at']),
+            },
+        } for row in conn.execute("SELECT id, name, color, created_at FROM tags")]
+        return self._index(actions) if actions else 0
+
+    # ==================== 主流程 ====================
+
+    def run(self, resume: bool = True,
+            progress_callback: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        执行迁移
+
+        Args:
+            resume: 是否从检查点继续（False则从头开始）
+            progress_callback: 进度回调，参数为进度字典
+
+        Returns:
+            迁移统计
+        """
+        if not resume:
+            self.clear_checkpoint()
+        state = self.load_checkpoint()
+        if state['last_id']:
+            logger.info(f"⏩ 从检查点继续: id > {state['last_id']} "
+                        f"(已完成 {state['conversations']} 个对话)")
+
+        conn = self._connect_readonly()
+        executor: Optional[Executor] = None
+        try:
+            remaining = self.count_remaining(conn, state['last_id'])
+            total_docs = remaining['conversations'] + remaining['messages']
+            logger.info(f"📊 待迁移: {remaining['conversations']}个对话, "
+                        f"{remaining['messages']}条消息")
+
+            tags = self.migrate_tags(conn)
+
+            if self.workers > 1:
+                executor = ProcessPoolExecutor(max_workers=self.workers)
+
+            start = time.perf_counter()
+            last_report = start
+            docs_done = 0
+            pending = None  # 预取的下一页转换任务（与写入重叠）
+
+            pages = self.iter_pages(conn, state['last_id'])
+            page = next(pages, None)
+            if page is not None:
+                pending = self._submit(executor, page)
+
+            while page is not None:
+                actions = pending.result() if executor else pending
+                next_page = next(pages, None)
+                pending = self._submit(executor, next_page) if next_page is not None else None
+
+                docs_done += self._index(actions)
+
+                state['last_id'] = page[-1]['id']
+                state['conversations'] += len(page)
+                state['messages'] += len(actions) - len(page)
+                self._save_checkpoint(state)
+
+                now = time.perf_counter()
+                if now - last_report >= self.progress_interval or next_page is None:
+                    progress = self._progress(docs_done, total_docs, now - start, state)
+                    last_report = now
+                    if progress_callback:
+                        progress_callback(progress)
+
+                page = next_page
+
+            duration = time.perf_counter() - start
+            rate = docs_done / duration if duration > 0 else 0.0
+            logger.info(f"✅ 迁移完成: {state['conversations']}个对话, "
+                        f"{state['messages']}条消息, {duration:.1f}秒 ({rate:,.0f} docs/s)")
+
+            result = {
+                'status': 'success',
+                'conversations': state['conversations'],
+                'messages': state['messages'],
+                'tags': tags,
+                'duration_seconds': duration,
+                'docs_per_second': rate,
+            }
+            self.clear_checkpoint()
+            return result
+
+        finally:
+            if executor:
+                executor.shutdown()
+            conn.close()
+
+    def _submit(self, executor: Optional[Executor], page: List[Dict]):
+        """提交一页的转换任务；无进程池时直接在当前进程转换"""
+        if executor is None:
+            return _build_actions_for_page(
+                (page, self.es_mgr.conversation_index, self.es_mgr.message_index)
+            )
+
+        # 把一页拆成多份分给各进程，结果按顺序合并
+        size = max(1, len(page) // self.workers)
+        chunks = [page[i:i + size] for i in range(0, len(page), size)]
+        futures = [
+            executor.submit(_build_actions_for_page,
+                            (chunk, self.es_mgr.conversation_index, self.es_mgr.message_index))
+            for chunk in chunks
+        ]
+        return _CombinedFuture(futures)
+
+    @staticmethod
+    def _progress(docs_done: int, total_docs: int, elapsed: float,
+                  state: Dict[str, Any]) -> Dict[str, Any]:
+        """计算并输出进度"""
+        rate = docs_done / elapsed if elapsed > 0 else 0.0
+        left = max(total_docs - docs_done, 0)
+        eta = left / rate if rate > 0 else None
+        percent = docs_done * 100 / total_docs if total_docs else 100.0
+
+        eta_text = f"{eta:.0f}秒" if eta is not None else "未知"
+        logger.info(f"   进度: {docs_done:,}/{total_docs:,} ({percent:.1f}%) | "
+                    f"{rate:,.0f} docs/s | 剩余约 {eta_text}")
+
+        return {
+            'docs_done': docs_done,
+            'docs_total': total_docs,
+            'percent': percent,
+            'docs_per_second': rate,
+            'eta_seconds': eta,
+            'last_id': state['last_id'],
+        }
+
+
+class _CombinedFuture:
+    """按提交顺序合并多个Future的结果"""
+
+    def __init__(self, futures):
+        self.futures = futures
+
+    def result(self) -> List[Dict[str, Any]]:
+        actions = []
+        for future in self.futures:
+            actions.extend(future.result())
+        return actions
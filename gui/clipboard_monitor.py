@@ -20,6 +20,9 @@ from typing import Optional, Set
 from PyQt6.QtCore import QTimer, QObject, pyqtSignal
 import pyperclip
 
+from scrapers.platforms import match_url
+from scrapers.url_canonical import canonicalize_url
+
 logger = logging.getLogger(__name__)
 
 
@@ -30,18 +33,6 @@ class ClipboardMonitor(QObject):
     ai_url_detected = pyqtSignal(str)  # 检测到AI对话URL
     conversation_added = pyqtSignal(dict)  # 对话添加成功
     
-    # 支持的AI对话平台URL模式
-    AI_URL_PATTERNS = [
-        r'https?://chat\.openai\.com/share/[\w-]+',  # ChatGPT分享链接
-        r'https?://chatgpt\.com/share/[\w-]+',       # ChatGPT新域名
-        r'https?://claude\.ai/share/[\w-]+',         # Claude分享链接
-        r'https?://chat\.deepseek\.com/share/[\w-]+',  # DeepSeek分享链接
-        r'https?://kimi\.moonshot\.cn/share/[\w-]+',
-        r'https?://poe\.com/s/[\w-]+',
-        r'https?://gemini\.google\.com/share/[\w-]+',
-        r'https?://tongyi\.aliyun\.com/qianwen/share/[\w-]+',
-    ]
-    
     def __init__(self, storage, check_interval: int = 1000):
         """
         初始化剪贴板监控器
@@ -99,16 +90,26 @@ class ClipboardMonitor(QObject):
             # 检查是否为AI对话URL
             if current_content and self.is_valid_url(current_content):
                 if self.is_ai_conversation_url(current_content):
-                    # 避免重复提示
-                    if current_content not in self.detected_urls:
-                        self.detected_urls.add(current_content)
-                        self.ai_url_detected.emit(current_content)
-                        self.show_add_prompt(current_content)
-                        logger.info(f"检测到AI对话URL: {current_content}")
+                    # 避免重复提示（同一分享的不同链接形式只提示一次，已收藏的不提示）
+                    url = canonicalize_url(current_content)
+                    if url not in self.detected_urls and not self._is_stored(url):
+                        self.detected_urls.add(url)
+                        self.ai_url_detected.emit(url)
+                        self.show_add_prompt(url)
+                        logger.info(f"检测到AI对话URL: {url}")
         
         except Exception as e:
             logger.error(f"检查剪贴板时出错: {e}", exc_info=True)
     
+    def _is_stored(self, url: str) -> bool:
+        """链接对应的对话是否已收藏"""
+        find_by_url = getattr(self.storage, 'find_by_url', None)
+        try:
+            return bool(find_by_url and find_by_url(url))
+        except Exception as e:
+            logger.warning(f"检查链接是否已收藏失败: {e}")
+            return False
+    
     def _get_clipboard_content(self) -> Optional[str]:
         """获取剪贴板内容"""
         try:
@@ -142,12 +143,9 @@ class ClipboardMonitor(QObject):
             url: URL字符串
             
         Returns:
-            是否为AI对话URL
+            是否为AI对话URL（平台注册表中任一平台的分享链接）
         """
-        for pattern in self.AI_URL_PATTERNS:
-            if re.match(pattern, url, re.IGNORECASE):
-                return True
-        return False
+        return match_url(url) is not None
     
     def show_add_prompt(self, url: str):
         """
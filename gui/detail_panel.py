@@ -7,14 +7,18 @@ from typing import Optional, Dict, Any
 import json
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLabel,
-    QTextEdit, QGroupBox, QPushButton, QScrollArea
+    QTextEdit, QGroupBox, QPushButton, QScrollArea,
+    QListWidget, QListWidgetItem
 )
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, pyqtSignal
 
 
 class DetailPanel(QWidget):
     """对话详情面板"""
     
+    # 信号：点击相关对话，参数为对话ID
+    related_selected = pyqtSignal(int)
+    
     @staticmethod
     def _parse_raw_content(raw_content) -> dict:
         """
@@ -112,6 +116,18 @@ class DetailPanel(QWidget):
         
         content_layout.addWidget(summary_group)
         
+        # 相关对话组（预先计算的相似列表，没有时隐藏）
+        self.related_group = QGroupBox("相关对话")
+        related_layout = QVBoxLayout(self.related_group)
+        
+        self.related_list = QListWidget()
+        self.related_list.setMaximumHeight(120)
+        self.related_list.itemClicked.connect(self._on_related_clicked)
+        related_layout.addWidget(self.related_list)
+        
+        self.related_group.setVisible(False)
+        content_layout.addWidget(self.related_group)
+        
         # 对话内容组
         content_group = QGroupBox("对话内容")
         content_content_layout = QVBoxLayout(content_group)
@@ -198,6 +214,9 @@ class DetailPanel(QWidget):
             summary = conversation.get('summary') or '(无摘要)'
             self.summary_text.setPlainText(summary)
             
+            # 更新相关对话
+            self._load_related(conversation_id)
+            
             # 更新对话内容
             self._load_conversation_content(raw_content)
             
@@ -209,6 +228,34 @@ class DetailPanel(QWidget):
             self._clear()
             self.content_text.setPlainText(f"加载失败: {str(e)}")
             
+    def _load_related(self, conversation_id: int, limit: int = 5):
+        """
+        加载相关对话（按主键读取预先计算的列表）
+        
+        Args:
+            conversation_id: 对话ID
+            limit: 显示数量
+        """
+        self.related_list.clear()
+        related = []
+        if hasattr(self.db, 'get_related_conversations'):
+            try:
+                related = self.db.get_related_conversations(conversation_id, limit)
+            except Exception:
+                related = []  # 旧数据库或非SQLite存储
+        
+        for item in related:
+            list_item = QListWidgetItem(f"🔗 {item['title']}  ({item['score']:.2f})")
+            list_item.setData(Qt.ItemDataRole.UserRole, item['id'])
+            self.related_list.addItem(list_item)
+        self.related_group.setVisible(bool(related))
+    
+    def _on_related_clicked(self, item: QListWidgetItem):
+        """点击相关对话"""
+        conversation_id = item.data(Qt.ItemDataRole.UserRole)
+        if conversation_id is not None:
+            self.related_selected.emit(conversation_id)
+    
     def _load_conversation_content(self, raw_content):
         """
         加载对话内容
@@ -264,6 +311,8 @@ class DetailPanel(QWidget):
         
         self.summary_text.clear()
         self.content_text.clear()
+        self.related_list.clear()
+        self.related_group.setVisible(False)
         
         self.export_btn.setEnabled(False)
         self.delete_btn.setEnabled(False)
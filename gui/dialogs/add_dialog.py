@@ -12,6 +12,7 @@ from PyQt6.QtWidgets import (
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 
 from scrapers.scraper_factory import ScraperFactory
+from scrapers.url_canonical import canonicalize_url
 from gui.error_handler import handle_error, handle_warning
 
 
@@ -139,6 +140,14 @@ class AddDialog(QDialog):
         if not url.startswith('http'):
             handle_warning("URL格式无效", parent=self)
             return
+        
+        # 已收藏的对话不再抓取
+        url = canonicalize_url(url)
+        find_by_url = getattr(self.db, 'find_by_url', None)
+        existing = find_by_url(url) if find_by_url else None
+        if existing:
+            handle_warning(f"该对话已收藏 (ID: {existing})，无需重复添加", parent=self, title="已收藏")
+            return
             
         # 禁用输入
         self.url_input.setEnabled(False)
@@ -35,10 +35,13 @@ class MainWindow(QMainWindow):
     # Signals
     conversation_added = pyqtSignal(dict)  # 对话添加信号
     conversation_deleted = pyqtSignal(int)  # 对话删除信号
+    auto_analysis_progress = pyqtSignal(dict)  # 后台自动分析进度（跨线程）
+    related_updated = pyqtSignal(dict)  # 相关对话更新完成（跨线程）
     
     def __init__(self, db_path: Optional[str] = None, db=None, parent=None, 
                  enable_tray: bool = True, enable_monitor: bool = True,
-                 enable_async: bool = True):
+                 enable_async: bool = True, enable_auto_analyze: bool = True,
+                 enable_related: bool = True):
         """
         初始化主窗口
         
@@ -49,6 +52,8 @@ class MainWindow(QMainWindow):
             enable_tray: 是否启用系统托盘
             enable_monitor: 是否启用剪贴板监控
             enable_async: 是否启用异步任务队列
+            enable_auto_analyze: 是否启用后台自动分析（还需 AI_AUTO_ANALYZE=true）
+            enable_related: 是否在后台计算对话向量、更新相关对话
         """
         super().__init__(parent)
         
@@ -65,9 +70,14 @@ class MainWindow(QMainWindow):
         self.system_tray: Optional[SystemTray] = None
         self.task_manager: Optional[TaskManager] = None
         self.progress_widget: Optional[ProgressWidget] = None
+        self.auto_analyzer = None
+        self._auto_analysis_saved = 0
+        self._related_thread = None
         self.enable_tray = enable_tray
         self.enable_monitor = enable_monitor
         self.enable_async = enable_async
+        self.enable_auto_analyze = enable_auto_analyze
+        self.enable_related = enable_related
         
         # 设置窗口属性
         self.setWindowTitle("ChatCompass - AI对话知识库")
@@ -85,10 +95,12 @@ class MainWindow(QMainWindow):
         # 初始化监控和托盘
         self._init_monitor()
         self._init_tray()
+        self._init_auto_analyzer()
         self._init_task_manager()
         
         # 加载数据
         self.refresh_list()
+        self.update_related()
         
     def _init_ui(self):
         """初始化UI组件"""
@@ -249,6 +261,11 @@ class MainWindow(QMainWindow):
         self.stats_label = QLabel("总计: 0 条对话")
         self.statusbar.addPermanentWidget(self.stats_label)
         
+        # 后台自动分析进度（未启用时隐藏）
+        self.analysis_label = QLabel("")
+        self.analysis_label.hide()
+        self.statusbar.addPermanentWidget(self.analysis_label)
+        
         # 更新统计
         self._update_stats()
         
@@ -265,6 +282,10 @@ class MainWindow(QMainWindow):
         # 对话删除 -> 刷新列表
         self.conversation_deleted.connect(lambda: self.refresh_list())
         
+        # 点击相关对话 -> 显示该对话；后台更新完成 -> 刷新当前对话的相关列表
+        self.detail_panel.related_selected.connect(self.detail_panel.show_conversation)
+        self.related_updated.connect(self.on_related_updated)
+        
         # 搜索栏信号
         self.search_bar.search_requested.connect(self._on_search_bar)
         self.search_bar.platform_filter_changed.connect(self._on_platform_filter)
@@ -451,7 +472,7 @@ class MainWindow(QMainWindow):
         if not self.enable_async:
             return
         
-        self.task_manager = TaskManager(self.db, max_workers=3)
+        self.task_manager = TaskManager(self.db, max_workers=3, auto_analyzer=self.auto_analyzer)
         
         # 创建进度组件
         self.progress_widget = ProgressWidget()
@@ -470,6 +491,88 @@ class MainWindow(QMainWindow):
         
         self.statusBar().showMessage("✅ 异步任务队列已启动", 2000)
     
+    def _init_auto_analyzer(self):
+        """初始化后台自动分析（AI_AUTO_ANALYZE=true 且使用SQLite存储时）"""
+        if not self.enable_auto_analyze or not getattr(self.db, 'db_path', None):
+            return
+        
+        from ai.ai_service import AIConfig, AIService
+        config = AIConfig.from_env()
+        if not config.enabled or not config.auto_analyze:
+            return
+        
+        from ai.auto_analyzer import AutoAnalyzer
+        self.auto_analyzer = AutoAnalyzer(
+            AIService(config), self.db.db_path,
+            is_busy=lambda: bool(self.task_manager and self.task_manager.task_queue.get_active_count()),
+            progress_callback=self.auto_analysis_progress.emit
+        )
+        self.auto_analysis_progress.connect(self.on_auto_analysis_progress)
+        
+        # 用户操作期间暂停分析
+        self.conversation_list.conversation_selected.connect(lambda *_: self.auto_analyzer.notify_activity())
+        self.search_bar.search_requested.connect(lambda *_: self.auto_analyzer.notify_activity())
+        
+        self.analysis_label.show()
+        self.auto_analyzer.start()
+    
+    def on_auto_analysis_progress(self, progress: dict):
+        """后台自动分析进度事件"""
+        state = progress['state']
+        if state == 'analyzing':
+            text = f"🤖 分析中: {progress['current'] or ''} (剩余 {progress['pending']})"
+        elif state == 'waiting':
+            text = f"🤖 等待空闲 (待分析 {progress['pending']})"
+        elif state == 'paused':
+            text = "🤖 AI服务不可用，稍后重试"
+        else:
+            text = f"🤖 已分析 {progress['completed']} 条"
+        self.analysis_label.setText(text)
+        
+        # 队列处理完且有新结果时刷新列表
+        if state == 'idle' and progress['saved'] > self._auto_analysis_saved:
+            self._auto_analysis_saved = progress['saved']
+            self.refresh_list()
+    
+    def update_related(self):
+        """在后台为新对话计算向量并增量更新相关对话（使用SQLite存储时；已在运行则跳过）"""
+        if not self.enable_related or not getattr(self.db, 'db_path', None):
+            return
+        if self._related_thread and self._related_thread.is_alive():
+            return
+        
+        import threading
+        db_path = self.db.db_path
+        
+        def run():
+            from database.db_manager import DatabaseManager
+            try:
+                from ai.ai_service import AIConfig
+                from ai.embeddings import create_pipeline
+                pipeline = create_pipeline(AIConfig.from_env())
+            except (ImportError, ValueError):
+                return  # 缺少NumPy或配置了未知后端：不显示相关对话
+            
+            db = DatabaseManager(db_path)  # 后台线程使用独立连接
+            try:
+                self.related_updated.emit(pipeline.update(db.conn))
+            except Exception as e:
+                self.related_updated.emit({'error': str(e)})
+            finally:
+                db.close()
+        
+        self._related_thread = threading.Thread(target=run, name="RelatedConversations", daemon=True)
+        self._related_thread.start()
+    
+    def on_related_updated(self, stats: dict):
+        """相关对话更新完成事件"""
+        if stats.get('error'):
+            self.statusBar().showMessage(f"⚠️ 更新相关对话失败: {stats['error']}", 5000)
+            return
+        current = self.detail_panel.current_conversation
+        if stats.get('updated') and current:
+            self.detail_panel._load_related(current['id'])
+    
     def on_task_added(self, task_id: str, url: str):
         """任务添加事件"""
         if self.progress_widget:
@@ -488,8 +591,13 @@ class MainWindow(QMainWindow):
         if self.progress_widget:
             self.progress_widget.complete_task(task_id, success=True)
         
-        # 刷新列表
+        if result.get('skipped'):
+            self.statusBar().showMessage(f"ℹ️ 对话已收藏 (ID: {result['conversation_id']})，未重新抓取", 5000)
+            return
+        
+        # 刷新列表和相关对话
         self.refresh_list()
+        self.update_related()
         self.statusBar().showMessage(f"✅ 对话添加成功: {result.get('title', '未知')}", 5000)
     
     def on_task_failed(self, task_id: str, error: str):
@@ -523,10 +631,18 @@ class MainWindow(QMainWindow):
         if self.task_manager:
             self.task_manager.stop()
         
+        # 停止后台自动分析（已完成的结果会写回数据库）
+        if self.auto_analyzer:
+            self.auto_analyzer.stop()
+        
         # 停止监控
         if self.clipboard_monitor:
             self.clipboard_monitor.stop()
         
+        # 关闭共享浏览器池
+        from scrapers.browser_pool import close_browser_pool
+        close_browser_pool()
+        
         # 隐藏托盘
         if self.system_tray:
             self.system_tray.hide()
@@ -6,9 +6,12 @@
 2. 协调爬虫和存储
 3. 处理任务生命周期
 4. 发送进度更新
+
+多个任务在同一事件循环中并发执行：爬取、入库（线程池）和AI分析（异步接口）互相重叠。
 """
 
 import asyncio
+import functools
 import logging
 from typing import Optional, Dict, Any
 from PyQt6.QtCore import QObject, QThread, pyqtSignal
@@ -16,6 +19,8 @@ from concurrent.futures import ThreadPoolExecutor
 
 from gui.task_queue import TaskQueue, TaskWorker, TaskStatus
 from scrapers.scraper_factory import ScraperFactory
+from scrapers.browser_pool import close_async_browser_pool
+from scrapers.url_canonical import canonicalize_url
 
 logger = logging.getLogger(__name__)
 
@@ -28,19 +33,27 @@ class TaskManagerThread(QThread):
     task_failed = pyqtSignal(str, str)      # 任务失败 (task_id, error)
     task_progress = pyqtSignal(str, int, str)  # 进度更新 (task_id, progress, message)
     
-    def __init__(self, task_queue: TaskQueue, storage):
+    def __init__(self, task_queue: TaskQueue, storage, auto_analyzer=None, ai_service=None):
         """
         初始化管理器线程
         
         Args:
             task_queue: 任务队列
             storage: 存储实例
+            auto_analyzer: 后台自动分析（可选），新保存的对话优先分析
+            ai_service: AIService（可选），未配置自动分析时在任务中直接分析，
+                        分析与入库并发进行
         """
         super().__init__()
         self.task_queue = task_queue
         self.storage = storage
+        self.auto_analyzer = auto_analyzer
+        self.ai_service = ai_service
         self.is_running = False
-        self.executor = ThreadPoolExecutor(max_workers=task_queue.max_workers)
+        # 数据库操作只用一个线程依次执行：DatabaseManager 的所有操作共用一个sqlite3连接，
+        # 并发任务同时写入会混进同一个隐式事务，互相提交对方写了一半的数据
+        self.storage_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-storage")
+        self._running_tasks = set()
         
         logger.info("任务管理器线程初始化完成")
     
@@ -65,26 +78,53 @@ class TaskManagerThread(QThread):
                 pending_tasks = self.task_queue.get_pending_tasks()
                 active_count = self.task_queue.get_active_count()
                 
-                # 检查是否可以启动新任务
+                # 有待处理任务时提前预热本地模型，爬取完成后的分析不必等待冷启动
+                if pending_tasks:
+                    self._preload_model()
+                
+                # 检查是否可以启动新任务（不等待其完成，立即检查下一个）
                 if pending_tasks and active_count < self.task_queue.max_workers:
                     task = pending_tasks[0]
-                    await self.execute_task(task)
+                    self.task_queue.update_task_status(task['id'], TaskStatus.RUNNING.value)
+                    running = asyncio.create_task(self.execute_task(task))
+                    self._running_tasks.add(running)
+                    running.add_done_callback(self._running_tasks.discard)
+                    continue
                 
                 # 等待一小段时间再检查
                 await asyncio.sleep(0.5)
                 
             except Exception as e:
                 logger.error(f"处理任务时出错: {e}", exc_info=True)
+        
+        # 停止时取消仍在执行的任务
+        for running in list(self._running_tasks):
+            running.cancel()
+        if self._running_tasks:
+            await asyncio.gather(*self._running_tasks, return_exceptions=True)
+        
+        # 异步浏览器池属于本线程的事件循环，循环结束前关闭
+        await close_async_browser_pool()
     
     async def execute_task(self, task: Dict):
         """执行单个任务"""
         task_id = task['id']
+        loop = asyncio.get_running_loop()
         
         try:
             # 更新状态为执行中
-            self.task_queue.update_task_status(task_id, TaskStatus.RUNNING.value)
+            if task['status'] != TaskStatus.RUNNING.value:
+                self.task_queue.update_task_status(task_id, TaskStatus.RUNNING.value)
             self.task_progress.emit(task_id, 10, "正在初始化...")
             
+            # 抓取之前按规范链接检查是否已收藏（任务带 refresh=True 时重新抓取并更新）
+            url = canonicalize_url(task['url'])
+            existing = await loop.run_in_executor(self.storage_executor, self._find_existing, url)
+            if existing and not task.get('refresh'):
+                self._complete(task_id, {'conversation_id': existing, 'message_count': None, 'skipped': True},
+                               {'url': url, 'conversation_id': existing, 'skipped': True}, "✅ 已收藏，跳过抓取")
+                return
+            
             # 创建爬虫
             scraper = ScraperFactory.create_scraper(task['platform'])
             if not scraper:
@@ -93,37 +133,52 @@ class TaskManagerThread(QThread):
             self.task_progress.emit(task_id, 30, "正在爬取数据...")
             
             # 执行爬取
-            result = await scraper.scrape_async(task['url'])
+            result = await scraper.scrape_async(url)
             
             if not result:
                 raise Exception("爬取失败,未返回数据")
             
             self.task_progress.emit(task_id, 70, "正在保存到数据库...")
             
-            # 保存到数据库 (使用正确的API)
-            conversation_id = self.storage.add_conversation(
-                source_url=task['url'],
-                platform=task['platform'],
-                title=result.get('title', '未知标题'),
-                raw_content=result  # 传递完整的result作为raw_content
-            )
+            # 近似重复的对话沿用原对话的分析结果，不再分析（重新抓取时不与自身比较）
+            duplicate = None
+            if not existing:
+                duplicate = await loop.run_in_executor(self.storage_executor, self._find_duplicate, result)
+            extra = {'duplicate_of': duplicate['id']} if duplicate else {}
             
-            # 消息已经包含在raw_content中,不需要单独保存
-            message_count = len(result.get('messages', []))
+            # 未配置后台自动分析时，分析与入库同时进行
+            analysis = None
+            if self.ai_service and not self.auto_analyzer and not duplicate:
+                analysis = asyncio.ensure_future(self._analyze(result))
             
-            self.task_progress.emit(task_id, 100, "✅ 完成")
+            # 保存到数据库 (使用正确的API)，SQLite写入放到线程池，不阻塞其他任务
+            if existing:
+                conversation_id = existing
+                await loop.run_in_executor(self.storage_executor, self.storage.replace_content,
+                                           existing, result.get('title', '未知标题'), result)
+            else:
+                conversation_id = await loop.run_in_executor(self.storage_executor, functools.partial(
+                    self.storage.add_conversation,
+                    source_url=url,
+                    platform=task['platform'],
+                    title=result.get('title', '未知标题'),
+                    raw_content=result,  # 传递完整的result作为raw_content
+                    **extra
+                ))
             
-            # 更新任务状态
-            self.task_queue.update_task_status(task_id, TaskStatus.COMPLETED.value)
-            self.task_queue.tasks[task_id]['result'] = {
-                'conversation_id': conversation_id,
-                'message_count': message_count
-            }
+            # 交给后台自动分析补齐摘要、分类和标签
+            if self.auto_analyzer and conversation_id and not duplicate:
+                self.auto_analyzer.enqueue(conversation_id)
             
-            # 发送完成信号
-            self.task_completed.emit(task_id, result)
+            if analysis is not None:
+                self.task_progress.emit(task_id, 85, "正在AI分析...")
+                await self._save_analysis(conversation_id, await analysis)
             
-            logger.info(f"任务执行成功: {task_id}")
+            # 消息已经包含在raw_content中,不需要单独保存
+            message_count = len(result.get('messages', []))
+            
+            self._complete(task_id, {'conversation_id': conversation_id, 'message_count': message_count},
+                           result, "✅ 完成")
             
         except Exception as e:
             error_msg = str(e)
@@ -137,10 +192,82 @@ class TaskManagerThread(QThread):
             self.task_failed.emit(task_id, error_msg)
             self.task_progress.emit(task_id, 0, f"❌ 失败: {error_msg}")
     
+    def _complete(self, task_id: str, summary: Dict, result: Dict, message: str):
+        """标记任务完成并发送完成信号"""
+        self.task_progress.emit(task_id, 100, message)
+        
+        # 更新任务状态
+        self.task_queue.update_task_status(task_id, TaskStatus.COMPLETED.value)
+        self.task_queue.tasks[task_id]['result'] = summary
+        
+        # 发送完成信号
+        self.task_completed.emit(task_id, result)
+        
+        logger.info(f"任务执行成功: {task_id}")
+    
+    def _find_existing(self, url: str) -> Optional[int]:
+        """已收藏该链接时返回对话ID（存储不支持按规范链接查找时返回None）"""
+        find_by_url = getattr(self.storage, 'find_by_url', None)
+        if find_by_url is None:
+            return None
+        try:
+            return find_by_url(url)
+        except Exception as e:
+            logger.warning(f"检查链接是否已收藏失败: {e}")
+            return None
+    
+    def _find_duplicate(self, result: Dict) -> Optional[Dict]:
+        """查找近似重复的已入库对话（存储未开启查重时返回None）"""
+        if getattr(self.storage, 'dedupe', None) not in ('flag', 'merge'):
+            return None
+        try:
+            duplicate = self.storage.find_near_duplicate(result)
+        except Exception as e:
+            logger.warning(f"近似重复检测失败: {e}")
+            return None
+        if duplicate:
+            logger.info(f"近似重复: 与对话 {duplicate['id']} 相似度 {duplicate['similarity']:.2f}")
+        return duplicate
+    
+    def _preload_model(self):
+        """预热分析所用的模型（后台进行；已加载时不发请求）"""
+        service = self.ai_service or getattr(self.auto_analyzer, 'service', None)
+        if service is None or not hasattr(service, 'preload_model'):
+            return
+        try:
+            service.preload_model()
+        except Exception as e:
+            logger.warning(f"模型预热失败: {e}")
+    
+    async def _analyze(self, result: Dict):
+        """分析爬取结果（失败只记录日志，不影响任务本身）"""
+        from ai.text_compressor import conversation_text
+        
+        try:
+            return await self.ai_service.analyze_conversation_async(
+                conversation_text(result), result.get('title', '')
+            )
+        except Exception as e:
+            logger.error(f"AI分析失败: {e}")
+            return None
+    
+    async def _save_analysis(self, conversation_id: Optional[int], analysis):
+        """写回分析结果（入库失败或分析没有结果时跳过）"""
+        if not conversation_id or analysis is None:
+            return
+        await asyncio.get_running_loop().run_in_executor(
+            self.storage_executor, self.storage.save_analysis_results, [(conversation_id, {
+                'summary': analysis.summary,
+                'category': analysis.category,
+                'tags': analysis.tags,
+                'confidence': analysis.confidence,
+            })]
+        )
+    
     def stop(self):
         """停止线程"""
         self.is_running = False
-        self.executor.shutdown(wait=False)
+        self.storage_executor.shutdown(wait=False)
         logger.info("任务管理器线程已停止")
 
 
@@ -154,16 +281,20 @@ class TaskManager(QObject):
     task_completed = pyqtSignal(str, dict)      # 任务完成 (task_id, result)
     task_failed = pyqtSignal(str, str)          # 任务失败 (task_id, error)
     
-    def __init__(self, storage, max_workers: int = 3):
+    def __init__(self, storage, max_workers: int = 3, auto_analyzer=None, ai_service=None):
         """
         初始化任务管理器
         
         Args:
             storage: 存储实例
             max_workers: 最大并发数
+            auto_analyzer: 后台自动分析（可选）
+            ai_service: AIService（可选），未配置自动分析时在任务中直接分析
         """
         super().__init__()
         self.storage = storage
+        self.auto_analyzer = auto_analyzer
+        self.ai_service = ai_service
         self.task_queue = TaskQueue(max_workers=max_workers)
         self.manager_thread: Optional[TaskManagerThread] = None
         
@@ -181,7 +312,8 @@ class TaskManager(QObject):
             logger.warning("管理器已在运行")
             return
         
-        self.manager_thread = TaskManagerThread(self.task_queue, self.storage)
+        self.manager_thread = TaskManagerThread(self.task_queue, self.storage, self.auto_analyzer,
+                                                self.ai_service)
         
         # 连接线程信号
         self.manager_thread.task_completed.connect(self.task_completed.emit)
@@ -201,9 +333,14 @@ class TaskManager(QObject):
         self.task_queue.stop()
         logger.info("任务管理器已停止")
     
-    def add_task(self, url: str, platform: str) -> str:
-        """添加任务"""
-        return self.task_queue.add_task(url, platform)
+    def add_task(self, url: str, platform: str, refresh: bool = False) -> str:
+        """
+        添加任务
+        
+        Args:
+            refresh: 已收藏的对话也重新抓取并更新内容
+        """
+        return self.task_queue.add_task(url, platform, refresh=refresh)
     
     def cancel_task(self, task_id: str) -> bool:
         """取消任务"""
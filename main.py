@@ -4,6 +4,7 @@ ChatCompass - AI对话知识库管理系统
 """
 import sys
 import os
+import threading
 from pathlib import Path
 
 # 设置Windows控制台UTF-8编码
@@ -18,7 +19,10 @@ sys.path.insert(0, str(PROJECT_ROOT))
 
 from database.db_manager import DatabaseManager
 from scrapers.scraper_factory import ScraperFactory
-from config import get_ai_client, DATABASE_PATH
+from scrapers.browser_pool import close_browser_pool
+from scrapers.url_canonical import canonicalize_url
+from config import get_ai_client, DATABASE_PATH, DEDUPE_POLICY, DEDUPE_THRESHOLD
+from ai.streaming import streaming
 
 
 class ChatCompass:
@@ -30,7 +34,7 @@ class ChatCompass:
         print("=" * 60)
         
         # 初始化数据库
-        self.db = DatabaseManager(DATABASE_PATH)
+        self.db = DatabaseManager(DATABASE_PATH, dedupe=DEDUPE_POLICY, dedupe_threshold=DEDUPE_THRESHOLD)
         
         # 初始化爬虫工厂
         self.scraper_factory = ScraperFactory()
@@ -42,11 +46,31 @@ class ChatCompass:
         except Exception as e:
             print(f"[WARN] AI客户端初始化失败: {e}")
             self.ai_client = None
+        
+        # 后台自动分析（交互模式下按 AI_AUTO_ANALYZE 启动）
+        self.auto_analyzer = None
+        
+        # 相关对话的向量流水线（首次使用时创建）；交互模式下新增对话后在后台增量更新
+        self._embedding_pipeline = None
+        self.background_related = False
+        self._related_thread = None
     
-    def add_conversation_from_url(self, url: str):
-        """从URL添加对话"""
+    def add_conversation_from_url(self, url: str, refresh: bool = False):
+        """
+        从URL添加对话
+        
+        Args:
+            refresh: 已收藏的对话也重新抓取，并替换为最新内容
+        """
         print(f"\n处理链接: {url}")
         
+        # 抓取之前按规范链接检查是否已收藏
+        url = canonicalize_url(url)
+        existing = self.db.find_by_url(url)
+        if existing and not refresh:
+            print(f"  [SKIP] 对话已收藏 (ID: {existing})，如需更新请使用: add --refresh <url>")
+            return existing
+        
         try:
             # 1. 抓取对话内容
             print("  [1/3] 抓取对话内容...")
@@ -55,20 +79,31 @@ class ChatCompass:
             print(f"      - 消息数: {conversation_data.message_count}")
             print(f"      - 字数: {conversation_data.word_count}")
             
-            # 2. AI分析
+            # 2. AI分析（近似重复的对话沿用原对话的分析结果）
             summary = None
             category = None
             tags = []
+            confidence = None
             
-            if self.ai_client:
+            duplicate = None
+            if self.db.dedupe and not existing:
+                duplicate = self.db.find_near_duplicate(conversation_data.to_dict())
+            if duplicate:
+                print(f"  [DUP] 与已有对话近似重复: [{duplicate['id']}] {duplicate['title']} "
+                      f"（相似度 {duplicate['similarity']:.0%}）")
+                print("  [2/3] 跳过AI分析")
+            elif self.ai_client:
                 print("  [2/3] AI分析中...")
                 try:
                     full_text = conversation_data.get_full_text()
-                    analysis = self.ai_client.analyze_conversation(full_text)
+                    with streaming(on_token=self._print_generation_progress):
+                        analysis = self.ai_client.analyze_conversation(full_text)
+                    print()
                     
                     summary = analysis.summary
                     category = analysis.category
                     tags = analysis.tags
+                    confidence = analysis.confidence
                     
                     print(f"  [OK] 分析完成")
                     print(f"      - 摘要: {summary[:50]}...")
@@ -81,6 +116,8 @@ class ChatCompass:
             
             # 3. 保存到数据库
             print("  [3/3] 保存到数据库...")
+            if existing:
+                return self._refresh_conversation(existing, conversation_data, summary, category, tags, confidence)
             conv_id = self.db.add_conversation(
                 source_url=url,
                 platform=conversation_data.platform,
@@ -88,10 +125,18 @@ class ChatCompass:
                 raw_content=conversation_data.to_dict(),
                 summary=summary,
                 category=category,
-                tags=tags
+                tags=tags,
+                analysis_confidence=confidence,
+                duplicate_of=duplicate['id'] if duplicate else None
             )
             
+            if duplicate and self.db.dedupe == 'merge':
+                print(f"  [OK] 已合并到对话 (ID: {conv_id})")
+                return conv_id
             print(f"  [OK] 保存成功 (ID: {conv_id})")
+            if self.auto_analyzer and confidence is None and not duplicate:
+                self.auto_analyzer.enqueue(conv_id)
+            self.update_related_async()
             return conv_id
             
         except Exception as e:
@@ -100,6 +145,25 @@ class ChatCompass:
             traceback.print_exc()
             return None
     
+    def _refresh_conversation(self, conv_id: int, conversation_data, summary, category, tags, confidence):
+        """用重新抓取的内容替换已收藏的对话"""
+        self.db.replace_content(conv_id, conversation_data.title, conversation_data.to_dict())
+        if confidence is not None:
+            self.db.save_analysis_results([(conv_id, {
+                'summary': summary, 'category': category, 'tags': tags, 'confidence': confidence,
+            })])
+        elif self.auto_analyzer:
+            self.auto_analyzer.enqueue(conv_id)
+        print(f"  [OK] 已更新 (ID: {conv_id})")
+        self.update_related_async()
+        return conv_id
+    
+    @staticmethod
+    def _print_generation_progress(token: str, stats):
+        """流式生成时在同一行刷新生成进度"""
+        print(f"\r      生成中: {stats.tokens} tokens "
+              f"({stats.tokens_per_second:.1f} tokens/s)", end='', flush=True)
+    
     def search(self, keyword: str):
         """搜索对话（增强版：显示上下文定位）"""
         print(f"\n🔍 搜索: {keyword}")
@@ -175,6 +239,155 @@ class ChatCompass:
         print(f"\n总标签数: {stats['total_tags']}")
         print("=" * 60)
     
+    def _create_auto_analyzer(self, **kwargs):
+        """创建自动分析（AI服务配置来自环境变量）"""
+        from ai.ai_service import AIConfig, AIService
+        from ai.auto_analyzer import AutoAnalyzer
+        return AutoAnalyzer(AIService(AIConfig.from_env()), self.db.db_path, **kwargs)
+    
+    def start_auto_analyzer(self):
+        """AI_AUTO_ANALYZE=true 时在后台分析未分析和低置信度的对话"""
+        from ai.ai_service import AIConfig
+        config = AIConfig.from_env()
+        if not config.enabled or not config.auto_analyze:
+            return
+        self.auto_analyzer = self._create_auto_analyzer()
+        self.auto_analyzer.start()
+        print("[OK] 后台自动分析已启动（输入 'analyze' 查看进度）")
+    
+    def auto_analyze(self, limit: int = None):
+        """分析未分析和低置信度的对话（后台运行时显示进度）"""
+        if self.auto_analyzer and self.auto_analyzer.running:
+            progress = self.auto_analyzer.progress()
+            print(f"\n后台自动分析: {progress['state']}")
+            print(f"  已分析: {progress['completed']} | 已保存: {progress['saved']} | "
+                  f"失败: {progress['failed']} | 待分析: {progress['pending']}")
+            if progress['current']:
+                print(f"  正在分析: {progress['current']}")
+            return
+        
+        def show_progress(progress):
+            if progress['current']:
+                print(f"\r  分析中: {progress['current'][:30]:<30} "
+                      f"已完成 {progress['completed']} | 剩余 {progress['pending']}", end='', flush=True)
+        
+        print("\n分析未分析和低置信度的对话...")
+        progress = self._create_auto_analyzer(progress_callback=show_progress).run_once(limit)
+        print(f"\n[OK] 完成: 分析 {progress['completed']} 条, 保存 {progress['saved']} 条, "
+              f"失败 {progress['failed']} 条")
+    
+    def train_classifier(self):
+        """用已分类的对话训练本地分类器（AI降级分析和快速预分类使用）"""
+        try:
+            from ai.local_classifier import LocalClassifier
+        except ImportError as e:
+            print(f"[ERROR] 本地分类器需要NumPy: {e}")
+            return
+        from ai.ai_service import AIConfig
+        
+        print("\n训练本地分类器...")
+        try:
+            stats = LocalClassifier.train_from_database(
+                self.db.conn, min_confidence=AIConfig.from_env().auto_analyze_min_confidence
+            )
+        except ValueError as e:
+            print(f"[ERROR] 训练失败: {e}")
+            return
+        
+        print(f"[OK] 训练完成: {stats['samples']} 条对话, {stats['categories']} 个分类, "
+              f"{stats['tags']} 个标签")
+        print(f"     训练集准确率: {stats['train_accuracy']:.1%} | 耗时: {stats['seconds']:.1f}秒")
+        print(f"     模型已保存: {stats['path']}")
+    
+    def dedupe(self, merge: bool = False):
+        """批量查重：找出已有对话中的近似重复（默认只标记，merge=True时合并）"""
+        print("\n查找近似重复的对话...")
+        try:
+            result = self.db.dedupe_library(merge=merge)
+        except ImportError as e:
+            print(f"[ERROR] 近似重复检测需要NumPy: {e}")
+            return
+        
+        duplicates = result['duplicates']
+        for item in duplicates:
+            print(f"  [{item['id']}] => [{item['original_id']}] 相似度 {item['similarity']:.0%} "
+                  f"(SimHash距离 {item['hamming']})")
+        action = "合并" if merge else "标记"
+        print(f"[OK] 完成: 新计算签名 {result['indexed']} 条, {action}重复对话 {len(duplicates)} 条")
+    
+    def _get_embedding_pipeline(self):
+        """创建向量流水线（后端由 AI_EMBEDDING_BACKEND 配置）；缺少NumPy时返回None"""
+        if self._embedding_pipeline is None:
+            try:
+                from ai.ai_service import AIConfig
+                from ai.embeddings import create_pipeline
+                self._embedding_pipeline = create_pipeline(AIConfig.from_env())
+            except (ImportError, ValueError) as e:
+                print(f"[WARN] 相关对话不可用: {e}")
+                self._embedding_pipeline = False
+        return self._embedding_pipeline or None
+    
+    def update_related(self, verbose: bool = False, rebuild: bool = False):
+        """
+        为新对话计算向量并增量更新相关对话列表
+        
+        Args:
+            rebuild: 清空相关列表后全部重新计算（向量缓存保留）
+        """
+        pipeline = self._get_embedding_pipeline()
+        if pipeline is None:
+            return None
+        
+        if verbose:
+            print(f"\n{'重建' if rebuild else '计算'}对话向量（{pipeline.encoder.name}）...")
+        try:
+            stats = pipeline.rebuild(self.db.conn) if rebuild else pipeline.update(self.db.conn)
+        except Exception as e:
+            print(f"[WARN] 更新相关对话失败: {e}")
+            return None
+        
+        if verbose:
+            print(f"[OK] 完成: 新编码 {stats['embedded']} 条（缓存命中 {stats['cached']}）, "
+                  f"更新 {stats['updated']} 个相关列表, 共 {stats['conversations']} 条对话 | "
+                  f"耗时: {stats['seconds']:.2f}秒")
+        return stats
+    
+    def update_related_async(self):
+        """交互模式下在后台线程增量更新相关对话（已在运行则跳过）；单次命令不计算，由 related 命令补齐"""
+        if not self.background_related:
+            return
+        if self._related_thread and self._related_thread.is_alive():
+            return
+        pipeline = self._get_embedding_pipeline()
+        if pipeline is None:
+            return
+        
+        db_path = self.db.db_path
+        
+        def run():
+            db = DatabaseManager(db_path)  # 后台线程使用独立连接
+            try:
+                pipeline.update(db.conn)
+            except Exception as e:
+                print(f"\n[WARN] 更新相关对话失败: {e}")
+            finally:
+                db.close()
+        
+        self._related_thread = threading.Thread(target=run, name="RelatedConversations", daemon=True)
+        self._related_thread.start()
+    
+    def _show_related(self, conversation_id: int, limit: int = 5):
+        """显示预先计算的相关对话（只读，不在这里计算向量）"""
+        if not self.db.has_embedding(conversation_id):
+            print("\n🔗 相关对话: 尚未计算（运行 'related' 生成）")
+            return
+        
+        related = self.db.get_related_conversations(conversation_id, limit)
+        if related:
+            print(f"\n🔗 相关对话:")
+            for item in related:
+                print(f"  [{item['id']}] {item['title']} （相似度 {item['score']:.2f}）")
+    
     def show_conversation(self, identifier: str):
         """显示单个对话的详细内容
         
@@ -240,6 +453,13 @@ class ChatCompass:
         if conversation.get('is_favorite'):
             print(f"\n⭐ 已收藏")
         
+        # 近似重复
+        if conversation.get('duplicate_of'):
+            print(f"\n♻️ 与对话 [{conversation['duplicate_of']}] 近似重复")
+        
+        # 相关对话
+        self._show_related(conversation['id'])
+        
         # 对话内容
         print(f"\n💬 对话内容:")
         print("-" * 70)
@@ -280,10 +500,14 @@ class ChatCompass:
     def interactive_mode(self):
         """交互式命令行模式"""
         print("\n进入交互模式（输入 'help' 查看帮助）\n")
+        self.start_auto_analyzer()
+        self.background_related = True
         
         while True:
             try:
                 command = input("ChatCompass> ").strip()
+                if self.auto_analyzer:
+                    self.auto_analyzer.notify_activity()
                 
                 if not command:
                     continue
@@ -291,11 +515,16 @@ class ChatCompass:
                 if command == 'help':
                     print("""
 可用命令:
-  add <url>        - 添加对话链接
+  add <url>        - 添加对话链接（已收藏的链接不再抓取）
+  add --refresh <url> - 重新抓取已收藏的对话并更新内容
   search <keyword> - 搜索对话
   list             - 列出最近的对话
   show <id|url>    - 查看对话详细内容
   stats            - 显示统计信息
+  analyze          - 分析未分析的对话（后台运行时显示进度）
+  train            - 训练本地分类器
+  related [--rebuild] - 计算新对话的向量，更新相关对话（--rebuild 全部重新计算）
+  dedupe [--merge] - 查找近似重复的对话（--merge 合并重复对话）
   help             - 显示帮助
   exit             - 退出程序
 
@@ -306,8 +535,13 @@ class ChatCompass:
                     """)
                 
                 elif command.startswith('add '):
-                    url = command[4:].strip()
-                    self.add_conversation_from_url(url)
+                    args = command[4:].split()
+                    refresh = '--refresh' in args
+                    urls = [arg for arg in args if arg != '--refresh']
+                    if urls:
+                        self.add_conversation_from_url(urls[0], refresh=refresh)
+                    else:
+                        print("请指定对话链接")
                 
                 elif command.startswith('search '):
                     keyword = command[7:].strip()
@@ -333,6 +567,18 @@ class ChatCompass:
                 elif command == 'stats':
                     self.show_statistics()
                 
+                elif command == 'analyze':
+                    self.auto_analyze()
+                
+                elif command == 'train':
+                    self.train_classifier()
+                
+                elif command in ('related', 'related --rebuild'):
+                    self.update_related(verbose=True, rebuild=command.endswith('--rebuild'))
+                
+                elif command in ('dedupe', 'dedupe --merge'):
+                    self.dedupe(merge=command.endswith('--merge'))
+                
                 elif command in ['exit', 'quit']:
                     print("再见！")
                     break
@@ -348,6 +594,9 @@ class ChatCompass:
     
     def close(self):
         """关闭资源"""
+        if self.auto_analyzer:
+            self.auto_analyzer.stop()
+        close_browser_pool()
         if self.db:
             self.db.close()
 
@@ -361,8 +610,9 @@ def main():
         command = sys.argv[1]
         
         if command == 'add' and len(sys.argv) > 2:
-            url = sys.argv[2]
-            app.add_conversation_from_url(url)
+            urls = [arg for arg in sys.argv[2:] if arg != '--refresh']
+            if urls:
+                app.add_conversation_from_url(urls[0], refresh='--refresh' in sys.argv[2:])
         
         elif command == 'search' and len(sys.argv) > 2:
             keyword = ' '.join(sys.argv[2:])
@@ -375,12 +625,25 @@ def main():
         elif command == 'stats':
             app.show_statistics()
         
+        elif command == 'analyze':
+            limit = int(sys.argv[2]) if len(sys.argv) > 2 else None
+            app.auto_analyze(limit)
+        
+        elif command == 'train':
+            app.train_classifier()
+        
+        elif command == 'related':
+            app.update_related(verbose=True, rebuild='--rebuild' in sys.argv[2:])
+        
+        elif command == 'dedupe':
+            app.dedupe(merge='--merge' in sys.argv[2:])
+        
         elif command == 'gui':
             print("GUI模式开发中...")
             # TODO: 启动PyQt6 GUI
         
         else:
-            print(f"用法: python main.py [add <url> | search <keyword> | show <id|url> | stats | gui]")
+            print(f"用法: python main.py [add [--refresh] <url> | search <keyword> | show <id|url> | stats | analyze [n] | train | related [--rebuild] | dedupe [--merge] | gui]")
     
     else:
         # 无参数时进入交互模式
@@ -1,18 +1,27 @@
 """
 爬虫模块
+
+各名称在第一次访问时才导入对应子模块：只用到链接识别、规范化的代码
+（剪贴板监控、查重）导入本包时不会加载 bs4、lxml 和 Playwright。
 """
-from .base_scraper import BaseScraper, ConversationData, Message
-from .chatgpt_scraper import ChatGPTScraper
-from .claude_scraper import ClaudeScraper
-from .deepseek_scraper import DeepSeekScraper
-from .scraper_factory import ScraperFactory
+import importlib
+
+_EXPORTS = {
+    'BaseScraper': '.base_scraper',
+    'ConversationData': '.base_scraper',
+    'Message': '.base_scraper',
+    'ChatGPTScraper': '.chatgpt_scraper',
+    'ClaudeScraper': '.claude_scraper',
+    'DeepSeekScraper': '.deepseek_scraper',
+    'ScraperFactory': '.scraper_factory',
+}
+
+__all__ = list(_EXPORTS)
+
 
-__all__ = [
-    'BaseScraper',
-    'ConversationData',
-    'Message',
-    'ChatGPTScraper',
-    'ClaudeScraper',
-    'DeepSeekScraper',
-    'ScraperFactory'
-]
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
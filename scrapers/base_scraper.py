@@ -2,10 +2,19 @@
 基础爬虫抽象类
 定义所有平台爬虫的统一接口
 """
+import asyncio
+import logging
+import re
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime
+from html import unescape
+
+from .platforms import platform_for_url
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -60,36 +69,251 @@ class ConversationData:
 
 
 class BaseScraper(ABC):
-    """爬虫基类"""
+    """
+    爬虫基类
+
+    需要浏览器渲染的平台只需配置页面加载方式（ready_selectors 等）并实现 parse_html，
+    同步抓取（共享浏览器池）和异步抓取（当前事件循环的异步浏览器池）共用同一套流程。
+    分级抓取：先用HTTP取回页面、从内嵌数据中解析对话，失败再用浏览器渲染。
+    """
+    
+    display_name = ''                       # 日志和错误信息中的平台名
+    ready_selectors: Tuple[str, ...] = ()   # 消息元素选择器，任一匹配即认为对话开始渲染
+    ready_timeout = 10000                   # 等待对话渲染的毫秒数
+    ready_quiet_ms = 500                    # 消息多久不再变化认为渲染完成
+    scroll_to_bottom = False                # 滚动到底部触发懒加载
     
     def __init__(self):
         self.platform_name = self.__class__.__name__.replace('Scraper', '').lower()
+        self.use_playwright = False
     
-    @abstractmethod
     def can_handle(self, url: str) -> bool:
-        """判断是否能处理该URL"""
-        pass
+        """判断是否能处理该URL（按平台注册表识别分享链接）"""
+        return platform_for_url(url) == self.platform_name
     
     @abstractmethod
     def scrape(self, url: str) -> ConversationData:
         """抓取对话内容"""
         pass
     
+    @abstractmethod
+    def parse_html(self, html: str, url: str) -> ConversationData:
+        """
+        从渲染后的页面HTML解析对话（浏览器抓取的平台实现）
+        
+        Raises:
+            ValueError: 未解析出消息
+        """
+        pass
+    
+    @abstractmethod
+    def parse_static_html(self, html: str, url: str) -> ConversationData:
+        """
+        不使用浏览器时，从服务端返回的HTML标记中解析对话（平台实现）
+        
+        Raises:
+            ValueError: 未解析出消息
+        """
+        pass
+    
+    def parse_embedded(self, html: str, url: str) -> Optional[ConversationData]:
+        """从页面内嵌的JSON数据中解析对话，没有时返回None"""
+        from .embedded_data import extract_conversation
+        
+        found = extract_conversation(html)
+        if not found:
+            return None
+        title, messages = found
+        return ConversationData(
+            platform=self.platform_name,
+            url=url,
+            title=title or self._title_from_html(html) or self._title_from_messages(messages),
+            messages=messages,
+            metadata={'scrape_method': 'http'}
+        )
+    
+    def _title_from_html(self, html: str) -> Optional[str]:
+        match = re.search(r'<title[^>]*>(.*?)</title>', html, re.S | re.I)
+        if not match:
+            return None
+        title = unescape(match.group(1)).strip()
+        if self.display_name:
+            title = re.sub(rf'\s*[-|]\s*{re.escape(self.display_name)}.*$', '', title, flags=re.I)
+        return title if title and title.lower() != self.display_name.lower() else None
+    
+    @staticmethod
+    def _title_from_messages(messages: List[Message]) -> str:
+        first = next((m.content for m in messages if m.role == 'user'), messages[0].content)
+        first = first.strip().splitlines()[0] if first.strip() else "未命名对话"
+        return first[:50] + ('...' if len(first) > 50 else '')
+    
     async def scrape_async(self, url: str) -> ConversationData:
         """
         异步抓取对话数据
         
+        浏览器抓取直接在当前事件循环中进行，不占用线程；
+        其他方式在线程池中运行同步scrape方法。
+        
         Args:
             url: 对话链接
             
         Returns:
             ConversationData: 对话数据
         """
-        # 默认实现: 在线程池中运行同步scrape方法
-        import asyncio
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, self.scrape, url)
+        if not (self.use_playwright and self.ready_selectors):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self.scrape, url)
+        
+        from .browser_pool import get_async_browser_pool
+        from .fetch_tiers import BROWSER
+        
+        self._check_url(url)
+        if self._should_try_http():
+            data, _ = await asyncio.to_thread(self._fetch_embedded, url)
+            if data:
+                return data
+        
+        print(f"[{self.display_name}] 使用Playwright异步抓取: {url}")
+        start = time.perf_counter()
+        try:
+            data = await get_async_browser_pool().run(url, lambda page: self._scrape_page_async(page, url))
+        except Exception:
+            self._record(BROWSER, False, start)
+            raise
+        self._record(BROWSER, True, start)
+        return data
     
     def validate_url(self, url: str) -> bool:
         """验证URL格式"""
         return url.startswith('http://') or url.startswith('https://')
+    
+    def _check_url(self, url: str):
+        if not self.validate_url(url):
+            raise ValueError(f"无效的URL: {url}")
+        if not self.can_handle(url):
+            raise ValueError(f"不支持的{self.display_name}链接格式: {url}")
+    
+    # ==================== 分级抓取 ====================
+    
+    def _scrape_tiered(self, url: str) -> ConversationData:
+        """
+        先用HTTP直取页面内嵌数据，失败再用浏览器渲染；
+        不使用浏览器时退回到解析服务端返回的HTML标记
+        """
+        html = None
+        if not self.use_playwright or self._should_try_http():
+            data, html = self._fetch_embedded(url)
+            if data:
+                return data
+        
+        if self.use_playwright:
+            return self._scrape_with_playwright(url)
+        
+        print(f"[{self.display_name}] 使用requests抓取: {url}")
+        if html is None:
+            from .fetch_tiers import fetch_html
+            try:
+                html = fetch_html(url)
+            except Exception as e:
+                raise RuntimeError(f"网络请求失败: {str(e)}")
+        return self.parse_static_html(html, url)
+    
+    def _should_try_http(self) -> bool:
+        from .fetch_tiers import fast_path_enabled, get_tier_stats
+        return fast_path_enabled() and get_tier_stats().should_try_http(self.platform_name)
+    
+    def _fetch_embedded(self, url: str) -> Tuple[Optional[ConversationData], Optional[str]]:
+        """HTTP直取：返回 (对话数据，未找到时为None; 页面HTML，请求失败时为None)"""
+        from .fetch_tiers import HTTP, fetch_html
+        
+        start = time.perf_counter()
+        html = data = None
+        try:
+            html = fetch_html(url)
+            data = self.parse_embedded(html, url)
+        except Exception as e:
+            logger.debug(f"[{self.display_name}] HTTP直取失败: {e}")
+        self._record(HTTP, data is not None, start)
+        
+        if data:
+            print(f"[{self.display_name}] 从页面内嵌数据提取 {data.message_count} 条消息（未启动浏览器）")
+        return data, html
+    
+    def _record(self, tier: str, ok: bool, start: float):
+        from .fetch_tiers import get_tier_stats
+        get_tier_stats().record(self.platform_name, tier, ok, time.perf_counter() - start)
+    
+    # ==================== 浏览器抓取 ====================
+    
+    def _scrape_with_playwright(self, url: str) -> ConversationData:
+        """使用Playwright抓取"""
+        from .browser_pool import get_browser_pool
+        from .fetch_tiers import BROWSER
+        
+        print(f"[{self.display_name}] 使用Playwright抓取: {url}")
+        
+        # 在共享浏览器池中打开页面（浏览器常驻，不再每次启动）
+        start = time.perf_counter()
+        try:
+            data = get_browser_pool().run(lambda page: self._scrape_page(page, url))
+        except Exception:
+            self._record(BROWSER, False, start)
+            raise
+        self._record(BROWSER, True, start)
+        return data
+    
+    def _scrape_page(self, page, url: str) -> ConversationData:
+        """在浏览器池提供的页面中加载并解析对话"""
+        from playwright.sync_api import TimeoutError as PlaywrightTimeout
+        from .page_readiness import wait_until_ready
+        
+        try:
+            # 不等 networkidle：对话由脚本渲染，出现在DOM中即可解析
+            page.goto(url, wait_until='domcontentloaded', timeout=30000)
+            try:
+                ready = wait_until_ready(page, ', '.join(self.ready_selectors), self.ready_quiet_ms,
+                                         self.ready_timeout, self.scroll_to_bottom)
+            except PlaywrightTimeout:
+                ready = self._not_ready()
+            
+            return self._with_readiness(self.parse_html(page.content(), url), ready)
+        except PlaywrightTimeout:
+            raise TimeoutError(f"页面加载超时: {url}")
+        except Exception as e:
+            raise RuntimeError(f"抓取失败: {str(e)}")
+    
+    async def _scrape_page_async(self, page, url: str) -> ConversationData:
+        """_scrape_page 的异步版本"""
+        from playwright.async_api import TimeoutError as PlaywrightTimeout
+        from .page_readiness import wait_until_ready_async
+        
+        try:
+            await page.goto(url, wait_until='domcontentloaded', timeout=30000)
+            try:
+                ready = await wait_until_ready_async(page, ', '.join(self.ready_selectors), self.ready_quiet_ms,
+                                                     self.ready_timeout, self.scroll_to_bottom)
+            except PlaywrightTimeout:
+                ready = self._not_ready()
+            
+            html = await page.content()
+        except PlaywrightTimeout:
+            raise TimeoutError(f"页面加载超时: {url}")
+        except Exception as e:
+            raise RuntimeError(f"抓取失败: {str(e)}")
+        
+        # 解析是纯CPU操作，不阻塞其他页面的加载
+        try:
+            return self._with_readiness(await asyncio.to_thread(self.parse_html, html, url), ready)
+        except Exception as e:
+            raise RuntimeError(f"抓取失败: {str(e)}")
+    
+    @staticmethod
+    def _with_readiness(data: ConversationData, ready: Dict) -> ConversationData:
+        """记录页面就绪耗时（毫秒）"""
+        if ready.get('elapsed') is not None:
+            data.metadata = {**(data.metadata or {}), 'ready_ms': ready['elapsed']}
+        return data
+    
+    def _not_ready(self) -> Dict:
+        print(f"[{self.display_name}] 警告: 未等到对话内容，按当前页面解析")
+        return {'count': 0, 'stable': False, 'elapsed': None}
@@ -0,0 +1,620 @@
+"""
+共享浏览器池
+
+各平台爬虫原来每个URL都 sync_playwright() + chromium.launch() 一次，
+启动浏览器要1~3秒并反复申请/释放几百MB内存。浏览器池常驻少量Chromium，供所有爬虫
+（CLI、添加对话对话框、TaskManagerThread）共享：
+
+1. 每个工作线程持有一个浏览器和一个可复用的上下文（Playwright同步API只能在创建它的线程中使用），
+   抓取任务排队交给空闲的工作线程，在新页面中执行后关闭页面
+2. 健康检查：取用前确认浏览器仍连接，崩溃后自动重启
+3. 回收：打开 max_pages_per_browser 个页面后，或页面JS堆超过 max_heap_mb 时重启浏览器；
+   空闲超过 idle_timeout 秒时关闭浏览器释放内存，下次抓取时再启动
+4. 浏览器和工作线程按需启动，不抓取时不占资源
+
+异步爬虫使用 AsyncBrowserPool（playwright.async_api）：浏览器属于调用方的事件循环，
+一个浏览器同时打开多个页面，并发由全局上限和按域名的信号量控制。
+
+用法:
+    pool = get_browser_pool()
+    html = pool.run(lambda page: (page.goto(url), page.content())[1])
+    html = await pool.run_async(fetch)      # 协程中使用，不占用线程池
+
+    pool = get_async_browser_pool()         # 当前事件循环的异步池
+    html = await pool.run(url, fetch_async) # fetch_async(page) 是协程函数
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple, TypeVar
+from urllib.parse import urlparse
+
+from . import page_readiness
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+# 读取页面JS堆大小（仅Chromium提供 performance.memory）
+_HEAP_SCRIPT = "() => (performance.memory && performance.memory.usedJSHeapSize) || 0"
+
+
+def _env_flag(name: str, default: str = 'true') -> bool:
+    return os.getenv(name, default).lower() == 'true'
+
+
+def launch_chromium(headless: bool = True) -> Tuple[Any, Callable[[], None]]:
+    """
+    启动无头Chromium
+
+    Returns:
+        (browser, 停止函数)；停止函数关闭本线程的Playwright驱动
+    """
+    from playwright.sync_api import sync_playwright
+
+    playwright = sync_playwright().start()
+    try:
+        browser = playwright.chromium.launch(headless=headless)
+    except Exception:
+        playwright.stop()
+        raise
+    return browser, playwright.stop
+
+
+async def launch_chromium_async(headless: bool = True) -> Tuple[Any, Callable[[], Awaitable[None]]]:
+    """启动无头Chromium（异步API，浏览器属于当前事件循环）"""
+    from playwright.async_api import async_playwright
+
+    playwright = await async_playwright().start()
+    try:
+        browser = await playwright.chromium.launch(headless=headless)
+    except Exception:
+        await playwright.stop()
+        raise
+    return browser, playwright.stop
+
+
+@dataclass
+class BrowserPoolStats:
+    """浏览器池统计"""
+    launches: int = 0          # 启动浏览器次数
+    recycles: int = 0          # 因页面数/内存/崩溃/空闲重启或关闭的次数
+    pages: int = 0             # 已完成的页面任务数
+    failures: int = 0          # 抛出异常的页面任务数
+    launch_seconds: float = 0.0  # 启动浏览器累计耗时
+
+
+class _BrowserSlot:
+    """工作线程持有的浏览器（只在该线程中访问）"""
+
+    def __init__(self, pool: 'BrowserPool'):
+        self.pool = pool
+        self.browser = None
+        self.context = None
+        self._stop = None
+        self.pages = 0
+        self.idle = False
+        self.last_used = time.monotonic()
+
+    def new_page(self):
+        if self.browser is not None and not self._healthy():
+            self.close("浏览器已断开")
+        if self.browser is None:
+            self._launch()
+        return self.context.new_page()
+
+    def _healthy(self) -> bool:
+        try:
+            return self.browser.is_connected()
+        except Exception:
+            return False
+
+    def _launch(self):
+        start = time.perf_counter()
+        self.browser, self._stop = self.pool.launcher()
+        self.context = self.browser.new_context(**self.pool.context_options)
+        if self.pool.block_resources:
+            page_readiness.block_resources(self.context)
+        self.pages = 0
+        elapsed = time.perf_counter() - start
+        with self.pool._lock:
+            self.pool.stats.launches += 1
+            self.pool.stats.launch_seconds += elapsed
+        logger.info(f"🌐 浏览器已启动（{elapsed:.2f}秒）")
+
+    def release(self, page):
+        """关闭页面；达到页面数或内存上限时重启浏览器"""
+        heap_mb = self._heap_mb(page)
+        try:
+            page.close()
+        except Exception:
+            pass
+        self.pages += 1
+        self.last_used = time.monotonic()
+
+        if self.pages >= self.pool.max_pages_per_browser:
+            self.close(f"已打开 {self.pages} 个页面")
+        elif heap_mb is not None and heap_mb > self.pool.max_heap_mb:
+            self.close(f"页面内存 {heap_mb:.0f}MB 超过上限")
+        elif not self._healthy():
+            self.close("浏览器已断开")
+
+    def _heap_mb(self, page) -> Optional[float]:
+        if not self.pool.max_heap_mb:
+            return None
+        try:
+            return page.evaluate(_HEAP_SCRIPT) / (1024 * 1024)
+        except Exception:
+            return None
+
+    def close(self, reason: Optional[str] = None):
+        if self.browser is None:
+            return
+        if reason:
+            logger.info(f"♻️ 回收浏览器: {reason}")
+            with self.pool._lock:
+                self.pool.stats.recycles += 1
+        for close in (self.browser.close, self._stop):
+            try:
+                if close:
+                    close()
+            except Exception:
+                pass  # 浏览器可能已崩溃
+        self.browser = self.context = self._stop = None
+
+
+class BrowserPool:
+    """常驻Chromium的浏览器池"""
+
+    def __init__(self, size: int = 2,
+                 max_pages_per_browser: int = 50,
+                 max_heap_mb: Optional[float] = 512,
+                 idle_timeout: Optional[float] = 300,
+                 launcher: Optional[Callable[[], Tuple[Any, Callable[[], None]]]] = None,
+                 context_options: Optional[Dict[str, Any]] = None,
+                 block_resources: bool = True):
+        """
+        初始化浏览器池
+
+        Args:
+            size: 浏览器（工作线程）数，即同时打开的页面数上限
+            max_pages_per_browser: 每个浏览器打开多少个页面后重启
+            max_heap_mb: 页面JS堆超过该值（MB）时重启浏览器，None表示不检查
+            idle_timeout: 空闲多少秒后关闭浏览器，None表示一直保留
+            launcher: 启动浏览器的函数，返回 (browser, 停止函数)，默认无头Chromium
+            context_options: 浏览器上下文参数，默认只设置User-Agent
+            block_resources: 拦截图片、字体、音视频和统计请求
+        """
+        self.size = max(1, size)
+        self.max_pages_per_browser = max(1, max_pages_per_browser)
+        self.max_heap_mb = max_heap_mb
+        self.idle_timeout = idle_timeout
+        self.launcher = launcher or launch_chromium
+        self.context_options = context_options if context_options is not None else {
+            'user_agent': DEFAULT_USER_AGENT
+        }
+        self.block_resources = block_resources
+
+        self.stats = BrowserPoolStats()
+        self._jobs: 'queue.Queue[Optional[Tuple[Callable, Future]]]' = queue.Queue()
+        self._lock = threading.Lock()
+        self._workers: list = []
+        self._slots: list = []
+        self._closed = False
+
+    @classmethod
+    def from_env(cls) -> 'BrowserPool':
+        """从环境变量创建（BROWSER_POOL_SIZE 等）"""
+        return cls(
+            size=int(os.getenv('BROWSER_POOL_SIZE', '2')),
+            max_pages_per_browser=int(os.getenv('BROWSER_MAX_PAGES', '50')),
+            max_heap_mb=float(os.getenv('BROWSER_MAX_HEAP_MB', '512')) or None,
+            idle_timeout=float(os.getenv('BROWSER_IDLE_TIMEOUT', '300')) or None,
+            block_resources=_env_flag('BROWSER_BLOCK_RESOURCES'),
+        )
+
+    # ==================== 任务 ====================
+
+    def submit(self, fn: Callable[[Any], T]) -> 'Future[T]':
+        """
+        提交页面任务
+
+        Args:
+            fn: 接收新页面（Playwright Page）的函数，在浏览器所在线程中执行；
+                返回后页面自动关闭
+
+        Returns:
+            concurrent.futures.Future
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("浏览器池已关闭")
+            self._jobs.put((fn, future))
+            # 排队任务多于空闲线程时增加工作线程（不超过 size）
+            if len(self._workers) < self.size and self._jobs.qsize() > self._idle_workers():
+                self._start_worker()
+        return future
+
+    def run(self, fn: Callable[[Any], T]) -> T:
+        """同步执行页面任务，返回 fn 的结果（异常原样抛出）"""
+        return self.submit(fn).result()
+
+    async def run_async(self, fn: Callable[[Any], T]) -> T:
+        """在协程中执行页面任务（等待期间不占用线程）"""
+        return await asyncio.wrap_future(self.submit(fn))
+
+    def _idle_workers(self) -> int:
+        return sum(1 for slot in self._slots if slot.idle)
+
+    def _start_worker(self):
+        slot = _BrowserSlot(self)
+        worker = threading.Thread(target=self._work, args=(slot,), daemon=True,
+                                  name=f"BrowserPool-{len(self._workers) + 1}")
+        self._slots.append(slot)
+        self._workers.append(worker)
+        worker.start()
+
+    def _work(self, slot: _BrowserSlot):
+        """工作线程：依次执行任务，浏览器只在本线程中使用"""
+        while True:
+            slot.idle = True
+            try:
+                job = self._jobs.get(timeout=self._poll_interval())
+            except queue.Empty:
+                if (slot.browser is not None and self.idle_timeout is not None
+                        and time.monotonic() - slot.last_used > self.idle_timeout):
+                    slot.close("空闲超时")
+                continue
+            slot.idle = False
+            if job is None:
+                break
+            fn, future = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            self._execute(slot, fn, future)
+        slot.close()
+
+    def _poll_interval(self) -> float:
+        if self.idle_timeout is None:
+            return 60.0
+        return max(0.05, min(self.idle_timeout / 2, 60.0))
+
+    def _execute(self, slot: _BrowserSlot, fn: Callable, future: Future):
+        try:
+            page = slot.new_page()
+        except BaseException as e:
+            with self._lock:
+                self.stats.failures += 1
+            future.set_exception(e)
+            return
+
+        try:
+            result = fn(page)
+        except BaseException as e:
+            with self._lock:
+                self.stats.failures += 1
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            with self._lock:
+                self.stats.pages += 1
+            slot.release(page)
+
+    # ==================== 生命周期 ====================
+
+    def status(self) -> Dict[str, Any]:
+        """池状态（工作线程数、已启动的浏览器数、排队任务数和统计）"""
+        return {
+            'size': self.size,
+            'workers': len(self._workers),
+            'browsers': sum(1 for slot in self._slots if slot.browser is not None),
+            'queued': self._jobs.qsize(),
+            **asdict(self.stats),
+        }
+
+    def close(self, timeout: float = 10.0):
+        """关闭所有浏览器并停止工作线程（排队中的任务被取消）"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers)
+
+        # 取消尚未开始的任务
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job[1].cancel()
+
+        for _ in workers:
+            self._jobs.put(None)
+        for worker in workers:
+            worker.join(timeout)
+
+
+class _AsyncBrowser:
+    """异步池中的浏览器（多个页面共享）"""
+
+    def __init__(self, browser, context, stop):
+        self.browser = browser
+        self.context = context
+        self.stop = stop
+        self.active = 0        # 正在使用的页面数
+        self.pages = 0         # 已打开过的页面数
+        self.retired = False   # 已停止分配新页面，最后一个页面关闭后关闭浏览器
+
+
+class AsyncBrowserPool:
+    """
+    异步浏览器池
+
+    属于创建它的事件循环（Playwright异步对象不能跨事件循环使用）。
+    一个浏览器同时打开多个页面：全局信号量限制同时打开的页面数，
+    按域名的信号量限制同一站点的并发，避免对单个平台短时间内发起过多请求。
+    """
+
+    def __init__(self, max_concurrency: int = 8,
+                 per_domain: int = 3,
+                 max_pages_per_browser: int = 50,
+                 max_heap_mb: Optional[float] = 512,
+                 launcher: Optional[Callable[[], Awaitable[Tuple[Any, Callable[[], Awaitable[None]]]]]] = None,
+                 context_options: Optional[Dict[str, Any]] = None,
+                 block_resources: bool = True):
+        """
+        初始化异步浏览器池
+
+        Args:
+            max_concurrency: 同时打开的页面数上限
+            per_domain: 同一域名同时打开的页面数上限
+            max_pages_per_browser: 每个浏览器打开多少个页面后换新浏览器
+            max_heap_mb: 页面JS堆超过该值（MB）时换新浏览器，None表示不检查
+            launcher: 启动浏览器的协程函数，返回 (browser, 停止协程函数)
+            context_options: 浏览器上下文参数，默认只设置User-Agent
+            block_resources: 拦截图片、字体、音视频和统计请求
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_domain = max(1, per_domain)
+        self.max_pages_per_browser = max(1, max_pages_per_browser)
+        self.max_heap_mb = max_heap_mb
+        self.launcher = launcher or launch_chromium_async
+        self.context_options = context_options if context_options is not None else {
+            'user_agent': DEFAULT_USER_AGENT
+        }
+        self.block_resources = block_resources
+
+        self.stats = BrowserPoolStats()
+        self._global = asyncio.Semaphore(self.max_concurrency)
+        self._domains: Dict[str, asyncio.Semaphore] = {}
+        self._launch_lock = asyncio.Lock()
+        self._current: Optional[_AsyncBrowser] = None
+        self._retired: Set[_AsyncBrowser] = set()
+        self._closed = False
+
+    @classmethod
+    def from_env(cls) -> 'AsyncBrowserPool':
+        """从环境变量创建（BROWSER_MAX_CONCURRENCY、BROWSER_PER_DOMAIN 等）"""
+        return cls(
+            max_concurrency=int(os.getenv('BROWSER_MAX_CONCURRENCY', '8')),
+            per_domain=int(os.getenv('BROWSER_PER_DOMAIN', '3')),
+            max_pages_per_browser=int(os.getenv('BROWSER_MAX_PAGES', '50')),
+            max_heap_mb=float(os.getenv('BROWSER_MAX_HEAP_MB', '512')) or None,
+            block_resources=_env_flag('BROWSER_BLOCK_RESOURCES'),
+        )
+
+    # ==================== 任务 ====================
+
+    async def run(self, url: str, fn: Callable[[Any], Awaitable[T]]) -> T:
+        """
+        在新页面中执行页面任务
+
+        Args:
+            url: 要抓取的链接（用于按域名限流）
+            fn: 接收新页面的协程函数；返回后页面自动关闭
+
+        Returns:
+            fn 的结果（异常原样抛出）
+        """
+        if self._closed:
+            raise RuntimeError("浏览器池已关闭")
+
+        # 先占域名名额再占全局名额，等待同一站点的任务不占用全局名额
+        async with self._domain(url), self._global:
+            handle = await self._acquire()
+            handle.active += 1
+            page = None
+            try:
+                page = await handle.context.new_page()
+                return await fn(page)
+            except BaseException:
+                self.stats.failures += 1
+                raise
+            finally:
+                await self._release(handle, page)
+
+    def _domain(self, url: str) -> asyncio.Semaphore:
+        host = (urlparse(url).hostname or '').lower()
+        semaphore = self._domains.get(host)
+        if semaphore is None:
+            semaphore = self._domains[host] = asyncio.Semaphore(self.per_domain)
+        return semaphore
+
+    async def _acquire(self) -> _AsyncBrowser:
+        async with self._launch_lock:
+            current = self._current
+            if current is not None and not self._healthy(current):
+                await self._retire(current, "浏览器已断开")
+            if self._current is None:
+                self._current = await self._launch()
+            return self._current
+
+    @staticmethod
+    def _healthy(handle: _AsyncBrowser) -> bool:
+        try:
+            return handle.browser.is_connected()
+        except Exception:
+            return False
+
+    async def _launch(self) -> _AsyncBrowser:
+        start = time.perf_counter()
+        browser, stop = await self.launcher()
+        try:
+            context = await browser.new_context(**self.context_options)
+            if self.block_resources:
+                await page_readiness.block_resources_async(context)
+        except Exception:
+            await browser.close()
+            await stop()
+            raise
+        elapsed = time.perf_counter() - start
+        self.stats.launches += 1
+        self.stats.launch_seconds += elapsed
+        logger.info(f"🌐 浏览器已启动（{elapsed:.2f}秒）")
+        return _AsyncBrowser(browser, context, stop)
+
+    async def _release(self, handle: _AsyncBrowser, page):
+        """关闭页面；达到页面数或内存上限时换新浏览器"""
+        heap_mb = None
+        if page is not None:
+            heap_mb = await self._heap_mb(page)
+            try:
+                await page.close()
+            except Exception:
+                pass
+            handle.pages += 1
+            self.stats.pages += 1
+        handle.active -= 1
+
+        if not handle.retired:
+            if handle.pages >= self.max_pages_per_browser:
+                await self._retire(handle, f"已打开 {handle.pages} 个页面")
+            elif heap_mb is not None and heap_mb > self.max_heap_mb:
+                await self._retire(handle, f"页面内存 {heap_mb:.0f}MB 超过上限")
+        elif handle.active == 0:
+            await self._close_handle(handle)
+
+    async def _heap_mb(self, page) -> Optional[float]:
+        if not self.max_heap_mb:
+            return None
+        try:
+            return await page.evaluate(_HEAP_SCRIPT) / (1024 * 1024)
+        except Exception:
+            return None
+
+    async def _retire(self, handle: _AsyncBrowser, reason: str):
+        """不再分配新页面；正在使用的页面关闭后关闭浏览器"""
+        if handle.retired:
+            return
+        logger.info(f"♻️ 回收浏览器: {reason}")
+        self.stats.recycles += 1
+        handle.retired = True
+        if self._current is handle:
+            self._current = None
+        if handle.active == 0:
+            await self._close_handle(handle)
+        else:
+            self._retired.add(handle)
+
+    async def _close_handle(self, handle: _AsyncBrowser):
+        self._retired.discard(handle)
+        for close in (handle.browser.close, handle.stop):
+            try:
+                await close()
+            except Exception:
+                pass  # 浏览器可能已崩溃
+
+    # ==================== 生命周期 ====================
+
+    def status(self) -> Dict[str, Any]:
+        """池状态（浏览器数、打开中的页面数、域名数和统计）"""
+        handles = list(self._retired) + ([self._current] if self._current else [])
+        return {
+            'max_concurrency': self.max_concurrency,
+            'per_domain': self.per_domain,
+            'browsers': len(handles),
+            'active_pages': sum(handle.active for handle in handles),
+            'domains': len(self._domains),
+            **asdict(self.stats),
+        }
+
+    async def close(self):
+        """关闭所有浏览器"""
+        self._closed = True
+        handles = list(self._retired) + ([self._current] if self._current else [])
+        self._current = None
+        for handle in handles:
+            await self._close_handle(handle)
+
+
+# ==================== 进程内共享 ====================
+
+_shared_pool: Optional[BrowserPool] = None
+_shared_lock = threading.Lock()
+_async_pools: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncBrowserPool]' = \
+    weakref.WeakKeyDictionary()
+
+
+def get_browser_pool() -> BrowserPool:
+    """进程内共享的浏览器池（首次调用时按环境变量创建，退出时关闭）"""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None or _shared_pool._closed:
+            _shared_pool = BrowserPool.from_env()
+        return _shared_pool
+
+
+def set_browser_pool(pool: Optional[BrowserPool]) -> Optional[BrowserPool]:
+    """替换共享的浏览器池（测试或自定义配置），返回原来的池"""
+    global _shared_pool
+    with _shared_lock:
+        previous, _shared_pool = _shared_pool, pool
+    return previous
+
+
+def close_browser_pool():
+    """关闭共享的浏览器池（未创建时什么也不做）"""
+    with _shared_lock:
+        pool = _shared_pool
+    if pool is not None:
+        pool.close()
+
+
+def get_async_browser_pool() -> AsyncBrowserPool:
+    """当前事件循环的异步浏览器池（首次调用时按环境变量创建）"""
+    loop = asyncio.get_running_loop()
+    pool = _async_pools.get(loop)
+    if pool is None or pool._closed:
+        pool = _async_pools[loop] = AsyncBrowserPool.from_env()
+    return pool
+
+
+def set_async_browser_pool(pool: AsyncBrowserPool):
+    """替换当前事件循环的异步浏览器池（测试或自定义配置）"""
+    _async_pools[asyncio.get_running_loop()] = pool
+
+
+async def close_async_browser_pool():
+    """关闭当前事件循环的异步浏览器池（事件循环结束前调用）"""
+    pool = _async_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+atexit.register(close_browser_pool)
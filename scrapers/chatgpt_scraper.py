@@ -3,167 +3,79 @@ ChatGPT分享链接爬虫
 支持格式: https://chat.openai.com/share/xxx 或 https://chatgpt.com/share/xxx
 """
 import re
-import json
-import time
 from typing import Optional
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
 from bs4 import BeautifulSoup
 
 from .base_scraper import BaseScraper, ConversationData, Message
+from .html_parser import make_soup, text_blocks as find_text_blocks
 
 
 class ChatGPTScraper(BaseScraper):
     """ChatGPT爬虫实现"""
     
+    display_name = 'ChatGPT'
+    # 页面加载：以下任一元素出现即认为对话已渲染
+    ready_selectors = (
+        '[data-testid^="conversation-turn"]',
+        'article',
+        '[role="article"]',
+        '[data-message-author-role]',
+        '[class*="conversation"]',
+    )
+    
     def __init__(self, use_playwright: bool = True):
         super().__init__()
         self.use_playwright = use_playwright
         self.platform_name = 'chatgpt'
     
-    def can_handle(self, url: str) -> bool:
-        """判断是否为ChatGPT分享链接"""
-        patterns = [
-            r'https?://chat\.openai\.com/share/[a-zA-Z0-9\-]+',
-            r'https?://chatgpt\.com/share/[a-zA-Z0-9\-]+'
-        ]
-        return any(re.match(pattern, url) for pattern in patterns)
-    
     def scrape(self, url: str) -> ConversationData:
         """抓取ChatGPT对话内容"""
-        if not self.validate_url(url):
-            raise ValueError(f"无效的URL: {url}")
+        self._check_url(url)
         
-        if not self.can_handle(url):
-            raise ValueError(f"不支持的ChatGPT链接格式: {url}")
-        
-        # 优先使用Playwright（处理动态内容）
-        if self.use_playwright:
-            return self._scrape_with_playwright(url)
-        else:
-            return self._scrape_with_requests(url)
+        # 先从页面内嵌数据直接提取，失败再使用Playwright（处理动态内容）
+        return self._scrape_tiered(url)
     
-    def _scrape_with_playwright(self, url: str) -> ConversationData:
-        """使用Playwright抓取（推荐方式）"""
-        print(f"[ChatGPT] 使用Playwright抓取: {url}")
+    def parse_html(self, html: str, url: str) -> ConversationData:
+        """解析渲染后的页面"""
+        soup = make_soup(html)
         
-        with sync_playwright() as p:
-            # 启动浏览器（无头模式）
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            )
-            page = context.new_page()
-            
-            try:
-                # 访问页面
-                page.goto(url, wait_until='networkidle', timeout=30000)
-                
-                # 尝试多种选择器等待内容加载
-                selectors_to_try = [
-                    '[data-testid^="conversation-turn"]',
-                    'article',
-                    '[role="article"]',
-                    '[data-message-author-role]',
-                    '[class*="conversation"]',
-                ]
-                
-                content_loaded = False
-                for selector in selectors_to_try:
-                    try:
-                        page.wait_for_selector(selector, timeout=10000)
-                        print(f"[ChatGPT] 内容加载完成 (选择器: {selector})")
-                        content_loaded = True
-                        break
-                    except PlaywrightTimeout:
-                        continue
-                
-                if not content_loaded:
-                    print("[ChatGPT] 警告: 使用标准选择器未找到内容，尝试通用方法...")
-                
-                # 额外等待确保内容完全加载
-                time.sleep(3)
-                
-                # 获取页面HTML
-                html_content = page.content()
-                
-                # 解析内容
-                soup = BeautifulSoup(html_content, 'html.parser')
-                
-                # 提取标题
-                title = self._extract_title(soup, page)
-                
-                # 提取消息（尝试多种方法）
-                messages = self._extract_messages_enhanced(soup, page)
-                
-                if not messages:
-                    raise ValueError("未能提取到对话内容，可能页面结构已变化。请运行 debug_chatgpt.py 诊断问题。")
-                
-                print(f"[ChatGPT] 成功提取 {len(messages)} 条消息")
-                
-                return ConversationData(
-                    platform=self.platform_name,
-                    url=url,
-                    title=title,
-                    messages=messages,
-                    metadata={'scrape_method': 'playwright'}
-                )
-                
-            except PlaywrightTimeout:
-                raise TimeoutError(f"页面加载超时: {url}")
-            except Exception as e:
-                raise RuntimeError(f"抓取失败: {str(e)}")
-            finally:
-                browser.close()
-    
-    def _scrape_with_requests(self, url: str) -> ConversationData:
-        """使用requests抓取（备用方案，可能失败）"""
-        import requests
+        # 提取标题
+        title = self._extract_title(soup)
         
-        print(f"[ChatGPT] 使用requests抓取: {url}")
+        # 提取消息（尝试多种方法）
+        messages = self._extract_messages_enhanced(soup)
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-        }
+        if not messages:
+            raise ValueError("未能提取到对话内容，可能页面结构已变化。请运行 debug_chatgpt.py 诊断问题。")
         
-        try:
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 尝试从<script>标签中提取JSON数据
-            script_tags = soup.find_all('script', type='application/json')
-            for script in script_tags:
-                try:
-                    data = json.loads(script.string)
-                    # 这里需要根据实际JSON结构解析
-                    # ChatGPT的分享页面可能在__NEXT_DATA__中包含对话数据
-                    if 'props' in data and 'pageProps' in data['props']:
-                        # 解析逻辑（需要根据实际结构调整）
-                        pass
-                except:
-                    continue
-            
-            # 如果JSON解析失败，尝试HTML解析
-            title = self._extract_title(soup)
-            messages = self._extract_messages(soup)
-            
-            if not messages:
-                raise ValueError("requests方法未能提取内容，建议使用Playwright")
-            
-            return ConversationData(
-                platform=self.platform_name,
-                url=url,
-                title=title,
-                messages=messages,
-                metadata={'scrape_method': 'requests'}
-            )
-            
-        except requests.RequestException as e:
-            raise RuntimeError(f"网络请求失败: {str(e)}")
+        print(f"[ChatGPT] 成功提取 {len(messages)} 条消息")
+        
+        return ConversationData(
+            platform=self.platform_name,
+            url=url,
+            title=title,
+            messages=messages,
+            metadata={'scrape_method': 'playwright'}
+        )
+    
+    def parse_static_html(self, html: str, url: str) -> ConversationData:
+        """解析服务端返回的HTML（不使用浏览器时的备用方案，可能失败）"""
+        soup = make_soup(html)
+        title = self._extract_title(soup)
+        messages = self._extract_messages(soup)
+        
+        if not messages:
+            raise ValueError("requests方法未能提取内容，建议使用Playwright")
+        
+        return ConversationData(
+            platform=self.platform_name,
+            url=url,
+            title=title,
+            messages=messages,
+            metadata={'scrape_method': 'requests'}
+        )
     
-    def _extract_title(self, soup: BeautifulSoup, page=None) -> str:
+    def _extract_title(self, soup: BeautifulSoup) -> str:
         """提取对话标题"""
         # 方法1: 从页面标题提取
         title_tag = soup.find('title')
@@ -180,14 +92,10 @@ class ChatGPTScraper(BaseScraper):
             text = first_message.get_text(strip=True)
             return text[:50] + ('...' if len(text) > 50 else '')
         
-        # 方法3: 使用Playwright获取
-        if page:
-            try:
-                title_element = page.query_selector('h1, [role="heading"]')
-                if title_element:
-                    return title_element.inner_text()
-            except:
-                pass
+        # 方法3: 页面中的标题元素
+        title_element = soup.select_one('h1, [role="heading"]')
+        if title_element and title_element.get_text(strip=True):
+            return title_element.get_text(strip=True)
         
         return "未命名对话"
     
@@ -213,7 +121,7 @@ class ChatGPTScraper(BaseScraper):
         
         return messages
     
-    def _extract_messages_enhanced(self, soup: BeautifulSoup, page=None) -> list[Message]:
+    def _extract_messages_enhanced(self, soup: BeautifulSoup) -> list[Message]:
         """增强的消息提取方法（支持多种页面结构）"""
         messages = []
         
@@ -255,39 +163,22 @@ class ChatGPTScraper(BaseScraper):
             if messages:
                 return messages
         
-        # 方法4: 使用Playwright直接提取
-        if page:
-            print("[ChatGPT] 方法4: 尝试使用Playwright直接提取")
-            try:
-                # 尝试找到所有消息元素
-                elements = page.query_selector_all('article, [data-testid^="conversation-turn"], [role="article"]')
-                if elements:
-                    print(f"[ChatGPT] Playwright找到 {len(elements)} 个消息元素")
-                    for i, element in enumerate(elements):
-                        try:
-                            text = element.inner_text()
-                            if text and len(text.strip()) > 0:
-                                role = 'user' if i % 2 == 0 else 'assistant'
-                                messages.append(Message(role=role, content=text.strip()))
-                        except:
-                            continue
-                    if messages:
-                        return messages
-            except Exception as e:
-                print(f"[ChatGPT] Playwright提取失败: {e}")
+        # 方法4: 按消息元素的可见文本提取
+        elements = soup.select('article, [data-testid^="conversation-turn"], [role="article"]')
+        if elements:
+            print(f"[ChatGPT] 方法4: 找到 {len(elements)} 个消息元素")
+            for i, element in enumerate(elements):
+                text = element.get_text(separator='\n', strip=True)
+                if text:
+                    role = 'user' if i % 2 == 0 else 'assistant'
+                    messages.append(Message(role=role, content=text))
+            if messages:
+                return messages
         
         # 方法5: 通用方法 - 查找包含大量文本的div
         print("[ChatGPT] 方法5: 使用通用文本提取")
-        all_divs = soup.find_all('div', class_=True)
-        text_blocks = []
-        for div in all_divs:
-            text = div.get_text(strip=True)
-            # 过滤掉太短的内容
-            if len(text) > 20 and len(text) < 5000:
-                # 检查是否是独立的文本块
-                children_text = sum(len(child.get_text(strip=True)) for child in div.find_all('div'))
-                if children_text < len(text) * 0.5:  # 子元素文本不超过自身的50%
-                    text_blocks.append(text)
+        # 单遍自底向上统计文本长度（子元素文本不超过自身的50%即为独立文本块）
+        text_blocks = find_text_blocks(soup)
         
         if text_blocks:
             print(f"[ChatGPT] 找到 {len(text_blocks)} 个文本块")
@@ -0,0 +1,158 @@
+"""
+分享页内嵌数据提取
+
+分享页的服务端渲染结果里通常带着完整的对话数据（Next.js 的 __NEXT_DATA__ / __next_f、
+Remix 的 __remixContext、window.__INITIAL_STATE__、application/json 脚本）。
+直接用HTTP取回HTML并从中解析对话，不需要启动浏览器执行脚本。
+
+对话在JSON中的位置随平台和版本变化，这里不写死路径，而是遍历JSON，
+找出能识别为消息（有角色和文本）且同时包含用户和助手消息的最长列表。
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import json
+import re
+from typing import Any, Iterator, List, Optional, Tuple
+
+from .base_scraper import Message
+
+# window.X = {...} 形式的全局数据
+_GLOBAL_ASSIGN = re.compile(
+    r'window\.(?:__remixContext|__INITIAL_STATE__|__NUXT__|__APOLLO_STATE__|__PRELOADED_STATE__)\s*=\s*')
+# <script id="__NEXT_DATA__" type="application/json"> 及其他JSON脚本
+_JSON_SCRIPT = re.compile(
+    r'<script[^>]*type=["\']application/(?:ld\+)?json["\'][^>]*>(.*?)</script>', re.S | re.I)
+# Next.js App Router: self.__next_f.push([1,"..."])
+_NEXT_FLIGHT = re.compile(r'self\.__next_f\.push\(\[\d+,\s*("(?:[^"\\]|\\.)*")\]\)', re.S)
+
+_USER_ROLES = {'user', 'human'}
+_ASSISTANT_ROLES = {'assistant', 'model', 'bot', 'ai', 'chatbot'}
+_TITLE_KEYS = ('title', 'name', 'conversation_title')
+_MAX_DEPTH = 40
+
+
+def extract_json_payloads(html: str) -> Iterator[Any]:
+    """依次产出页面中内嵌的JSON对象"""
+    decoder = json.JSONDecoder()
+
+    for match in _JSON_SCRIPT.finditer(html):
+        try:
+            yield json.loads(match.group(1))
+        except ValueError:
+            continue
+
+    for match in _GLOBAL_ASSIGN.finditer(html):
+        try:
+            yield decoder.raw_decode(html, match.end())[0]
+        except ValueError:
+            continue
+
+    # Flight数据：字符串拼接后按行分隔，每行为 "id:JSON"
+    chunks = []
+    for match in _NEXT_FLIGHT.finditer(html):
+        try:
+            chunks.append(json.loads(match.group(1)))
+        except ValueError:
+            continue
+    for line in "".join(chunks).splitlines():
+        _, sep, payload = line.partition(':')
+        if sep and payload[:1] in '[{':
+            try:
+                yield json.loads(payload)
+            except ValueError:
+                continue
+
+
+def _role(item: dict) -> Optional[str]:
+    author = item.get('author')
+    role = author.get('role') if isinstance(author, dict) else None
+    role = role or item.get('role') or item.get('sender') or item.get('from')
+    if not isinstance(role, str):
+        return None
+    role = role.lower()
+    if role in _USER_ROLES:
+        return 'user'
+    if role in _ASSISTANT_ROLES:
+        return 'assistant'
+    return None            # system / tool 等消息不计入对话
+
+
+def _text(value: Any) -> str:
+    """消息内容：字符串、{parts: [...]}、[{type: 'text', text}] 等形式"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return "\n".join(filter(None, (_text(part) for part in value)))
+    if isinstance(value, dict):
+        if value.get('type') not in (None, 'text', 'markdown', 'code'):
+            return ''
+        for key in ('parts', 'text', 'content', 'value'):
+            if key in value:
+                return _text(value[key])
+    return ''
+
+
+def _as_message(item: Any) -> Optional[Message]:
+    if not isinstance(item, dict):
+        return None
+    if isinstance(item.get('message'), dict):     # ChatGPT: {message: {author, content}}
+        item = item['message']
+    role = _role(item)
+    if role is None:
+        return None
+    for key in ('content', 'text', 'parts', 'message'):
+        if key in item:
+            content = _text(item[key]).strip()
+            if content:
+                return Message(role=role, content=content)
+    return None
+
+
+def _walk(node: Any, parent: Optional[dict], depth: int = 0) -> Iterator[Tuple[list, Optional[dict]]]:
+    """遍历JSON，产出 (列表, 所在的对象)"""
+    if depth > _MAX_DEPTH:
+        return
+    if isinstance(node, dict):
+        for value in node.values():
+            yield from _walk(value, node, depth + 1)
+    elif isinstance(node, list):
+        yield node, parent
+        for value in node:
+            yield from _walk(value, parent, depth + 1)
+
+
+def find_conversation(payload: Any) -> Optional[Tuple[Optional[str], List[Message]]]:
+    """
+    在JSON中查找对话
+
+    Returns:
+        (标题, 消息列表)；没有同时包含用户和助手消息的列表时返回None
+    """
+    best, best_parent = [], None
+    for items, parent in _walk(payload, None):
+        if len(items) < 2 or len(items) <= len(best):
+            continue
+        messages = [message for message in map(_as_message, items) if message]
+        roles = {message.role for message in messages}
+        if len(messages) > len(best) and roles == {'user', 'assistant'}:
+            best, best_parent = messages, parent
+
+    if not best:
+        return None
+    title = None
+    if best_parent:
+        title = next((best_parent[key] for key in _TITLE_KEYS
+                      if isinstance(best_parent.get(key), str) and best_parent[key].strip()), None)
+    return title, best
+
+
+def extract_conversation(html: str) -> Optional[Tuple[Optional[str], List[Message]]]:
+    """从页面HTML的内嵌数据中提取对话（取消息最多的一份）"""
+    best = None
+    for payload in extract_json_payloads(html):
+        found = find_conversation(payload)
+        if found and (best is None or len(found[1]) > len(best[1])):
+            best = found
+    return best
@@ -0,0 +1,138 @@
+"""
+分级抓取：HTTP直取优先，浏览器兜底
+
+第一级直接请求分享页并从内嵌数据中解析对话（embedded_data），比启动浏览器渲染快一到两个数量级；
+解析不到再交给浏览器。每个平台分别记录两级的成功率和耗时：
+HTTP一级最近的成功率过低时（平台改版后内嵌数据不再包含对话）直接使用浏览器，
+只偶尔再试探一次HTTP，恢复后自动回到快速路径。
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+HTTP = 'http'
+BROWSER = 'browser'
+
+_HEADERS = {
+    'User-Agent': ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/120.0 Safari/537.36'),
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def fetch_html(url: str, timeout: float = 15) -> str:
+    """用共享的HTTP会话（复用连接）获取页面HTML"""
+    global _session
+    import requests
+
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers.update(_HEADERS)
+    response = _session.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.text
+
+
+class _TierRecord:
+    """单个平台单级的统计"""
+
+    def __init__(self, window: int):
+        self.attempts = 0
+        self.successes = 0
+        self.seconds = 0.0
+        self.recent: Deque[bool] = deque(maxlen=window)
+
+    def to_dict(self) -> Dict:
+        return {
+            'attempts': self.attempts,
+            'successes': self.successes,
+            'success_rate': round(self.successes / self.attempts, 3) if self.attempts else None,
+            'avg_ms': round(self.seconds / self.attempts * 1000, 1) if self.attempts else None,
+        }
+
+
+class TierStats:
+    """各平台分级抓取的成功率和耗时"""
+
+    def __init__(self, window: int = 20, min_attempts: int = 5,
+                 min_success_rate: float = 0.2, probe_every: int = 10):
+        """
+        Args:
+            window: 按最近多少次HTTP抓取计算成功率
+            min_attempts: 少于该次数时总是先试HTTP
+            min_success_rate: 最近成功率低于该值时跳过HTTP
+            probe_every: 跳过HTTP期间每隔多少次抓取试探一次
+        """
+        self.window = window
+        self.min_attempts = min_attempts
+        self.min_success_rate = min_success_rate
+        self.probe_every = probe_every
+        self._records: Dict[str, Dict[str, _TierRecord]] = {}
+        self._skipped: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, platform: str, tier: str, ok: bool, seconds: float):
+        """记录一次抓取"""
+        with self._lock:
+            record = self._records.setdefault(platform, {}).setdefault(tier, _TierRecord(self.window))
+            record.attempts += 1
+            record.successes += int(ok)
+            record.seconds += seconds
+            record.recent.append(ok)
+
+    def should_try_http(self, platform: str) -> bool:
+        """该平台这次抓取是否先试HTTP"""
+        with self._lock:
+            record = self._records.get(platform, {}).get(HTTP)
+            if record is None or len(record.recent) < self.min_attempts:
+                return True
+            if sum(record.recent) / len(record.recent) >= self.min_success_rate:
+                return True
+            skipped = self._skipped.get(platform, 0) + 1
+            self._skipped[platform] = 0 if skipped >= self.probe_every else skipped
+            return skipped >= self.probe_every
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict]]:
+        """{平台: {级别: {attempts, successes, success_rate, avg_ms}}}"""
+        with self._lock:
+            return {platform: {tier: record.to_dict() for tier, record in tiers.items()}
+                    for platform, tiers in self._records.items()}
+
+    def reset(self):
+        with self._lock:
+            self._records.clear()
+            self._skipped.clear()
+
+
+_tier_stats = TierStats()
+
+
+def get_tier_stats() -> TierStats:
+    """进程内共享的分级抓取统计"""
+    return _tier_stats
+
+
+def fast_path_enabled() -> bool:
+    """是否启用HTTP直取（SCRAPER_FAST_PATH，默认启用）"""
+    return os.getenv('SCRAPER_FAST_PATH', 'true').lower() == 'true'
+
+
+def summarize(stats: Optional[Dict] = None) -> str:
+    """统计摘要，便于日志输出"""
+    stats = stats if stats is not None else _tier_stats.snapshot()
+    parts = []
+    for platform, tiers in sorted(stats.items()):
+        for tier, record in sorted(tiers.items()):
+            parts.append(f"{platform}/{tier}: {record['successes']}/{record['attempts']} "
+                         f"平均{record['avg_ms']}ms")
+    return ", ".join(parts) or "暂无抓取记录"
@@ -0,0 +1,156 @@
+"""
+页面就绪检测与资源拦截
+
+原来的抓取流程等待 networkidle，再逐个尝试选择器（每个最多10秒），最后固定 sleep 几秒。
+分享页的对话一出现在DOM中就可以解析：
+1. 就绪检测：页面中注入 MutationObserver，平台的消息选择器匹配到元素后，
+   消息数和最后一条消息的长度在 quiet_ms 内不再变化即认为加载完成（流式渲染的长回答也能等到结束）；
+   需要时滚动到底部触发懒加载，再等一个静默窗口
+2. 资源拦截：图片、字体、音视频和统计/埋点请求直接中止，页面更快到达可解析状态
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import logging
+from typing import Any, Dict
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# 拦截的资源类型（Playwright request.resource_type）
+BLOCKED_RESOURCE_TYPES = frozenset({'image', 'media', 'font'})
+
+# 拦截的统计/埋点域名（匹配域名本身及其子域名）
+BLOCKED_HOSTS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'segment.io',
+    'segment.com',
+    'sentry.io',
+    'browser-intake-datadoghq.com',
+    'intercom.io',
+    'intercomcdn.com',
+    'statsig.com',
+    'featuregates.org',
+    'hotjar.com',
+    'mixpanel.com',
+    'amplitude.com',
+    'clarity.ms',
+)
+
+# 在页面中等待对话就绪：返回 {count, stable, elapsed}
+_READY_SCRIPT = """
+({selector, quietMs, timeoutMs, scroll}) => new Promise(resolve => {
+    const start = performance.now();
+    let quietTimer = null, lastSignature = null, scrolled = false;
+
+    const signature = () => {
+        const nodes = document.querySelectorAll(selector);
+        const last = nodes[nodes.length - 1];
+        return nodes.length ? nodes.length + ':' + (last.textContent || '').length : null;
+    };
+    const finish = stable => {
+        observer.disconnect();
+        clearTimeout(quietTimer);
+        clearTimeout(deadline);
+        resolve({count: document.querySelectorAll(selector).length, stable,
+                 elapsed: Math.round(performance.now() - start)});
+    };
+    const onQuiet = () => {
+        if (scroll && !scrolled) {
+            scrolled = true;
+            window.scrollTo(0, document.body.scrollHeight);
+            quietTimer = setTimeout(onQuiet, quietMs);
+            return;
+        }
+        finish(true);
+    };
+    const check = () => {
+        const current = signature();
+        if (current === null || current === lastSignature) return;
+        lastSignature = current;
+        clearTimeout(quietTimer);
+        quietTimer = setTimeout(onQuiet, quietMs);
+    };
+
+    const observer = new MutationObserver(check);
+    observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+    const deadline = setTimeout(() => finish(false), timeoutMs);
+    check();
+})
+"""
+
+
+def _ready_args(selector: str, quiet_ms: int, timeout_ms: int, scroll: bool) -> Dict[str, Any]:
+    return {'selector': selector, 'quietMs': quiet_ms, 'timeoutMs': timeout_ms, 'scroll': scroll}
+
+
+def wait_until_ready(page, selector: str, quiet_ms: int = 500,
+                     timeout_ms: int = 10000, scroll: bool = False) -> Dict[str, Any]:
+    """
+    等待对话渲染完成（同步API）
+
+    Args:
+        page: Playwright页面
+        selector: 消息元素的CSS选择器（可用逗号组合多个）
+        quiet_ms: 消息不再变化多久认为渲染完成
+        timeout_ms: 最长等待时间
+        scroll: 渲染完成后滚动到底部并再等一个静默窗口
+
+    Returns:
+        {'count': 消息元素数, 'stable': 是否在超时前稳定, 'elapsed': 毫秒}
+    """
+    try:
+        return page.evaluate(_READY_SCRIPT, _ready_args(selector, quiet_ms, timeout_ms, scroll))
+    except Exception as e:
+        # 页面跳转等原因导致脚本上下文失效时退回到等待选择器
+        logger.debug(f"就绪检测脚本失败，改为等待选择器: {e}")
+        page.wait_for_selector(selector, timeout=timeout_ms)
+        return {'count': None, 'stable': False, 'elapsed': None}
+
+
+async def wait_until_ready_async(page, selector: str, quiet_ms: int = 500,
+                                 timeout_ms: int = 10000, scroll: bool = False) -> Dict[str, Any]:
+    """wait_until_ready 的异步版本"""
+    try:
+        return await page.evaluate(_READY_SCRIPT, _ready_args(selector, quiet_ms, timeout_ms, scroll))
+    except Exception as e:
+        logger.debug(f"就绪检测脚本失败，改为等待选择器: {e}")
+        await page.wait_for_selector(selector, timeout=timeout_ms)
+        return {'count': None, 'stable': False, 'elapsed': None}
+
+
+# ==================== 资源拦截 ====================
+
+def should_block(resource_type: str, url: str) -> bool:
+    """是否拦截该请求（图片/字体/音视频/统计埋点）"""
+    if resource_type in BLOCKED_RESOURCE_TYPES:
+        return True
+    host = (urlparse(url).hostname or '').lower()
+    return any(host == blocked or host.endswith('.' + blocked) for blocked in BLOCKED_HOSTS)
+
+
+def block_resources(context):
+    """为浏览器上下文注册拦截规则（同步API）"""
+    def handle(route):
+        request = route.request
+        if should_block(request.resource_type, request.url):
+            route.abort()
+        else:
+            route.continue_()
+
+    context.route('**/*', handle)
+
+
+async def block_resources_async(context):
+    """为浏览器上下文注册拦截规则（异步API）"""
+    async def handle(route):
+        request = route.request
+        if should_block(request.resource_type, request.url):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await context.route('**/*', handle)
@@ -0,0 +1,118 @@
+"""
+平台注册表
+
+集中登记各AI平台的域名、分享链接路径、规范链接形式和对应的爬虫类，
+链接识别（ScraperFactory、剪贴板监控）和规范化（url_canonical）都查这一张表：
+
+1. 按域名查字典定位平台，再用预编译的正则匹配分享路径，不必逐个平台尝试，识别一个链接只需几微秒
+2. 爬虫类以 "模块:类名" 登记，第一次用到时才导入（连带 bs4/lxml 等解析依赖），
+   只做链接识别的代码（剪贴板监控、查重）不会加载爬虫
+3. 只识别、暂不支持抓取的平台（scraper 为空）也在表中，剪贴板监控同样能提示
+
+新增平台只需在 PLATFORMS 中加一项。
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+import importlib
+import re
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple, Type
+
+# 协议、域名、路径（查询参数和锚点不参与识别）
+_URL = re.compile(r'^(https?)://([^/?#\s]+)(/[^?#\s]*)?', re.I)
+
+
+@dataclass(frozen=True)
+class Platform:
+    """一个AI平台"""
+    name: str                          # 平台标识（入库的 platform 字段）
+    display_name: str
+    hosts: Tuple[str, ...]             # 域名（不含 www.）
+    share_path: str                    # 分享链接路径的正则，第一个分组为分享ID
+    canonical: Optional[str] = None    # 规范链接模板，{} 为分享ID；为空时按通用规则规范化
+    scraper: Optional[str] = None      # 爬虫类 "模块:类名"，为空表示暂不支持抓取
+    aliases: Tuple[str, ...] = ()      # create_scraper 接受的其他名称
+
+    @property
+    def supported(self) -> bool:
+        """是否支持抓取"""
+        return self.scraper is not None
+
+
+PLATFORMS = (
+    Platform('chatgpt', 'ChatGPT', ('chatgpt.com', 'chat.openai.com'), r'/share/([^/?#\s]+)',
+             'https://chatgpt.com/share/{}', 'scrapers.chatgpt_scraper:ChatGPTScraper', ('openai',)),
+    Platform('claude', 'Claude', ('claude.ai',), r'/share/([^/?#\s]+)',
+             'https://claude.ai/share/{}', 'scrapers.claude_scraper:ClaudeScraper', ('anthropic',)),
+    Platform('deepseek', 'DeepSeek', ('chat.deepseek.com',), r'/share/([^/?#\s]+)',
+             'https://chat.deepseek.com/share/{}', 'scrapers.deepseek_scraper:DeepSeekScraper'),
+    # 以下平台暂不支持抓取，只用于剪贴板提示
+    Platform('kimi', 'Kimi', ('kimi.moonshot.cn',), r'/share/([\w-]+)'),
+    Platform('poe', 'Poe', ('poe.com',), r'/s/([\w-]+)'),
+    Platform('gemini', 'Gemini', ('gemini.google.com',), r'/share/([\w-]+)'),
+    Platform('tongyi', '通义千问', ('tongyi.aliyun.com',), r'/qianwen/share/([\w-]+)'),
+)
+
+# 预编译：域名 -> (平台, 分享路径正则)
+_BY_HOST: Dict[str, Tuple[Platform, re.Pattern]] = {
+    host: (platform, re.compile(platform.share_path))
+    for platform in PLATFORMS for host in platform.hosts
+}
+_BY_NAME: Dict[str, Platform] = {
+    name: platform for platform in PLATFORMS for name in (platform.name, *platform.aliases)
+}
+_classes: Dict[str, type] = {}
+
+
+def match_url(url: str) -> Optional[Tuple[Platform, str]]:
+    """
+    识别分享链接
+
+    Returns:
+        (平台, 分享ID)，不是已知平台的分享链接时返回None
+
+    Examples:
+        >>> platform, share_id = match_url("https://chat.openai.com/share/abc-123?utm_source=x")
+        >>> platform.name, share_id
+        ('chatgpt', 'abc-123')
+    """
+    parts = _URL.match(url.strip())
+    if not parts:
+        return None
+    host = parts.group(2).lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    entry = _BY_HOST.get(host)
+    if entry is None:
+        return None
+    match = entry[1].match(parts.group(3) or '')
+    return (entry[0], match.group(1)) if match else None
+
+
+def platform_for_url(url: str) -> Optional[str]:
+    """链接所属的平台标识，不是已知平台的分享链接时返回None"""
+    match = match_url(url)
+    return match[0].name if match else None
+
+
+def get_platform(name: str) -> Optional[Platform]:
+    """按平台标识或别名查找（不区分大小写）"""
+    return _BY_NAME.get(name.lower())
+
+
+def supported_platforms() -> Tuple[Platform, ...]:
+    """支持抓取的平台"""
+    return tuple(platform for platform in PLATFORMS if platform.supported)
+
+
+def load_scraper_class(platform: Platform) -> Type:
+    """导入平台的爬虫类（第一次调用时导入模块）"""
+    if not platform.supported:
+        raise ValueError(f"暂不支持抓取{platform.display_name}")
+    cls = _classes.get(platform.name)
+    if cls is None:
+        module, _, attr = platform.scraper.partition(':')
+        cls = _classes[platform.name] = getattr(importlib.import_module(module), attr)
+    return cls
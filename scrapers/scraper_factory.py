@@ -1,49 +1,41 @@
 """
 爬虫工厂类
 自动识别URL并选择合适的爬虫
+
+按平台注册表（platforms.py）识别链接；各平台的爬虫在第一次用到时才导入和创建。
 """
-from typing import Optional
+import asyncio
+from typing import Dict, List, Optional, Union
 from .base_scraper import BaseScraper, ConversationData
-from .chatgpt_scraper import ChatGPTScraper
-from .claude_scraper import ClaudeScraper
-from .deepseek_scraper import DeepSeekScraper
+from .platforms import get_platform, load_scraper_class, match_url, supported_platforms
 
 
 class ScraperFactory:
     """爬虫工厂"""
     
     def __init__(self):
-        # 注册所有可用的爬虫
-        self.scrapers = [
-            ChatGPTScraper(use_playwright=True),
-            ClaudeScraper(use_playwright=True),
-            DeepSeekScraper(use_playwright=True),
-            # 未来可以添加更多平台：
-            # GeminiScraper(),
-            # KimiScraper(),
-        ]
+        # 平台标识 -> 已创建的爬虫（新增平台在 platforms.PLATFORMS 中注册）
+        self._scrapers: Dict[str, BaseScraper] = {}
     
     def get_scraper(self, url: str) -> Optional[BaseScraper]:
         """根据URL获取对应的爬虫"""
-        for scraper in self.scrapers:
-            if scraper.can_handle(url):
-                return scraper
-        return None
+        match = match_url(url)
+        if match is None or not match[0].supported:
+            return None
+        
+        platform = match[0]
+        scraper = self._scrapers.get(platform.name)
+        if scraper is None:
+            scraper = self._scrapers[platform.name] = load_scraper_class(platform)(use_playwright=True)
+        return scraper
     
     @staticmethod
     def create_scraper(platform: str) -> Optional[BaseScraper]:
         """根据平台名称创建爬虫"""
-        platform_lower = platform.lower()
-        
-        if platform_lower in ['chatgpt', 'openai']:
-            return ChatGPTScraper(use_playwright=True)
-        elif platform_lower in ['claude', 'anthropic']:
-            return ClaudeScraper(use_playwright=True)
-        elif platform_lower in ['deepseek']:
-            return DeepSeekScraper(use_playwright=True)
-        # 可扩展更多平台
-        
-        return None
+        entry = get_platform(platform)
+        if entry is None or not entry.supported:
+            return None
+        return load_scraper_class(entry)(use_playwright=True)
     
     def scrape(self, url: str) -> ConversationData:
         """自动识别并抓取"""
@@ -51,14 +43,36 @@ class ScraperFactory:
         
         if not scraper:
             raise ValueError(f"不支持的链接格式: {url}\n"
-                           f"目前支持的平台: ChatGPT, Claude, DeepSeek")
+                           f"目前支持的平台: {', '.join(p.display_name for p in supported_platforms())}")
         
         print(f"识别到平台: {scraper.platform_name.upper()}")
         return scraper.scrape(url)
     
+    async def scrape_async(self, url: str) -> ConversationData:
+        """自动识别并异步抓取"""
+        scraper = self.get_scraper(url)
+        
+        if not scraper:
+            raise ValueError(f"不支持的链接格式: {url}\n"
+                           f"目前支持的平台: {', '.join(p.display_name for p in supported_platforms())}")
+        
+        return await scraper.scrape_async(url)
+    
+    async def scrape_many(self, urls: List[str]) -> List[Union[ConversationData, Exception]]:
+        """
+        并发抓取多个链接
+        
+        并发数由异步浏览器池的全局上限和按域名的上限控制。
+        
+        Returns:
+            与urls一一对应的抓取结果，失败的链接对应异常对象
+        """
+        return await asyncio.gather(*(self.scrape_async(url) for url in urls),
+                                    return_exceptions=True)
+    
     def get_supported_platforms(self) -> list[str]:
         """获取支持的平台列表"""
-        return [scraper.platform_name for scraper in self.scrapers]
+        return [platform.name for platform in supported_platforms()]
 
 
 # 使用示例
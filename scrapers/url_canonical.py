@@ -0,0 +1,42 @@
+"""
+分享链接规范化
+
+同一个分享可能以多种形式出现：chat.openai.com 与 chatgpt.com、http 与 https、
+带 www、结尾斜杠、?utm_source=... 跟踪参数、#锚点等。入库和查重前统一转换为规范形式，
+抓取前即可判断对话是否已经收藏，不必等浏览器抓取和AI分析完成后才被唯一约束拦下。
+
+作者: ChatCompass Team
+版本: v1.4.0
+"""
+
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .platforms import match_url
+
+# 不影响页面内容的跟踪参数
+_TRACKING_PARAMS = frozenset({'fbclid', 'gclid', 'ref', 'ref_src', 'spm', 'from'})
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    转换为规范链接
+
+    已知平台（见 platforms.PLATFORMS）的分享链接只保留分享ID；其他链接统一协议和域名大小写，
+    去掉锚点、跟踪参数和结尾斜杠。
+
+    Examples:
+        >>> canonicalize_url("http://chat.openai.com/share/abc-123/?utm_source=x#top")
+        'https://chatgpt.com/share/abc-123'
+    """
+    url = url.strip()
+    match = match_url(url)
+    if match and match[0].canonical:
+        return match[0].canonical.format(match[1])
+
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return url
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not key.lower().startswith('utm_') and key.lower() not in _TRACKING_PARAMS]
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
@@ -44,6 +44,26 @@ def temp_db():
             pass  # 忽略清理失败
 
 
+@pytest.fixture
+def db_path(tmp_path):
+    """临时数据库路径（位于pytest的tmp_path下，随测试自动清理）"""
+    return str(tmp_path / "test.db")
+
+
+@pytest.fixture
+def db(db_path, request):
+    """
+    临时数据库管理器fixture
+    
+    默认不开启近似重复检测；需要时通过间接参数指定查重策略：
+        @pytest.mark.parametrize('db', ['flag'], indirect=True)
+    """
+    from database.db_manager import DatabaseManager
+    manager = DatabaseManager(db_path, dedupe=getattr(request, 'param', None))
+    yield manager
+    manager.close()
+
+
 @pytest.fixture
 def temp_dir():
     """创建临时目录fixture"""
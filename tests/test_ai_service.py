@@ -128,7 +128,7 @@ class TestOllamaClient:
         if models:
             assert all(isinstance(m, str) for m in models)
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_generate(self, mock_post):
         """测试文本生成"""
         # 模拟响应
@@ -145,7 +145,7 @@ class TestOllamaClient:
         assert result == '这是生成的文本'
         assert mock_post.called
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_generate_timeout(self, mock_post):
         """测试超时处理"""
         import requests
@@ -308,7 +308,7 @@ class TestAIService:
         
         summary = service.generate_summary("测试对话内容")
         
-        assert summary == "简短的摘要"
+        assert summary == "这是一个关于Python编程的对话。"
     
     def test_generate_tags(self, ai_config, mock_ollama_client):
         """测试生成标签"""
@@ -317,7 +317,22 @@ class TestAIService:
         
         tags = service.generate_tags("测试对话内容")
         
-        assert tags == ["标签1", "标签2", "标签3"]
+        assert tags == ["Python", "编程", "学习"]
+    
+    def test_summary_and_tags_share_one_generation(self, ai_config, mock_ollama_client, tmp_path):
+        """测试摘要和标签来自同一次完整分析"""
+        ai_config.cache_path = str(tmp_path / "ai_cache.db")
+        service = AIService(config=ai_config)
+        service.client = mock_ollama_client
+        
+        assert service.generate_summary("测试对话内容") == "这是一个关于Python编程的对话。"
+        assert service.generate_tags("测试对话内容", num_tags=2) == ["Python", "编程"]
+        assert service.analyze_conversation("测试对话内容", tasks=['category']).category == "编程"
+        
+        assert mock_ollama_client.analyze_conversation.call_count == 1
+        mock_ollama_client.generate_summary_only.assert_not_called()
+        mock_ollama_client.generate_tags_only.assert_not_called()
+        service.cache.close()
     
     def test_batch_analyze(self, ai_config, mock_ollama_client):
         """测试批量分析"""
@@ -57,13 +57,14 @@ class TestSegmentAlgorithm:
         
         assert 6 <= len(segments) <= 9, f"预期6-9段，实际{len(segments)}段"
         
-        # 验证分段边界（应该在对话边界）
+        # 验证分段边界：在说话人标记之前分割，后一段从完整的一轮对话开始
+        # （说话人标记留在本轮消息的开头，不会落在上一段的末尾）
         boundary_splits = 0
-        for seg in segments[:-1]:  # 除最后一段
-            if seg.strip().endswith(('User:', 'Assistant:', '用户:', '助手:')):
+        for seg in segments[1:]:  # 除第一段
+            if seg.strip().startswith(('User:', 'Assistant:', '用户:', '助手:')):
                 boundary_splits += 1
         
-        # 至少50%应该在边界分割
+        # 至少30%应该在边界分割
         assert boundary_splits >= len(segments) * 0.3, "边界分割比例过低"
     
     def test_split_no_boundaries(self, client):
@@ -395,6 +396,12 @@ class TestAIServiceIntegration:
             enable_fallback=True
         )
     
+    @pytest.fixture(autouse=True)
+    def available(self):
+        """服务集成测试只替换客户端，不依赖本机运行的Ollama"""
+        with patch.object(AIService, 'is_available', return_value=True):
+            yield
+    
     def test_ai_service_with_segment_strategy(self, config):
         """测试20：AI服务调用分段策略"""
         service = AIService(config)
@@ -542,6 +549,9 @@ class TestCoverageReport:
             "性能测试": {
                 "大文本分段性能": "✅ test_split_performance_large_text",
                 "避免不必要分段": "✅ test_no_unnecessary_splits"
+            },
+            "覆盖率报告": {
+                "策略覆盖率报告": "✅ test_strategy_coverage_report"
             }
         }
         
@@ -46,7 +46,7 @@ class TestOllamaClient:
         client = OllamaClient(base_url="http://localhost:11434/")
         assert client.base_url == "http://localhost:11434"
     
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_is_available_success(self, mock_get):
         """测试服务可用性检查（成功）"""
         mock_get.return_value.status_code = 200
@@ -54,7 +54,7 @@ class TestOllamaClient:
         client = OllamaClient()
         assert client.is_available() is True
     
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_is_available_failure(self, mock_get):
         """测试服务可用性检查（失败）"""
         mock_get.side_effect = Exception("Connection error")
@@ -62,7 +62,7 @@ class TestOllamaClient:
         client = OllamaClient()
         assert client.is_available() is False
     
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_list_models(self, mock_get):
         """测试列出模型"""
         mock_response = Mock()
@@ -82,7 +82,7 @@ class TestOllamaClient:
         assert 'qwen2.5:7b' in models
         assert 'llama3.2' in models
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_generate_success(self, mock_post):
         """测试生成文本（成功）"""
         mock_response = Mock()
@@ -97,7 +97,7 @@ class TestOllamaClient:
         assert result == "这是生成的文本"
         mock_post.assert_called_once()
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_generate_with_system_prompt(self, mock_post):
         """测试带系统提示词的生成"""
         mock_response = Mock()
@@ -113,7 +113,7 @@ class TestOllamaClient:
         assert 'system' in payload
         assert payload['system'] == "system prompt"
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_generate_timeout(self, mock_post):
         """测试生成超时"""
         import requests
@@ -198,6 +198,102 @@ class TestOllamaClient:
         assert conversation in prompt
 
 
+class TestOllamaConnectionReuse:
+    """测试连接复用与可用性缓存"""
+    
+    @pytest.fixture
+    def server(self):
+        """统计TCP连接数和请求数的Ollama桩服务"""
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        stats = {'connections': 0, 'tags': 0, 'generate': 0}
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            
+            def log_message(self, *args):
+                pass
+            
+            def setup(self):
+                super().setup()
+                stats['connections'] += 1
+            
+            def _reply(self, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def do_GET(self):
+                stats['tags'] += 1
+                self._reply({'models': [{'name': 'stub'}]})
+            
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stats['generate'] += 1
+                self._reply({'response': 'ok', 'done': True})
+        
+        httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        yield f"http://127.0.0.1:{httpd.server_address[1]}", stats
+        httpd.shutdown()
+        httpd.server_close()
+    
+    def test_keep_alive_connection_reused(self, server):
+        """多次请求复用同一个连接"""
+        url, stats = server
+        client = OllamaClient(base_url=url, model="stub")
+        for _ in range(5):
+            assert client.generate("p") == "ok"
+        client.close()
+        
+        assert stats['generate'] == 5
+        assert stats['connections'] == 1
+    
+    def test_availability_and_models_cached(self, server):
+        """一次探测同时缓存可用性和模型列表"""
+        url, stats = server
+        client = OllamaClient(base_url=url, model="stub")
+        
+        assert client.is_available()
+        assert client.is_available()
+        assert client.list_models() == ['stub']
+        assert stats['tags'] == 1
+        
+        assert client.is_available(force=True)
+        assert stats['tags'] == 2
+        client.close()
+    
+    def test_availability_ttl_expires(self, server):
+        url, stats = server
+        client = OllamaClient(base_url=url, model="stub", availability_ttl=0)
+        client.is_available()
+        client.is_available()
+        assert stats['tags'] == 2
+        client.close()
+    
+    def test_generate_refreshes_health(self, server):
+        """生成成功即视为可用，无需再探测"""
+        url, stats = server
+        client = OllamaClient(base_url=url, model="stub")
+        client.generate("p")
+        assert client.is_available()
+        assert stats['tags'] == 0
+        client.close()
+    
+    def test_connection_error_marks_unavailable(self):
+        client = OllamaClient(base_url="http://127.0.0.1:9", model="stub")
+        with pytest.raises(RuntimeError):
+            client.generate("p")
+        with patch.object(client.session, 'get') as probe:
+            assert client.is_available() is False
+            probe.assert_not_called()
+
+
 class TestOpenAIClient:
     """测试OpenAI客户端"""
     
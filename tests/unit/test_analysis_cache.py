@@ -0,0 +1,119 @@
+"""
+AI分析结果缓存单元测试
+"""
+import json
+from unittest.mock import patch
+
+import pytest
+
+from ai.ai_service import AIConfig, AIService
+from ai.analysis_cache import AnalysisCache
+
+
+ANALYSIS_JSON = json.dumps({
+    "summary": "关于Python的对话", "category": "编程", "tags": ["Python"]
+}, ensure_ascii=False)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = AnalysisCache(str(tmp_path / "cache.db"))
+    yield cache
+    cache.close()
+
+
+class TestAnalysisCache:
+    """测试缓存本身"""
+
+    def test_key_ignores_whitespace_but_not_model(self):
+        key = AnalysisCache.make_key('analysis', "用户: 你好\n\n助手: 你好", 'm1')
+        assert key == AnalysisCache.make_key('analysis', "  用户: 你好 助手:   你好 ", 'm1')
+        assert key != AnalysisCache.make_key('analysis', "用户: 你好 助手: 你好", 'm2')
+        assert key != AnalysisCache.make_key('analysis', "用户: 你好 助手: 你好", 'm1',
+                                             prompt_version='2')
+        assert key != AnalysisCache.make_key('summary', "用户: 你好 助手: 你好", 'm1')
+
+    def test_hit_miss_stats(self, cache):
+        assert cache.get('k') is None
+        cache.put('k', 'tags', 'm', ['Python'])
+        assert cache.get('k') == ['Python']
+
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['hit_rate'] == 0.5
+        assert stats['entries'] == 1
+
+    def test_lru_eviction(self, tmp_path):
+        cache = AnalysisCache(str(tmp_path / "small.db"), max_bytes=300)
+        for i in range(3):
+            cache.put(f'k{i}', 'summary', 'm', 'x' * 80)
+        cache.get('k0')                       # k0 变为最近使用
+        cache.put('k3', 'summary', 'm', 'x' * 80)
+
+        assert cache.get('k1') is None        # 最久未使用的被淘汰
+        assert cache.get('k0') is not None
+        assert cache.get('k3') is not None
+        assert cache.stats()['bytes'] <= 300
+        cache.close()
+
+    def test_persisted_across_instances(self, tmp_path):
+        path = str(tmp_path / "persist.db")
+        first = AnalysisCache(path)
+        first.put('k', 'summary', 'm', '摘要')
+        first.close()
+
+        second = AnalysisCache(path)
+        assert second.get('k') == '摘要'
+        assert second.stats()['bytes'] > 0
+        second.close()
+
+
+class TestAIServiceCache:
+    """测试AIService各入口使用缓存"""
+
+    @pytest.fixture
+    def service(self, tmp_path):
+        service = AIService(AIConfig(
+            backend='ollama', ollama_model='stub',
+            cache_path=str(tmp_path / "ai_cache.db")
+        ))
+        yield service
+        service.cache.close()
+
+    def test_analyze_hit_skips_model_and_availability_check(self, service):
+        text = "用户: 如何学习Python？\n\n助手: 从基础语法开始。"
+        with patch.object(service.client, 'is_available', return_value=True) as available, \
+             patch.object(service.client, 'generate', return_value=ANALYSIS_JSON) as generate:
+            first = service.analyze_conversation(text)
+            second = service.analyze_conversation(text + "  ")
+
+            assert generate.call_count == 1
+            assert available.call_count == 1
+        assert second == first
+        assert service.get_status()['cache']['hits'] == 1
+
+    def test_use_cache_false_refreshes(self, service):
+        with patch.object(service.client, 'is_available', return_value=True), \
+             patch.object(service.client, 'generate', return_value=ANALYSIS_JSON) as generate:
+            service.analyze_conversation("文本")
+            service.analyze_conversation("文本", use_cache=False)
+        assert generate.call_count == 2
+
+    def test_fallback_result_not_cached(self, service):
+        with patch.object(service.client, 'is_available', return_value=True), \
+             patch.object(service.client, 'generate', side_effect=TimeoutError("超时")):
+            result = service.analyze_conversation("Python代码问题")
+        assert result.confidence <= 0.5
+        assert service.cache.stats()['entries'] == 0
+
+    def test_summary_tags_and_batch(self, service):
+        with patch.object(service.client, 'is_available', return_value=True), \
+             patch.object(service.client, 'generate', return_value=ANALYSIS_JSON) as generate:
+            for _ in range(2):
+                assert service.generate_summary("文本") == "关于Python的对话"
+                assert service.generate_tags("文本", num_tags=2) == ["Python"]
+            results = service.batch_analyze([{'text': "文本"}, {'text': "文本"}])
+
+        assert generate.call_count == 1
+        assert results[0] == results[1]
@@ -0,0 +1,226 @@
+"""
+异步AI接口单元测试
+
+基于模拟大模型服务：并发重叠、分段并发、单次请求超时、取消、缓存与降级。
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ai.ai_service import AIConfig, AIService
+from ai.ollama_client import AIAnalysisResult, OllamaClient
+from benchmarks.fake_llm_server import FakeLLMServer
+
+SHORT_TEXT = "用户: 如何优化SQL查询？\n\n助手: 先用EXPLAIN查看执行计划，再建立合适的索引。"
+
+
+@pytest.fixture
+def server():
+    with FakeLLMServer(latency=0.2, tokens_per_second=2000, parallel=8) as fake:
+        yield fake
+
+
+def make_service(url, cache_path=None):
+    return AIService(AIConfig(backend='ollama', ollama_host=url, ollama_model="fake-model",
+                              cache_path=cache_path))
+
+
+class TestOllamaAsync:
+    """测试Ollama异步客户端"""
+
+    def test_requests_overlap_without_blocking_loop(self, server):
+        client = OllamaClient(base_url=server.url, model="fake-model")
+        ticks = []
+
+        async def ticker(stop):
+            while not stop.is_set():
+                ticks.append(time.perf_counter())
+                await asyncio.sleep(0.02)
+
+        async def main():
+            stop = asyncio.Event()
+            background = asyncio.create_task(ticker(stop))
+            start = time.perf_counter()
+            results = await asyncio.gather(*(client.analyze_conversation_async(SHORT_TEXT)
+                                             for _ in range(4)))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await background
+            await client.close_async()
+            return results, elapsed
+
+        results, elapsed = asyncio.run(main())
+
+        assert all(r.summary.startswith("模拟摘要") for r in results)
+        assert server.stats.max_concurrency >= 2
+        assert elapsed < 0.2 * 4                  # 明显少于顺序执行
+        assert len(ticks) >= 5                    # 等待模型时事件循环仍在运行
+
+    def test_segments_summarized_concurrently(self, server):
+        client = OllamaClient(base_url=server.url, model="fake-model")
+        client.segment_threshold = 2000
+        client.segment_token_budget = 300
+        text = "\n\n".join(f"用户: 第{i}个问题，关于索引和查询计划。\n\n助手: " + "建立联合索引。" * 80
+                           for i in range(6))
+
+        result = asyncio.run(client.analyze_conversation_async(text, tasks=['summary']))
+
+        assert len(result.segment_timings) > 1
+        assert [item['index'] for item in result.segment_timings] == \
+            list(range(1, len(result.segment_timings) + 1))
+        assert result.summary and result.category == "" and result.tags == []
+        assert server.stats.max_concurrency > 1
+
+    def test_per_request_timeout(self):
+        with FakeLLMServer(hang_rate=1.0, hang_seconds=3) as fake:
+            client = OllamaClient(base_url=fake.url, model="fake-model", timeout=60)
+            start = time.perf_counter()
+            with pytest.raises(TimeoutError):
+                asyncio.run(client.generate_async("写一段摘要", timeout=0.3))
+            assert time.perf_counter() - start < 2
+
+    def test_availability_shares_cache(self, server):
+        client = OllamaClient(base_url=server.url, model="fake-model")
+
+        assert asyncio.run(client.is_available_async())
+        assert client.list_models() == ["fake-model"]    # 异步探测同时刷新了模型列表
+        assert not asyncio.run(OllamaClient(base_url="http://127.0.0.1:9").is_available_async())
+
+
+class TestOpenAIAsync:
+    """测试OpenAI兼容接口的异步客户端"""
+
+    def test_analyze(self, server):
+        from ai.openai_client import OpenAIClient
+        client = OpenAIClient(api_key="test", model="fake-model", base_url=f"{server.url}/v1")
+
+        async def main():
+            results = await asyncio.gather(*(client.analyze_conversation_async(SHORT_TEXT)
+                                             for _ in range(3)))
+            await client.close_async()
+            return results
+
+        results = asyncio.run(main())
+        assert all(r.summary.startswith("模拟摘要") for r in results)
+        assert server.stats.max_concurrency >= 2
+
+
+class TestServiceAsync:
+    """测试 AIService.analyze_conversation_async"""
+
+    def test_uses_cache(self, server, tmp_path):
+        service = make_service(server.url, cache_path=str(tmp_path / "cache.db"))
+
+        first = asyncio.run(service.analyze_conversation_async(SHORT_TEXT, "SQL"))
+        requests = server.stats.requests
+        second = asyncio.run(service.analyze_conversation_async(SHORT_TEXT, "SQL", tasks=['tags']))
+
+        assert second.tags == first.tags and second.summary == ""
+        assert server.stats.requests == requests
+        # 同步接口命中同一份缓存
+        assert service.analyze_conversation(SHORT_TEXT).summary == first.summary
+
+    def test_concurrent_identical_requests_generate_once(self, server):
+        service = make_service(server.url)
+        service.client.is_available()
+        requests = server.stats.requests
+
+        async def main():
+            return await asyncio.gather(*(service.analyze_conversation_async(SHORT_TEXT)
+                                          for _ in range(3)))
+
+        results = asyncio.run(main())
+        assert len({r.summary for r in results}) == 1
+        assert server.stats.requests == requests + 1
+
+    def test_timeout_falls_back(self):
+        with FakeLLMServer(hang_rate=1.0, hang_seconds=3) as fake:
+            service = make_service(fake.url)
+            start = time.perf_counter()
+            result = asyncio.run(service.analyze_conversation_async(SHORT_TEXT, "SQL", timeout=0.3))
+
+        assert time.perf_counter() - start < 2
+        assert result is not None and result.confidence <= 0.5
+
+    def test_cancel_event(self, server):
+        service = make_service(server.url)
+        cancel = threading.Event()
+        cancel.set()
+
+        assert asyncio.run(service.analyze_conversation_async(SHORT_TEXT, cancel_event=cancel)) is None
+
+    def test_sync_only_client_runs_in_thread(self):
+        class SyncClient:
+            def __init__(self):
+                self.threads = []
+
+            def analyze_conversation(self, text, tasks=None):
+                self.threads.append(threading.current_thread())
+                return AIAnalysisResult(summary="摘要", category="编程", tags=["SQL"], confidence=0.9)
+
+        service = make_service("http://127.0.0.1:9")
+        service.client = SyncClient()
+        service.is_available = lambda: True
+
+        result = asyncio.run(service.analyze_conversation_async(SHORT_TEXT))
+
+        assert result.category == "编程"
+        assert service.client.threads[0] is not threading.main_thread()
+
+
+class TestTaskManagerStorage:
+    """测试并发任务的数据库操作依次执行"""
+
+    def test_storage_calls_do_not_overlap(self, monkeypatch):
+        pytest.importorskip('PyQt6')
+        from gui import task_manager
+        from gui.task_queue import TaskQueue
+
+        class SlowStorage:
+            def __init__(self):
+                self.active = 0
+                self.max_active = 0
+                self.lock = threading.Lock()
+                self.ids = 0
+
+            def _enter(self):
+                with self.lock:
+                    self.active += 1
+                    self.max_active = max(self.max_active, self.active)
+                time.sleep(0.02)
+                with self.lock:
+                    self.active -= 1
+
+            def find_by_url(self, url):
+                self._enter()
+                return None
+
+            def add_conversation(self, **kwargs):
+                self._enter()
+                self.ids += 1
+                return self.ids
+
+        class FakeScraper:
+            async def scrape_async(self, url):
+                await asyncio.sleep(0.01)
+                return {'title': url, 'messages': [{'role': 'user', 'content': "问题"}]}
+
+        monkeypatch.setattr(task_manager.ScraperFactory, 'create_scraper', staticmethod(lambda p: FakeScraper()))
+        queue = TaskQueue(max_workers=3)
+        storage = SlowStorage()
+        thread = task_manager.TaskManagerThread(queue, storage)
+        tasks = [queue.tasks[queue.add_task(f"https://chatgpt.com/share/t{i}", 'chatgpt')] for i in range(6)]
+
+        async def run_all():
+            await asyncio.gather(*(thread.execute_task(task) for task in tasks))
+
+        try:
+            asyncio.run(run_all())
+        finally:
+            thread.stop()
+
+        assert storage.ids == 6
+        assert storage.max_active == 1
+        assert all(task['status'] == 'completed' for task in tasks)
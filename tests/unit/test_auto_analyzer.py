@@ -0,0 +1,199 @@
+"""
+后台自动分析单元测试
+
+待分析查询走索引、优先级、空闲节流、批量写回和降级结果升级。
+"""
+import sqlite3
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from ai.ai_service import AIConfig
+from ai.auto_analyzer import PRIORITY_MISSING, PRIORITY_NEW, AutoAnalyzer
+from ai.ollama_client import AIAnalysisResult
+from database.db_manager import DatabaseManager
+
+
+class FakeService:
+    """记录调用的AIService替身"""
+
+    def __init__(self, confidence=0.9, available=True, delay=0.0):
+        self.config = AIConfig()
+        self.confidence = confidence
+        self.available = available
+        self.delay = delay
+        self.titles = []
+
+    def is_available(self):
+        return self.available
+
+    def analyze_conversation(self, text, title="", cancel_event=None):
+        self.titles.append(title)
+        time.sleep(self.delay)
+        if not self.available:
+            return None
+        return AIAnalysisResult(summary=f"{title}的摘要", category="编程",
+                                tags=["Python", "AI"], confidence=self.confidence)
+
+    def _fallback_analysis(self, text, title=""):
+        return AIAnalysisResult(summary="降级摘要", category="其他", tags=["降级"], confidence=0.3)
+
+
+def add(db, index, confidence=None, summary=None, tags=None):
+    return db.add_conversation(
+        source_url=f"https://chatgpt.com/share/{index}", platform="chatgpt", title=f"对话{index}",
+        raw_content={'messages': [{'role': 'user', 'content': f'问题{index}'}]},
+        summary=summary, category="其他" if summary else None, tags=tags,
+        analysis_confidence=confidence,
+    )
+
+
+class TestPendingQuery:
+    """测试数据库层"""
+
+    def test_migrates_old_database(self, db_path):
+        conn = sqlite3.connect(db_path)
+        conn.execute("""CREATE TABLE conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, source_url TEXT UNIQUE NOT NULL,
+            platform TEXT NOT NULL, title TEXT, raw_content TEXT NOT NULL, summary TEXT,
+            category TEXT, word_count INTEGER DEFAULT 0, message_count INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP, updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_favorite INTEGER DEFAULT 0, notes TEXT)""")
+        conn.execute("INSERT INTO conversations (source_url, platform, raw_content, summary, category) "
+                     "VALUES ('u1', 'chatgpt', '{}', '摘要', '编程'), ('u2', 'chatgpt', '{}', NULL, NULL)")
+        conn.commit()
+        conn.close()
+
+        db = DatabaseManager(db_path)
+        pending = db.get_pending_analysis(0.6)
+        db.close()
+
+        assert [row['id'] for row in pending] == [2]
+
+    def test_query_uses_index(self, db):
+        plan = " ".join(row[3] for row in db.conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM conversations "
+            "WHERE analysis_confidence IS NULL OR analysis_confidence < ?", (0.6,)))
+        assert "idx_conversations_analysis" in plan
+        assert "SCAN conversations" not in plan
+
+    def test_missing_before_low_confidence(self, db):
+        low = add(db, 1, confidence=0.5)
+        lower = add(db, 2, confidence=0.3)
+        add(db, 3, confidence=0.9)
+        missing = add(db, 4)
+
+        assert [row['id'] for row in db.get_pending_analysis(0.6)] == [missing, lower, low]
+
+    def test_save_replaces_tags_and_keeps_better_results(self, db):
+        conv_id = add(db, 1, confidence=0.3, summary="降级摘要", tags=["降级"])
+
+        saved = db.save_analysis_results([
+            (conv_id, {'summary': "新摘要", 'category': "编程", 'tags': ["Python"], 'confidence': 0.9}),
+        ])
+        assert saved == 1
+        assert db.get_conversation_tags(conv_id) == ["Python"]
+
+        # 更低置信度的结果不覆盖
+        assert db.save_analysis_results([
+            (conv_id, {'summary': "差", 'category': "其他", 'tags': [], 'confidence': 0.3}),
+        ]) == 0
+        conv = db.get_conversation(conv_id)
+        assert conv['summary'] == "新摘要" and conv['analysis_confidence'] == 0.9
+
+        # 更新后全文索引保持一致
+        db.conn.execute("INSERT INTO conversations_fts(conversations_fts) VALUES('integrity-check')")
+        assert db.conn.execute("SELECT rowid FROM conversations_fts WHERE conversations_fts MATCH '新摘要'"
+                               ).fetchone()[0] == conv_id
+
+
+class TestRunOnce:
+    """测试前台处理（CLI）"""
+
+    def test_analyzes_missing_and_low_confidence(self, db, db_path):
+        missing = add(db, 1)
+        low = add(db, 2, confidence=0.3, summary="降级摘要", tags=["降级"])
+        add(db, 3, confidence=0.9, summary="已分析")
+        service = FakeService()
+
+        original = DatabaseManager.save_analysis_results
+        with patch.object(DatabaseManager, 'save_analysis_results', autospec=True,
+                          side_effect=original) as save:
+            progress = AutoAnalyzer(service, db_path, batch_size=10).run_once()
+
+        assert service.titles == ["对话1", "对话2"]
+        assert progress['completed'] == 2 and progress['saved'] == 2
+        assert save.call_count == 1                      # 两条结果一个事务写回
+        for conv_id in (missing, low):
+            conv = db.get_conversation(conv_id)
+            assert conv['category'] == "编程" and conv['analysis_confidence'] == 0.9
+            assert conv['tags'] == ["Python", "AI"]
+        assert db.get_pending_analysis(0.6) == []
+
+    def test_unavailable_service_uses_fallback_for_missing_only(self, db, db_path):
+        missing = add(db, 1)
+        low = add(db, 2, confidence=0.4, summary="旧摘要")
+
+        progress = AutoAnalyzer(FakeService(available=False), db_path).run_once()
+
+        assert db.get_conversation(missing)['analysis_confidence'] == 0.3
+        assert db.get_conversation(low)['summary'] == "旧摘要"
+        assert progress['failed'] == 1
+
+    def test_low_confidence_results_not_retried_immediately(self, db, db_path):
+        add(db, 1)
+        analyzer = AutoAnalyzer(FakeService(confidence=0.5), db_path)
+
+        analyzer.run_once()
+        analyzer.run_once()
+
+        assert analyzer.service.titles == ["对话1"]
+
+
+class TestBackgroundWorker:
+    """测试后台线程"""
+
+    def test_priority_order(self, db_path):
+        analyzer = AutoAnalyzer(FakeService(), db_path)
+        analyzer.enqueue(1, PRIORITY_MISSING)
+        analyzer.enqueue(2, 2.5)
+        analyzer.enqueue(3, PRIORITY_NEW)
+        analyzer.enqueue(2, PRIORITY_MISSING)   # 提高优先级
+
+        assert [analyzer._pop() for _ in range(4)] == [3, 2, 1, None]
+
+    def test_waits_for_idle_and_flushes_on_stop(self, db, db_path):
+        conv_id = add(db, 1)
+        busy = threading.Event()
+        busy.set()
+        states = []
+        analyzer = AutoAnalyzer(FakeService(), db_path, idle_delay=0.2, throttle=0,
+                                flush_interval=60, is_busy=busy.is_set,
+                                progress_callback=lambda p: states.append(p['state']))
+        analyzer.start()
+        time.sleep(0.4)
+        assert analyzer.service.titles == []     # 有爬取任务时不分析
+        assert 'waiting' in states
+
+        busy.clear()
+        analyzer.notify_activity()
+        deadline = time.time() + 3
+        while analyzer.progress()['completed'] < 1 and time.time() < deadline:
+            time.sleep(0.05)
+        analyzer.stop()
+
+        assert analyzer.service.titles == ["对话1"]
+        assert db.get_conversation(conv_id)['analysis_confidence'] == 0.9
+        assert states[-1] == 'stopped'
+
+    def test_new_conversations_processed_first(self, db, db_path):
+        add(db, 1)
+        analyzer = AutoAnalyzer(FakeService(), db_path, idle_delay=0, throttle=0)
+        analyzer.notify_activity()
+        new_id = add(db, 2)
+        analyzer._scan(db)
+        analyzer.enqueue(new_id)
+
+        assert analyzer._pop() == new_id
@@ -0,0 +1,186 @@
+"""
+并发批量分析单元测试
+"""
+import threading
+import time
+from unittest.mock import Mock
+
+import pytest
+
+from ai.ai_service import AIConfig, AIService
+from ai.batch_analyzer import BatchAnalyzer, TokenBucket
+from ai.ollama_client import AIAnalysisResult, OllamaClient
+
+
+class SlowClient:
+    """按文本返回结果、记录并发峰值的客户端替身"""
+
+    def __init__(self, delay=0.1, fail_on=None):
+        self.delay = delay
+        self.fail_on = fail_on or set()
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self.availability_checks = 0
+        self._lock = threading.Lock()
+
+    def is_available(self):
+        self.availability_checks += 1
+        return True
+
+    def analyze_conversation(self, text):
+        with self._lock:
+            self.calls.append(text)
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if text in self.fail_on:
+            raise RuntimeError("模拟失败")
+        return AIAnalysisResult(summary=f"摘要:{text}", category="编程", tags=[text], confidence=0.8)
+
+
+def _service(enable_fallback):
+    service = AIService(AIConfig(backend='ollama', enable_fallback=enable_fallback))
+    service.client = SlowClient()
+    service.is_available = service.client.is_available
+    return service
+
+
+@pytest.fixture
+def service():
+    return _service(enable_fallback=False)
+
+
+@pytest.fixture
+def fallback_service():
+    return _service(enable_fallback=True)
+
+
+def _convs(n):
+    return [{'id': i, 'text': f"对话{i}"} for i in range(n)]
+
+
+class TestTokenBucket:
+    """测试令牌桶"""
+
+    def test_rate_limit(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        start = time.perf_counter()
+        for _ in range(5):
+            bucket.acquire()
+        assert time.perf_counter() - start >= 0.18
+
+    def test_cancel_while_waiting(self):
+        bucket = TokenBucket(rate=0.1, capacity=1)
+        bucket.acquire()
+        cancel = threading.Event()
+        cancel.set()
+        assert bucket.acquire(cancel) is False
+
+
+class TestBatchAnalyzer:
+    """测试并发批量分析"""
+
+    def test_concurrent_and_ordered(self, service):
+        conversations = _convs(8)
+        progress = []
+        reports = []
+
+        start = time.perf_counter()
+        results = service.batch_analyze(conversations, callback=lambda c, t: progress.append((c, t)),
+                                        progress_callback=reports.append, concurrency=4)
+        elapsed = time.perf_counter() - start
+
+        assert [r.summary for r in results] == [f"摘要:对话{i}" for i in range(8)]
+        assert progress == [(i, 8) for i in range(1, 9)]
+        assert service.client.peak == 4
+        assert elapsed < 0.8 * 0.75
+        assert service.client.availability_checks == 1
+        assert reports[-1]['completed'] == 8
+        assert reports[-1]['items_per_minute'] > 0
+
+    def test_iter_results_as_completed(self, service):
+        service.client.delay = 0
+        analyzer = BatchAnalyzer(service, concurrency=2)
+        indexes = [index for index, _ in analyzer.iter_results(_convs(5))]
+        assert sorted(indexes) == list(range(5))
+
+    def test_failure_returns_none(self, service):
+        service.client.fail_on = {"对话1"}
+        results = service.batch_analyze(_convs(3), concurrency=2)
+        assert results[1] is None
+        assert results[0] is not None and results[2] is not None
+
+    def test_unavailable_service(self, service):
+        service.is_available = Mock(return_value=False)
+        assert service.batch_analyze(_convs(3)) == [None, None, None]
+        assert service.client.calls == []
+
+    def test_cancel_and_resume_from_checkpoint(self, service, tmp_path):
+        checkpoint = str(tmp_path / "batch.jsonl")
+        conversations = _convs(10)
+        analyzer = BatchAnalyzer(service, concurrency=2, checkpoint_path=checkpoint)
+
+        seen = 0
+        for _ in analyzer.iter_results(conversations):
+            seen += 1
+            if seen == 4:
+                analyzer.cancel()
+
+        done_first = len(service.client.calls)
+        assert done_first < 10
+        assert len(analyzer.load_checkpoint()) == done_first
+
+        service.client.calls.clear()
+        results = BatchAnalyzer(service, concurrency=2, checkpoint_path=checkpoint).run(conversations)
+
+        assert all(r is not None for r in results)
+        assert len(service.client.calls) == 10 - done_first
+        assert not (tmp_path / "batch.jsonl").exists()
+
+    def test_resume_retries_failures(self, service, tmp_path):
+        checkpoint = str(tmp_path / "batch.jsonl")
+        conversations = _convs(5)
+        service.client.fail_on = {"对话1", "对话3"}
+
+        results = BatchAnalyzer(service, concurrency=2, checkpoint_path=checkpoint).run(conversations)
+        assert [r is None for r in results] == [False, True, False, True, False]
+        analyzer = BatchAnalyzer(service, concurrency=2, checkpoint_path=checkpoint)
+        assert sorted(analyzer.load_checkpoint()) == ["id:0", "id:2", "id:4"]
+
+        service.client.fail_on = set()
+        service.client.calls.clear()
+        results = analyzer.run(conversations)
+
+        assert sorted(service.client.calls) == ["对话1", "对话3"]
+        assert [r.summary for r in results] == [f"摘要:对话{i}" for i in range(5)]
+        assert not (tmp_path / "batch.jsonl").exists()
+
+    def test_resume_retries_failures_with_fallback(self, fallback_service, tmp_path):
+        """启用降级时批量失败也不写入降级结果，续跑时重试"""
+        checkpoint = str(tmp_path / "batch.jsonl")
+        conversations = _convs(5)
+        fallback_service.client.fail_on = {"对话1", "对话3"}
+
+        analyzer = BatchAnalyzer(fallback_service, concurrency=2, checkpoint_path=checkpoint)
+        progress = []
+        results = analyzer.run(conversations, progress_callback=progress.append)
+        assert [r is None for r in results] == [False, True, False, True, False]
+        assert progress[-1]['failed'] == 2
+        assert sorted(analyzer.load_checkpoint()) == ["id:0", "id:2", "id:4"]
+
+        fallback_service.client.fail_on = set()
+        fallback_service.client.calls.clear()
+        results = analyzer.run(conversations)
+
+        assert sorted(fallback_service.client.calls) == ["对话1", "对话3"]
+        assert [r.summary for r in results] == [f"摘要:对话{i}" for i in range(5)]
+        assert not (tmp_path / "batch.jsonl").exists()
+
+    def test_default_concurrency_by_backend(self):
+        ollama = AIService(AIConfig(backend='ollama'))
+        assert isinstance(ollama.client, OllamaClient)
+        assert BatchAnalyzer(ollama).concurrency >= 1
+        assert BatchAnalyzer(ollama, concurrency=3).concurrency == 3
@@ -0,0 +1,424 @@
+"""
+浏览器池单元测试
+
+用假浏览器代替Chromium：复用浏览器、线程归属、按页面数/内存/断开回收、空闲关闭、并发上限和爬虫接入。
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from scrapers import browser_pool
+from scrapers.browser_pool import BrowserPool
+from scrapers.claude_scraper import ClaudeScraper
+
+CLAUDE_HTML = """<html><head><title>索引优化 - Claude</title></head><body>
+<div class="message human">如何优化SQL查询？</div>
+<div class="message assistant">使用联合索引并遵循最左前缀原则。</div>
+</body></html>"""
+
+
+class FakePage:
+    def __init__(self, browser):
+        self.browser = browser
+        self.closed = False
+        self.heap = browser.heap
+
+    def _check_thread(self):
+        assert threading.get_ident() == self.browser.thread, "页面在其他线程中使用"
+
+    def goto(self, url, **kwargs):
+        self._check_thread()
+        self.url = url
+        self.wait_until = kwargs.get('wait_until')
+
+    def wait_for_selector(self, selector, timeout=None):
+        self._check_thread()
+
+    def content(self):
+        self._check_thread()
+        return CLAUDE_HTML
+
+    def evaluate(self, script, arg=None):
+        self._check_thread()
+        if 'performance.memory' in script:
+            return self.heap
+        if 'MutationObserver' in script:
+            self.ready_arg = arg
+            return {'count': 2, 'stable': True, 'elapsed': 35}
+        return None
+
+    def query_selector(self, selector):
+        return None
+
+    def close(self):
+        self._check_thread()
+        self.closed = True
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.routes = []
+
+    def route(self, pattern, handler):
+        self.routes.append((pattern, handler))
+
+    def new_page(self):
+        page = FakePage(self.browser)
+        self.browser.pages.append(page)
+        return page
+
+
+class FakeBrowser:
+    def __init__(self, heap=0):
+        self.thread = threading.get_ident()
+        self.heap = heap
+        self.connected = True
+        self.closed = False
+        self.pages = []
+
+    def new_context(self, **options):
+        self.options = options
+        self.context = FakeContext(self)
+        return self.context
+
+    def is_connected(self):
+        return self.connected
+
+    def close(self):
+        assert threading.get_ident() == self.thread
+        self.closed = True
+
+
+class FakeLauncher:
+    def __init__(self, heap=0):
+        self.heap = heap
+        self.browsers = []
+        self.stopped = 0
+
+    def __call__(self):
+        browser = FakeBrowser(self.heap)
+        self.browsers.append(browser)
+        return browser, self.stop
+
+    def stop(self):
+        self.stopped += 1
+
+
+@pytest.fixture
+def launcher():
+    return FakeLauncher()
+
+
+def make_pool(launcher, **kwargs):
+    kwargs.setdefault('idle_timeout', None)
+    return BrowserPool(launcher=launcher, **kwargs)
+
+
+class TestReuse:
+    """测试浏览器复用"""
+
+    def test_reuses_browser(self, launcher):
+        pool = make_pool(launcher, size=1)
+        urls = [pool.run(lambda page, i=i: (page.goto(f"https://claude.ai/share/{i}"), page.url)[1])
+                for i in range(5)]
+        pool.close()
+
+        assert urls[-1] == "https://claude.ai/share/4"
+        assert len(launcher.browsers) == 1
+        browser = launcher.browsers[0]
+        assert len(browser.pages) == 5 and all(page.closed for page in browser.pages)
+        assert browser.closed and launcher.stopped == 1
+        assert pool.status()['pages'] == 5 and pool.status()['launches'] == 1
+
+    def test_exception_propagates(self, launcher):
+        pool = make_pool(launcher, size=1)
+
+        def fail(page):
+            raise TimeoutError("页面加载超时")
+
+        with pytest.raises(TimeoutError):
+            pool.run(fail)
+        assert pool.run(lambda page: "ok") == "ok"   # 浏览器仍可用
+        pool.close()
+
+        assert len(launcher.browsers) == 1
+        assert launcher.browsers[0].pages[0].closed
+        assert pool.stats.failures == 1
+
+    def test_launch_failure(self):
+        def broken():
+            raise RuntimeError("Executable doesn't exist")
+
+        pool = make_pool(broken, size=1)
+        with pytest.raises(RuntimeError):
+            pool.run(lambda page: None)
+        pool.close()
+
+    def test_closed_pool_rejects(self, launcher):
+        pool = make_pool(launcher)
+        pool.close()
+        with pytest.raises(RuntimeError):
+            pool.submit(lambda page: None)
+
+
+class TestRecycle:
+    """测试回收"""
+
+    def test_after_max_pages(self, launcher):
+        pool = make_pool(launcher, size=1, max_pages_per_browser=3)
+        for _ in range(7):
+            pool.run(lambda page: None)
+        pool.close()
+
+        assert [len(b.pages) for b in launcher.browsers] == [3, 3, 1]
+        assert all(b.closed for b in launcher.browsers)
+        assert pool.stats.recycles == 2
+
+    def test_heap_threshold(self):
+        launcher = FakeLauncher(heap=600 * 1024 * 1024)
+        pool = make_pool(launcher, size=1, max_heap_mb=512)
+        pool.run(lambda page: None)
+        pool.run(lambda page: None)
+        pool.close()
+
+        assert len(launcher.browsers) == 2
+
+    def test_disconnected_browser_relaunched(self, launcher):
+        pool = make_pool(launcher, size=1)
+        pool.run(lambda page: None)
+        launcher.browsers[0].connected = False     # 浏览器崩溃
+
+        assert pool.run(lambda page: page.browser) is launcher.browsers[1]
+        pool.close()
+
+    def test_idle_timeout(self, launcher):
+        pool = make_pool(launcher, size=1, idle_timeout=0.1)
+        pool.run(lambda page: None)
+
+        deadline = time.monotonic() + 5
+        while not launcher.browsers[0].closed and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert launcher.browsers[0].closed
+        assert pool.status()['browsers'] == 0
+
+        pool.run(lambda page: None)            # 空闲关闭后按需重启
+        assert len(launcher.browsers) == 2
+        pool.close()
+
+
+class TestConcurrency:
+    """测试并发"""
+
+    def test_bounded_by_size(self, launcher):
+        pool = make_pool(launcher, size=2)
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def job(page):
+            with lock:
+                active.append(1)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.pop()
+            return threading.get_ident()
+
+        async def main():
+            return await asyncio.gather(*(pool.run_async(job) for _ in range(8)))
+
+        threads = asyncio.run(main())
+        pool.close()
+
+        assert max(peak) == 2
+        assert len(set(threads)) == 2 and len(launcher.browsers) == 2
+
+    def test_shared_pool(self, launcher, monkeypatch):
+        monkeypatch.setattr(browser_pool, '_shared_pool', None)
+        pool = make_pool(launcher)
+        browser_pool.set_browser_pool(pool)
+
+        assert browser_pool.get_browser_pool() is pool
+        browser_pool.close_browser_pool()
+        assert browser_pool.get_browser_pool() is not pool   # 关闭后重新创建
+
+
+class TestScraper:
+    """测试爬虫使用共享池"""
+
+    def test_claude_scraper(self, launcher, monkeypatch):
+        monkeypatch.setenv('SCRAPER_FAST_PATH', 'false')
+        pool = make_pool(launcher, size=1)
+        monkeypatch.setattr(browser_pool, '_shared_pool', pool)
+
+        scraper = ClaudeScraper()
+        first = scraper.scrape("https://claude.ai/share/abc-1")
+        second = scraper.scrape("https://claude.ai/share/abc-2")
+        pool.close()
+
+        assert first.title == "索引优化"
+        assert [m.role for m in first.messages] == ['user', 'assistant']
+        assert second.url == "https://claude.ai/share/abc-2"
+        assert first.metadata['ready_ms'] == 35
+        browser = launcher.browsers[0]
+        assert len(launcher.browsers) == 1 and browser.options['user_agent']
+        # 不等 networkidle，就绪检测按平台的消息选择器进行并滚动到底部
+        page = browser.pages[0]
+        assert page.wait_until == 'domcontentloaded'
+        assert 'div[class*="message"]' in page.ready_arg['selector'] and page.ready_arg['scroll']
+        assert [pattern for pattern, _ in browser.context.routes] == ['**/*']
+
+
+class AsyncFakePage:
+    def __init__(self, browser):
+        self.browser = browser
+        self.closed = False
+
+    async def goto(self, url, **kwargs):
+        self.url = url
+        await asyncio.sleep(self.browser.delay)
+
+    async def wait_for_selector(self, selector, timeout=None):
+        pass
+
+    async def content(self):
+        return CLAUDE_HTML
+
+    async def evaluate(self, script, arg=None):
+        if 'performance.memory' in script:
+            return self.browser.heap
+        return {'count': 2, 'stable': True, 'elapsed': 35} if 'MutationObserver' in script else None
+
+    async def close(self):
+        self.closed = True
+
+
+class AsyncFakeBrowser:
+    def __init__(self, delay, heap=0):
+        self.delay = delay
+        self.heap = heap
+        self.connected = True
+        self.closed = False
+        self.pages = []
+
+    async def new_context(self, **options):
+        return self
+
+    async def route(self, pattern, handler):
+        self.route_handler = handler
+
+    async def new_page(self):
+        page = AsyncFakePage(self)
+        self.pages.append(page)
+        return page
+
+    def is_connected(self):
+        return self.connected
+
+    async def close(self):
+        self.closed = True
+
+
+class AsyncFakeLauncher:
+    def __init__(self, delay=0.0, heap=0):
+        self.delay = delay
+        self.heap = heap
+        self.browsers = []
+
+    async def __call__(self):
+        browser = AsyncFakeBrowser(self.delay, self.heap)
+        self.browsers.append(browser)
+
+        async def stop():
+            pass
+        return browser, stop
+
+
+class TestAsyncPool:
+    """测试异步浏览器池"""
+
+    def test_per_domain_and_global_limits(self):
+        launcher = AsyncFakeLauncher()
+        pool = browser_pool.AsyncBrowserPool(max_concurrency=4, per_domain=2, launcher=launcher)
+        active = {}
+        peaks = {'total': 0}
+
+        async def job(page, host):
+            active[host] = active.get(host, 0) + 1
+            peaks[host] = max(peaks.get(host, 0), active[host])
+            peaks['total'] = max(peaks['total'], sum(active.values()))
+            await asyncio.sleep(0.02)
+            active[host] -= 1
+            return host
+
+        async def main():
+            urls = [f"https://{host}/share/{i}" for i in range(6)
+                    for host in ("chatgpt.com", "claude.ai", "chat.deepseek.com")]
+            results = await asyncio.gather(*(
+                pool.run(url, lambda page, url=url: job(page, url.split('/')[2])) for url in urls))
+            await pool.close()
+            return results
+
+        results = asyncio.run(main())
+
+        assert len(results) == 18
+        assert peaks['total'] == 4
+        assert all(peaks[host] <= 2 for host in ("chatgpt.com", "claude.ai", "chat.deepseek.com"))
+        assert len(launcher.browsers) == 1 and launcher.browsers[0].closed
+        assert all(page.closed for page in launcher.browsers[0].pages)
+
+    def test_recycle_waits_for_active_pages(self):
+        launcher = AsyncFakeLauncher(delay=0.01)
+        pool = browser_pool.AsyncBrowserPool(max_pages_per_browser=3, launcher=launcher)
+
+        async def main():
+            await asyncio.gather(*(pool.run(f"https://claude.ai/share/{i}", AsyncFakePage.content)
+                                   for i in range(7)))
+            status = pool.status()
+            await pool.close()
+            return status
+
+        status = asyncio.run(main())
+
+        assert status['pages'] == 7 and status['active_pages'] == 0
+        assert len(launcher.browsers) >= 3
+        # 回收的浏览器在其页面全部关闭后才关闭
+        assert all(b.closed for b in launcher.browsers)
+        assert all(p.closed for b in launcher.browsers for p in b.pages)
+
+    def test_heap_and_disconnect(self):
+        launcher = AsyncFakeLauncher(heap=600 * 1024 * 1024)
+        pool = browser_pool.AsyncBrowserPool(max_heap_mb=512, launcher=launcher)
+
+        async def main():
+            await pool.run("https://claude.ai/share/1", AsyncFakePage.content)
+            await pool.run("https://claude.ai/share/2", AsyncFakePage.content)
+            pool.max_heap_mb = None
+            launcher.browsers[-1].connected = False
+            await pool.run("https://claude.ai/share/3", AsyncFakePage.content)
+            await pool.close()
+
+        asyncio.run(main())
+        assert len(launcher.browsers) == 3
+
+    def test_async_scraper(self, monkeypatch):
+        monkeypatch.setenv('SCRAPER_FAST_PATH', 'false')
+        launcher = AsyncFakeLauncher()
+
+        async def main():
+            browser_pool.set_async_browser_pool(browser_pool.AsyncBrowserPool(launcher=launcher))
+            urls = [f"https://claude.ai/share/abc-{i}" for i in range(3)] + ["https://claude.ai/x"]
+            results = await ClaudeScraper().scrape_async(urls[0]), await asyncio.gather(
+                *(ClaudeScraper().scrape_async(url) for url in urls[1:]), return_exceptions=True)
+            await browser_pool.close_async_browser_pool()
+            return results
+
+        first, rest = asyncio.run(main())
+
+        assert first.title == "索引优化" and len(first.messages) == 2
+        assert [r.url for r in rest[:2]] == ["https://claude.ai/share/abc-1", "https://claude.ai/share/abc-2"]
+        assert isinstance(rest[2], ValueError)      # 不支持的链接格式
+        assert len(launcher.browsers) == 1
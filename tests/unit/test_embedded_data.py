@@ -0,0 +1,170 @@
+"""
+内嵌数据提取与分级抓取单元测试
+
+Next.js / Remix / Flight 数据中的对话、各平台消息格式、成功率驱动的分级策略和爬虫接入。
+"""
+import asyncio
+import json
+
+import pytest
+
+from scrapers import fetch_tiers
+from scrapers.claude_scraper import ClaudeScraper
+from scrapers.chatgpt_scraper import ChatGPTScraper
+from scrapers.embedded_data import extract_conversation, find_conversation
+from scrapers.fetch_tiers import BROWSER, HTTP, TierStats
+
+CHATGPT_DATA = {
+    'props': {'pageProps': {'serverResponse': {'data': {
+        'title': "SQL索引优化",
+        'linear_conversation': [
+            {'id': 'root'},
+            {'message': {'author': {'role': 'system'}, 'content': {'content_type': 'text', 'parts': [""]}}},
+            {'message': {'author': {'role': 'user'},
+                         'content': {'content_type': 'text', 'parts': ["如何优化SQL查询？"]}}},
+            {'message': {'author': {'role': 'assistant'},
+                         'content': {'content_type': 'text', 'parts': ["使用联合索引，", "遵循最左前缀原则。"]}}},
+        ],
+    }}}},
+}
+
+CLAUDE_DATA = {
+    'name': "旅行计划",
+    'chat_messages': [
+        {'sender': 'human', 'text': "", 'content': [{'type': 'text', 'text': "旅行前要准备什么？"}]},
+        {'sender': 'assistant', 'content': [{'type': 'tool_use', 'input': {}},
+                                            {'type': 'text', 'text': "提前预订机票和酒店。"}]},
+    ],
+}
+
+
+def page(body, title="分享的对话 - ChatGPT"):
+    return f"<html><head><title>{title}</title></head><body><div id='root'></div>{body}</body></html>"
+
+
+def next_data(data):
+    return f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(data, ensure_ascii=False)}</script>'
+
+
+class TestExtraction:
+    """测试内嵌数据提取"""
+
+    def test_next_data(self):
+        title, messages = extract_conversation(page(next_data(CHATGPT_DATA)))
+
+        assert title == "SQL索引优化"
+        assert [(m.role, m.content) for m in messages] == [
+            ('user', "如何优化SQL查询？"), ('assistant', "使用联合索引，\n遵循最左前缀原则。")]
+
+    def test_remix_context(self):
+        data = {'state': {'loaderData': {'routes/share.$id': {'serverResponse': CHATGPT_DATA['props']['pageProps']['serverResponse']}}}}
+        html = page(f"<script>window.__remixContext = {json.dumps(data)};__remixContext.p = null;</script>")
+
+        assert extract_conversation(html)[0] == "SQL索引优化"
+
+    def test_claude_content_blocks(self):
+        title, messages = find_conversation(CLAUDE_DATA)
+
+        assert title == "旅行计划"
+        assert [m.content for m in messages] == ["旅行前要准备什么？", "提前预订机票和酒店。"]
+
+    def test_next_flight(self):
+        payload = json.dumps(CLAUDE_DATA, ensure_ascii=False)
+        chunks = [f'0:["$","html",null,{{}}]\n5:{payload[:40]}', f'{payload[40:]}\n']
+        html = page("".join(f'<script>self.__next_f.push([1,{json.dumps(chunk)}])</script>' for chunk in chunks))
+
+        assert len(extract_conversation(html)[1]) == 2
+
+    def test_no_conversation(self):
+        only_user = {'messages': [{'role': 'user', 'content': "a"}, {'role': 'user', 'content': "b"}]}
+        assert find_conversation(only_user) is None
+        assert extract_conversation(page(next_data(only_user))) is None
+        assert extract_conversation(page('<script type="application/json">{broken</script>')) is None
+
+
+class TestTierStats:
+    """测试分级策略"""
+
+    def test_skips_failing_http_and_probes(self):
+        stats = TierStats(min_attempts=3, min_success_rate=0.5, probe_every=4)
+        for _ in range(3):
+            assert stats.should_try_http('claude')
+            stats.record('claude', HTTP, False, 0.1)
+
+        decisions = [stats.should_try_http('claude') for _ in range(8)]
+        assert decisions == [False, False, False, True] * 2
+        assert stats.should_try_http('chatgpt')          # 各平台独立
+
+        for _ in range(3):
+            stats.record('claude', HTTP, True, 0.1)       # 恢复后回到快速路径
+        assert stats.should_try_http('claude')
+
+    def test_snapshot(self):
+        stats = TierStats()
+        stats.record('chatgpt', HTTP, True, 0.2)
+        stats.record('chatgpt', HTTP, False, 0.4)
+        stats.record('chatgpt', BROWSER, True, 3.0)
+
+        snapshot = stats.snapshot()['chatgpt']
+        assert snapshot[HTTP] == {'attempts': 2, 'successes': 1, 'success_rate': 0.5, 'avg_ms': 300.0}
+        assert snapshot[BROWSER]['avg_ms'] == 3000.0
+        assert "chatgpt/http: 1/2" in fetch_tiers.summarize(stats.snapshot())
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = TierStats()
+    monkeypatch.setattr(fetch_tiers, '_tier_stats', stats)
+    monkeypatch.setenv('SCRAPER_FAST_PATH', 'true')
+    return stats
+
+
+def serve(monkeypatch, html):
+    monkeypatch.setattr(fetch_tiers, 'fetch_html', lambda url, timeout=15: html)
+
+
+class TestTieredScrape:
+    """测试爬虫分级抓取"""
+
+    def test_http_tier(self, stats, monkeypatch):
+        serve(monkeypatch, page(next_data(CHATGPT_DATA)))
+        monkeypatch.setattr(ChatGPTScraper, '_scrape_with_playwright',
+                            lambda self, url: pytest.fail("不应启动浏览器"))
+
+        data = ChatGPTScraper().scrape("https://chatgpt.com/share/abc")
+
+        assert data.metadata['scrape_method'] == 'http' and data.title == "SQL索引优化"
+        assert stats.snapshot()['chatgpt'][HTTP]['successes'] == 1
+
+    def test_falls_back_to_browser(self, stats, monkeypatch):
+        serve(monkeypatch, page("<div>需要JavaScript</div>"))
+        calls = []
+
+        def browser(self, url):
+            calls.append(url)
+            return "rendered"
+
+        monkeypatch.setattr(ChatGPTScraper, '_scrape_with_playwright', browser)
+        assert ChatGPTScraper().scrape("https://chatgpt.com/share/abc") == "rendered"
+        assert calls == ["https://chatgpt.com/share/abc"]
+        assert stats.snapshot()['chatgpt'][HTTP]['successes'] == 0
+
+    def test_title_from_page(self, stats, monkeypatch):
+        data = {'conversation': {'messages': [{'role': 'user', 'content': "你好"},
+                                              {'role': 'assistant', 'content': "你好！"}]}}
+        serve(monkeypatch, page(next_data(data), title="问候 | Claude"))
+
+        assert ClaudeScraper().scrape("https://claude.ai/share/abc").title == "问候"
+
+    def test_requests_mode(self, stats, monkeypatch):
+        serve(monkeypatch, page('<div class="message human">服务端渲染的问题</div>'
+                                '<div class="message assistant">服务端渲染的回答</div>'))
+
+        data = ClaudeScraper(use_playwright=False).scrape("https://claude.ai/share/abc")
+        assert data.metadata['scrape_method'] == 'requests' and len(data.messages) == 2
+
+    def test_async_http_tier(self, stats, monkeypatch):
+        serve(monkeypatch, page(next_data(CLAUDE_DATA)))
+
+        data = asyncio.run(ClaudeScraper().scrape_async("https://claude.ai/share/abc"))
+        assert data.metadata['scrape_method'] == 'http' and data.title == "旅行计划"
@@ -0,0 +1,217 @@
+"""
+对话向量与相关对话单元测试
+
+编码器、按内容哈希缓存、增量 top-k 与暴力计算一致、删除/修改对话后的维护。
+"""
+import numpy as np
+import pytest
+
+from ai.ai_service import AIConfig
+from ai.embeddings import EmbeddingPipeline, HashingEncoder, OllamaEmbedder, create_pipeline
+from benchmarks.fake_llm_server import FakeLLMServer
+
+TOPICS = [
+    ("SQL索引", "联合索引遵循最左前缀原则，用EXPLAIN查看执行计划，避免在索引列上使用函数。"),
+    ("Python列表推导式", "列表推导式比for循环更简洁，可以加入if条件过滤，嵌套推导式注意可读性。"),
+    ("旅行计划", "提前预订机票和酒店更便宜，行程不要安排得太满，准备好签证和保险材料。"),
+]
+
+
+def add(db, i, topic=None):
+    title, body = topic or TOPICS[i % len(TOPICS)]
+    messages = [{'role': 'user', 'content': f"关于{title}的问题（第{i}条）"},
+                {'role': 'assistant', 'content': body * (1 + i % 3)}]
+    return db.add_conversation(source_url=f"https://chat.local/{i}", platform='chatgpt',
+                               title=f"{title} #{i}", raw_content={'messages': messages})
+
+
+def brute_force(pipeline, db, k):
+    """每条对话前k个相似度（暴力计算）"""
+    ids, matrix = pipeline.load_vectors(db.conn)
+    scores = matrix @ matrix.T
+    np.fill_diagonal(scores, -np.inf)
+    return {cid: np.sort(scores[row])[::-1][:k] for row, cid in enumerate(ids)}
+
+
+def stored(db):
+    """每条对话保存的 [(related_id, score)]，按rank排序"""
+    lists = {}
+    for cid, related_id, score in db.conn.execute(
+            "SELECT conversation_id, related_id, score FROM related_conversations ORDER BY conversation_id, rank"):
+        lists.setdefault(cid, []).append((related_id, score))
+    return lists
+
+
+class TestEncoders:
+    """测试编码器"""
+
+    def test_hashing_similarity(self):
+        vectors = HashingEncoder().embed([TOPICS[0][1], TOPICS[0][1] + "联合索引", TOPICS[2][1]])
+
+        assert vectors.shape == (3, 512) and vectors.dtype == np.float32
+        assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+        assert vectors[0] @ vectors[1] > vectors[0] @ vectors[2]
+
+    def test_ollama_batch_and_legacy_api(self):
+        texts = [TOPICS[0][1], TOPICS[1][1], TOPICS[2][1]]
+        with FakeLLMServer(latency=0) as server:
+            vectors = OllamaEmbedder(server.url, model="fake-model").embed(texts)
+            assert vectors.shape == (3, 64)
+            assert server.stats.requests == 1          # 一批一次请求
+
+        with FakeLLMServer(latency=0, embed_batch_api=False) as server:
+            legacy = OllamaEmbedder(server.url, model="fake-model").embed(texts)
+        assert np.allclose(vectors, legacy)
+
+    def test_create_pipeline(self):
+        assert create_pipeline(AIConfig()).encoder.name == "hashing-512"
+        config = AIConfig(embedding_backend='ollama', embedding_model='bge-m3')
+        assert create_pipeline(config).encoder.name == "ollama:bge-m3"
+        with pytest.raises(ValueError):
+            create_pipeline(AIConfig(embedding_backend='unknown'))
+
+
+class TestPipeline:
+    """测试增量流水线"""
+
+    def test_incremental_matches_brute_force(self, db):
+        pipeline = EmbeddingPipeline(top_k=4, batch_size=5, block_size=7)
+        for i in range(20):
+            add(db, i)
+        first = pipeline.update(db.conn)
+        assert first['embedded'] == 20 and first['updated'] == 20
+
+        for i in range(20, 32):
+            add(db, i)
+        second = pipeline.update(db.conn)
+
+        assert second['embedded'] == 12 and second['conversations'] == 32
+        expected = brute_force(pipeline, db, 4)
+        actual = stored(db)
+        for cid, scores in expected.items():
+            # 相似度并列时可能选中不同的对话，比较相似度
+            assert len({related_id for related_id, _ in actual[cid]}) == 4
+            assert np.allclose([score for _, score in actual[cid]], scores, atol=1e-5)
+        assert pipeline.update(db.conn)['updated'] == 0
+
+    def test_top_k_neighbors_blocked(self):
+        rng = np.random.default_rng(0)
+        matrix = rng.normal(size=(50, 16)).astype(np.float32)
+        matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+        pipeline = EmbeddingPipeline(block_size=8)
+
+        rows, scores = pipeline.top_k_neighbors(matrix, np.arange(50), matrix, 5)
+
+        full = matrix @ matrix.T
+        np.fill_diagonal(full, -np.inf)
+        assert np.array_equal(rows, np.argsort(-full, axis=1)[:, :5])
+        assert np.all(np.diff(scores, axis=1) <= 0)
+
+    def test_content_hash_cache(self, db):
+        pipeline = EmbeddingPipeline()
+        add(db, 0)
+        add(db, 3)          # 与0不同的标题和内容长度
+        stats = pipeline.update(db.conn)
+        assert stats['computed'] == 2
+
+        db.conn.execute("DELETE FROM conversation_embeddings")
+        db.conn.commit()
+        stats = pipeline.update(db.conn)
+        assert stats['embedded'] == 2 and stats['computed'] == 0 and stats['cached'] == 2
+
+    def test_per_message(self, db):
+        pipeline = EmbeddingPipeline(per_message=True)
+        add(db, 0)
+        pipeline.update(db.conn)
+        assert db.conn.execute("SELECT COUNT(*) FROM message_embeddings").fetchone()[0] == 2
+
+    def test_encoder_change_rebuilds(self, db):
+        for i in range(4):
+            add(db, i)
+        EmbeddingPipeline(HashingEncoder(128), top_k=2).update(db.conn)
+
+        stats = EmbeddingPipeline(HashingEncoder(256), top_k=2).update(db.conn)
+        assert stats['embedded'] == 4 and stats['updated'] == 4
+
+
+class TestMaintenance:
+    """测试删除/修改对话后的维护和查询"""
+
+    def test_get_related(self, db):
+        pipeline = EmbeddingPipeline(top_k=3)
+        ids = [add(db, i) for i in range(6)]
+        pipeline.update(db.conn)
+
+        related = db.get_related_conversations(ids[0], limit=2)
+        assert len(related) == 2
+        assert related[0]['title'].startswith("SQL索引")      # 同主题最相似
+        assert related[0]['score'] >= related[1]['score']
+        assert db.has_embedding(ids[0])
+
+    def test_delete_removes_references(self, db):
+        pipeline = EmbeddingPipeline(top_k=3)
+        ids = [add(db, i) for i in range(6)]
+        pipeline.update(db.conn)
+
+        db.delete_conversation(ids[3])
+        assert not db.conn.execute("SELECT 1 FROM related_conversations WHERE related_id = ?",
+                                   (ids[3],)).fetchone()
+        pipeline.update(db.conn)
+        assert all(len(db.get_related_conversations(cid, 10)) == 3 for cid in ids if cid != ids[3])
+
+    def test_content_update_recomputes(self, db):
+        pipeline = EmbeddingPipeline(top_k=2)
+        ids = [add(db, i) for i in range(4)]
+        pipeline.update(db.conn)
+
+        db.conn.execute("UPDATE conversations SET title = ? WHERE id = ?", ("旅行计划 新", ids[0]))
+        db.conn.commit()
+        assert not db.has_embedding(ids[0])
+        assert db.get_related_conversations(ids[0]) == []
+
+        assert pipeline.update(db.conn)['embedded'] == 1
+        assert len(db.get_related_conversations(ids[0])) == 2
+
+
+class TestCommandLine:
+    """测试命令行的相关对话：show只读预先计算的结果，计算放在后台或related命令"""
+
+    @pytest.fixture
+    def app(self, db):
+        from main import ChatCompass
+        app = ChatCompass.__new__(ChatCompass)
+        app.db = db
+        app._embedding_pipeline = EmbeddingPipeline(top_k=2)
+        app.background_related = False
+        app._related_thread = None
+        return app
+
+    def test_show_does_not_compute(self, app, db, capsys):
+        ids = [add(db, i) for i in range(3)]
+        app._show_related(ids[0])
+
+        assert "尚未计算" in capsys.readouterr().out
+        assert db.conn.execute("SELECT COUNT(*) FROM conversation_embeddings").fetchone()[0] == 0
+
+        app.update_related()
+        app._show_related(ids[0])
+        assert "🔗 相关对话:\n" in capsys.readouterr().out
+
+    def test_background_update(self, app, db):
+        ids = [add(db, i) for i in range(3)]
+        app.update_related_async()
+        assert app._related_thread is None        # 单次命令不计算
+
+        app.background_related = True
+        app.update_related_async()
+        app._related_thread.join(10)
+        assert db.has_embedding(ids[0])
+
+    def test_rebuild(self, app, db):
+        ids = [add(db, i) for i in range(3)]
+        assert app.update_related()['embedded'] == 3
+        assert app.update_related()['updated'] == 0
+
+        stats = app.update_related(rebuild=True)
+        assert stats['embedded'] == 0 and stats['updated'] == 3
+        assert len(db.get_related_conversations(ids[0])) == 2
@@ -0,0 +1,279 @@
+"""
+变更日志与增量复制单元测试
+"""
+import json
+
+import pytest
+from database.db_manager import DatabaseManager
+from database.es_replicator import ChangeLogReplicator
+
+
+class FakeESManager:
+    """记录bulk动作的ES替身"""
+
+    conversation_index = "test_conversations"
+    message_index = "test_messages"
+    tag_index = "test_tags"
+
+    def __init__(self):
+        self.docs = {}
+        self.calls = []
+
+    def bulk_write(self, actions):
+        self.calls.append(actions)
+        errors = []
+        for action in actions:
+            key = (action['_index'], action['_id'])
+            if action['_op_type'] == 'index':
+                self.docs[key] = action['_source']
+            elif key in self.docs:
+                del self.docs[key]
+            else:
+                errors.append({'delete': {'_id': action['_id'], 'status': 404}})
+        return len(actions) - len(errors), errors
+
+    def delete_messages_from(self, cutoffs):
+        stale = [key for key, doc in self.docs.items()
+                 if key[0] == self.message_index
+                 and doc['order_index'] >= cutoffs.get(doc['conversation_id'], float('inf'))]
+        for key in stale:
+            del self.docs[key]
+        return len(stale)
+
+    def conversation(self, source_url):
+        doc_id = ChangeLogReplicator.conversation_doc_id(source_url)
+        return self.docs.get((self.conversation_index, doc_id))
+
+    def messages(self, source_url):
+        doc_id = ChangeLogReplicator.conversation_doc_id(source_url)
+        return sorted(doc['content'] for key, doc in self.docs.items()
+                      if key[0] == self.message_index and doc['conversation_id'] == doc_id)
+
+
+@pytest.fixture
+def replicator(db):
+    es = FakeESManager()
+    rep = ChangeLogReplicator(db.db_path, es, batch_size=100)
+    rep.catch_up()
+    es.calls.clear()
+    yield rep
+    rep.close()
+
+
+def _add(db, url, tags=None):
+    return db.add_conversation(
+        source_url=url,
+        platform="chatgpt",
+        title="测试对话",
+        raw_content={'messages': [{'role': 'user', 'content': '你好'}]},
+        summary="摘要",
+        category="编程",
+        tags=tags or []
+    )
+
+
+class TestChangeLogTriggers:
+    """测试触发器写入变更日志"""
+
+    def test_insert_update_delete_logged(self, db, replicator):
+        hwm = replicator.get_high_water_mark()
+        conv_id = _add(db, "https://chatgpt.com/share/a")
+        db.update_conversation(conv_id, summary="新摘要")
+        db.delete_conversation(conv_id)
+
+        ops = [(c['entity'], c['op']) for c in replicator.fetch_changes(hwm, 100)]
+        assert ops == [
+            ('conversation', 'upsert'),
+            ('conversation', 'upsert'),
+            ('conversation', 'delete'),
+        ]
+
+    def test_timestamp_trigger_not_duplicated(self, db, replicator):
+        """updated_at的自动更新不应产生额外变更"""
+        conv_id = _add(db, "https://chatgpt.com/share/b")
+        hwm = db.conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+        db.update_conversation(conv_id, title="新标题")
+        assert len(replicator.fetch_changes(hwm, 100)) == 1
+
+    def test_tag_link_logged_as_conversation_upsert(self, db, replicator):
+        conv_id = _add(db, "https://chatgpt.com/share/c")
+        hwm = db.conn.execute("SELECT MAX(seq) FROM change_log").fetchone()[0]
+        db._add_tags_to_conversation(conv_id, ["Python"])
+
+        changes = replicator.fetch_changes(hwm, 100)
+        assert ('conversation', conv_id, 'upsert') in [
+            (c['entity'], c['entity_id'], c['op']) for c in changes
+        ]
+
+    def test_not_logged_without_consumer(self, db):
+        """未启用复制时不写日志，旧库中无人消费的积压在打开时清理"""
+        _add(db, "https://chatgpt.com/share/k")
+        assert db.conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 0
+
+        db.conn.execute("DROP TRIGGER conversations_cl_ai")
+        db.conn.execute("""
+            CREATE TRIGGER conversations_cl_ai AFTER INSERT ON conversations BEGIN
+                INSERT INTO change_log(entity, entity_id, op, entity_key)
+                VALUES ('conversation', new.id, 'upsert', new.source_url);
+            END
+        """)
+        _add(db, "https://chatgpt.com/share/l")
+        db.conn.commit()
+
+        reopened = DatabaseManager(db.db_path)
+        sql = reopened.conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'conversations_cl_ai'"
+        ).fetchone()[0]
+        assert 'replication_state' in sql
+        assert reopened.conn.execute("SELECT COUNT(*) FROM change_log").fetchone()[0] == 0
+        reopened.close()
+
+
+class TestCoalesce:
+    """测试变更合并"""
+
+    def test_keeps_last_op_and_delete_key(self):
+        changes = [
+            {'entity': 'conversation', 'entity_id': 1, 'op': 'upsert', 'entity_key': 'u1'},
+            {'entity': 'conversation', 'entity_id': 1, 'op': 'upsert', 'entity_key': None},
+            {'entity': 'conversation', 'entity_id': 1, 'op': 'delete', 'entity_key': 'u1'},
+            {'entity': 'conversation', 'entity_id': 1, 'op': 'upsert', 'entity_key': None},
+            {'entity': 'tag', 'entity_id': 1, 'op': 'upsert', 'entity_key': 'Python'},
+        ]
+        merged = ChangeLogReplicator.coalesce(changes)
+
+        assert len(merged) == 2
+        assert merged[('conversation', 1)] == {'op': 'upsert', 'key': 'u1', 'stale': []}
+
+    def test_changed_key_marked_stale(self):
+        changes = [
+            {'entity': 'conversation', 'entity_id': 1, 'op': 'upsert', 'entity_key': 'u1'},
+            {'entity': 'conversation', 'entity_id': 1, 'op': 'delete', 'entity_key': 'u1'},
+            {'entity': 'conversation', 'entity_id': 1, 'op': 'upsert', 'entity_key': 'u2'},
+            {'entity': 'conversation', 'entity_id': 1, 'op': 'upsert', 'entity_key': 'u3'},
+        ]
+        merged = ChangeLogReplicator.coalesce(changes)
+
+        assert merged[('conversation', 1)] == {'op': 'upsert', 'key': 'u3', 'stale': ['u1', 'u2']}
+
+
+class TestReplication:
+    """测试复制到ES"""
+
+    def test_upsert_with_tags_in_one_bulk(self, db, replicator):
+        _add(db, "https://chatgpt.com/share/d", tags=["Python", "测试"])
+
+        replicator.catch_up()
+
+        doc = replicator.es_mgr.conversation("https://chatgpt.com/share/d")
+        assert doc is not None
+        assert sorted(doc['tags']) == ["Python", "测试"]
+        assert 'T' in doc['create_time']
+        assert len(replicator.es_mgr.calls) == 1
+
+    def test_delete_propagates(self, db, replicator):
+        conv_id = _add(db, "https://chatgpt.com/share/e")
+        replicator.catch_up()
+
+        db.delete_conversation(conv_id)
+        replicator.catch_up()
+
+        assert replicator.es_mgr.conversation("https://chatgpt.com/share/e") is None
+
+    def test_insert_then_delete_in_same_batch(self, db, replicator):
+        """插入后立即删除：删除不存在的文档(404)不算失败"""
+        conv_id = _add(db, "https://chatgpt.com/share/f")
+        db.delete_conversation(conv_id)
+
+        result = replicator.run_once()
+
+        assert result['actions'] == 1
+        assert replicator.es_mgr.conversation("https://chatgpt.com/share/f") is None
+
+    def test_tag_rename_refreshes_conversations(self, db, replicator):
+        _add(db, "https://chatgpt.com/share/g", tags=["旧名"])
+        replicator.catch_up()
+
+        db.conn.execute("UPDATE tags SET name = '新名' WHERE name = '旧名'")
+        db.conn.commit()
+        replicator.catch_up()
+
+        doc = replicator.es_mgr.conversation("https://chatgpt.com/share/g")
+        assert doc['tags'] == ["新名"]
+
+    def test_high_water_mark_persisted_and_log_purged(self, db, replicator):
+        _add(db, "https://chatgpt.com/share/h")
+        replicator.catch_up()
+        hwm = replicator.get_high_water_mark()
+
+        # 新实例从持久化的高水位继续
+        other = ChangeLogReplicator(db.db_path, FakeESManager())
+        assert other.get_high_water_mark() == hwm
+        assert other.run_once()['changes'] == 0
+        other.close()
+
+        remaining = db.conn.execute(
+            "SELECT COUNT(*) FROM change_log WHERE seq <= ?", (hwm,)
+        ).fetchone()[0]
+        assert remaining == 0
+
+    def test_failed_bulk_does_not_advance(self, db, replicator):
+        _add(db, "https://chatgpt.com/share/i")
+        hwm = replicator.get_high_water_mark()
+        replicator.es_mgr.bulk_write = lambda actions: (0, [{'index': {'status': 500}}])
+
+        with pytest.raises(RuntimeError):
+            replicator.run_once()
+
+        assert replicator.get_high_water_mark() == hwm
+        assert replicator.get_lag()['pending'] > 0
+
+    def test_seed_existing_rows(self, db, replicator):
+        db.conn.execute("""
+            INSERT INTO replication_state (consumer, last_seq) VALUES ('other', 0)
+        """)
+        db.conn.commit()
+        _add(db, "https://chatgpt.com/share/j")
+
+        fresh_es = FakeESManager()
+        fresh = ChangeLogReplicator(db.db_path, fresh_es, consumer='fresh')
+        fresh.seed()
+        fresh.catch_up()
+
+        assert fresh_es.conversation("https://chatgpt.com/share/j") is not None
+        fresh.close()
+
+    def test_message_docs_follow_conversation(self, db, replicator):
+        url = "https://chatgpt.com/share/m"
+        conv_id = db.add_conversation(
+            source_url=url, platform="chatgpt", title="消息",
+            raw_content={'messages': [{'role': 'user', 'content': '问'},
+                                      {'role': 'assistant', 'content': '答'}]},
+        )
+        replicator.catch_up()
+        assert replicator.es_mgr.messages(url) == ['答', '问']
+
+        db.conn.execute(
+            "UPDATE conversations SET raw_content = ?, message_count = 1 WHERE id = ?",
+            (json.dumps({'messages': [{'role': 'user', 'content': '新问题'}]}), conv_id)
+        )
+        db.conn.commit()
+        replicator.catch_up()
+        assert replicator.es_mgr.messages(url) == ['新问题']
+
+        db.delete_conversation(conv_id)
+        replicator.catch_up()
+        assert replicator.es_mgr.messages(url) == []
+
+    def test_source_url_change_removes_old_docs(self, db, replicator):
+        old_url, new_url = "https://chatgpt.com/share/n", "https://chatgpt.com/share/n2"
+        conv_id = _add(db, old_url)
+        replicator.catch_up()
+
+        db.conn.execute("UPDATE conversations SET source_url = ? WHERE id = ?", (new_url, conv_id))
+        db.conn.commit()
+        replicator.catch_up()
+
+        es = replicator.es_mgr
+        assert es.conversation(old_url) is None and es.messages(old_url) == []
+        assert es.conversation(new_url) is not None and es.messages(new_url) == ['你好']
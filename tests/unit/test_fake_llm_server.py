@@ -0,0 +1,103 @@
+"""
+模拟大模型服务与基准测试单元测试
+"""
+import json
+import time
+
+import pytest
+
+from ai.ai_service import AIConfig, AIService
+from ai.ollama_client import OllamaClient
+from benchmarks.ai_benchmark import make_conversations, percentile, run_benchmark
+from benchmarks.fake_llm_server import FakeLLMServer
+
+
+@pytest.fixture
+def server():
+    with FakeLLMServer(latency=0.01, tokens_per_second=2000) as fake:
+        yield fake
+
+
+class TestFakeLLMServer:
+    """测试模拟服务"""
+
+    def test_answers_requested_fields_only(self):
+        prompt = 'Return JSON:\n{\n    "summary": "...",\n    "tags": []\n}'
+        data = json.loads(FakeLLMServer.respond_to(prompt))
+        assert set(data) == {'summary', 'tags'}
+        assert FakeLLMServer.respond_to(prompt) == FakeLLMServer.respond_to(prompt)
+
+    def test_ollama_client_streaming(self, server):
+        client = OllamaClient(base_url=server.url, model="fake-model")
+        assert client.is_available()
+        assert client.list_models() == ["fake-model"]
+
+        result = client.analyze_conversation("用户: 如何优化SQL？\n\n助手: 建立索引。")
+
+        assert result.summary.startswith("模拟摘要")
+        assert result.category and len(result.tags) == 3
+
+    def test_openai_compatible(self, server):
+        from ai.openai_client import OpenAIClient
+        client = OpenAIClient(api_key="test", model="fake-model", base_url=f"{server.url}/v1")
+
+        assert client.is_available()
+        result = client.analyze_conversation("用户: 你好\n\n助手: 你好！")
+        assert result.summary.startswith("模拟摘要")
+
+        stream = client.client.chat.completions.create(
+            model="fake-model", messages=[{"role": "user", "content": "你好"}], stream=True)
+        text = "".join(chunk.choices[0].delta.content or "" for chunk in stream)
+        assert text.startswith("模拟摘要")
+
+    def test_token_rate_and_latency(self):
+        with FakeLLMServer(latency=0.2, tokens_per_second=100) as fake:
+            client = OllamaClient(base_url=fake.url, model="fake-model")
+            start = time.perf_counter()
+            text = client.generate("写一段摘要")
+            elapsed = time.perf_counter() - start
+
+        tokens = len(FakeLLMServer.tokenize(text))
+        assert elapsed >= 0.2 + tokens / 100 * 0.8
+
+    def test_failure_injection(self):
+        with FakeLLMServer(latency=0, failure_rate=1.0) as fake:
+            client = OllamaClient(base_url=fake.url, model="fake-model")
+            with pytest.raises(Exception):
+                client.generate("prompt")
+            assert fake.stats.failures == 1
+
+    def test_parallel_slots_limit_concurrency(self):
+        with FakeLLMServer(latency=0.05, tokens_per_second=1000, parallel=2) as fake:
+            service = AIService(AIConfig(ollama_host=fake.url, ollama_model="fake-model"))
+            results = service.batch_analyze(
+                [{'text': f"用户: 问题{i}"} for i in range(8)], concurrency=6)
+
+        assert all(results)
+        assert fake.stats.max_concurrency == 2
+
+
+class TestBenchmark:
+    """测试基准测试"""
+
+    def test_percentile(self):
+        values = [0.1 * i for i in range(1, 21)]
+        assert percentile(values, 50) == pytest.approx(1.0)
+        assert percentile(values, 95) == pytest.approx(1.9)
+        assert percentile([], 95) == 0.0
+
+    def test_conversations_reproducible(self):
+        first = make_conversations(5, seed=1, long_ratio=0.5)
+        assert first == make_conversations(5, seed=1, long_ratio=0.5)
+        assert any(len(c['text']) > 12000 for c in first)
+
+    def test_run_all_scenarios(self, server, tmp_path):
+        conversations = make_conversations(4)
+        results = run_benchmark(server.url, "fake-model", conversations, concurrency=2)
+
+        assert [r.name for r in results] == ['ollama', 'openai', 'batch', 'ingest']
+        for result in results:
+            assert result.errors == 0
+            assert len(result.latencies) == 4
+            assert result.p95 >= result.p50 > 0
+            assert result.to_dict()['conversations_per_minute'] > 0
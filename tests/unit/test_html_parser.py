@@ -0,0 +1,71 @@
+"""
+HTML解析层单元测试
+
+解析后端选择、单遍文本块提取与原实现一致、ChatGPT通用提取路径。
+"""
+import pytest
+
+from benchmarks.html_parse_benchmark import make_share_page, quadratic_text_blocks
+from scrapers.chatgpt_scraper import ChatGPTScraper
+from scrapers.html_parser import PARSERS, get_parser, is_installed, make_soup, text_blocks
+
+AVAILABLE = [parser for parser in PARSERS if is_installed(parser)]
+
+NESTED = """
+<html><body>
+<div class="wrap">
+  <div class="a">第一段独立的文本内容，长度超过二十个字符。<!-- 注释不计入文本长度注释不计入 --></div>
+  <div class="b">外层文本较长较长较长较长较长较长较长较长较长较长<div class="c">短</div>
+    <span>行内文本也计入长度</span><script>var ignored = "script内容不计入";</script></div>
+  <div>没有class的div不会成为文本块，但计入外层的子元素文本</div>
+  <section class="s"><div class="d">嵌套在section中的div文本，同样需要被统计进去。</div></section>
+</div>
+</body></html>
+"""
+
+
+class TestParser:
+    """测试解析后端选择"""
+
+    def test_default_prefers_lxml(self, monkeypatch):
+        monkeypatch.delenv('SCRAPER_HTML_PARSER', raising=False)
+        assert get_parser() == AVAILABLE[0]
+
+    def test_env_override_and_fallback(self, monkeypatch):
+        monkeypatch.setenv('SCRAPER_HTML_PARSER', 'html.parser')
+        assert get_parser() == 'html.parser'
+
+        monkeypatch.setenv('SCRAPER_HTML_PARSER', 'not-a-parser')
+        assert get_parser() == AVAILABLE[0]
+        assert make_soup("<title>标题</title>").title.string == "标题"
+
+
+@pytest.mark.parametrize('parser', AVAILABLE)
+class TestTextBlocks:
+    """测试单遍文本块提取"""
+
+    def test_matches_reference(self, parser):
+        soup = make_soup(NESTED, parser)
+        assert text_blocks(soup) == quadratic_text_blocks(soup)
+        assert text_blocks(soup)[0].startswith("第一段")
+
+    def test_matches_reference_on_share_page(self, parser):
+        soup = make_soup(make_share_page(60_000, depth=6, fallback=True), parser)
+        blocks = text_blocks(soup)
+
+        assert blocks and blocks == quadratic_text_blocks(soup)
+
+    def test_subtree(self, parser):
+        soup = make_soup(NESTED, parser)
+        section = soup.find('section')
+        assert text_blocks(section) == ["嵌套在section中的div文本，同样需要被统计进去。"]
+
+
+def test_chatgpt_fallback_extraction():
+    """没有消息标记的页面走通用文本提取"""
+    html = make_share_page(20_000, depth=4, fallback=True)
+    data = ChatGPTScraper().parse_html(html, "https://chatgpt.com/share/abc")
+
+    assert data.title == "模拟对话"
+    assert 0 < data.message_count <= 20
+    assert [m.role for m in data.messages[:2]] == ['user', 'assistant']
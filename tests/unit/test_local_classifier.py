@@ -0,0 +1,181 @@
+"""
+本地分类器单元测试
+
+训练、预测耗时、持久化，以及在AIService中的降级和前置快速通道。
+"""
+import json
+import random
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from ai.ai_service import AIConfig, AIService
+from ai.local_classifier import LocalClassifier
+from ai.ollama_client import OllamaClient
+from database.db_manager import DatabaseManager
+
+
+TOPICS = {
+    '编程': (['Python', '函数', '变量', '调试', '报错', '代码', '列表', '循环'], ['Python', '调试']),
+    '写作': (['文章', '段落', '标题', '润色', '开头', '读者', '修辞', '结尾'], ['写作', '润色']),
+    '数学': (['方程', '积分', '导数', '矩阵', '证明', '概率', '函数图像', '几何'], ['数学', '微积分']),
+    '旅行': (['机票', '酒店', '行程', '签证', '景点', '攻略', '美食', '预算'], ['旅行', '攻略']),
+}
+
+
+def make_corpus(per_category=40, seed=1):
+    rng = random.Random(seed)
+    texts, categories, tags = [], [], []
+    for category, (words, category_tags) in TOPICS.items():
+        for _ in range(per_category):
+            picked = rng.choices(words, k=12)
+            texts.append(f"用户: 请帮我看看{'、'.join(picked[:6])}\n\n助手: 关于{'和'.join(picked[6:])}的建议如下")
+            categories.append(category)
+            tags.append(category_tags)
+    return texts, categories, tags
+
+
+@pytest.fixture(scope="module")
+def model():
+    classifier = LocalClassifier(num_features=1 << 12)
+    classifier.fit(*make_corpus())
+    return classifier
+
+
+class CountingClient(OllamaClient):
+    """记录生成次数的Ollama客户端替身"""
+
+    def __init__(self):
+        super().__init__(base_url="http://127.0.0.1:9", model="stub")
+        self.prompts = []
+
+    def generate(self, prompt, system_prompt=None, stop_at_json=False):
+        self.prompts.append(prompt)
+        return json.dumps({"summary": "模型摘要", "category": "其他", "tags": ["模型"]},
+                          ensure_ascii=False)
+
+
+class TestLocalClassifier:
+    """测试训练与预测"""
+
+    def test_holdout_accuracy(self, model):
+        texts, categories, _ = make_corpus(per_category=10, seed=7)
+        predicted = [model.predict(text).category for text in texts]
+        accuracy = sum(p == c for p, c in zip(predicted, categories)) / len(texts)
+        assert accuracy >= 0.9
+
+    def test_predicts_tags(self, model):
+        prediction = model.predict("用户: 这个Python函数调试时报错了")
+        assert prediction.category == '编程'
+        assert 'Python' in prediction.tags
+        assert 0 < prediction.confidence <= 1
+
+    def test_prediction_under_5ms(self, model):
+        text = "用户: 帮我规划行程，预算有限，需要酒店和机票建议\n\n助手: 好的" * 20
+        model.predict(text)
+        start = time.perf_counter()
+        for _ in range(20):
+            model.predict(text)
+        assert (time.perf_counter() - start) / 20 < 0.005
+
+    def test_requires_two_categories(self):
+        with pytest.raises(ValueError):
+            LocalClassifier().fit(["a", "b"], ["编程", "编程"])
+
+    def test_untrained_predict_raises(self):
+        with pytest.raises(RuntimeError):
+            LocalClassifier().predict("文本")
+
+    def test_save_load_roundtrip(self, model, tmp_path):
+        path = model.save(tmp_path / "model.npz")
+        loaded = LocalClassifier.load(path)
+        text = "用户: 求这个积分和导数"
+        assert loaded.version == model.version
+        assert loaded.predict(text) == model.predict(text)
+
+    def test_train_from_database(self, tmp_path):
+        db = DatabaseManager(str(tmp_path / "test.db"))
+        texts, categories, tags = make_corpus(per_category=5)
+        for i, (text, category, item_tags) in enumerate(zip(texts, categories, tags)):
+            user, assistant = text.split("\n\n")
+            db.add_conversation(
+                source_url=f"https://chatgpt.com/share/{i}", platform="chatgpt", title=f"对话{i}",
+                raw_content={'messages': [{'role': 'user', 'content': user[4:]},
+                                          {'role': 'assistant', 'content': assistant[4:]}]},
+                category=category, tags=item_tags, analysis_confidence=0.9,
+            )
+
+        stats = LocalClassifier.train_from_database(db.conn, str(tmp_path / "model.npz"),
+                                                    num_features=1 << 12)
+        db.close()
+
+        assert stats['samples'] == 20 and stats['categories'] == 4 and stats['tags'] == 8
+        assert LocalClassifier.load(stats['path']).predict("用户: 酒店和签证").category == '旅行'
+
+    def test_training_data_skips_low_confidence_and_duplicates(self, tmp_path):
+        db = DatabaseManager(str(tmp_path / "test.db"))
+        rows = [('trusted', 0.9, None), ('fallback', 0.3, None), ('unanalyzed', None, None),
+                ('boundary', 0.6, None), ('duplicate', 0.9, 1)]
+        for name, confidence, duplicate_of in rows:
+            db.add_conversation(
+                source_url=f"https://chatgpt.com/share/{name}", platform="chatgpt", title=name,
+                raw_content={'messages': [{'role': 'user', 'content': name}]},
+                category="编程", analysis_confidence=confidence, duplicate_of=duplicate_of,
+            )
+
+        texts, categories, _ = LocalClassifier.load_training_data(db.conn)
+        strict, _, _ = LocalClassifier.load_training_data(db.conn, min_confidence=0.8)
+        db.close()
+
+        assert sorted(text.split("\n")[0] for text in texts) == ['boundary', 'trusted']
+        assert [text.split("\n")[0] for text in strict] == ['trusted']
+
+
+class TestServiceIntegration:
+    """测试AIService中的降级与前置快速通道"""
+
+    @pytest.fixture
+    def model_path(self, model, tmp_path):
+        return str(model.save(tmp_path / "model.npz"))
+
+    def test_fallback_uses_local_model(self, model_path):
+        service = AIService(AIConfig(backend='ollama', local_model_path=model_path))
+        result = service._fallback_analysis("用户: 这个矩阵的证明和积分怎么做？")
+
+        assert result.category == '数学'
+        assert 0.3 <= result.confidence <= 0.5
+        assert service.get_status()['local_classifier']['categories'] == sorted(TOPICS)
+
+    def test_prepass_skips_model_for_category_and_tags(self, model_path):
+        service = AIService(AIConfig(backend='ollama', local_model_path=model_path,
+                                     local_prepass_confidence=0.5))
+        service.client = CountingClient()
+        service.is_available = lambda: False  # 本地模型完成时不应探测大模型
+
+        result = service.analyze_conversation("用户: 写文章的开头和结尾怎么润色", tasks=['category', 'tags'])
+
+        assert result.category == '写作' and '写作' in result.tags
+        assert service.client.prompts == []
+
+    def test_prepass_asks_model_only_for_summary(self, model_path):
+        service = AIService(AIConfig(backend='ollama', local_model_path=model_path,
+                                     local_prepass_confidence=0.5))
+        service.client = CountingClient()
+        service.is_available = lambda: True
+
+        result = service.analyze_conversation("用户: 机票和酒店预算怎么安排")
+
+        assert result.summary == "模型摘要"
+        assert result.category == '旅行'
+        assert len(service.client.prompts) == 1
+        assert '"category"' not in service.client.prompts[0]
+
+    def test_low_confidence_goes_to_model(self, model_path):
+        service = AIService(AIConfig(backend='ollama', local_model_path=model_path,
+                                     local_prepass_confidence=1.01))
+        service.client = CountingClient()
+        service.is_available = lambda: True
+
+        assert service.analyze_conversation("用户: 机票和酒店").category == "其他"
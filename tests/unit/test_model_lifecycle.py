@@ -0,0 +1,142 @@
+"""
+Ollama模型生命周期单元测试
+
+keep_alive 解析与透传、预热、load_duration 统计、后台预加载和状态输出。
+"""
+import asyncio
+import time
+
+import pytest
+
+from ai.ai_service import AIConfig, AIService
+from ai.ollama_client import OllamaClient, keep_alive_seconds
+from ai.streaming import StreamStats
+from benchmarks.fake_llm_server import FakeLLMServer
+
+
+@pytest.fixture
+def server():
+    with FakeLLMServer(latency=0.01, tokens_per_second=5000, load_duration=0.4) as fake:
+        yield fake
+
+
+def wait_warmup(client, timeout=5.0):
+    if client._warming is not None:
+        client._warming.join(timeout)
+
+
+class TestKeepAlive:
+    """测试 keep_alive"""
+
+    @pytest.mark.parametrize("value, expected", [
+        (None, 300.0), ("30m", 1800.0), ("1h30m", 5400.0), ("45s", 45.0),
+        (120, 120.0), ("0", 0.0), (-1, None), ("-1", None),
+    ])
+    def test_parse(self, value, expected):
+        assert keep_alive_seconds(value) == expected
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            keep_alive_seconds("ten minutes")
+
+    def test_sent_with_every_request(self):
+        client = OllamaClient(keep_alive="30m")
+        assert client._build_payload("p")["keep_alive"] == "30m"
+        assert "keep_alive" not in OllamaClient()._build_payload("p")
+
+    def test_model_unloaded_after_keep_alive(self, server):
+        client = OllamaClient(base_url=server.url, model="fake-model", keep_alive=0.3)
+        client.generate("你好")
+        assert client.is_model_loaded()
+
+        time.sleep(0.5)
+        assert not client.is_model_loaded()
+        client.generate("你好")
+
+        assert client.load_stats.cold_loads == 2
+
+
+class TestLoadStats:
+    """测试 load_duration 统计"""
+
+    def test_analysis_stopping_early_records_cold_load(self, server):
+        """JSON完整后提前断开读不到 done 块，按首块耗时记录冷启动"""
+        client = OllamaClient(base_url=server.url, model="fake-model")
+        stats = StreamStats()
+        prompt = '输出JSON: {"summary": "...", "category": "编程"}'
+        "".join(client.stream_generate(prompt, stop_at_json=True, stats=stats))
+
+        assert stats.stopped_early
+        assert client.load_stats.cold_loads == 1
+        assert client.load_stats.last_load_seconds == pytest.approx(0.4, abs=0.1)
+
+        client.analyze_conversation("用户: 如何优化SQL？\n\n助手: 使用索引。")
+        assert client.load_stats.cold_loads == 1              # 模型已加载，不再计入
+
+    def test_analysis_async_records_cold_load(self, server):
+        client = OllamaClient(base_url=server.url, model="fake-model")
+        asyncio.run(client.analyze_conversation_async("用户: 如何优化SQL？\n\n助手: 使用索引。"))
+
+        assert client.load_stats.cold_loads == 1
+        assert client.load_stats.last_load_seconds == pytest.approx(0.4, abs=0.1)
+
+
+class TestWarmUp:
+    """测试预热"""
+
+    def test_first_request_after_warm_up_is_fast(self, server):
+        client = OllamaClient(base_url=server.url, model="fake-model", keep_alive="10m")
+
+        assert client.warm_up() == pytest.approx(0.4, abs=0.05)
+        start = time.perf_counter()
+        client.generate("写一段摘要")
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 0.3
+        assert client.load_stats.warmups == 1 and client.load_stats.cold_loads == 1
+        assert client.warm_up() == 0.0            # 估计仍已加载，不再请求
+
+    def test_preload_runs_once_in_background(self, server):
+        client = OllamaClient(base_url=server.url, model="fake-model")
+
+        start = time.perf_counter()
+        assert client.preload()
+        assert time.perf_counter() - start < 0.1   # 不阻塞调用方
+        assert not client.preload()                # 正在预热
+        wait_warmup(client)
+
+        assert server.model_loaded and client.is_model_loaded()
+        assert not client.preload()
+        assert server.stats.requests == 1
+
+    def test_warm_up_async(self, server):
+        client = OllamaClient(base_url=server.url, model="fake-model")
+        assert asyncio.run(client.warm_up_async()) > 0.3
+        assert client.load_stats.warmups == 1
+
+    def test_unavailable_server(self):
+        client = OllamaClient(base_url="http://127.0.0.1:9", model="fake-model")
+        assert client.warm_up() is None
+        assert not client.is_model_loaded()
+
+
+class TestServiceStatus:
+    """测试AIService集成"""
+
+    def test_warm_up_on_start_and_status(self, server):
+        service = AIService(AIConfig(backend='ollama', ollama_host=server.url, ollama_model="fake-model",
+                                     warmup_on_start=True))
+        wait_warmup(service.client)
+
+        lifecycle = service.get_status()['model_lifecycle']
+        assert lifecycle['loaded'] is True
+        assert lifecycle['keep_alive'] == "30m"
+        assert lifecycle['warmups'] == 1 and lifecycle['cold_loads'] == 1
+        assert lifecycle['last_load_seconds'] == pytest.approx(0.4, abs=0.05)
+        assert not service.preload_model()
+
+    def test_status_reports_unloaded_model(self, server):
+        service = AIService(AIConfig(backend='ollama', ollama_host=server.url, ollama_model="fake-model"))
+
+        lifecycle = service.get_status()['model_lifecycle']
+        assert lifecycle['loaded'] is False and lifecycle['warmups'] == 0
@@ -0,0 +1,133 @@
+"""
+多任务分析单元测试
+
+摘要、分类、标签在一次生成中完成；部分请求复用同一结果，不重复生成。
+"""
+import json
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from ai.ai_service import AIConfig, AIService
+from ai.ollama_client import OllamaClient
+from ai.openai_client import OpenAIClient
+
+
+FULL_JSON = json.dumps({
+    "summary": "关于Python的对话", "category": "编程", "tags": ["Python", "学习", "入门"]
+}, ensure_ascii=False)
+
+
+class CountingClient(OllamaClient):
+    """记录生成次数和提示词的Ollama客户端替身"""
+
+    def __init__(self, delay=0.0):
+        super().__init__(base_url="http://127.0.0.1:9", model="stub")
+        self.delay = delay
+        self.prompts = []
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, system_prompt=None, stop_at_json=False):
+        with self._lock:
+            self.prompts.append((prompt, stop_at_json))
+        time.sleep(self.delay)
+        return FULL_JSON
+
+
+class TestMultiTaskPrompt:
+    """测试多任务提示词"""
+
+    def test_normalize_tasks(self):
+        assert OllamaClient.normalize_tasks(None) == ('summary', 'category', 'tags')
+        assert OllamaClient.normalize_tasks(['tags', 'summary', 'tags']) == ('summary', 'tags')
+        assert OllamaClient.normalize_tasks('category') == ('category',)
+        with pytest.raises(ValueError):
+            OllamaClient.normalize_tasks(['keywords'])
+
+    def test_prompt_lists_only_requested_fields(self):
+        prompt = OllamaClient()._build_analysis_prompt("用户: 你好", ['tags'])
+        assert '"tags"' in prompt
+        assert 'summary' not in prompt and 'category' not in prompt
+
+    def test_subset_uses_one_json_generation(self):
+        client = CountingClient()
+        result = client.analyze_conversation("用户: 你好", tasks=['tags'])
+
+        assert result.tags == ["Python", "学习", "入门"]
+        assert result.summary == "" and result.category == ""
+        assert len(client.prompts) == 1
+        assert client.prompts[0][1] is True    # JSON模式 + 对象闭合即停止
+
+    def test_ollama_json_format_payload(self):
+        client = OllamaClient()
+        assert client._build_payload("p", json_mode=True)["format"] == "json"
+        assert "format" not in client._build_payload("p")
+
+    def test_openai_json_mode(self):
+        client = OpenAIClient(api_key="test")
+        message = Mock()
+        message.content = FULL_JSON
+        response = Mock(choices=[Mock(message=message)])
+
+        with patch.object(client.client.chat.completions, 'create', return_value=response) as create:
+            result = client.analyze_conversation("用户: 你好", tasks=['summary', 'category'])
+
+        assert create.call_args.kwargs['response_format'] == {"type": "json_object"}
+        assert result.summary == "关于Python的对话"
+        assert result.tags == []
+
+
+class TestServiceSharing:
+    """测试AIService复用同一次生成"""
+
+    @pytest.fixture
+    def service(self, tmp_path):
+        service = AIService(AIConfig(backend='ollama', cache_path=str(tmp_path / "cache.db")))
+        service.client = CountingClient()
+        service.is_available = lambda: True
+        yield service
+        service.cache.close()
+
+    def test_partial_requests_served_from_full_result(self, service):
+        text = "用户: 如何学习Python？\n\n助手: 从基础语法开始。"
+
+        assert service.analyze_conversation(text).category == "编程"
+        assert service.generate_summary(text) == "关于Python的对话"
+        assert service.generate_tags(text, num_tags=2) == ["Python", "学习"]
+        assert service.analyze_conversation(text, tasks=['tags']).summary == ""
+
+        assert len(service.client.prompts) == 1
+
+    def test_subset_result_cached_separately(self, service):
+        service.analyze_conversation("文本", tasks=['tags'])
+        service.analyze_conversation("文本", tasks=['tags'])
+        assert len(service.client.prompts) == 1
+
+        service.analyze_conversation("文本")   # 子集结果不能冒充完整分析
+        assert len(service.client.prompts) == 2
+
+    def test_concurrent_requests_share_generation(self):
+        service = AIService(AIConfig(backend='ollama'))   # 无缓存，只靠进行中请求合并
+        service.client = CountingClient(delay=0.2)
+        service.is_available = lambda: True
+        results = {}
+
+        def run(name, fn):
+            results[name] = fn()
+
+        threads = [
+            threading.Thread(target=run, args=('analysis', lambda: service.analyze_conversation("文本"))),
+            threading.Thread(target=run, args=('summary', lambda: service.generate_summary("文本"))),
+            threading.Thread(target=run, args=('tags', lambda: service.generate_tags("文本"))),
+        ]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.02)
+        for thread in threads:
+            thread.join()
+
+        assert len(service.client.prompts) == 1
+        assert results['summary'] == results['analysis'].summary
+        assert results['tags'] == results['analysis'].tags
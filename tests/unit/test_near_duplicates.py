@@ -0,0 +1,162 @@
+"""
+近似重复检测单元测试
+
+MinHash/SimHash签名、LSH候选、入库时标记/合并、分析结果沿用和批量查重。
+"""
+import pytest
+
+from database.db_manager import DatabaseManager
+from database.near_duplicates import NearDuplicateIndex, normalize_text
+
+ANSWER = ("联合索引遵循最左前缀原则，查询条件要从索引的第一列开始匹配。"
+          "用EXPLAIN查看执行计划，关注type、key和rows三列。避免在索引列上使用函数或隐式类型转换，"
+          "否则索引会失效。范围查询之后的列无法继续使用索引，可以调整列的顺序。")
+
+
+def conversation(answer=ANSWER, question="如何优化SQL查询？"):
+    return {'messages': [{'role': 'user', 'content': question},
+                         {'role': 'assistant', 'content': answer}]}
+
+
+def reshared():
+    """同一段对话的另一份分享：Markdown和空白不同，末尾多一句"""
+    return conversation("**" + ANSWER.replace("。", "。\n\n") + "**  希望对你有帮助。", "如何优化 SQL 查询?")
+
+
+OTHER = conversation("提前预订机票和酒店更便宜，行程不要安排得太满，准备好签证和保险材料。"
+                     "出发前确认护照有效期，下载离线地图，备好常用药品和转换插头。", "旅行前要准备什么？")
+
+
+# 共享的 db fixture 默认不查重，这里按策略间接参数化
+FLAG = pytest.mark.parametrize('db', ['flag'], indirect=True)
+MERGE = pytest.mark.parametrize('db', ['merge'], indirect=True)
+
+
+class TestSignature:
+    """测试签名"""
+
+    def test_normalize_ignores_formatting(self):
+        assert normalize_text(conversation()) == normalize_text(
+            conversation("  " + ANSWER.replace("，", ", "), "如何优化SQL查询?"))
+
+    def test_similarity(self):
+        index = NearDuplicateIndex(conn=None)
+        a, b, c = (index.signature(x) for x in (conversation(), reshared(), OTHER))
+
+        assert index.similarity(a.minhash, b.minhash) >= 0.8
+        assert index.similarity(a.minhash, c.minhash) < 0.2
+        assert index.hamming(a.simhash, b.simhash) < index.hamming(a.simhash, c.simhash)
+
+    def test_estimate_tracks_jaccard(self):
+        index = NearDuplicateIndex(conn=None)
+        base = "".join(chr(0x4e00 + (i * 7919) % 3000) for i in range(2000))
+        for cut in (200, 800):
+            changed = base[cut:] + "".join(chr(0x4e00 + (i * 104729) % 3000) for i in range(cut))
+            shingles = [{text[i:i + 5] for i in range(len(text) - 4)} for text in (base, changed)]
+            jaccard = len(shingles[0] & shingles[1]) / len(shingles[0] | shingles[1])
+
+            a, b = (index.signature({'messages': [{'content': text}]}) for text in (base, changed))
+            assert index.similarity(a.minhash, b.minhash) == pytest.approx(jaccard, abs=0.12)
+
+    def test_short_content_skipped(self):
+        assert NearDuplicateIndex(conn=None).signature(conversation("好的", "你好")) is None
+
+    def test_invalid_bands(self):
+        with pytest.raises(ValueError):
+            NearDuplicateIndex(conn=None, num_perm=100, bands=16)
+
+
+class TestIngest:
+    """测试入库时查重"""
+
+    @FLAG
+    def test_flag_duplicate(self, db):
+        original = db.add_conversation("https://chatgpt.com/share/a", 'chatgpt', "SQL优化", conversation())
+        other = db.add_conversation("https://chatgpt.com/share/b", 'chatgpt', "旅行", OTHER)
+
+        match = db.find_near_duplicate(reshared())
+        assert match['id'] == original and match['similarity'] >= 0.8
+        assert db.find_near_duplicate(conversation("完全不同的内容" * 20)) is None
+
+        duplicate = db.add_conversation("https://chat.openai.com/share/a-reshared", 'chatgpt', "SQL优化", reshared())
+        assert duplicate not in (original, other)
+        assert db.get_conversation(duplicate)['duplicate_of'] == original
+        assert db.get_conversation(other)['duplicate_of'] is None
+
+    @FLAG
+    def test_duplicate_shares_analysis(self, db):
+        original = db.add_conversation("https://chatgpt.com/share/a", 'chatgpt', "SQL优化", conversation())
+        duplicate = db.add_conversation("https://chat.openai.com/share/a-reshared", 'chatgpt', "SQL优化", reshared())
+
+        # 重复对话不进入待分析队列，原对话的结果一并写入
+        assert [row['id'] for row in db.get_pending_analysis(0.6)] == [original]
+        updated = db.save_analysis_results([(original, {'summary': "索引优化", 'category': "编程",
+                                                        'tags': ["数据库"], 'confidence': 0.9})])
+        assert updated == 2
+        assert db.get_conversation(duplicate)['summary'] == "索引优化"
+        assert db.get_conversation_tags(duplicate) == ["数据库"]
+
+        # 原对话已分析后入库的重复对话直接复制结果
+        third = db.add_conversation("https://chatgpt.com/share/c", 'chatgpt', "SQL优化", reshared())
+        assert db.get_conversation(third)['analysis_confidence'] == 0.9
+        assert db.get_conversation(third)['duplicate_of'] == original
+
+    @MERGE
+    def test_merge_policy(self, db):
+        original = db.add_conversation("https://chatgpt.com/share/a", 'chatgpt', "SQL优化", conversation())
+
+        assert db.add_conversation("https://chat.openai.com/share/a-reshared", 'chatgpt', "SQL", reshared()) == original
+        assert db.get_statistics()['total_conversations'] == 1
+        # 别名链接再次添加时直接返回原对话
+        assert db.add_conversation("https://chat.openai.com/share/a-reshared", 'chatgpt', "SQL", OTHER) == original
+
+    def test_off_by_default(self, db, tmp_path):
+        db.add_conversation("https://chatgpt.com/share/a", 'chatgpt', "SQL优化", conversation())
+        duplicate = db.add_conversation("https://chat.openai.com/share/a-reshared", 'chatgpt', "SQL", reshared())
+        assert db.get_conversation(duplicate)['duplicate_of'] is None
+
+        with pytest.raises(ValueError):
+            DatabaseManager(str(tmp_path / "bad.db"), dedupe='delete')
+
+    @FLAG
+    def test_deleting_original_clears_flag(self, db):
+        original = db.add_conversation("https://chatgpt.com/share/a", 'chatgpt', "SQL优化", conversation())
+        duplicate = db.add_conversation("https://chat.openai.com/share/a-reshared", 'chatgpt', "SQL", reshared())
+
+        db.delete_conversation(original)
+        assert db.get_conversation(duplicate)['duplicate_of'] is None
+        assert not db.conn.execute("SELECT 1 FROM lsh_bands WHERE conversation_id = ?", (original,)).fetchone()
+
+
+class TestBatch:
+    """测试批量查重"""
+
+    @pytest.fixture
+    def library(self, db):
+        """入库时未查重的对话库，返回对话ID"""
+        ids = [db.add_conversation("https://chatgpt.com/share/a", 'chatgpt', "SQL优化", conversation()),
+               db.add_conversation("https://chatgpt.com/share/b", 'chatgpt', "旅行", OTHER),
+               db.add_conversation("https://chat.openai.com/share/a-reshared", 'chatgpt', "SQL", reshared()),
+               db.add_conversation("https://chatgpt.com/share/a2", 'chatgpt', "SQL", conversation())]
+        db.update_conversation(ids[2], is_favorite=True, notes="重新分享的版本")
+        return ids
+
+    def test_flag(self, db, library):
+        ids = library
+
+        result = db.dedupe_library()
+
+        assert result['indexed'] == 4
+        assert [(d['id'], d['original_id']) for d in result['duplicates']] == [(ids[2], ids[0]), (ids[3], ids[0])]
+        assert db.get_conversation(ids[3])['duplicate_of'] == ids[0]
+        assert db.dedupe_library()['indexed'] == 0     # 签名已缓存
+
+    def test_merge(self, db, library):
+        ids = library
+
+        db.dedupe_library(merge=True)
+
+        assert db.get_statistics()['total_conversations'] == 2
+        original = db.get_conversation(ids[0])
+        assert original['is_favorite'] and original['notes'] == "重新分享的版本"
+        assert db.add_conversation("https://chat.openai.com/share/a-reshared", 'chatgpt', "SQL", reshared()) == ids[0]
@@ -0,0 +1,177 @@
+"""
+Ollama流式生成单元测试
+
+使用本地HTTP桩服务逐行输出NDJSON。
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ai.ai_service import AIConfig, AIService
+from ai.ollama_client import OllamaClient
+from ai.streaming import GenerationCancelled, JsonCompletionDetector, streaming
+
+
+ANSWER = '```json\n{"summary": "讨论{括号}和\\"引号\\"", "category": "编程", "tags": ["Python"]}\n```'
+
+
+class StreamingStub:
+    """按token逐行输出的Ollama桩服务；JSON之后继续慢速输出尾巴"""
+
+    def __init__(self, tokens, tail_tokens=20, tail_delay=0.1):
+        self.tokens = tokens
+        self.tail_tokens = tail_tokens
+        self.tail_delay = tail_delay
+        self.payloads = []
+        self.sent = 0
+        self.disconnected = threading.Event()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _line(self, data):
+                body = (json.dumps(data, ensure_ascii=False) + "\n").encode('utf-8')
+                self.wfile.write(f"{len(body):x}\r\n".encode() + body + b"\r\n")
+                self.wfile.flush()
+                stub.sent += 1
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                stub.payloads.append(json.loads(self.rfile.read(length)))
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    for token in stub.tokens:
+                        self._line({"response": token, "done": False})
+                        time.sleep(0.005)
+                    for _ in range(stub.tail_tokens):
+                        time.sleep(stub.tail_delay)
+                        self._line({"response": " 多余的解释", "done": False})
+                    self._line({"response": "", "done": True,
+                                "eval_count": len(stub.tokens), "eval_duration": 10**9})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    stub.disconnected.set()
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _tokens(text, size=4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.fixture
+def stub():
+    server = StreamingStub(_tokens(ANSWER))
+    yield server
+    server.close()
+
+
+class TestJsonCompletionDetector:
+    """测试JSON完整性检测"""
+
+    def test_detects_end_across_chunks(self):
+        detector = JsonCompletionDetector()
+        chunks = _tokens(ANSWER, 3)
+        text = ""
+        for chunk in chunks:
+            end = detector.feed(chunk)
+            if end >= 0:
+                text += chunk[:end]
+                break
+            text += chunk
+        assert json.loads(text[text.index('{'):])["tags"] == ["Python"]
+
+    def test_braces_inside_strings_ignored(self):
+        detector = JsonCompletionDetector()
+        assert detector.feed('{"a": "}}}"') == -1
+        assert detector.feed(', "b": "\\"}"}') == 13
+
+
+class TestStreamingGenerate:
+    """测试流式生成"""
+
+    def test_stop_at_json_closes_stream_early(self, stub):
+        client = OllamaClient(base_url=stub.url, model="stub", timeout=10)
+        start = time.perf_counter()
+        result = client.analyze_conversation("用户: 你好")
+        elapsed = time.perf_counter() - start
+
+        assert result.tags == ["Python"]
+        assert elapsed < 1.0                     # 不等待2秒的尾巴
+        assert stub.payloads[0]["stream"] is True
+        assert stub.disconnected.wait(2)         # 连接已断开，服务端停止生成
+
+    def test_on_token_and_throughput(self):
+        server = StreamingStub(_tokens("这是一段普通的流式输出文本"), tail_tokens=0)
+        client = OllamaClient(base_url=server.url, model="stub", timeout=10)
+        received = []
+
+        with streaming(on_token=lambda token, stats: received.append((token, stats.tokens))):
+            text = client.generate("prompt")
+        server.close()
+
+        assert text == "这是一段普通的流式输出文本"
+        assert [t for t, _ in received] == _tokens(text)
+        assert received[-1][1] == len(received)
+
+    def test_stream_generate_reports_model_stats(self):
+        server = StreamingStub(_tokens("abcdefgh"), tail_tokens=0)
+        client = OllamaClient(base_url=server.url, model="stub", timeout=10)
+        from ai.streaming import StreamStats
+        stats = StreamStats()
+
+        assert "".join(client.stream_generate("p", stats=stats)) == "abcdefgh"
+        server.close()
+        assert stats.eval_duration == 1.0
+        assert stats.tokens_per_second == pytest.approx(2.0)
+
+    def test_cancel_stops_generation(self, stub):
+        client = OllamaClient(base_url=stub.url, model="stub", timeout=10)
+        cancel = threading.Event()
+
+        def on_token(token, stats):
+            if stats.tokens == 3:
+                cancel.set()
+
+        with pytest.raises(GenerationCancelled):
+            with streaming(on_token=on_token, cancel_event=cancel):
+                client.generate("prompt")
+        assert stub.disconnected.wait(2)
+
+
+class TestServiceStreaming:
+    """测试AIService透传回调与取消"""
+
+    def test_cancelled_analysis_returns_none_without_fallback(self, stub):
+        service = AIService(AIConfig(ollama_host=stub.url, ollama_model="stub"))
+        service.is_available = lambda: True
+        cancel = threading.Event()
+        cancel.set()
+
+        assert service.analyze_conversation("用户: 你好", cancel_event=cancel) is None
+
+    def test_live_tokens(self, stub):
+        service = AIService(AIConfig(ollama_host=stub.url, ollama_model="stub"))
+        service.is_available = lambda: True
+        tokens = []
+
+        result = service.analyze_conversation("用户: 你好", on_token=lambda t, s: tokens.append(t))
+
+        assert result.category == "编程"
+        assert "".join(tokens).strip().endswith("}")
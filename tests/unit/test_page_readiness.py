@@ -0,0 +1,127 @@
+"""
+页面就绪检测与资源拦截单元测试
+"""
+import asyncio
+
+import pytest
+
+from scrapers.page_readiness import (block_resources, block_resources_async, should_block,
+                                     wait_until_ready, wait_until_ready_async)
+
+
+class FakeRequest:
+    def __init__(self, resource_type, url):
+        self.resource_type = resource_type
+        self.url = url
+
+
+class FakeRoute:
+    def __init__(self, resource_type, url):
+        self.request = FakeRequest(resource_type, url)
+        self.action = None
+
+    def abort(self):
+        self.action = 'abort'
+
+    def continue_(self):
+        self.action = 'continue'
+
+
+class AsyncFakeRoute(FakeRoute):
+    async def abort(self):
+        self.action = 'abort'
+
+    async def continue_(self):
+        self.action = 'continue'
+
+
+class FakeContext:
+    def route(self, pattern, handler):
+        self.pattern, self.handler = pattern, handler
+
+
+class BrokenPage:
+    """脚本上下文失效的页面"""
+
+    def __init__(self):
+        self.waited = None
+
+    def evaluate(self, script, arg=None):
+        raise RuntimeError("Execution context was destroyed")
+
+    def wait_for_selector(self, selector, timeout=None):
+        self.waited = (selector, timeout)
+
+
+class TestBlocking:
+    """测试资源拦截"""
+
+    @pytest.mark.parametrize("resource_type,url,blocked", [
+        ('image', "https://cdn.oaistatic.com/logo.png", True),
+        ('font', "https://claude.ai/fonts/a.woff2", True),
+        ('media', "https://chatgpt.com/v.mp4", True),
+        ('script', "https://www.googletagmanager.com/gtm.js", True),
+        ('xhr', "https://api.segment.io/v1/t", True),
+        ('script', "https://cdn.oaistatic.com/app.js", False),
+        ('document', "https://chatgpt.com/share/abc", False),
+        ('fetch', "https://notsegment.io/api", False),
+    ])
+    def test_should_block(self, resource_type, url, blocked):
+        assert should_block(resource_type, url) is blocked
+
+    def test_route_handlers(self):
+        context = FakeContext()
+        block_resources(context)
+        image, script = FakeRoute('image', "https://a.com/x.png"), FakeRoute('script', "https://a.com/x.js")
+        context.handler(image)
+        context.handler(script)
+        assert context.pattern == '**/*'
+        assert (image.action, script.action) == ('abort', 'continue')
+
+    def test_async_route_handlers(self):
+        class AsyncContext:
+            async def route(self, pattern, handler):
+                self.handler = handler
+
+        async def main():
+            context = AsyncContext()
+            await block_resources_async(context)
+            route = AsyncFakeRoute('font', "https://a.com/x.woff")
+            await context.handler(route)
+            return route.action
+
+        assert asyncio.run(main()) == 'abort'
+
+
+class TestReadiness:
+    """测试就绪检测"""
+
+    def test_passes_arguments(self):
+        class Page:
+            def evaluate(self, script, arg):
+                assert 'MutationObserver' in script
+                self.arg = arg
+                return {'count': 4, 'stable': True, 'elapsed': 120}
+
+        page = Page()
+        result = wait_until_ready(page, 'article', quiet_ms=300, timeout_ms=5000, scroll=True)
+        assert result['count'] == 4
+        assert page.arg == {'selector': 'article', 'quietMs': 300, 'timeoutMs': 5000, 'scroll': True}
+
+    def test_falls_back_to_selector(self):
+        page = BrokenPage()
+        result = wait_until_ready(page, 'article', timeout_ms=5000)
+        assert page.waited == ('article', 5000)
+        assert result['stable'] is False
+
+    def test_async_falls_back_to_selector(self):
+        class AsyncBrokenPage:
+            async def evaluate(self, script, arg=None):
+                raise RuntimeError("Execution context was destroyed")
+
+            async def wait_for_selector(self, selector, timeout=None):
+                self.waited = selector
+
+        page = AsyncBrokenPage()
+        assert asyncio.run(wait_until_ready_async(page, 'article'))['count'] is None
+        assert page.waited == 'article'
@@ -0,0 +1,95 @@
+"""
+平台注册表单元测试
+
+按域名识别分享链接、规范链接、爬虫按需导入与创建、剪贴板监控共用注册表。
+"""
+import subprocess
+import sys
+
+import pytest
+
+from scrapers.platforms import PLATFORMS, get_platform, match_url, platform_for_url, supported_platforms
+from scrapers.scraper_factory import ScraperFactory
+
+
+class TestMatchUrl:
+    """测试链接识别"""
+
+    @pytest.mark.parametrize('url, platform, share_id', [
+        ("https://chatgpt.com/share/abc-123", 'chatgpt', 'abc-123'),
+        ("http://chat.openai.com/share/abc_1?utm_source=x#top", 'chatgpt', 'abc_1'),
+        ("https://www.ChatGPT.com/share/abc", 'chatgpt', 'abc'),
+        ("https://claude.ai/share/x1/", 'claude', 'x1'),
+        ("https://chat.deepseek.com/share/d9", 'deepseek', 'd9'),
+        ("https://poe.com/s/Abc", 'poe', 'Abc'),
+        ("https://tongyi.aliyun.com/qianwen/share/q1", 'tongyi', 'q1'),
+    ])
+    def test_share_links(self, url, platform, share_id):
+        matched, matched_id = match_url(url)
+        assert (matched.name, matched_id) == (platform, share_id)
+
+    @pytest.mark.parametrize('url', [
+        "https://chatgpt.com/c/abc",
+        "https://claude.com/share/abc",
+        "https://evil.com/chatgpt.com/share/abc",
+        "ftp://chatgpt.com/share/abc",
+        "chatgpt.com/share/abc",
+        "",
+    ])
+    def test_rejects(self, url):
+        assert match_url(url) is None
+        assert platform_for_url(url) is None
+
+    def test_registry(self):
+        assert [p.name for p in supported_platforms()] == ['chatgpt', 'claude', 'deepseek']
+        assert get_platform('OpenAI').name == 'chatgpt'
+        assert get_platform('unknown') is None
+        hosts = [host for platform in PLATFORMS for host in platform.hosts]
+        assert len(hosts) == len(set(hosts))
+
+
+class TestLazyLoading:
+    """测试爬虫按需导入"""
+
+    def test_import_does_not_load_parsers(self):
+        code = ("import sys, scrapers\n"
+                "from scrapers.url_canonical import canonicalize_url\n"
+                "from scrapers.scraper_factory import ScraperFactory\n"
+                "assert ScraperFactory().get_supported_platforms() == ['chatgpt', 'claude', 'deepseek']\n"
+                "assert canonicalize_url('http://chat.openai.com/share/a/') == 'https://chatgpt.com/share/a'\n"
+                "loaded = [m for m in sys.modules if m.split('.')[0] in ('bs4', 'lxml', 'playwright')]\n"
+                "assert not loaded, loaded\n"
+                "assert 'scrapers.chatgpt_scraper' not in sys.modules\n"
+                "assert scrapers.ChatGPTScraper.__name__ == 'ChatGPTScraper'\n")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True)
+        assert result.returncode == 0, result.stderr
+
+    def test_factory_creates_on_demand(self):
+        factory = ScraperFactory()
+        assert factory._scrapers == {}
+
+        scraper = factory.get_scraper("https://chat.openai.com/share/abc")
+        assert scraper.platform_name == 'chatgpt' and scraper.use_playwright
+        assert factory.get_scraper("https://chatgpt.com/share/other") is scraper
+        assert list(factory._scrapers) == ['chatgpt']
+
+        assert factory.get_scraper("https://poe.com/s/abc") is None      # 只识别，不支持抓取
+        assert ScraperFactory.create_scraper('Anthropic').platform_name == 'claude'
+        assert ScraperFactory.create_scraper('kimi') is None
+
+    def test_unsupported_message(self):
+        with pytest.raises(ValueError, match="ChatGPT, Claude, DeepSeek"):
+            ScraperFactory().scrape("https://poe.com/s/abc")
+
+
+class TestClipboardMonitor:
+    """测试剪贴板监控使用注册表"""
+
+    def test_detects_registered_platforms(self):
+        pytest.importorskip('PyQt6')
+        from gui.clipboard_monitor import ClipboardMonitor
+
+        monitor = ClipboardMonitor(storage=None)
+        assert monitor.is_ai_conversation_url("https://chat.deepseek.com/share/d9")
+        assert monitor.is_ai_conversation_url("https://gemini.google.com/share/g1")
+        assert not monitor.is_ai_conversation_url("https://chatgpt.com/c/abc")
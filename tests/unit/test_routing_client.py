@@ -0,0 +1,223 @@
+"""
+混合路由客户端单元测试
+
+使用本地HTTP桩服务模拟Ollama和OpenAI兼容接口。
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ai.ollama_client import OllamaClient
+from ai.openai_client import OpenAIClient
+from ai.routing_client import Backend, CircuitBreaker, RoutingAIClient
+
+
+ANALYSIS_JSON = json.dumps({
+    "summary": "关于Python的对话",
+    "category": "编程",
+    "tags": ["Python"]
+}, ensure_ascii=False)
+
+
+class StubServer:
+    """同时兼容Ollama(/api/*)和OpenAI(/v1/*)的HTTP桩服务"""
+
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name = name
+        self.delay = delay
+        self.fail = fail
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path.startswith('/api/tags'):
+                    self._reply(200, {"models": [{"name": "stub"}]})
+                else:
+                    self._reply(200, {"object": "list", "data": []})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                self.rfile.read(length)
+                stub.requests += 1
+                time.sleep(stub.delay)
+                if stub.fail:
+                    self._reply(500, {"error": "stub failure"})
+                    return
+                text = f"{ANALYSIS_JSON[:-1]}, \"backend\": \"{stub.name}\"}}"
+                if self.path.startswith('/api/generate'):
+                    self._reply(200, {"response": text, "done": True})
+                else:
+                    self._reply(200, {
+                        "id": "stub", "object": "chat.completion", "created": 0,
+                        "model": "stub",
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": text}}],
+                    })
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def servers():
+    created = []
+
+    def make(name, **kwargs):
+        server = StubServer(name, **kwargs)
+        created.append(server)
+        return server
+
+    yield make
+    for server in created:
+        server.close()
+
+
+def _ollama(server):
+    return OllamaClient(base_url=server.url, model="stub", timeout=10)
+
+
+def _openai(server):
+    return OpenAIClient(api_key="test-key", model="stub", base_url=f"{server.url}/v1")
+
+
+def _backend_of(result):
+    return json.loads(result)["backend"]
+
+
+class TestCircuitBreaker:
+    """测试熔断器"""
+
+    def test_opens_after_threshold_and_half_opens(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure()
+        assert breaker.allow_request()
+        breaker.record_failure()
+        assert breaker.is_open()
+        assert not breaker.allow_request()
+
+        time.sleep(0.06)
+        assert breaker.allow_request()          # 半开试探
+        assert not breaker.allow_request()      # 只放行一个
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestRouting:
+    """测试路由、对冲与降级"""
+
+    def test_routes_to_fastest_backend(self, servers):
+        slow = servers("slow", delay=0.3)
+        fast = servers("fast", delay=0.01)
+        router = RoutingAIClient.from_clients(
+            {"slow": _ollama(slow), "fast": _openai(fast)}, hedge=False
+        )
+
+        # 预热：两个后端各积累一次延迟样本（没有样本的后端按悲观先验计分，不会被自动探测）
+        for backend in router.backends:
+            router._invoke(backend, 'generate', ("p",), {})
+        results = [_backend_of(router.generate("p")) for _ in range(5)]
+
+        assert results == ["fast"] * 5
+        router.close()
+
+    def test_hedge_when_primary_slow(self, servers):
+        slow = servers("slow", delay=1.5)
+        fast = servers("fast", delay=0.01)
+        router = RoutingAIClient.from_clients(
+            {"slow": _ollama(slow), "fast": _ollama(fast)},
+            min_hedge_delay=0.1, default_hedge_delay=0.1
+        )
+
+        start = time.perf_counter()
+        result = router.generate("p")
+        elapsed = time.perf_counter() - start
+
+        assert _backend_of(result) == "fast"
+        assert elapsed < 1.0
+        assert router.hedges_sent == 1
+        assert router.backends[1].stats.hedged_wins == 1
+        router.close()
+
+    def test_failover_and_circuit_breaker(self, servers):
+        broken = servers("broken", fail=True)
+        healthy = servers("healthy")
+        router = RoutingAIClient(
+            [Backend("broken", _ollama(broken), failure_threshold=2, reset_timeout=60),
+             Backend("healthy", _ollama(healthy))],
+            hedge=False
+        )
+
+        for _ in range(2):
+            assert _backend_of(router.generate("p")) == "healthy"
+        assert broken.requests == 1                 # 只失败过的后端排到最后，不再优先请求
+
+        healthy.fail = True
+        with pytest.raises(RuntimeError):
+            router.generate("p")
+        assert router.backends[0].breaker.is_open()
+
+        healthy.fail = False
+        requests_before = broken.requests
+        router.generate("p")
+        assert broken.requests == requests_before   # 熔断后不再请求
+        router.close()
+
+    def test_pessimistic_prior_for_unproven_backends(self):
+        backends = [Backend(name, client=None) for name in ("fresh", "fast", "slow", "broken")]
+        router = RoutingAIClient(backends, hedge=False)
+        fresh, fast, slow, broken = backends
+
+        # 都没有样本：按配置顺序；只失败过的后端排在最后
+        broken.stats.record(0.01, False)
+        assert [b.name for b in router._ranked_backends()] == ["fresh", "fast", "slow", "broken"]
+
+        fast.stats.record(0.2, True)
+        slow.stats.record(1.0, True)
+        # 未请求过的后端与最慢的已知后端持平，不会因为没有数据排到最前
+        assert [b.name for b in router._ranked_backends()] == ["fast", "fresh", "slow", "broken"]
+        assert broken.score(1.0) > fresh.score(1.0) == slow.score(1.0)
+        router.close()
+
+    def test_all_backends_fail(self, servers):
+        broken = servers("broken", fail=True)
+        router = RoutingAIClient.from_clients({"broken": _ollama(broken)}, hedge=False)
+
+        with pytest.raises(RuntimeError):
+            router.generate("p")
+        router.close()
+
+    def test_analyze_conversation_and_stats(self, servers):
+        server = servers("one")
+        router = RoutingAIClient.from_clients({"one": _openai(server)})
+
+        result = router.analyze_conversation("用户: 你好")
+        summary = router.generate_summary_only("用户: 你好")   # OpenAI客户端无快速模式
+
+        assert result.category == "编程"
+        assert summary == "关于Python的对话"
+        stats = router.get_stats()[0]
+        assert stats['requests'] == 2
+        assert stats['p50_ms'] is not None
+        assert router.is_available()
+        router.close()
@@ -0,0 +1,94 @@
+"""
+爬虫离线语料单元测试
+
+生成的语料两层都能解析出期望结果、语料读写、回放服务、HTTP层通过本地回放完整抓取、基准测试。
+"""
+import pytest
+
+from benchmarks.replay_server import ReplayServer
+from benchmarks.scraper_benchmark import compare, run_benchmark
+from benchmarks.scraper_corpus import PLATFORMS, build_corpus, check, load_corpus, save_corpus
+from scrapers.chatgpt_scraper import ChatGPTScraper
+from scrapers.claude_scraper import ClaudeScraper
+from scrapers.deepseek_scraper import DeepSeekScraper
+from scrapers.fetch_tiers import HTTP, fetch_html, get_tier_stats
+
+SCRAPERS = {'chatgpt': ChatGPTScraper, 'claude': ClaudeScraper, 'deepseek': DeepSeekScraper}
+
+
+@pytest.fixture(scope='module')
+def pages():
+    return build_corpus(sizes=['short', 'long'])
+
+
+class TestCorpus:
+    """测试语料生成与读写"""
+
+    def test_deterministic(self, pages):
+        again = build_corpus(sizes=['short', 'long'])
+        assert [p.html for p in again] == [p.html for p in pages]
+        assert build_corpus(['chatgpt'], ['short'], seed=7)[0].digest != pages[0].digest
+
+    @pytest.mark.parametrize('platform', PLATFORMS)
+    def test_both_tiers_parse(self, pages, platform):
+        scraper = SCRAPERS[platform](use_playwright=False)
+        for page in [p for p in pages if p.platform == platform]:
+            assert check(page, scraper.parse_html(page.html, page.share_url)) == []
+            assert check(page, scraper.parse_embedded(page.html, page.share_url)) == []
+
+    def test_check_reports_mismatch(self, pages):
+        page = pages[0]
+        data = ChatGPTScraper(use_playwright=False).parse_html(page.html, page.share_url)
+        data.messages[-1].content += "多出的内容"
+        assert check(page, data) == ["消息内容不一致"]
+        data.messages.pop()
+        assert "期望" in check(page, data)[0]
+        assert check(page, None) == ["未解析出对话"]
+
+    def test_save_and_load(self, pages, tmp_path):
+        save_corpus(pages[:2], tmp_path)
+        save_corpus(pages[1:3], tmp_path)         # 合并清单，同名覆盖
+
+        loaded = load_corpus(tmp_path)
+        assert [p.name for p in loaded] == [p.name for p in pages[:3]]
+        assert loaded[2].html == pages[2].html and loaded[2].roles == pages[2].roles
+        assert [p.platform for p in load_corpus(tmp_path, ['claude'])] == ['claude']
+
+
+class TestReplay:
+    """测试回放服务"""
+
+    def test_serves_pages(self, pages):
+        with ReplayServer(pages) as server:
+            assert fetch_html(server.url_for(pages[3])) == pages[3].html
+            with pytest.raises(Exception):
+                fetch_html(server.url + "/chatgpt/share/missing")
+            assert server.requests == 2
+
+    def test_http_tier_end_to_end(self, pages):
+        page = next(p for p in pages if p.platform == 'claude' and p.name.endswith('long'))
+        stats = get_tier_stats()
+        stats.reset()
+        try:
+            with ReplayServer([page]) as server:
+                data, html = ClaudeScraper(use_playwright=True)._fetch_embedded(server.url_for(page))
+            assert html == page.html
+            assert check(page, data) == []
+            assert stats.snapshot()['claude'][HTTP]['successes'] == 1
+        finally:
+            stats.reset()
+
+
+class TestBenchmark:
+    """测试基准测试"""
+
+    def test_run(self):
+        pages = build_corpus(['chatgpt', 'deepseek'], ['short'])
+        rows = run_benchmark(pages, tiers=['parse', 'embedded', 'http'], repeat=2)
+
+        assert [(r['page'], r['tier']) for r in rows][:2] == [('chatgpt-short', 'parse'), ('deepseek-short', 'parse')]
+        assert len(rows) == 6 and all(r['ok'] and r['messages'] == 12 for r in rows)
+        assert all(r['p95_ms'] >= r['p50_ms'] > 0 and r['peak_mb'] >= 0 for r in rows)
+
+        baseline = [{**r, 'p50_ms': r['p50_ms'] * 2} for r in rows]
+        assert compare(rows, baseline)[('chatgpt-short', 'parse')] == pytest.approx(-50)
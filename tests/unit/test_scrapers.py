@@ -95,6 +95,20 @@ class TestConversationData:
         assert data['metadata']['key'] == 'value'
 
 
+class TestBaseScraper:
+    """测试爬虫基类接口"""
+    
+    def test_parse_methods_are_abstract(self):
+        """测试未实现解析方法的子类不能实例化"""
+        class IncompleteScraper(BaseScraper):
+            def scrape(self, url):
+                return None
+        
+        with pytest.raises(TypeError, match="parse_html"):
+            IncompleteScraper()
+        assert {'scrape', 'parse_html', 'parse_static_html'} <= BaseScraper.__abstractmethods__
+
+
 class TestChatGPTScraper:
     """测试ChatGPT爬虫"""
     
@@ -0,0 +1,85 @@
+"""
+分段分析（map-reduce）单元测试
+"""
+import json
+import threading
+import time
+
+from ai.ollama_client import OllamaClient
+from ai.segmented_analysis import estimate_tokens
+
+
+FINAL_JSON = json.dumps({
+    "summary": "完整摘要", "category": "编程", "tags": ["Docker"], "confidence": 0.9
+}, ensure_ascii=False)
+
+
+class SlowClient(OllamaClient):
+    """分段摘要固定耗时，最终分析立即返回"""
+
+    def __init__(self, delay=0.2):
+        super().__init__(base_url="http://127.0.0.1:9", model="stub")
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate(self, prompt, system_prompt=None, stop_at_json=False):
+        if prompt.startswith("基于以下按顺序排列的分段摘要"):
+            return FINAL_JSON
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return "分段摘要"
+
+
+class TestTokenBudget:
+    """测试token预算换算"""
+
+    def test_estimate_tokens(self):
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("a" * 400) == 100
+        assert estimate_tokens("中文" * 50) == 100
+
+    def test_cjk_segments_are_shorter(self):
+        client = OllamaClient()
+        assert client._segment_length_for("中" * 20000) < client._segment_length_for("a" * 20000)
+
+
+class TestConcurrentSegments:
+    """测试并发分段摘要"""
+
+    def test_wall_time_close_to_slowest_segment(self):
+        client = SlowClient(delay=0.2)
+        text = "User: Question about docker\n\nAssistant: Answer\n\n" * 2000   # 约10万字符
+
+        start = time.perf_counter()
+        result = client.analyze_conversation(text)
+        elapsed = time.perf_counter() - start
+
+        segments = len(result.segment_timings)
+        assert segments >= 5
+        assert client.peak == min(segments, client.segment_concurrency)
+        assert elapsed < 0.2 * segments / 2
+        assert result.summary == "完整摘要"
+        assert [t['index'] for t in result.segment_timings] == list(range(1, segments + 1))
+        assert all(t['seconds'] >= 0.2 for t in result.segment_timings)
+
+    def test_concurrency_is_bounded(self):
+        client = SlowClient(delay=0.05)
+        client.segment_concurrency = 2
+        client.analyze_conversation("User: q\n\nAssistant: a\n\n" * 3000)
+
+        assert client.peak == 2
+
+    def test_segments_cover_whole_text(self):
+        client = OllamaClient()
+        text = "用户: 问题\n\n助手: 回答\n\n" * 3000
+        segments = client._split_into_segments(text, client._segment_length_for(text))
+
+        assert len(segments) > 1
+        assert all(len(s) <= client._segment_length_for(text) for s in segments)
+        assert sum(len(s) for s in segments) >= len(text.strip()) * 0.99
@@ -0,0 +1,159 @@
+"""
+流式迁移引擎单元测试
+"""
+import pytest
+from unittest.mock import patch
+from database.db_manager import DatabaseManager
+from database.streaming_migrator import StreamingMigrator, build_conversation_actions
+
+
+class FakeES:
+    """按(_index, _id)存储文档的ES替身"""
+
+    conversation_index = "test_conversations"
+    message_index = "test_messages"
+    tag_index = "test_tags"
+
+    def __init__(self, fail_on_call=None):
+        self.es = self
+        self.docs = {}
+        self.calls = 0
+        self.fail_on_call = fail_on_call
+
+    def parallel_bulk(self, client, actions, **kwargs):
+        self.calls += 1
+        if self.fail_on_call == self.calls:
+            raise ConnectionError("模拟ES中断")
+        for action in actions:
+            self.docs[(action['_index'], action['_id'])] = action['_source']
+            yield True, {'index': {'_id': action['_id']}}
+
+    def count(self, index):
+        return sum(1 for (i, _) in self.docs if i == index)
+
+
+@pytest.fixture
+def populated_db(temp_db):
+    db = DatabaseManager(temp_db)
+    for i in range(25):
+        db.add_conversation(
+            source_url=f"https://chatgpt.com/share/conv-{i}",
+            platform="chatgpt",
+            title=f"对话{i}",
+            raw_content={'messages': [
+                {'role': 'user', 'content': f'问题{i}'},
+                {'role': 'assistant', 'content': f'回答{i}'},
+            ]},
+            tags=["Python"] if i % 2 else []
+        )
+    db.close()
+    return temp_db
+
+
+def _run(db_path, es, tmp_path, **kwargs):
+    migrator = StreamingMigrator(
+        db_path, es, page_size=10, workers=1,
+        checkpoint_path=str(tmp_path / "ckpt.json"), **kwargs
+    )
+    with patch('database.streaming_migrator.helpers.parallel_bulk', es.parallel_bulk):
+        return migrator, migrator.run()
+
+
+class TestBuildActions:
+    """测试文档转换"""
+
+    def test_conversation_and_messages(self):
+        conv = {
+            'id': 1, 'source_url': 'https://chatgpt.com/share/x', 'platform': 'chatgpt',
+            'title': 't', 'summary': None, 'category': None, 'message_count': 2,
+            'created_at': '2024-01-01 10:00:00', 'updated_at': '2024-01-01 10:00:00',
+            'raw_content': '{"messages": [{"role": "user", "content": "a"},'
+                           ' {"role": "assistant", "content": "b"}]}',
+            'tags': ['Python'],
+        }
+        actions = build_conversation_actions(conv, 'c', 'm')
+
+        assert len(actions) == 3
+        assert actions[0]['_source']['tags'] == ['Python']
+        assert actions[0]['_source']['create_time'] == '2024-01-01T10:00:00'
+        assert actions[2]['_source']['order_index'] == 1
+        assert actions[2]['_source']['parent_message_id'] == actions[1]['_id']
+
+    def test_invalid_raw_content(self):
+        conv = {'id': 1, 'source_url': 'u', 'platform': 'p', 'title': 't',
+                'raw_content': 'not json', 'created_at': None, 'updated_at': None}
+        assert len(build_conversation_actions(conv, 'c', 'm')) == 1
+
+
+class TestStreamingMigrator:
+    """测试迁移流程"""
+
+    def test_full_migration(self, populated_db, tmp_path):
+        es = FakeES()
+        migrator, result = _run(populated_db, es, tmp_path)
+
+        assert result['status'] == 'success'
+        assert result['conversations'] == 25
+        assert result['messages'] == 50
+        assert es.count(es.conversation_index) == 25
+        assert es.count(es.message_index) == 50
+        assert es.count(es.tag_index) > 0
+        # 完成后清理检查点
+        assert not migrator.checkpoint_path.exists()
+
+    def test_keyset_pagination(self, populated_db):
+        migrator = StreamingMigrator(populated_db, FakeES(), page_size=10, workers=1)
+        conn = migrator._connect_readonly()
+        pages = list(migrator.iter_pages(conn, 0))
+        conn.close()
+
+        assert [len(p) for p in pages] == [10, 10, 5]
+        ids = [c['id'] for p in pages for c in p]
+        assert ids == sorted(set(ids))
+        assert pages[0][1]['tags'] == ["Python"]
+
+    def test_resume_after_interruption(self, populated_db, tmp_path):
+        # 第一次：标签1次 + 第1页成功，第2页写入时ES中断
+        es = FakeES(fail_on_call=3)
+        with pytest.raises(ConnectionError):
+            _run(populated_db, es, tmp_path)
+
+        checkpoint = StreamingMigrator(
+            populated_db, es, checkpoint_path=str(tmp_path / "ckpt.json")
+        ).load_checkpoint()
+        assert checkpoint['conversations'] == 10
+
+        # 第二次：从检查点继续，只写剩余的15个对话
+        es.fail_on_call = None
+        written_before = es.count(es.conversation_index)
+        _, result = _run(populated_db, es, tmp_path)
+
+        assert written_before == 10
+        assert result['conversations'] == 25
+        assert es.count(es.conversation_index) == 25
+
+    def test_progress_callback(self, populated_db, tmp_path):
+        es = FakeES()
+        reports = []
+        migrator = StreamingMigrator(
+            populated_db, es, page_size=10, workers=1, progress_interval=0,
+            checkpoint_path=str(tmp_path / "ckpt.json")
+        )
+        with patch('database.streaming_migrator.helpers.parallel_bulk', es.parallel_bulk):
+            migrator.run(progress_callback=reports.append)
+
+        assert len(reports) == 3
+        assert reports[-1]['percent'] == pytest.approx(100.0)
+        assert reports[-1]['docs_per_second'] > 0
+
+    def test_process_pool(self, populated_db, tmp_path):
+        es = FakeES()
+        migrator = StreamingMigrator(
+            populated_db, es, page_size=10, workers=2,
+            checkpoint_path=str(tmp_path / "ckpt.json")
+        )
+        with patch('database.streaming_migrator.helpers.parallel_bulk', es.parallel_bulk):
+            result = migrator.run()
+
+        assert result['messages'] == 50
+        assert es.count(es.message_index) == 50
@@ -0,0 +1,114 @@
+"""
+抽取式预压缩单元测试
+"""
+import time
+
+import pytest
+
+from ai import text_compressor
+from ai.ollama_client import OllamaClient
+from ai.segmented_analysis import estimate_tokens
+from ai.text_compressor import TextCompressor, attach_compressor
+
+
+CODE = "```python\n" + "\n".join(f"def step{i}(df):\n    return df.dropna()" for i in range(10)) + "\n```"
+
+TOPICS = ["缺失值", "分组聚合", "可视化", "时间序列", "合并数据表"]
+
+
+def _conversation(rounds=30):
+    parts = []
+    for i in range(rounds):
+        topic = TOPICS[i % len(TOPICS)]
+        parts.append(f"用户: 第{i}个问题：pandas里{topic}怎么处理？")
+        parts.append(f"助手: 关于{topic}，推荐使用pandas的内置方法。Copy code\n{CODE}\n\n"
+                     f"另外，{topic}的处理还要注意数据类型。" + "这段补充说明比较冗长。" * i)
+    return "\n\n".join(parts)
+
+
+class TestTextCompressor:
+    """测试预压缩"""
+
+    def test_short_text_unchanged(self):
+        text = "用户: 你好\n\n助手: 你好，有什么可以帮你？"
+        result = TextCompressor(1000).compress(text)
+        assert result.text == text
+        assert result.ratio == 1.0
+
+    def test_boilerplate_and_duplicate_blocks_removed(self):
+        text = "用户: 问题\n\nCopy code\n\n助手: 一段足够长的重复回答内容，用于测试去重。\n\n" \
+               "用户: 再问一次\n\n助手: 一段足够长的重复回答内容，用于测试去重。"
+        result = TextCompressor(1000).compress(text)
+
+        assert "Copy code" not in result.text
+        assert result.text.count("一段足够长的重复回答内容") == 1
+        assert result.duplicates_removed == 1
+
+    def test_code_collapsed_to_signatures(self):
+        result = TextCompressor(5000).compress(f"助手: 示例代码\n\n{CODE}")
+        assert "def step0(df):" in result.text
+        assert "return df.dropna()" not in result.text
+        assert "省略" in result.text
+        assert result.code_blocks_collapsed == 1
+
+    def test_fits_budget_and_keeps_order(self):
+        text = _conversation()
+        result = TextCompressor(600).compress(text)
+
+        assert result.compressed_tokens <= 600
+        assert result.ratio < 0.1
+        assert result.sentences_dropped > 0
+        # 保留的提问仍按原文顺序出现
+        numbers = [int(line.split("第")[1].split("个")[0])
+                   for line in result.text.split("\n") if line.startswith("用户: 第")]
+        assert numbers == sorted(numbers) and numbers
+
+    def test_fast_enough(self):
+        text = _conversation(100)
+        start = time.perf_counter()
+        TextCompressor(2000).compress(text)
+        assert time.perf_counter() - start < 1.0
+
+    def test_position_fallback_without_numpy(self, monkeypatch):
+        monkeypatch.setattr(text_compressor, "np", None)
+        result = TextCompressor(300).compress(_conversation(10))
+        assert estimate_tokens(result.text) <= 300
+
+
+class TestClientIntegration:
+    """测试分析前预压缩"""
+
+    def test_client_reports_compression_ratio(self):
+        client = attach_compressor(OllamaClient(), 500)
+        prompts = []
+        client.generate = lambda prompt, system_prompt=None, stop_at_json=False: (
+            prompts.append(prompt) or '{"summary": "s", "category": "编程", "tags": []}')
+        text = _conversation(15)
+
+        result = client.analyze_conversation(text)
+
+        assert len(prompts) == 1
+        assert result.compression_ratio == pytest.approx(
+            estimate_tokens(client.compressor.compress(text).text) / estimate_tokens(text), abs=0.01)
+        assert "Copy code" not in prompts[0]
+
+    def test_long_conversation_still_segmented(self):
+        """长对话不整体压缩到预算以内，仍按原文分段，每段再压缩"""
+        client = attach_compressor(OllamaClient(), 500)
+        prompts = []
+        client.generate = lambda prompt, system_prompt=None, stop_at_json=False: (
+            prompts.append(prompt) or '{"summary": "s", "category": "编程", "tags": []}')
+        text = _conversation(60)
+        assert len(text) >= client.segment_threshold
+
+        result = client.analyze_conversation(text)
+
+        assert len(result.segment_timings) > 1
+        assert len(prompts) == len(result.segment_timings) + 1
+        assert "第59个问题" in "".join(prompts)               # 对话结尾没有在分段前被丢掉
+        assert not any("Copy code" in prompt for prompt in prompts)
+        assert 0 < result.compression_ratio < 1
+
+    def test_attach_disabled(self):
+        client = attach_compressor(OllamaClient(), 0)
+        assert client.compressor is None
@@ -0,0 +1,131 @@
+"""
+链接规范化与抓取前查重单元测试
+
+各平台分享链接的规范形式、按规范链接查找已收藏对话、重新抓取替换内容、命令行添加时跳过抓取。
+"""
+import sqlite3
+
+import pytest
+
+from main import ChatCompass
+from scrapers.base_scraper import ConversationData, Message
+from scrapers.url_canonical import canonicalize_url
+
+
+def content(answer="使用联合索引"):
+    return {'messages': [{'role': 'user', 'content': "如何优化SQL查询？"},
+                         {'role': 'assistant', 'content': answer}]}
+
+
+class TestCanonicalize:
+    """测试链接规范化"""
+
+    @pytest.mark.parametrize('url', [
+        "https://chatgpt.com/share/abc-123",
+        "http://chat.openai.com/share/abc-123",
+        "https://www.chatgpt.com/share/abc-123/",
+        "  https://chatgpt.com/share/abc-123?utm_source=wechat#msg-2 ",
+    ])
+    def test_chatgpt(self, url):
+        assert canonicalize_url(url) == "https://chatgpt.com/share/abc-123"
+
+    def test_share_id_is_whole_segment(self):
+        assert canonicalize_url("https://chatgpt.com/share/test_0_1") != canonicalize_url("https://chatgpt.com/share/test_0_2")
+
+    def test_other_platforms(self):
+        assert canonicalize_url("http://Claude.ai/share/x1/") == "https://claude.ai/share/x1"
+        assert canonicalize_url("https://chat.deepseek.com/share/d9?from=app") == "https://chat.deepseek.com/share/d9"
+
+    def test_generic(self):
+        assert canonicalize_url("HTTPS://Poe.com/s/Abc/?utm_medium=x&lang=zh#top") == "https://poe.com/s/Abc?lang=zh"
+        assert canonicalize_url("不是链接") == "不是链接"
+
+
+class TestFindByUrl:
+    """测试按规范链接查找"""
+
+    def test_variants(self, db):
+        conv_id = db.add_conversation("https://chat.openai.com/share/abc", 'chatgpt', "SQL", content())
+
+        assert db.find_by_url("https://chatgpt.com/share/abc?utm_source=x") == conv_id
+        assert db.find_by_url("https://chatgpt.com/share/other") is None
+        # 同一分享的另一种链接形式不再重复入库
+        assert db.add_conversation("https://chatgpt.com/share/abc", 'chatgpt', "SQL", content()) == conv_id
+        assert db.get_statistics()['total_conversations'] == 1
+
+    def test_alias_and_delete(self, db):
+        conv_id = db.add_conversation("https://chatgpt.com/share/a", 'chatgpt', "SQL", content())
+        db.add_alias("https://chat.openai.com/share/b", conv_id)
+        assert db.find_by_url("https://chatgpt.com/share/b/") == conv_id
+
+        db.delete_conversation(conv_id)
+        assert db.find_by_url("https://chatgpt.com/share/a") is None
+        assert db.find_by_url("https://chatgpt.com/share/b") is None
+
+    def test_other_connection(self, db, tmp_path):
+        assert db.find_by_url("https://claude.ai/share/x") is None      # 加载内存索引
+
+        other = sqlite3.connect(str(tmp_path / "test.db"))
+        other.execute("INSERT INTO conversations (source_url, platform, title, raw_content) "
+                      "VALUES ('https://claude.ai/share/x', 'claude', 't', '{}')")
+        other.commit()
+        conv_id = other.execute("SELECT id FROM conversations").fetchone()[0]
+        assert db.find_by_url("https://claude.ai/share/x") == conv_id
+
+        other.execute("DELETE FROM conversations")
+        other.commit()
+        other.close()
+        assert db.find_by_url("https://claude.ai/share/x") is None
+
+    def test_replace_content(self, db):
+        conv_id = db.add_conversation("https://chatgpt.com/share/a", 'chatgpt', "SQL", content(),
+                                      summary="旧摘要", tags=['SQL'], analysis_confidence=0.9)
+        db.update_conversation(conv_id, is_favorite=True)
+
+        db.replace_content(conv_id, "SQL（更新）", content("使用联合索引，遵循最左前缀原则"))
+
+        conversation = db.get_conversation(conv_id)
+        assert conversation['title'] == "SQL（更新）"
+        assert conversation['raw_content']['messages'][1]['content'].endswith("最左前缀原则")
+        assert conversation['analysis_confidence'] is None
+        assert conversation['is_favorite'] and conversation['tags'] == ['SQL']
+
+
+class FakeFactory:
+    def __init__(self):
+        self.urls = []
+
+    def scrape(self, url):
+        self.urls.append(url)
+        return ConversationData(platform='chatgpt', url=url, title=f"第{len(self.urls)}次抓取",
+                                messages=[Message('user', "问题"), Message('assistant', "回答")])
+
+
+@pytest.fixture
+def app(db, monkeypatch):
+    app = ChatCompass.__new__(ChatCompass)
+    app.db = db
+    app.scraper_factory = FakeFactory()
+    app.ai_client = None
+    app.auto_analyzer = None
+    app.background_related = False
+    return app
+
+
+class TestAddFromUrl:
+    """测试命令行添加"""
+
+    def test_skips_known_share(self, app):
+        conv_id = app.add_conversation_from_url("http://chat.openai.com/share/abc")
+
+        assert app.add_conversation_from_url("https://chatgpt.com/share/abc/") == conv_id
+        assert app.scraper_factory.urls == ["https://chatgpt.com/share/abc"]
+        assert app.db.get_conversation(conv_id)['source_url'] == "https://chatgpt.com/share/abc"
+
+    def test_refresh(self, app):
+        conv_id = app.add_conversation_from_url("https://chatgpt.com/share/abc")
+
+        assert app.add_conversation_from_url("https://chatgpt.com/share/abc", refresh=True) == conv_id
+        assert len(app.scraper_factory.urls) == 2
+        assert app.db.get_conversation(conv_id)['title'] == "第2次抓取"
+        assert app.db.get_statistics()['total_conversations'] == 1